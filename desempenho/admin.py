@@ -1,3 +1,59 @@
 from django.contrib import admin
 
-# Register your models here.
+from .models import DesempenhoDiario, SerieDiariaDisciplina, HistogramaAcerto, PontosFracosUsuario, EngajamentoDiario, RetencaoCoorte
+
+
+@admin.register(DesempenhoDiario)
+class DesempenhoDiarioAdmin(admin.ModelAdmin):
+    list_display = ('usuario', 'data', 'disciplina', 'assunto', 'banca', 'respondidas', 'acertos')
+    list_filter = ('data',)
+    search_fields = ('usuario__username',)
+    # Consolidado derivado de RespostaUsuario: use `reconstruir_desempenho` para corrigi-lo.
+    def has_add_permission(self, request): return False
+    def has_change_permission(self, request, obj=None): return False
+
+
+@admin.register(SerieDiariaDisciplina)
+class SerieDiariaDisciplinaAdmin(admin.ModelAdmin):
+    list_display = ('usuario', 'data', 'disciplina', 'respondidas', 'acertos')
+    list_filter = ('data',)
+    search_fields = ('usuario__username',)
+    # Somada a cada evento de resposta gravado (ver EscritorDeEventos).
+    def has_add_permission(self, request): return False
+    def has_change_permission(self, request, obj=None): return False
+
+
+@admin.register(HistogramaAcerto)
+class HistogramaAcertoAdmin(admin.ModelAdmin):
+    list_display = ('escopo', 'alvo_id', 'total_usuarios', 'atualizado_em')
+    list_filter = ('escopo',)
+    # Recalculado por `atualizar_histogramas_acerto`.
+    def has_add_permission(self, request): return False
+    def has_change_permission(self, request, obj=None): return False
+
+
+@admin.register(PontosFracosUsuario)
+class PontosFracosUsuarioAdmin(admin.ModelAdmin):
+    list_display = ('usuario', 'assuntos', 'atualizado_em')
+    search_fields = ('usuario__username',)
+    # Recalculado por `recalcular_pontos_fracos`.
+    def has_add_permission(self, request): return False
+    def has_change_permission(self, request, obj=None): return False
+
+
+@admin.register(EngajamentoDiario)
+class EngajamentoDiarioAdmin(admin.ModelAdmin):
+    list_display = ('data', 'usuarios_ativos', 'ativos_7_dias', 'ativos_30_dias', 'respostas', 'novos_usuarios')
+    date_hierarchy = 'data'
+    # Recalculado por `calcular_engajamento`.
+    def has_add_permission(self, request): return False
+    def has_change_permission(self, request, obj=None): return False
+
+
+@admin.register(RetencaoCoorte)
+class RetencaoCoorteAdmin(admin.ModelAdmin):
+    list_display = ('coorte', 'semana', 'tamanho_coorte', 'ativos')
+    list_filter = ('coorte',)
+    # Recalculado por `calcular_engajamento`.
+    def has_add_permission(self, request): return False
+    def has_change_permission(self, request, obj=None): return False
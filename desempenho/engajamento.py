@@ -0,0 +1,161 @@
+# desempenho/engajamento.py
+
+from datetime import timedelta
+
+import numpy as np
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.db.models import Count, Q
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from pratica.models import EventoResposta
+from pratica.utils import filtro_periodo, fuso_local, hoje_local
+from .models import EngajamentoDiario, VolumeDisciplinaDiario, RetencaoCoorte
+
+# =======================================================================
+# ANALYTICS DE ENGAJAMENTO (JOB NOTURNO)
+# =======================================================================
+# Uma única leitura do histórico de respostas, já agregada pelo banco em
+# células (usuário, dia, disciplina), alimenta todas as métricas: DAU/WAU/MAU,
+# volume por disciplina e a matriz de retenção por coorte de cadastro. O resto
+# é feito em NumPy sobre essas células, sem laços por usuário.
+DIAS_ENGAJAMENTO = 90
+SEMANAS_COORTE = 12
+TAMANHO_LOTE_ENGAJAMENTO = 5000
+JANELAS_ATIVOS = {'usuarios_ativos': 1, 'ativos_7_dias': 7, 'ativos_30_dias': 30}
+
+def _celulas_de_atividade(inicio, fim, tamanho_lote):
+    """
+    Matriz (n x 5) com [usuario_id, dia (ordinal), disciplina_id, respostas,
+    acertos] de cada célula com respostas entre `inicio` e `fim`.
+    """
+    celulas = EventoResposta.objects.filter(**filtro_periodo('registrado_em', inicio, fim)).annotate(
+        dia=TruncDate('registrado_em', tzinfo=fuso_local())
+    ).values('usuario_id', 'dia', 'questao__disciplina_id').annotate(
+        respostas=Count('id'), acertos=Count('id', filter=Q(correta=True))
+    ).values_list('usuario_id', 'dia', 'questao__disciplina_id', 'respostas', 'acertos').order_by()
+
+    blocos, lote = [], []
+    for usuario_id, dia, disciplina_id, respostas, acertos in celulas.iterator(chunk_size=tamanho_lote):
+        lote.append((usuario_id, dia.toordinal(), disciplina_id, respostas, acertos))
+        if len(lote) >= tamanho_lote:
+            blocos.append(np.array(lote, dtype=np.int64))
+            lote = []
+    if lote:
+        blocos.append(np.array(lote, dtype=np.int64))
+    return np.concatenate(blocos) if blocos else np.empty((0, 5), dtype=np.int64)
+
+def ativos_por_janela(usuarios, dias, janela, n_dias):
+    """
+    Número de usuários distintos ativos nos `janela` dias terminados em cada
+    dia 0..n_dias-1. `usuarios`/`dias` são os pares únicos (usuário, dia),
+    ordenados por usuário e dia. Cada dia ativo cobre as janelas que terminam
+    em [dia, dia + janela); dentro do mesmo usuário os intervalos se sobrepõem,
+    então cada um só começa onde o anterior terminou. Somando +1/-1 nas bordas
+    e acumulando, cada usuário conta uma única vez por janela.
+    """
+    anterior = np.r_[-janela, dias[:-1]]
+    mesmo_usuario = np.r_[False, usuarios[1:] == usuarios[:-1]]
+    inicio = np.where(mesmo_usuario, np.maximum(dias, anterior + janela), dias)
+    fim = dias + janela
+    valido = inicio < fim
+    tamanho = n_dias + janela
+    bordas = np.bincount(inicio[valido], minlength=tamanho) - np.bincount(fim[valido], minlength=tamanho)
+    return np.cumsum(bordas)[:n_dias]
+
+def _inicio_da_semana(dia):
+    return dia - timedelta(days=dia.weekday())
+
+def _matriz_de_retencao(usuarios, dias, cadastros, semanas):
+    """
+    Retorna (tamanhos, ativos): tamanhos[c] é o número de cadastrados na
+    semana c e ativos[c, k] quantos deles responderam na semana c + k.
+    `dias` e `cadastros[:, 1]` são dias contados a partir da segunda-feira
+    da primeira coorte; `cadastros[:, 0]` são os ids dos usuários.
+    """
+    tamanhos = np.bincount(cadastros[:, 1] // 7, minlength=semanas)[:semanas]
+    ativos = np.zeros((semanas, semanas), dtype=np.int64)
+    if not len(cadastros) or not len(usuarios):
+        return tamanhos, ativos
+    ordem = np.argsort(cadastros[:, 0])
+    ids, semana_coorte = cadastros[ordem, 0], cadastros[ordem, 1] // 7
+    posicao = np.minimum(np.searchsorted(ids, usuarios), len(ids) - 1)
+    da_coorte = (ids[posicao] == usuarios) & (dias >= 0)
+    posicao, semana_atividade = posicao[da_coorte], dias[da_coorte] // 7
+    k = semana_atividade - semana_coorte[posicao]
+    posicao, k = posicao[k >= 0], k[k >= 0]
+    # Um usuário conta uma vez por semana, não importa quantos dias estudou.
+    unicos = np.unique(posicao * semanas + k)
+    celulas = semana_coorte[unicos // semanas] * semanas + unicos % semanas
+    ativos += np.bincount(celulas, minlength=semanas * semanas).reshape(semanas, semanas)
+    return tamanhos, ativos
+
+def calcular_engajamento(dias=DIAS_ENGAJAMENTO, semanas=SEMANAS_COORTE, fim=None, tamanho_lote=TAMANHO_LOTE_ENGAJAMENTO):
+    """
+    Recalcula as tabelas-resumo do painel de engajamento para os `dias` dias
+    terminados em `fim` (padrão: ontem, o último dia fechado) e a matriz de
+    retenção das últimas `semanas` coortes semanais. Retorna o número de
+    linhas gravadas em cada tabela.
+    """
+    fim = fim or hoje_local() - timedelta(days=1)
+    inicio = fim - timedelta(days=dias - 1)
+    primeira_coorte = _inicio_da_semana(fim) - timedelta(weeks=semanas - 1)
+    # O MAU do primeiro dia e a retenção da primeira coorte precisam de atividade anterior ao período.
+    origem = min(inicio - timedelta(days=max(JANELAS_ATIVOS.values()) - 1), primeira_coorte)
+    n_dias = (fim - origem).days + 1
+
+    celulas = _celulas_de_atividade(origem, fim, tamanho_lote)
+    usuario, dia, disciplina, respostas, acertos = celulas.T
+    dia = dia - origem.toordinal()
+    pares = np.unique(usuario * n_dias + dia)
+    usuarios_pares, dias_pares = pares // n_dias, pares % n_dias
+
+    metricas = {campo: ativos_por_janela(usuarios_pares, dias_pares, janela, n_dias) for campo, janela in JANELAS_ATIVOS.items()}
+    metricas['respostas'] = np.bincount(dia, weights=respostas, minlength=n_dias)
+    metricas['acertos'] = np.bincount(dia, weights=acertos, minlength=n_dias)
+
+    cadastros = np.array([
+        (user_id, (timezone.localtime(data, fuso_local()).date() - origem).days)
+        for user_id, data in User.objects.filter(**filtro_periodo('date_joined', origem, fim)).values_list('id', 'date_joined').iterator(chunk_size=tamanho_lote)
+    ], dtype=np.int64).reshape(-1, 2)
+    metricas['novos_usuarios'] = np.bincount(cadastros[:, 1], minlength=n_dias)
+
+    desde_inicio = (inicio - origem).days
+    engajamento = [
+        EngajamentoDiario(data=origem + timedelta(days=d), **{campo: int(valores[d]) for campo, valores in metricas.items()})
+        for d in range(desde_inicio, n_dias)
+    ]
+
+    no_periodo = dia >= desde_inicio
+    base = int(disciplina.max(initial=0)) + 1
+    chaves, indices = np.unique(dia[no_periodo] * base + disciplina[no_periodo], return_inverse=True)
+    volume_respostas = np.bincount(indices, weights=respostas[no_periodo], minlength=len(chaves))
+    volume_acertos = np.bincount(indices, weights=acertos[no_periodo], minlength=len(chaves))
+    volumes = [
+        VolumeDisciplinaDiario(
+            data=origem + timedelta(days=int(chave) // base), disciplina_id=int(chave) % base,
+            respostas=int(volume_respostas[i]), acertos=int(volume_acertos[i]),
+        )
+        for i, chave in enumerate(chaves)
+    ]
+
+    deslocamento = (primeira_coorte - origem).days
+    em_coorte = cadastros[:, 1] >= deslocamento
+    tamanhos, ativos = _matriz_de_retencao(
+        usuarios_pares, dias_pares - deslocamento, cadastros[em_coorte] - [0, deslocamento], semanas
+    )
+    retencao = [
+        RetencaoCoorte(coorte=primeira_coorte + timedelta(weeks=c), semana=k, tamanho_coorte=int(tamanhos[c]), ativos=int(ativos[c, k]))
+        # Só as semanas que já começaram: a coorte c tem semanas - c colunas.
+        for c in range(semanas) for k in range(semanas - c)
+    ]
+
+    with transaction.atomic():
+        EngajamentoDiario.objects.filter(data__gte=inicio, data__lte=fim).delete()
+        EngajamentoDiario.objects.bulk_create(engajamento, batch_size=1000)
+        VolumeDisciplinaDiario.objects.filter(data__gte=inicio, data__lte=fim).delete()
+        VolumeDisciplinaDiario.objects.bulk_create(volumes, batch_size=2000)
+        RetencaoCoorte.objects.filter(coorte__gte=primeira_coorte).delete()
+        RetencaoCoorte.objects.bulk_create(retencao, batch_size=1000)
+    return {'dias': len(engajamento), 'volumes': len(volumes), 'coortes': len(retencao)}
@@ -0,0 +1,15 @@
+# desempenho/management/commands/atualizar_histogramas_acerto.py
+
+from django.core.management.base import BaseCommand
+
+from desempenho.services import atualizar_histogramas_acerto
+
+
+class Command(BaseCommand):
+    help = ('Recalcula os histogramas de acerto por disciplina, banca e simulado usados na comparação '
+            '"top X%" do desempenho e do resultado de simulados. Agende uma vez por dia.')
+
+    def handle(self, *args, **options):
+        gravados = atualizar_histogramas_acerto()
+        resumo = ', '.join(f'{total} de {escopo.lower()}' for escopo, total in gravados.items())
+        self.stdout.write(self.style.SUCCESS(f'Histogramas de acerto atualizados: {resumo}.'))
@@ -0,0 +1,31 @@
+# desempenho/management/commands/calcular_engajamento.py
+
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+
+from desempenho.engajamento import calcular_engajamento, DIAS_ENGAJAMENTO, SEMANAS_COORTE
+
+
+class Command(BaseCommand):
+    help = ('Recalcula as tabelas-resumo do painel de engajamento da gestão: usuários ativos (DAU/WAU/MAU), '
+            'respostas por disciplina e retenção por coorte semanal de cadastro. Agende uma vez por noite.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dias', type=int, default=DIAS_ENGAJAMENTO, help='Quantidade de dias recalculados.')
+        parser.add_argument('--semanas', type=int, default=SEMANAS_COORTE, help='Quantidade de coortes semanais na matriz de retenção.')
+        parser.add_argument('--ate', help='Último dia calculado (AAAA-MM-DD). Padrão: ontem.')
+
+    def handle(self, *args, **options):
+        fim = None
+        if options['ate']:
+            try:
+                fim = date.fromisoformat(options['ate'])
+            except ValueError:
+                raise CommandError('Data inválida. Use o formato AAAA-MM-DD.')
+
+        resumo = calcular_engajamento(dias=options['dias'], semanas=options['semanas'], fim=fim)
+        self.stdout.write(self.style.SUCCESS(
+            f"Engajamento recalculado: {resumo['dias']} dias, {resumo['volumes']} linhas de volume por disciplina "
+            f"e {resumo['coortes']} células de retenção."
+        ))
@@ -0,0 +1,20 @@
+# desempenho/management/commands/recalcular_pontos_fracos.py
+
+from django.core.management.base import BaseCommand
+
+from desempenho.services import recalcular_pontos_fracos
+
+
+class Command(BaseCommand):
+    help = ('Recalcula a recomendação de pontos fracos (top assuntos a revisar) de todos os usuários com respostas '
+            'e grava o resultado na tabela PontosFracosUsuario. Agende uma vez por noite.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--usuarios', nargs='+', type=int, metavar='ID', help='Recalcula apenas os usuários informados.')
+
+    def handle(self, *args, **options):
+        recomendacoes = recalcular_pontos_fracos(usuario_ids=options['usuarios'])
+        com_recomendacao = sum(1 for assuntos in recomendacoes.values() if assuntos)
+        self.stdout.write(self.style.SUCCESS(
+            f'Pontos fracos recalculados para {len(recomendacoes)} usuários ({com_recomendacao} com recomendações).'
+        ))
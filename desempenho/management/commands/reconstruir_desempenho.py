@@ -0,0 +1,16 @@
+# desempenho/management/commands/reconstruir_desempenho.py
+
+from django.core.management.base import BaseCommand
+
+from desempenho.services import reconstruir_desempenho
+
+
+class Command(BaseCommand):
+    help = 'Recalcula o consolidado diário de desempenho (DesempenhoDiario) a partir das respostas dos usuários.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--usuarios', nargs='+', type=int, metavar='ID', help='Recalcula apenas os usuários informados.')
+
+    def handle(self, *args, **options):
+        criadas = reconstruir_desempenho(usuario_ids=options['usuarios'])
+        self.stdout.write(self.style.SUCCESS(f'Consolidado de desempenho reconstruído: {criadas} células.'))
@@ -0,0 +1,61 @@
+# Generated by Django 5.2.5 on 2026-10-19 13:37
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, Q
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+
+def popular_desempenho(apps, schema_editor):
+    RespostaUsuario = apps.get_model('pratica', 'RespostaUsuario')
+    DesempenhoDiario = apps.get_model('desempenho', 'DesempenhoDiario')
+    celulas = RespostaUsuario.objects.annotate(
+        dia=TruncDate('data_resposta', tzinfo=timezone.get_default_timezone())
+    ).values(
+        'usuario_id', 'dia', 'questao__disciplina_id', 'questao__assunto_id', 'questao__banca_id', 'questao__instituicao_id'
+    ).annotate(total=Count('id'), total_acertos=Count('id', filter=Q(foi_correta=True))).order_by()
+    DesempenhoDiario.objects.bulk_create([
+        DesempenhoDiario(
+            usuario_id=c['usuario_id'], data=c['dia'], disciplina_id=c['questao__disciplina_id'],
+            assunto_id=c['questao__assunto_id'], banca_id=c['questao__banca_id'],
+            instituicao_id=c['questao__instituicao_id'], respondidas=c['total'], acertos=c['total_acertos'],
+        )
+        for c in celulas.iterator()
+    ], batch_size=5000)
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        ('pratica', '0002_respostausuario_resposta_usuario_data_idx_and_more'),
+        ('questoes', '0001_initial'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DesempenhoDiario',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('data', models.DateField()),
+                ('respondidas', models.PositiveIntegerField(default=0)),
+                ('acertos', models.PositiveIntegerField(default=0)),
+                ('assunto', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='questoes.assunto')),
+                ('banca', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, to='questoes.banca')),
+                ('disciplina', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='questoes.disciplina')),
+                ('instituicao', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, to='questoes.instituicao')),
+                ('usuario', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='desempenho_diario', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Desempenho Diário',
+                'verbose_name_plural': 'Desempenho Diário',
+                'indexes': [models.Index(fields=['usuario', 'data'], name='desempenho_usuario_data_idx')],
+                'unique_together': {('usuario', 'data', 'disciplina', 'assunto', 'banca', 'instituicao')},
+            },
+        ),
+        migrations.RunPython(popular_desempenho, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 5.2.5 on 2026-10-19 13:48
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('desempenho', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='HistogramaAcerto',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('escopo', models.CharField(choices=[('DISCIPLINA', 'Disciplina'), ('BANCA', 'Banca'), ('SIMULADO', 'Simulado')], max_length=10)),
+                ('alvo_id', models.PositiveIntegerField()),
+                ('contagens', models.JSONField(default=list, help_text='Número de usuários em cada faixa de acerto (0-5%, 5-10%, ..., 95-100%).')),
+                ('total_usuarios', models.PositiveIntegerField(default=0)),
+                ('atualizado_em', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name': 'Histograma de Acerto',
+                'verbose_name_plural': 'Histogramas de Acerto',
+                'unique_together': {('escopo', 'alvo_id')},
+            },
+        ),
+    ]
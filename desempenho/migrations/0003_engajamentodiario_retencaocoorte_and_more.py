@@ -0,0 +1,64 @@
+# Generated by Django 5.2.5 on 2026-10-19 13:59
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('desempenho', '0002_histogramaacerto'),
+        ('questoes', '0002_calibracaoquestao'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EngajamentoDiario',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('data', models.DateField(unique=True)),
+                ('usuarios_ativos', models.PositiveIntegerField(default=0, help_text='DAU: usuários com ao menos uma resposta no dia.')),
+                ('ativos_7_dias', models.PositiveIntegerField(default=0, help_text='WAU: usuários ativos nos 7 dias terminados nesta data.')),
+                ('ativos_30_dias', models.PositiveIntegerField(default=0, help_text='MAU: usuários ativos nos 30 dias terminados nesta data.')),
+                ('respostas', models.PositiveIntegerField(default=0)),
+                ('acertos', models.PositiveIntegerField(default=0)),
+                ('novos_usuarios', models.PositiveIntegerField(default=0)),
+            ],
+            options={
+                'verbose_name': 'Engajamento Diário',
+                'verbose_name_plural': 'Engajamento Diário',
+                'ordering': ['data'],
+            },
+        ),
+        migrations.CreateModel(
+            name='RetencaoCoorte',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('coorte', models.DateField()),
+                ('semana', models.PositiveSmallIntegerField()),
+                ('tamanho_coorte', models.PositiveIntegerField(default=0)),
+                ('ativos', models.PositiveIntegerField(default=0)),
+            ],
+            options={
+                'verbose_name': 'Retenção de Coorte',
+                'verbose_name_plural': 'Retenção de Coortes',
+                'ordering': ['coorte', 'semana'],
+                'unique_together': {('coorte', 'semana')},
+            },
+        ),
+        migrations.CreateModel(
+            name='VolumeDisciplinaDiario',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('data', models.DateField()),
+                ('respostas', models.PositiveIntegerField(default=0)),
+                ('acertos', models.PositiveIntegerField(default=0)),
+                ('disciplina', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='questoes.disciplina')),
+            ],
+            options={
+                'verbose_name': 'Volume Diário por Disciplina',
+                'verbose_name_plural': 'Volume Diário por Disciplina',
+                'unique_together': {('data', 'disciplina')},
+            },
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 5.2.5 on 2026-10-19 14:28
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('desempenho', '0003_engajamentodiario_retencaocoorte_and_more'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PontosFracosUsuario',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('assuntos', models.JSONField(default=list, help_text='IDs dos assuntos recomendados, do mais fraco ao menos fraco.')),
+                ('atualizado_em', models.DateTimeField(auto_now=True)),
+                ('usuario', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='pontos_fracos', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Pontos Fracos do Usuário',
+                'verbose_name_plural': 'Pontos Fracos dos Usuários',
+            },
+        ),
+    ]
@@ -0,0 +1,40 @@
+# Generated by Django 5.2.5 on 2026-10-19 15:03
+
+import django.db.models.functions.comparison
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, Min, Sum
+
+
+def juntar_celulas_duplicadas(apps, schema_editor):
+    # Células sem banca/instituição podiam ter sido criadas em dobro pela
+    # chave antiga: soma as contagens na primeira e apaga as demais.
+    DesempenhoDiario = apps.get_model('desempenho', 'DesempenhoDiario')
+    chave = ('usuario_id', 'data', 'disciplina_id', 'assunto_id', 'banca_id', 'instituicao_id')
+    duplicadas = DesempenhoDiario.objects.values(*chave).annotate(
+        linhas=Count('id'), primeira=Min('id'), total=Sum('respondidas'), total_acertos=Sum('acertos')
+    ).filter(linhas__gt=1).order_by()
+    for celula in duplicadas.iterator():
+        DesempenhoDiario.objects.filter(pk=celula['primeira']).update(respondidas=celula['total'], acertos=celula['total_acertos'])
+        DesempenhoDiario.objects.filter(**{campo: celula[campo] for campo in chave}).exclude(pk=celula['primeira']).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('desempenho', '0004_pontosfracosusuario'),
+        ('questoes', '0002_calibracaoquestao'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AlterUniqueTogether(
+            name='desempenhodiario',
+            unique_together=set(),
+        ),
+        migrations.RunPython(juntar_celulas_duplicadas, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='desempenhodiario',
+            constraint=models.UniqueConstraint(models.F('usuario'), models.F('data'), models.F('disciplina'), models.F('assunto'), django.db.models.functions.comparison.Coalesce('banca', 0), django.db.models.functions.comparison.Coalesce('instituicao', 0), name='desempenho_celula_unica'),
+        ),
+    ]
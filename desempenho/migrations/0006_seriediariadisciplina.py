@@ -0,0 +1,55 @@
+# Generated by Django 5.2.5 on 2026-10-19 15:04
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, Q
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+
+def popular_serie(apps, schema_editor):
+    EventoResposta = apps.get_model('pratica', 'EventoResposta')
+    SerieDiariaDisciplina = apps.get_model('desempenho', 'SerieDiariaDisciplina')
+    celulas = EventoResposta.objects.annotate(
+        dia=TruncDate('registrado_em', tzinfo=timezone.get_default_timezone())
+    ).values('usuario_id', 'dia', 'questao__disciplina_id').annotate(
+        total=Count('id'), total_acertos=Count('id', filter=Q(correta=True))
+    ).order_by()
+    SerieDiariaDisciplina.objects.bulk_create([
+        SerieDiariaDisciplina(
+            usuario_id=c['usuario_id'], data=c['dia'], disciplina_id=c['questao__disciplina_id'],
+            respondidas=c['total'], acertos=c['total_acertos'],
+        )
+        for c in celulas.iterator()
+    ], batch_size=5000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('desempenho', '0005_desempenhodiario_celula_unica'),
+        ('pratica', '0006_revisaoespacada_revisao_questao_idx'),
+        ('questoes', '0002_calibracaoquestao'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SerieDiariaDisciplina',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('data', models.DateField()),
+                ('respondidas', models.PositiveIntegerField(default=0)),
+                ('acertos', models.PositiveIntegerField(default=0)),
+                ('disciplina', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='questoes.disciplina')),
+                ('usuario', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='serie_diaria', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Série Diária por Disciplina',
+                'verbose_name_plural': 'Séries Diárias por Disciplina',
+                'unique_together': {('usuario', 'data', 'disciplina')},
+            },
+        ),
+        migrations.RunPython(popular_serie, migrations.RunPython.noop),
+    ]
@@ -1,3 +1,170 @@
+# desempenho/models.py
+
 from django.db import models
+from django.db.models.functions import Coalesce
+from django.contrib.auth.models import User
+from questoes.models import Disciplina, Assunto, Banca, Instituicao
+
+
+class DesempenhoDiario(models.Model):
+    """
+    Consolidado de respostas por usuário, dia (America/Sao_Paulo) e recorte
+    de conteúdo. Como RespostaUsuario guarda apenas a última resposta de cada
+    questão, refazer uma questão move a contagem da célula antiga para a nova.
+    Mantido de forma incremental pelo fluxo de respostas (ver services.py).
+    """
+    usuario = models.ForeignKey(User, on_delete=models.CASCADE, related_name='desempenho_diario')
+    data = models.DateField()
+    disciplina = models.ForeignKey(Disciplina, on_delete=models.CASCADE)
+    assunto = models.ForeignKey(Assunto, on_delete=models.CASCADE)
+    banca = models.ForeignKey(Banca, on_delete=models.CASCADE, null=True, blank=True)
+    instituicao = models.ForeignKey(Instituicao, on_delete=models.CASCADE, null=True, blank=True)
+    respondidas = models.PositiveIntegerField(default=0)
+    acertos = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            # Questões sem banca ou instituição também precisam de uma única
+            # célula: como NULL não colide com NULL numa chave única comum,
+            # a unicidade é sobre COALESCE(..., 0).
+            models.UniqueConstraint(
+                'usuario', 'data', 'disciplina', 'assunto', Coalesce('banca', 0), Coalesce('instituicao', 0),
+                name='desempenho_celula_unica',
+            ),
+        ]
+        indexes = [models.Index(fields=['usuario', 'data'], name='desempenho_usuario_data_idx')]
+        verbose_name = "Desempenho Diário"
+        verbose_name_plural = "Desempenho Diário"
+
+    def __str__(self):
+        return f"{self.usuario.username} em {self.data:%d/%m/%Y}: {self.acertos}/{self.respondidas}"
+
+
+class SerieDiariaDisciplina(models.Model):
+    """
+    Respostas e acertos por usuário, dia (America/Sao_Paulo) e disciplina,
+    somados a cada EventoResposta gravado. Ao contrário de DesempenhoDiario,
+    refazer uma questão não move contagens entre dias: cada resposta conta no
+    dia em que foi dada e a célula só cresce. Fonte dos gráficos de evolução.
+    """
+    usuario = models.ForeignKey(User, on_delete=models.CASCADE, related_name='serie_diaria')
+    data = models.DateField()
+    disciplina = models.ForeignKey(Disciplina, on_delete=models.CASCADE, related_name='+')
+    respondidas = models.PositiveIntegerField(default=0)
+    acertos = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        unique_together = ('usuario', 'data', 'disciplina')
+        verbose_name = "Série Diária por Disciplina"
+        verbose_name_plural = "Séries Diárias por Disciplina"
+
+    def __str__(self):
+        return f"{self.usuario_id} em {self.data:%d/%m/%Y} ({self.disciplina_id}): {self.acertos}/{self.respondidas}"
+
+
+class HistogramaAcerto(models.Model):
+    """
+    Distribuição do percentual de acerto dos usuários em um recorte
+    (disciplina, banca ou simulado), em faixas fixas de 5 pontos. Faixas fixas
+    tornam os histogramas somáveis; a posição de um usuário é lida em
+    O(faixas), sem consultar as linhas dos outros usuários. Recalculado pelo
+    comando `atualizar_histogramas_acerto`.
+    """
+    class Escopo(models.TextChoices):
+        DISCIPLINA = 'DISCIPLINA', 'Disciplina'
+        BANCA = 'BANCA', 'Banca'
+        SIMULADO = 'SIMULADO', 'Simulado'
+
+    escopo = models.CharField(max_length=10, choices=Escopo.choices)
+    alvo_id = models.PositiveIntegerField()
+    contagens = models.JSONField(default=list, help_text="Número de usuários em cada faixa de acerto (0-5%, 5-10%, ..., 95-100%).")
+    total_usuarios = models.PositiveIntegerField(default=0)
+    atualizado_em = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        unique_together = ('escopo', 'alvo_id')
+        verbose_name = "Histograma de Acerto"
+        verbose_name_plural = "Histogramas de Acerto"
+
+    def __str__(self):
+        return f"{self.get_escopo_display()} #{self.alvo_id} ({self.total_usuarios} usuários)"
+
+
+class PontosFracosUsuario(models.Model):
+    """
+    Top-k de assuntos recomendados ao usuário (do mais fraco ao menos fraco).
+    Gravado em lote pelo comando `recalcular_pontos_fracos`; o dashboard e a
+    prática só leem esta linha, sem recalcular nada na requisição.
+    """
+    usuario = models.OneToOneField(User, on_delete=models.CASCADE, related_name='pontos_fracos')
+    assuntos = models.JSONField(default=list, help_text="IDs dos assuntos recomendados, do mais fraco ao menos fraco.")
+    atualizado_em = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = "Pontos Fracos do Usuário"
+        verbose_name_plural = "Pontos Fracos dos Usuários"
+
+    def __str__(self):
+        return f"{self.usuario.username}: {len(self.assuntos)} assuntos recomendados"
+
+
+# =======================================================================
+# ANALYTICS DE ENGAJAMENTO (PAINEL DA GESTÃO)
+# =======================================================================
+# Tabelas-resumo gravadas pelo comando `calcular_engajamento`. O painel da
+# gestão lê somente daqui, nunca de EventoResposta ou de User.date_joined.
+
+class EngajamentoDiario(models.Model):
+    """ Usuários ativos (no dia, em 7 e em 30 dias), respostas e cadastros de um dia. """
+    data = models.DateField(unique=True)
+    usuarios_ativos = models.PositiveIntegerField(default=0, help_text="DAU: usuários com ao menos uma resposta no dia.")
+    ativos_7_dias = models.PositiveIntegerField(default=0, help_text="WAU: usuários ativos nos 7 dias terminados nesta data.")
+    ativos_30_dias = models.PositiveIntegerField(default=0, help_text="MAU: usuários ativos nos 30 dias terminados nesta data.")
+    respostas = models.PositiveIntegerField(default=0)
+    acertos = models.PositiveIntegerField(default=0)
+    novos_usuarios = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        ordering = ['data']
+        verbose_name = "Engajamento Diário"
+        verbose_name_plural = "Engajamento Diário"
+
+    def __str__(self):
+        return f"{self.data:%d/%m/%Y}: {self.usuarios_ativos} ativos, {self.respostas} respostas"
+
+
+class VolumeDisciplinaDiario(models.Model):
+    """ Respostas e acertos de toda a plataforma por disciplina e dia. """
+    data = models.DateField()
+    disciplina = models.ForeignKey(Disciplina, on_delete=models.CASCADE, related_name='+')
+    respostas = models.PositiveIntegerField(default=0)
+    acertos = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        unique_together = ('data', 'disciplina')
+        verbose_name = "Volume Diário por Disciplina"
+        verbose_name_plural = "Volume Diário por Disciplina"
+
+    def __str__(self):
+        return f"{self.disciplina_id} em {self.data:%d/%m/%Y}: {self.respostas} respostas"
+
+
+class RetencaoCoorte(models.Model):
+    """
+    Uma célula da matriz de retenção: dos usuários cadastrados na semana
+    `coorte` (segunda-feira), quantos responderam questões `semana` semanas
+    depois (0 = a própria semana do cadastro).
+    """
+    coorte = models.DateField()
+    semana = models.PositiveSmallIntegerField()
+    tamanho_coorte = models.PositiveIntegerField(default=0)
+    ativos = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        unique_together = ('coorte', 'semana')
+        ordering = ['coorte', 'semana']
+        verbose_name = "Retenção de Coorte"
+        verbose_name_plural = "Retenção de Coortes"
 
-# Create your models here.
+    def __str__(self):
+        return f"Coorte {self.coorte:%d/%m/%Y}, semana {self.semana}: {self.ativos}/{self.tamanho_coorte}"
@@ -0,0 +1,398 @@
+# desempenho/services.py
+
+import math
+
+import numpy as np
+from collections import defaultdict
+from datetime import timedelta
+
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Q, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from pratica.models import RespostaUsuario, EventoResposta
+from pratica.utils import fuso_local, hoje_local
+from questoes.models import Assunto, Questao
+from simulados.models import Simulado, SessaoSimulado
+from .models import DesempenhoDiario, SerieDiariaDisciplina, HistogramaAcerto, PontosFracosUsuario
+
+# =======================================================================
+# MANUTENÇÃO INCREMENTAL DO CONSOLIDADO
+# =======================================================================
+def _dimensoes(questao):
+    return {
+        'disciplina_id': questao.disciplina_id, 'assunto_id': questao.assunto_id,
+        'banca_id': questao.banca_id, 'instituicao_id': questao.instituicao_id,
+    }
+
+def _ajustar_celula(usuario_id, data, dimensoes, delta_respondidas, delta_acertos):
+    """ Soma os deltas à célula (usuário, dia, recorte), criando-a se preciso. """
+    celula = DesempenhoDiario.objects.filter(usuario_id=usuario_id, data=data, **dimensoes)
+    incremento = {'respondidas': F('respondidas') + delta_respondidas, 'acertos': F('acertos') + delta_acertos}
+
+    if delta_respondidas < 0 or delta_acertos < 0:
+        # Decrementos nunca criam células nem deixam contagens negativas.
+        pk = celula.filter(respondidas__gte=-delta_respondidas, acertos__gte=-delta_acertos).values_list('pk', flat=True).first()
+        if pk:
+            DesempenhoDiario.objects.filter(pk=pk).update(**incremento)
+        return
+
+    if celula.update(**incremento):
+        return
+    try:
+        with transaction.atomic():
+            DesempenhoDiario.objects.create(usuario_id=usuario_id, data=data, respondidas=delta_respondidas, acertos=delta_acertos, **dimensoes)
+    except IntegrityError:
+        celula.update(**incremento)
+
+def registrar_resposta_no_desempenho(usuario_id, questao, correta, resposta_anterior=None):
+    """
+    Atualiza o consolidado para uma resposta gravada agora. `resposta_anterior`
+    é a RespostaUsuario da mesma questão antes da gravação (se existia): a
+    contagem dela sai do dia em que foi feita e entra no dia de hoje.
+    """
+    hoje = hoje_local()
+    dimensoes = _dimensoes(questao)
+    if resposta_anterior is None:
+        _ajustar_celula(usuario_id, hoje, dimensoes, 1, int(correta))
+        return
+
+    dia_anterior = timezone.localtime(resposta_anterior.data_resposta, fuso_local()).date()
+    if dia_anterior == hoje:
+        if correta != resposta_anterior.foi_correta:
+            _ajustar_celula(usuario_id, hoje, dimensoes, 0, int(correta) - int(resposta_anterior.foi_correta))
+        return
+    _ajustar_celula(usuario_id, dia_anterior, dimensoes, -1, -int(resposta_anterior.foi_correta))
+    _ajustar_celula(usuario_id, hoje, dimensoes, 1, int(correta))
+
+def registrar_eventos_na_serie(eventos, disciplinas=None):
+    """
+    Soma um lote de EventoResposta recém-gravados em SerieDiariaDisciplina:
+    um UPDATE com F() por célula (usuário, dia, disciplina) do lote, criando
+    a célula na primeira resposta. `disciplinas` ({questao_id: disciplina_id})
+    evita reler as questões já conhecidas por quem gravou os eventos.
+    """
+    disciplinas = dict(disciplinas or {})
+    faltantes = {evento.questao_id for evento in eventos} - disciplinas.keys()
+    if faltantes:
+        disciplinas.update(Questao.objects.filter(id__in=faltantes).values_list('id', 'disciplina_id'))
+
+    celulas = defaultdict(lambda: [0, 0])
+    for evento in eventos:
+        data = timezone.localtime(evento.registrado_em, fuso_local()).date()
+        celula = celulas[(evento.usuario_id, data, disciplinas[evento.questao_id])]
+        celula[0] += 1
+        celula[1] += int(evento.correta)
+
+    for (usuario_id, data, disciplina_id), (respondidas, acertos) in celulas.items():
+        celula = SerieDiariaDisciplina.objects.filter(usuario_id=usuario_id, data=data, disciplina_id=disciplina_id)
+        incremento = {'respondidas': F('respondidas') + respondidas, 'acertos': F('acertos') + acertos}
+        if celula.update(**incremento):
+            continue
+        try:
+            with transaction.atomic():
+                SerieDiariaDisciplina.objects.create(usuario_id=usuario_id, data=data, disciplina_id=disciplina_id, respondidas=respondidas, acertos=acertos)
+        except IntegrityError:
+            celula.update(**incremento)
+
+# =======================================================================
+# RECONSTRUÇÃO EM LOTE
+# =======================================================================
+def reconstruir_desempenho(usuario_ids=None, tamanho_lote=5000):
+    """
+    Recalcula o consolidado a partir de RespostaUsuario com um único GROUP BY
+    (opcionalmente só para alguns usuários). Retorna o número de células criadas.
+    """
+    respostas = RespostaUsuario.objects.all()
+    consolidado = DesempenhoDiario.objects.all()
+    if usuario_ids is not None:
+        respostas = respostas.filter(usuario_id__in=usuario_ids)
+        consolidado = consolidado.filter(usuario_id__in=usuario_ids)
+
+    celulas = respostas.annotate(dia=TruncDate('data_resposta', tzinfo=fuso_local())).values(
+        'usuario_id', 'dia', 'questao__disciplina_id', 'questao__assunto_id', 'questao__banca_id', 'questao__instituicao_id'
+    ).annotate(total=Count('id'), total_acertos=Count('id', filter=Q(foi_correta=True))).order_by()
+
+    criadas = 0
+    with transaction.atomic():
+        consolidado.delete()
+        lote = []
+        for celula in celulas.iterator(chunk_size=tamanho_lote):
+            lote.append(DesempenhoDiario(
+                usuario_id=celula['usuario_id'], data=celula['dia'],
+                disciplina_id=celula['questao__disciplina_id'], assunto_id=celula['questao__assunto_id'],
+                banca_id=celula['questao__banca_id'], instituicao_id=celula['questao__instituicao_id'],
+                respondidas=celula['total'], acertos=celula['total_acertos'],
+            ))
+            if len(lote) >= tamanho_lote:
+                DesempenhoDiario.objects.bulk_create(lote)
+                criadas += len(lote)
+                lote = []
+        DesempenhoDiario.objects.bulk_create(lote)
+        criadas += len(lote)
+    return criadas
+
+# =======================================================================
+# SÉRIES TEMPORAIS (GRÁFICOS DE EVOLUÇÃO)
+# =======================================================================
+# Lidas de SerieDiariaDisciplina, somada a cada evento de resposta gravado:
+# cada resposta conta no dia em que foi dada, inclusive as refeitas. A página
+# lê no máximo (pontos x disciplinas) linhas prontas, sem GROUP BY.
+PONTOS_SERIE = {'dia': 30, 'semana': 26}
+MAXIMO_PONTOS_SERIE = {'dia': 180, 'semana': 52}
+
+def _inicio_do_balde(data, agrupamento):
+    return data - timedelta(days=data.weekday()) if agrupamento == 'semana' else data
+
+def ultima_resposta_em(usuario_id):
+    """ Horário da última resposta do usuário (índice usuario, registrado_em), ou None. """
+    return EventoResposta.objects.filter(usuario_id=usuario_id).order_by('-registrado_em').values_list('registrado_em', flat=True).first()
+
+def montar_serie_desempenho(usuario_id, agrupamento='dia', pontos=None, hoje=None):
+    """
+    Série de respondidas/acertos por dia ou por semana (segunda a domingo),
+    geral e por disciplina, lida das células de SerieDiariaDisciplina do
+    período (índice único usuario, data, disciplina). Os valores vêm como
+    listas alinhadas a `rotulos` (datas de início de cada balde), prontas
+    para o Chart.js; baldes sem respostas valem 0.
+    """
+    hoje = hoje or hoje_local()
+    pontos = pontos or PONTOS_SERIE[agrupamento]
+    passo = timedelta(days=7 if agrupamento == 'semana' else 1)
+    ultimo = _inicio_do_balde(hoje, agrupamento)
+    baldes = [ultimo - passo * i for i in range(pontos - 1, -1, -1)]
+    posicoes = {balde: i for i, balde in enumerate(baldes)}
+
+    linhas = SerieDiariaDisciplina.objects.filter(
+        usuario_id=usuario_id, data__gte=baldes[0], data__lte=hoje
+    ).values_list('data', 'disciplina_id', 'disciplina__nome', 'respondidas', 'acertos')
+
+    geral = {'respondidas': [0] * pontos, 'acertos': [0] * pontos}
+    disciplinas = {}
+    for data, disciplina_id, nome, respondidas, acertos in linhas:
+        i = posicoes[_inicio_do_balde(data, agrupamento)]
+        serie = disciplinas.setdefault(disciplina_id, {
+            'id': disciplina_id, 'nome': nome, 'respondidas': [0] * pontos, 'acertos': [0] * pontos,
+        })
+        for destino in (geral, serie):
+            destino['respondidas'][i] += respondidas
+            destino['acertos'][i] += acertos
+
+    return {
+        'agrupamento': agrupamento,
+        'rotulos': [balde.isoformat() for balde in baldes],
+        'geral': geral,
+        'disciplinas': sorted(disciplinas.values(), key=lambda d: -sum(d['respondidas'])),
+    }
+
+# =======================================================================
+# HISTOGRAMAS DE ACERTO (COMPARAÇÃO COM A PLATAFORMA)
+# =======================================================================
+FAIXAS_HISTOGRAMA = 20
+# Abaixo disso o percentual do usuário (ou a amostra do recorte) é ruído.
+MINIMO_RESPOSTAS_HISTOGRAMA = 10
+MINIMO_USUARIOS_HISTOGRAMA = 5
+
+def faixa_de_acerto(percentual):
+    """ Índice da faixa (0..19) de um percentual de 0 a 100; 100% cai na última. """
+    return min(int(percentual * FAIXAS_HISTOGRAMA / 100), FAIXAS_HISTOGRAMA - 1)
+
+def somar_histogramas(*histogramas):
+    """ Histogramas de faixas fixas se combinam somando faixa a faixa. """
+    return [sum(contagens) for contagens in zip(*histogramas)]
+
+def _acumular(histogramas, alvo_id, acertos, total):
+    histogramas[alvo_id][faixa_de_acerto(acertos * 100 / total)] += 1
+
+def _histogramas_do_consolidado(dimensao):
+    histogramas = defaultdict(lambda: [0] * FAIXAS_HISTOGRAMA)
+    totais = DesempenhoDiario.objects.exclude(**{f'{dimensao}_id': None}).values('usuario_id', f'{dimensao}_id').annotate(
+        total=Sum('respondidas'), total_acertos=Sum('acertos')
+    ).filter(total__gte=MINIMO_RESPOSTAS_HISTOGRAMA).order_by()
+    for linha in totais.iterator(chunk_size=5000):
+        _acumular(histogramas, linha[f'{dimensao}_id'], linha['total_acertos'], linha['total'])
+    return histogramas
+
+def _histogramas_de_simulados():
+    # Resultado de cada sessão finalizada: acertos sobre o total de questões do simulado.
+    questoes_por_simulado = dict(Simulado.objects.annotate(n=Count('questoes')).filter(n__gt=0).values_list('id', 'n'))
+    histogramas = defaultdict(lambda: [0] * FAIXAS_HISTOGRAMA)
+    sessoes = SessaoSimulado.objects.filter(finalizado=True, simulado_id__in=questoes_por_simulado).annotate(
+        total_acertos=Count('respostas', filter=Q(respostas__foi_correta=True))
+    ).values_list('simulado_id', 'total_acertos').order_by()
+    for simulado_id, acertos in sessoes.iterator(chunk_size=5000):
+        _acumular(histogramas, simulado_id, acertos, questoes_por_simulado[simulado_id])
+    return histogramas
+
+def atualizar_histogramas_acerto():
+    """
+    Recalcula os histogramas de todas as disciplinas, bancas e simulados a
+    partir do consolidado diário e das sessões finalizadas. Retorna o número
+    de histogramas gravados por escopo.
+    """
+    calculados = {
+        HistogramaAcerto.Escopo.DISCIPLINA: _histogramas_do_consolidado('disciplina'),
+        HistogramaAcerto.Escopo.BANCA: _histogramas_do_consolidado('banca'),
+        HistogramaAcerto.Escopo.SIMULADO: _histogramas_de_simulados(),
+    }
+    with transaction.atomic():
+        for escopo, histogramas in calculados.items():
+            HistogramaAcerto.objects.filter(escopo=escopo).exclude(alvo_id__in=list(histogramas)).delete()
+            HistogramaAcerto.objects.bulk_create([
+                HistogramaAcerto(escopo=escopo, alvo_id=alvo_id, contagens=contagens, total_usuarios=sum(contagens))
+                for alvo_id, contagens in histogramas.items()
+            ], update_conflicts=True, unique_fields=['escopo', 'alvo_id'], update_fields=['contagens', 'total_usuarios', 'atualizado_em'])
+    return {escopo.label: len(histogramas) for escopo, histogramas in calculados.items()}
+
+def posicao_no_histograma(contagens, percentual):
+    """
+    Percentual dos usuários à frente de quem tem `percentual` de acerto
+    ("top X%"), contando metade da própria faixa. Retorna um inteiro de 1 a 100.
+    """
+    faixa = faixa_de_acerto(percentual)
+    acima = sum(contagens[faixa + 1:]) + contagens[faixa] / 2
+    return min(max(math.ceil(acima * 100 / sum(contagens)), 1), 100)
+
+def posicoes_na_plataforma(escopo, percentuais):
+    """
+    Recebe {alvo_id: percentual do usuário} e retorna {alvo_id: {'top', 'usuarios'}}
+    para os alvos com histograma e amostra suficiente (uma única consulta).
+    """
+    posicoes = {}
+    for alvo_id, contagens, total in HistogramaAcerto.objects.filter(
+        escopo=escopo, alvo_id__in=list(percentuais), total_usuarios__gte=MINIMO_USUARIOS_HISTOGRAMA
+    ).values_list('alvo_id', 'contagens', 'total_usuarios'):
+        posicoes[alvo_id] = {'top': posicao_no_histograma(contagens, percentuais[alvo_id]), 'usuarios': total}
+    return posicoes
+
+def comparar_disciplinas_do_usuario(usuario_id):
+    """
+    Posição do usuário em cada disciplina em que tem respostas suficientes,
+    do melhor para o pior: [{'id', 'nome', 'percentual', 'top', 'usuarios'}].
+    """
+    proprios = {
+        linha['disciplina_id']: linha for linha in DesempenhoDiario.objects.filter(usuario_id=usuario_id).values(
+            'disciplina_id', 'disciplina__nome'
+        ).annotate(total=Sum('respondidas'), total_acertos=Sum('acertos')).filter(total__gte=MINIMO_RESPOSTAS_HISTOGRAMA).order_by()
+    }
+    percentuais = {d: linha['total_acertos'] * 100 / linha['total'] for d, linha in proprios.items()}
+    posicoes = posicoes_na_plataforma(HistogramaAcerto.Escopo.DISCIPLINA, percentuais)
+    return sorted((
+        {'id': d, 'nome': proprios[d]['disciplina__nome'], 'percentual': percentuais[d], **posicao}
+        for d, posicao in posicoes.items()
+    ), key=lambda item: item['top'])
+
+# =======================================================================
+# RECOMENDAÇÃO DE PONTOS FRACOS
+# =======================================================================
+# Cada assunto recebe uma nota por usuário, calculada de forma vetorizada
+# sobre a matriz usuário x assunto montada a partir do consolidado diário:
+#   - taxa de erro com suavização bayesiana (prior = taxa de erro global do
+#     assunto, com peso de PESO_PRIOR respostas), sobre contagens que decaem
+#     com meia-vida de MEIA_VIDA_DIAS (respostas antigas pesam menos);
+#   - lacuna de cobertura: fração das questões do assunto ainda não feitas.
+# Só concorrem assuntos das disciplinas que o usuário já pratica.
+# O top-k de cada usuário fica em PontosFracosUsuario, recalculado pelo job
+# noturno; a requisição só lê essa linha.
+PESO_PRIOR = 5.0
+MEIA_VIDA_DIAS = 30.0
+PESO_ERRO = 0.7
+PESO_COBERTURA = 0.3
+TOP_PONTOS_FRACOS = 5
+TAMANHO_LOTE_RECOMENDACAO = 500
+
+def _contexto_de_assuntos():
+    """ Índices, disciplina, total de questões e taxa de erro global de cada assunto. """
+    assuntos = list(Assunto.objects.order_by('id').values_list('id', 'disciplina_id'))
+    indice = {assunto_id: i for i, (assunto_id, _) in enumerate(assuntos)}
+    disciplinas = {d: j for j, d in enumerate(sorted({d for _, d in assuntos}))}
+    assunto_disciplina = np.zeros((len(assuntos), len(disciplinas)))
+    for i, (_, disciplina_id) in enumerate(assuntos):
+        assunto_disciplina[i, disciplinas[disciplina_id]] = 1
+
+    questoes = np.zeros(len(assuntos))
+    for assunto_id, total in Questao.objects.values('assunto_id').annotate(total=Count('id')).values_list('assunto_id', 'total').order_by():
+        if assunto_id in indice:
+            questoes[indice[assunto_id]] = total
+
+    respondidas, erros = np.zeros(len(assuntos)), np.zeros(len(assuntos))
+    for assunto_id, total, acertos in DesempenhoDiario.objects.values('assunto_id').annotate(
+        total=Sum('respondidas'), total_acertos=Sum('acertos')
+    ).values_list('assunto_id', 'total', 'total_acertos').order_by():
+        respondidas[indice[assunto_id]], erros[indice[assunto_id]] = total, total - acertos
+    # Assuntos sem nenhuma resposta na plataforma partem de 50% de erro.
+    prior = np.divide(erros, respondidas, out=np.full(len(assuntos), 0.5), where=respondidas > 0)
+    return {'ids': np.array([a for a, _ in assuntos]), 'indice': indice, 'assunto_disciplina': assunto_disciplina, 'questoes': questoes, 'prior': prior}
+
+def pontuar_assuntos(linhas, n_usuarios, contexto):
+    """
+    Recebe as linhas (usuário_idx, assunto_idx, data, respondidas, acertos)
+    do consolidado de um lote de usuários e devolve a matriz de notas
+    usuário x assunto (maior = mais fraco; -inf = fora da recomendação).
+    """
+    n_assuntos = len(contexto['ids'])
+    usuario_idx, assunto_idx, idade, respondidas, acertos = (np.array(coluna) for coluna in zip(*linhas))
+    peso = 0.5 ** (idade / MEIA_VIDA_DIAS)
+
+    feitas = np.zeros((n_usuarios, n_assuntos))
+    np.add.at(feitas, (usuario_idx, assunto_idx), respondidas)
+    n_decaido = np.zeros((n_usuarios, n_assuntos))
+    np.add.at(n_decaido, (usuario_idx, assunto_idx), respondidas * peso)
+    erros_decaidos = np.zeros((n_usuarios, n_assuntos))
+    np.add.at(erros_decaidos, (usuario_idx, assunto_idx), (respondidas - acertos) * peso)
+
+    erro_suavizado = (erros_decaidos + PESO_PRIOR * contexto['prior']) / (n_decaido + PESO_PRIOR)
+    questoes = contexto['questoes']
+    cobertura = np.divide(feitas, questoes, out=np.ones_like(feitas), where=questoes > 0)
+    notas = PESO_ERRO * erro_suavizado + PESO_COBERTURA * (1 - np.minimum(cobertura, 1))
+
+    # Candidatos: assuntos com questões, nas disciplinas em que o usuário já respondeu algo.
+    disciplinas_praticadas = (feitas @ contexto['assunto_disciplina']) > 0
+    candidatos = ((disciplinas_praticadas @ contexto['assunto_disciplina'].T) > 0) & (questoes > 0)
+    return np.where(candidatos, notas, -np.inf)
+
+def recalcular_pontos_fracos(usuario_ids=None, hoje=None, tamanho_lote=TAMANHO_LOTE_RECOMENDACAO, top=TOP_PONTOS_FRACOS):
+    """
+    Recalcula e grava em PontosFracosUsuario o top-k de pontos fracos dos
+    usuários (todos os que têm respostas, por padrão), em lotes de
+    `tamanho_lote` usuários. Na execução completa, remove as linhas de quem
+    não tem mais respostas. Retorna {usuario_id: [assunto_id, ...]}.
+    """
+    hoje = hoje or hoje_local()
+    inicio_execucao = timezone.now()
+    contexto = _contexto_de_assuntos()
+    completo = usuario_ids is None
+    if completo:
+        usuario_ids = DesempenhoDiario.objects.values_list('usuario_id', flat=True).distinct().order_by('usuario_id')
+    usuario_ids = list(usuario_ids)
+
+    recomendacoes = {}
+    for inicio in range(0, len(usuario_ids), tamanho_lote):
+        lote = usuario_ids[inicio:inicio + tamanho_lote]
+        posicao = {usuario_id: i for i, usuario_id in enumerate(lote)}
+        linhas = [
+            (posicao[usuario_id], contexto['indice'][assunto_id], (hoje - data).days, total, acertos)
+            for usuario_id, assunto_id, data, total, acertos in DesempenhoDiario.objects.filter(
+                usuario_id__in=lote, respondidas__gt=0
+            ).values_list('usuario_id', 'assunto_id', 'data', 'respondidas', 'acertos').iterator(chunk_size=5000)
+        ]
+        notas = pontuar_assuntos(linhas, len(lote), contexto) if linhas else np.full((len(lote), len(contexto['ids'])), -np.inf)
+
+        # argpartition separa o top-k em O(assuntos); só os k escolhidos são ordenados.
+        k = min(top, notas.shape[1])
+        melhores = np.argpartition(-notas, k - 1, axis=1)[:, :k] if k else np.empty((len(lote), 0), dtype=int)
+        for usuario_id, i in posicao.items():
+            escolhidos = sorted((j for j in melhores[i] if np.isfinite(notas[i, j])), key=lambda j: -notas[i, j])
+            recomendacoes[usuario_id] = [int(contexto['ids'][j]) for j in escolhidos]
+        PontosFracosUsuario.objects.bulk_create(
+            [PontosFracosUsuario(usuario_id=u, assuntos=recomendacoes[u]) for u in lote],
+            update_conflicts=True, unique_fields=['usuario'], update_fields=['assuntos', 'atualizado_em']
+        )
+    if completo:
+        PontosFracosUsuario.objects.filter(atualizado_em__lt=inicio_execucao).delete()
+    return recomendacoes
+
+def pontos_fracos_do_usuario(usuario_id):
+    """ Assuntos recomendados (do mais fraco ao menos fraco), como gravados pelo job noturno. """
+    return PontosFracosUsuario.objects.filter(usuario_id=usuario_id).values_list('assuntos', flat=True).first() or []
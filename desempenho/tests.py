@@ -1,3 +1,232 @@
-from django.test import TestCase
+# desempenho/tests.py
 
-# Create your tests here.
+from datetime import date, timedelta
+from django.test import TestCase, Client
+from django.urls import reverse
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+
+from questoes.models import Questao, Disciplina, Assunto, Banca
+from usuarios.models import UserProfile
+from pratica.models import RespostaUsuario, EventoResposta
+from pratica.eventos import EscritorDeEventos
+from pratica.utils import inicio_do_dia
+from gamificacao.models import GamificationSettings
+from gamificacao.services import processar_resposta_gamificacao, _janelas_locais
+from desempenho.models import DesempenhoDiario, HistogramaAcerto, PontosFracosUsuario, EngajamentoDiario, VolumeDisciplinaDiario, RetencaoCoorte
+from desempenho.engajamento import calcular_engajamento
+from desempenho.services import (
+    _ajustar_celula, _dimensoes, reconstruir_desempenho, atualizar_histogramas_acerto, comparar_disciplinas_do_usuario, posicoes_na_plataforma, faixa_de_acerto,
+    recalcular_pontos_fracos, pontos_fracos_do_usuario, montar_serie_desempenho
+)
+
+
+class DesempenhoBaseTestCase(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        """
+        Três usuários e três questões da mesma disciplina, sem limitador de
+        respostas, para que o pipeline de resposta rode em sequência.
+        """
+        settings = GamificationSettings.load()
+        settings.tempo_minimo_entre_respostas_segundos = 0
+        settings.cooldown_mesma_questao_horas = 0
+        settings.save()
+
+        cls.disciplina = Disciplina.objects.create(nome="Direito de Teste")
+        cls.banca = Banca.objects.create(nome="Banca de Teste")
+        cls.assunto = Assunto.objects.create(disciplina=cls.disciplina, nome="Assunto de Teste")
+        cls.questoes = [
+            Questao.objects.create(
+                disciplina=cls.disciplina, assunto=cls.assunto, banca=cls.banca, ano=2023,
+                enunciado=f"Enunciado {i}", alternativas={'A': '1', 'B': '2'}, gabarito='A'
+            )
+            for i in range(3)
+        ]
+        cls.usuarios = []
+        for i in range(3):
+            user = User.objects.create_user(f'aluno{i}', f'aluno{i}@test.com', 'password123')
+            UserProfile.objects.create(user=user, nome=f'Aluno{i}', sobrenome='Teste')
+            cls.usuarios.append(user)
+
+    def setUp(self):
+        cache.clear()
+        _janelas_locais.clear()
+
+    def responder(self, user, questao, alternativa):
+        with self.captureOnCommitCallbacks(execute=True):
+            return processar_resposta_gamificacao(user, questao, alternativa)
+
+
+class DesempenhoDiarioTestCase(DesempenhoBaseTestCase):
+
+    def celulas(self, user):
+        return list(DesempenhoDiario.objects.filter(usuario=user).order_by('data').values_list('data', 'respondidas', 'acertos'))
+
+    def test_reresposta_move_a_contagem_e_bate_com_a_reconstrucao(self):
+        user = self.usuarios[0]
+        self.responder(user, self.questoes[0], 'A')
+        self.responder(user, self.questoes[1], 'B')
+        RespostaUsuario.objects.filter(usuario=user, questao=self.questoes[1]).update(data_resposta=timezone.now() - timedelta(days=3))
+        reconstruir_desempenho([user.id])
+        self.assertEqual([c[1:] for c in self.celulas(user)], [(1, 0), (1, 1)])
+
+        # Reresponder hoje tira a contagem do dia antigo e corrige o acerto de hoje.
+        self.responder(user, self.questoes[1], 'A')
+        self.responder(user, self.questoes[0], 'B')
+        incremental = [c for c in self.celulas(user) if c[1]]
+        reconstruir_desempenho([user.id])
+        self.assertEqual(incremental, self.celulas(user))
+        self.assertEqual([c[1:] for c in incremental], [(2, 1)])
+
+    def test_celula_sem_banca_nem_instituicao_e_unica(self):
+        user = self.usuarios[0]
+        questao = Questao.objects.create(disciplina=self.disciplina, assunto=self.assunto, ano=2023,
+                                         enunciado="Sem banca", alternativas={'A': '1', 'B': '2'}, gabarito='A')
+        celula = {'usuario': user, 'data': timezone.localdate(), 'disciplina': self.disciplina, 'assunto': self.assunto}
+        DesempenhoDiario.objects.create(**celula, respondidas=1, acertos=1)
+        # A segunda de duas primeiras respostas concorrentes cai no IntegrityError e soma na célula existente.
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            DesempenhoDiario.objects.create(**celula, respondidas=1)
+        _ajustar_celula(user.id, celula['data'], _dimensoes(questao), 1, 0)
+        self.assertEqual(self.celulas(user), [(celula['data'], 2, 1)])
+
+    def test_dashboard_agrega_o_consolidado(self):
+        user = self.usuarios[1]
+        self.responder(user, self.questoes[0], 'A')
+        self.responder(user, self.questoes[1], 'B')
+        client = Client()
+        client.login(username=user.username, password='password123')
+
+        response = client.get(reverse('dashboard'), {'periodo': 'semana', 'disciplina': self.disciplina.id})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual((response.context['total_respondidas'], response.context['total_acertos']), (2, 1))
+        self.assertEqual(response.context['desempenho_principal'][0]['nome'], self.assunto.nome)
+        self.assertEqual(response.context['desempenho_banca'][0]['total'], 2)
+
+    def test_serie_por_semana_com_etag(self):
+        user = self.usuarios[2]
+        self.responder(user, self.questoes[0], 'A')
+        self.responder(user, self.questoes[1], 'B')
+        client = Client()
+        client.login(username=user.username, password='password123')
+        url = reverse('serie_desempenho')
+
+        response = client.get(url, {'agrupamento': 'semana', 'pontos': 4})
+        serie = response.json()
+        self.assertEqual(len(serie['rotulos']), 4)
+        self.assertEqual((serie['geral']['respondidas'][-1], serie['geral']['acertos'][-1]), (2, 1))
+        self.assertEqual(serie['disciplinas'][0]['nome'], self.disciplina.nome)
+
+        etag = response['ETag']
+        self.assertEqual(client.get(url, {'agrupamento': 'semana', 'pontos': 4}, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        self.responder(user, self.questoes[2], 'A')
+        self.assertEqual(client.get(url, {'agrupamento': 'semana', 'pontos': 4}, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+        # A série vem do histórico: refazer uma questão soma uma resposta em vez de substituir a anterior.
+        self.responder(user, self.questoes[1], 'A')
+        serie = client.get(url, {'agrupamento': 'semana', 'pontos': 4}).json()
+        self.assertEqual((serie['geral']['respondidas'][-1], serie['geral']['acertos'][-1]), (4, 3))
+        # A série sai das células prontas: uma leitura, sem agregar o histórico de eventos.
+        with self.assertNumQueries(1):
+            self.assertEqual(montar_serie_desempenho(user.id, 'semana', 4), serie)
+
+    def test_histogramas_dao_a_posicao_sem_ler_outros_usuarios(self):
+        hoje = timezone.localdate()
+        usuarios = self.usuarios + [User.objects.create_user(f'extra{i}', password='x') for i in range(3)]
+        # Acertos em 20 respostas: 4, 8, 12, 16, 19 e 20 (o último com só 5 respostas não entra).
+        for user, acertos in zip(usuarios, [4, 8, 12, 16, 19, 5]):
+            respondidas = 5 if acertos == 5 else 20
+            DesempenhoDiario.objects.create(usuario=user, data=hoje, disciplina=self.disciplina, assunto=self.assunto, banca=self.banca, respondidas=respondidas, acertos=acertos)
+
+        atualizar_histogramas_acerto()
+        histograma = HistogramaAcerto.objects.get(escopo=HistogramaAcerto.Escopo.DISCIPLINA, alvo_id=self.disciplina.id)
+        self.assertEqual(histograma.total_usuarios, 5)
+        self.assertEqual(histograma.contagens[faixa_de_acerto(95)], 1)
+        self.assertTrue(HistogramaAcerto.objects.filter(escopo=HistogramaAcerto.Escopo.BANCA, alvo_id=self.banca.id).exists())
+
+        comparacao = comparar_disciplinas_do_usuario(usuarios[4].id)
+        self.assertEqual([(c['nome'], c['top']) for c in comparacao], [(self.disciplina.nome, 10)])
+        with self.assertNumQueries(1):
+            posicoes = posicoes_na_plataforma(HistogramaAcerto.Escopo.DISCIPLINA, {self.disciplina.id: 20.0})
+        self.assertEqual(posicoes[self.disciplina.id]['top'], 90)
+
+    def test_pontos_fracos_priorizam_erros_nas_disciplinas_praticadas(self):
+        user = self.usuarios[0]
+        assunto_fraco = Assunto.objects.create(disciplina=self.disciplina, nome="Assunto Fraco")
+        outra = Disciplina.objects.create(nome="Disciplina Nunca Praticada")
+        Assunto.objects.create(disciplina=outra, nome="Fora do Radar")
+        questoes_fracas = [
+            Questao.objects.create(disciplina=self.disciplina, assunto=assunto_fraco, banca=self.banca, ano=2023,
+                                   enunciado=f"Fraca {i}", alternativas={'A': '1', 'B': '2'}, gabarito='A')
+            for i in range(2)
+        ]
+        for questao in self.questoes:
+            self.responder(user, questao, 'A')
+        self.responder(user, questoes_fracas[0], 'B')
+
+        # Antes do job noturno, a requisição não calcula nada.
+        self.assertEqual(pontos_fracos_do_usuario(user.id), [])
+        PontosFracosUsuario.objects.create(usuario=self.usuarios[2], assuntos=[self.assunto.id])
+        recomendacoes = recalcular_pontos_fracos()
+        self.assertEqual(recomendacoes[user.id], [assunto_fraco.id, self.assunto.id])
+        with self.assertNumQueries(1):
+            self.assertEqual(pontos_fracos_do_usuario(user.id), [assunto_fraco.id, self.assunto.id])
+        # Quem não tem mais respostas perde a recomendação antiga.
+        self.assertFalse(PontosFracosUsuario.objects.filter(usuario=self.usuarios[2]).exists())
+
+        client = Client()
+        client.login(username=user.username, password='password123')
+        response = client.get(reverse('pratica:praticar_pontos_fracos'))
+        self.assertRedirects(response, f"{reverse('pratica:listar_questoes')}?assunto={assunto_fraco.id}&assunto={self.assunto.id}", fetch_redirect_response=False)
+
+
+class EngajamentoTestCase(DesempenhoBaseTestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.staff_user = User.objects.create_user('staffmember', 'staff@test.com', 'password123', is_staff=True)
+        UserProfile.objects.create(user=cls.staff_user, nome='Staff', sobrenome='Member')
+
+    def test_ativos_volume_e_retencao_por_coorte(self):
+        fim = date(2026, 10, 18)  # domingo: a semana do fim vai de 12/10 a 18/10
+        jogador0, jogador1, jogador2 = self.usuarios
+        cadastros = {jogador0: fim - timedelta(days=12), jogador1: fim - timedelta(days=9), jogador2: fim - timedelta(days=40)}
+        for user, dia in cadastros.items():
+            User.objects.filter(id=user.id).update(date_joined=inicio_do_dia(dia) + timedelta(hours=10))
+
+        with EscritorDeEventos() as escritor:
+            for user, dias_atras, correta in [(jogador0, 0, True), (jogador0, 0, False), (jogador0, 1, True), (jogador0, 3, True),
+                                              (jogador1, 8, False), (jogador2, 40, True)]:
+                escritor.adicionar(user.id, self.questoes[0].id, 'A', correta, EventoResposta.Origem.PRATICA,
+                                   registrado_em=inicio_do_dia(fim - timedelta(days=dias_atras)) + timedelta(hours=23, minutes=30))
+
+        resumo = calcular_engajamento(dias=10, semanas=3, fim=fim)
+        self.assertEqual(resumo['dias'], 10)
+        ultimo = EngajamentoDiario.objects.get(data=fim)
+        self.assertEqual((ultimo.usuarios_ativos, ultimo.ativos_7_dias, ultimo.ativos_30_dias, ultimo.respostas, ultimo.acertos), (1, 1, 2, 2, 1))
+        self.assertEqual(
+            list(EngajamentoDiario.objects.filter(data__lte=fim - timedelta(days=2)).values_list('usuarios_ativos', 'ativos_7_dias')[:7]),
+            [(0, 0), (1, 1), (0, 1), (0, 1), (0, 1), (0, 1), (1, 2)]
+        )
+        # A resposta de 40 dias atrás já saiu da janela de 30 dias do primeiro dia.
+        self.assertEqual(EngajamentoDiario.objects.get(data=fim - timedelta(days=9)).ativos_30_dias, 0)
+        self.assertEqual(EngajamentoDiario.objects.get(data=cadastros[jogador1]).novos_usuarios, 1)
+        self.assertEqual(VolumeDisciplinaDiario.objects.get(data=fim, disciplina=self.disciplina).respostas, 2)
+
+        self.assertEqual(
+            list(RetencaoCoorte.objects.values_list('coorte', 'semana', 'tamanho_coorte', 'ativos')),
+            [(fim - timedelta(days=20), 0, 0, 0), (fim - timedelta(days=20), 1, 0, 0), (fim - timedelta(days=20), 2, 0, 0),
+             (fim - timedelta(days=13), 0, 2, 1), (fim - timedelta(days=13), 1, 2, 1), (fim - timedelta(days=6), 0, 0, 0)]
+        )
+
+        client = Client()
+        client.login(username=self.staff_user.username, password='password123')
+        with self.assertNumQueries(7):
+            response = client.get(reverse('gestao:painel_engajamento'))
+        self.assertEqual(response.context['ultimo_dia'], ultimo)
+        self.assertEqual([celula['percentual'] for celula in response.context['retencao'][1]['semanas']], [50.0, 50.0])
@@ -5,4 +5,5 @@ from . import views
 
 urlpatterns = [
     path('dashboard/', views.dashboard, name='dashboard'),
+    path('serie/', views.serie_desempenho, name='serie_desempenho'),
 ]
\ No newline at end of file
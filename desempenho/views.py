@@ -2,14 +2,29 @@
 
 from django.shortcuts import render
 from django.contrib.auth.decorators import login_required
-from django.db.models import Count, Q
-from django.utils import timezone
-from datetime import timedelta
-from pratica.models import RespostaUsuario
+from django.http import JsonResponse
+from django.views.decorators.cache import cache_control
+from django.views.decorators.http import condition
+from django.db.models import F, Sum
+from django.db.models.functions import Coalesce
+from pratica.utils import inicio_do_periodo, hoje_local
+from .models import DesempenhoDiario
+from .services import (
+    PONTOS_SERIE, MAXIMO_PONTOS_SERIE, montar_serie_desempenho, ultima_resposta_em, comparar_disciplinas_do_usuario,
+    pontos_fracos_do_usuario,
+)
 # Precisamos de todos os modelos para os filtros
 from questoes.models import Disciplina, Assunto, Banca, Instituicao
 import json
 
+def _agrupar_celulas(celulas, dimensao):
+    """ Soma as células do consolidado por disciplina, assunto ou banca. """
+    return list(
+        celulas.values(f'{dimensao}_id', nome=F(f'{dimensao}__nome'))
+        .annotate(total=Sum('respondidas'), acertos=Sum('acertos'))
+        .filter(total__gt=0).order_by('-total')
+    )
+
 @login_required
 def dashboard(request):
     usuario = request.user
@@ -22,80 +37,58 @@ def dashboard(request):
     instituicao_id = request.GET.get('instituicao')
 
     # --- 2. CONSTRUIR O QUERYSET BASE DINAMICAMENTE ---
-    respostas_base = RespostaUsuario.objects.filter(usuario=usuario)
-
-    # Filtro de Período (igual ao anterior)
-    now = timezone.now()
-    start_date = None
-    if periodo == 'hoje':
-        start_date = now.replace(hour=0, minute=0, second=0, microsecond=0)
-    elif periodo == 'semana':
-        start_date = (now - timedelta(days=now.weekday())).replace(hour=0, minute=0, second=0, microsecond=0)
-    elif periodo == 'mes':
-        start_date = now.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
-    elif periodo == 'ano':
-        start_date = now.replace(month=1, day=1, hour=0, minute=0, second=0, microsecond=0)
-    
-    if start_date:
-        respostas_base = respostas_base.filter(data_resposta__gte=start_date)
+    # Tudo é agregado a partir do consolidado diário (DesempenhoDiario), que
+    # já tem as contagens por dia e por recorte de conteúdo do usuário.
+    celulas_usuario = DesempenhoDiario.objects.filter(usuario=usuario, respondidas__gt=0)
+    celulas = celulas_usuario
+
+    # Filtro de Período: o consolidado é diário, no fuso America/Sao_Paulo.
+    data_inicio = inicio_do_periodo(periodo)
+    if data_inicio:
+        celulas = celulas.filter(data__gte=data_inicio)
 
     # Filtros de Conteúdo
     if disciplina_id:
-        respostas_base = respostas_base.filter(questao__disciplina_id=disciplina_id)
+        celulas = celulas.filter(disciplina_id=disciplina_id)
     if assunto_id:
-        respostas_base = respostas_base.filter(questao__assunto_id=assunto_id)
+        celulas = celulas.filter(assunto_id=assunto_id)
     if banca_id:
-        respostas_base = respostas_base.filter(questao__banca_id=banca_id)
+        celulas = celulas.filter(banca_id=banca_id)
     if instituicao_id:
-        respostas_base = respostas_base.filter(questao__instituicao_id=instituicao_id)
+        celulas = celulas.filter(instituicao_id=instituicao_id)
 
     # --- 3. CALCULAR ESTATÍSTICAS GERAIS (COM BASE NOS FILTROS) ---
-    total_respondidas = respostas_base.count()
-    total_acertos = respostas_base.filter(foi_correta=True).count()
+    totais = celulas.aggregate(respondidas=Coalesce(Sum('respondidas'), 0), acertos=Coalesce(Sum('acertos'), 0))
+    total_respondidas = totais['respondidas']
+    total_acertos = totais['acertos']
     total_erros = total_respondidas - total_acertos
     percentual_acerto_geral = (total_acertos / total_respondidas * 100) if total_respondidas > 0 else 0
 
     # --- 4. PREPARAR DADOS PARA OS GRÁFICOS E TABELAS ---
 
     # Desempenho por Banca (sempre relevante)
-    desempenho_banca = Banca.objects.filter(
-        questao__respostausuario__in=respostas_base
-    ).annotate(
-        total=Count('questao', filter=Q(questao__respostausuario__in=respostas_base)),
-        acertos=Count('questao', filter=Q(questao__respostausuario__in=respostas_base, questao__respostausuario__foi_correta=True))
-    ).filter(total__gt=0).order_by('-total')
-
-    # Desempenho por Disciplina OU Assunto (Interface Dinâmica)
-    desempenho_principal = []
-    if disciplina_id:
-        # Se uma disciplina foi selecionada, detalhamos por Assunto
-        desempenho_principal = Assunto.objects.filter(
-            questao__respostausuario__in=respostas_base
-        ).annotate(
-            total=Count('questao', filter=Q(questao__respostausuario__in=respostas_base)),
-            acertos=Count('questao', filter=Q(questao__respostausuario__in=respostas_base, questao__respostausuario__foi_correta=True))
-        ).filter(total__gt=0).order_by('-total')
-    else:
-        # Se nenhuma disciplina foi selecionada, mostramos o geral por Disciplina
-        desempenho_principal = Disciplina.objects.filter(
-            questao__respostausuario__in=respostas_base
-        ).annotate(
-            total=Count('questao', filter=Q(questao__respostausuario__in=respostas_base)),
-            acertos=Count('questao', filter=Q(questao__respostausuario__in=respostas_base, questao__respostausuario__foi_correta=True))
-        ).filter(total__gt=0).order_by('-total')
-    
+    desempenho_banca = _agrupar_celulas(celulas.exclude(banca=None), 'banca')
+
+    # Desempenho por Disciplina OU Assunto (Interface Dinâmica):
+    # com uma disciplina selecionada, detalhamos por Assunto.
+    desempenho_principal = _agrupar_celulas(celulas, 'assunto' if disciplina_id else 'disciplina')
     for item in desempenho_principal:
-        item.percentual_acerto = (item.acertos / item.total * 100) if item.total > 0 else 0
+        item['percentual_acerto'] = (item['acertos'] / item['total'] * 100) if item['total'] > 0 else 0
 
     # --- 5. PREPARAR DADOS PARA OS DROPDOWNS DE FILTRO ---
-    disciplinas_para_filtro = Disciplina.objects.filter(questao__respostausuario__usuario=usuario).distinct().order_by('nome')
-    bancas_para_filtro = Banca.objects.filter(questao__respostausuario__usuario=usuario).distinct().order_by('nome')
-    instituicoes_para_filtro = Instituicao.objects.filter(questao__respostausuario__usuario=usuario).distinct().order_by('nome')
+    disciplinas_para_filtro = Disciplina.objects.filter(id__in=celulas_usuario.values('disciplina_id')).order_by('nome')
+    bancas_para_filtro = Banca.objects.filter(id__in=celulas_usuario.values('banca_id')).order_by('nome')
+    instituicoes_para_filtro = Instituicao.objects.filter(id__in=celulas_usuario.values('instituicao_id')).order_by('nome')
     
     assuntos_para_filtro = None
     if disciplina_id:
         assuntos_para_filtro = Assunto.objects.filter(disciplina_id=disciplina_id).order_by('nome')
 
+    # Recomendação de estudo (calculada em lote pelo job noturno)
+    ids_pontos_fracos = pontos_fracos_do_usuario(usuario.id)
+    assuntos_por_id = Assunto.objects.select_related('disciplina').in_bulk(ids_pontos_fracos)
+    pontos_fracos = [assuntos_por_id[a] for a in ids_pontos_fracos if a in assuntos_por_id]
+
     # Títulos para a UI
     periodo_titulos = {'geral': 'Todo o Período', 'hoje': 'Hoje', 'semana': 'Esta Semana', 'mes': 'Este Mês', 'ano': 'Este Ano'}
     periodo_titulo_selecionado = periodo_titulos.get(periodo, 'Todo o Período')
@@ -112,8 +105,8 @@ def dashboard(request):
         'desempenho_banca': desempenho_banca,
         
         # Dados para os gráficos (JSON)
-        'labels_banca': json.dumps([b.nome for b in desempenho_banca]),
-        'data_acertos_banca': json.dumps([b.acertos for b in desempenho_banca]),
+        'labels_banca': json.dumps([b['nome'] for b in desempenho_banca]),
+        'data_acertos_banca': json.dumps([b['acertos'] for b in desempenho_banca]),
         
         # Filtros Selecionados (para manter o estado na UI)
         'periodo_selecionado': periodo,
@@ -123,6 +116,10 @@ def dashboard(request):
         'banca_selecionada': banca_id,
         'instituicao_selecionada': instituicao_id,
         
+        # Posição na plataforma (histogramas pré-calculados, todo o período)
+        'comparacao_disciplinas': comparar_disciplinas_do_usuario(usuario.id),
+        'pontos_fracos': pontos_fracos,
+
         # Opções para os dropdowns de filtro
         'disciplinas_para_filtro': disciplinas_para_filtro,
         'assuntos_para_filtro': assuntos_para_filtro,
@@ -130,4 +127,34 @@ def dashboard(request):
         'instituicoes_para_filtro': instituicoes_para_filtro,
     }
 
-    return render(request, 'desempenho/dashboard.html', context)
\ No newline at end of file
+    return render(request, 'desempenho/dashboard.html', context)
+
+
+# =======================================================================
+# SÉRIE DE EVOLUÇÃO (JSON PARA OS GRÁFICOS)
+# =======================================================================
+def _parametros_serie(request):
+    agrupamento = request.GET.get('agrupamento', 'dia')
+    if agrupamento not in PONTOS_SERIE:
+        agrupamento = 'dia'
+    try:
+        pontos = int(request.GET.get('pontos', PONTOS_SERIE[agrupamento]))
+    except ValueError:
+        pontos = PONTOS_SERIE[agrupamento]
+    return agrupamento, min(max(pontos, 1), MAXIMO_PONTOS_SERIE[agrupamento])
+
+def _etag_serie(request):
+    # A série só muda com uma nova resposta (ou com a virada do dia, que desloca os baldes).
+    if not request.user.is_authenticated:
+        return None
+    agrupamento, pontos = _parametros_serie(request)
+    ultima = ultima_resposta_em(request.user.id)
+    marca = int(ultima.timestamp() * 1000) if ultima else 0
+    return f"serie-{request.user.id}-{marca}-{hoje_local().isoformat()}-{agrupamento}-{pontos}"
+
+@login_required
+@cache_control(private=True, max_age=0, must_revalidate=True)
+@condition(etag_func=_etag_serie)
+def serie_desempenho(request):
+    agrupamento, pontos = _parametros_serie(request)
+    return JsonResponse(montar_serie_desempenho(request.user.id, agrupamento, pontos))
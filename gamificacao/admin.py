@@ -1,8 +1,8 @@
 # gamificacao/admin.py
 from django.contrib import admin
 from .models import (
-    GamificationSettings, ProfileGamificacao, ProfileStreak, MetaDiariaUsuario,
-    RankingSemanal, RankingMensal,
+    GamificationSettings, ProfileGamificacao, ProfileStreak, MetaDiariaUsuario, MetaDiariaMensal, CooldownAtivo,
+    RankingSemanal, RankingMensal, PlacarGeral, PlacarEscopo, LancamentoGamificacao, ItemCatalogo,
     Avatar, Borda, Banner, TipoDesbloqueio,
     RecompensaPendente, AvatarUsuario, BordaUsuario, BannerUsuario, RecompensaUsuario,
     TrilhaDeConquistas, SerieDeConquistas, VariavelDoJogo, Conquista, Condicao, ConquistaUsuario,
@@ -73,12 +73,39 @@ class CampanhaAdmin(admin.ModelAdmin):
     raw_id_fields = ('simulado_especifico',)
 
 # Registro dos outros modelos com a visualização padrão
+@admin.register(LancamentoGamificacao)
+class LancamentoGamificacaoAdmin(admin.ModelAdmin):
+    list_display = ('user_profile', 'motivo', 'delta_xp', 'delta_moedas', 'referencia', 'criado_em')
+    list_filter = ('motivo',)
+    search_fields = ('user_profile__user__username', 'referencia')
+    # O extrato é append-only: não pode ser alterado pelo admin.
+    def has_change_permission(self, request, obj=None): return False
+    def has_delete_permission(self, request, obj=None): return False
+
+@admin.register(ItemCatalogo)
+class ItemCatalogoAdmin(admin.ModelAdmin):
+    list_display = ('nome', 'tipo', 'raridade', 'preco_moedas', 'nivel_necessario', 'na_loja', 'desbloqueio_por_nivel')
+    list_filter = ('tipo', 'na_loja', 'raridade')
+    search_fields = ('nome',)
+    # O catálogo é derivado de Avatar/Borda/Banner: edite a recompensa de origem.
+    def has_add_permission(self, request): return False
+    def has_change_permission(self, request, obj=None): return False
+
+@admin.register(CooldownAtivo)
+class CooldownAtivoAdmin(admin.ModelAdmin):
+    list_display = ('user_profile', 'tipo', 'alvo_id', 'expira_em')
+    list_filter = ('tipo',)
+    search_fields = ('user_profile__user__username',)
+
 admin.site.register(GamificationSettings)
 admin.site.register(ProfileGamificacao)
 admin.site.register(ProfileStreak)
 admin.site.register(MetaDiariaUsuario)
+admin.site.register(MetaDiariaMensal)
 admin.site.register(RankingSemanal)
 admin.site.register(RankingMensal)
+admin.site.register(PlacarGeral)
+admin.site.register(PlacarEscopo)
 admin.site.register(ConquistaUsuario)
 admin.site.register(CampanhaUsuarioCompletion)
 admin.site.register(RecompensaPendente)
@@ -0,0 +1,48 @@
+# gamificacao/management/commands/aplicar_regras_em_lote.py
+
+from django.core.management.base import BaseCommand, CommandError
+
+from gamificacao.models import Conquista, Campanha
+from gamificacao.services import (
+    previa_conquista, previa_campanha, aplicar_conquista_em_lote, aplicar_campanha_em_lote
+)
+
+
+class Command(BaseCommand):
+    help = (
+        'Avalia uma Conquista ou Campanha sobre todos os usuários ativos e concede, em lotes, '
+        'a quem já cumpre as condições. Use --previa para apenas contar os elegíveis. '
+        'Se a execução for interrompida, retome com --a-partir-de <último id informado>.'
+    )
+
+    def add_arguments(self, parser):
+        alvo = parser.add_mutually_exclusive_group(required=True)
+        alvo.add_argument('--conquista', type=int, help='ID da conquista.')
+        alvo.add_argument('--campanha', type=int, help='ID da campanha.')
+        parser.add_argument('--previa', action='store_true', help='Apenas mostra quantos usuários seriam contemplados.')
+        parser.add_argument('--lote', type=int, default=1000, help='Quantidade de perfis avaliados por transação.')
+        parser.add_argument('--a-partir-de', type=int, default=0, help='Retoma a partir deste id de UserProfile (exclusivo).')
+
+    def handle(self, *args, **options):
+        if options['conquista']:
+            regra = Conquista.objects.filter(id=options['conquista']).first()
+            previa, aplicar = previa_conquista, aplicar_conquista_em_lote
+        else:
+            regra = Campanha.objects.filter(id=options['campanha']).first()
+            previa, aplicar = previa_campanha, aplicar_campanha_em_lote
+        if regra is None:
+            raise CommandError('Regra não encontrada.')
+
+        if options['previa']:
+            resumo = previa(regra)
+            self.stdout.write(self.style.SUCCESS(f"'{regra.nome}': {resumo['elegiveis']} de {resumo['populacao']} usuários seriam contemplados agora."))
+            for grupo in resumo.get('grupos', []):
+                situacao = f"{grupo['elegiveis']} elegíveis" if grupo['avaliavel'] else 'depende do evento (não avaliado)'
+                self.stdout.write(f"  - {grupo['nome']}: {situacao}")
+            return
+
+        total = 0
+        for progresso in aplicar(regra, tamanho_lote=options['lote'], a_partir_de=options['a_partir_de']):
+            total += progresso['concedidos']
+            self.stdout.write(f"Lote até o perfil {progresso['ultimo_id']}: {progresso['concedidos']} de {progresso['avaliados']} contemplados.")
+        self.stdout.write(self.style.SUCCESS(f"'{regra.nome}' aplicada: {total} usuários contemplados."))
@@ -0,0 +1,283 @@
+# gamificacao/management/commands/benchmark_gamificacao.py
+
+import json
+import random
+import statistics
+import subprocess
+import time
+from collections import Counter
+from datetime import timedelta
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from questoes.models import Disciplina, Assunto, Banca, Questao
+from simulados.models import Simulado, SessaoSimulado, RespostaSimulado
+from usuarios.models import UserProfile
+from gamificacao.models import (
+    GamificationSettings, ProfileGamificacao, ProfileStreak, VariavelDoJogo, Condicao,
+    Conquista, Campanha, Avatar
+)
+from gamificacao.services import processar_resposta_gamificacao, processar_conclusao_simulado
+
+PREFIXO = 'bench_'
+
+
+class _DescartarDados(Exception):
+    """Usada para desfazer a transação do benchmark ao final da execução."""
+
+
+class Command(BaseCommand):
+    help = (
+        'Gera uma população sintética (usuários, questões, conquistas e campanhas), reproduz um fluxo de '
+        'respostas e simulados pelos serviços reais de gamificação e grava em JSON a vazão, a latência '
+        '(p50/p95/p99), as consultas SQL por evento e as distribuições finais de XP, nível e moedas. '
+        'Por padrão tudo roda em uma transação desfeita ao final, sem deixar dados no banco.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--usuarios', type=int, default=50)
+        parser.add_argument('--questoes', type=int, default=300)
+        parser.add_argument('--conquistas', type=int, default=20)
+        parser.add_argument('--campanhas', type=int, default=3, help='Campanhas por gatilho (primeira ação, meta diária e simulado).')
+        parser.add_argument('--eventos', type=int, default=2000, help='Total de eventos a reproduzir.')
+        parser.add_argument('--proporcao-simulados', type=float, default=0.02, help='Fração dos eventos que são conclusões de simulado.')
+        parser.add_argument('--questoes-por-simulado', type=int, default=10)
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument('--respeitar-cooldowns', action='store_true', help='Mantém os cooldowns e o tempo mínimo entre respostas configurados.')
+        parser.add_argument('--manter', action='store_true', help='Mantém os dados sintéticos no banco ao final.')
+        parser.add_argument('--saida', default='benchmark_gamificacao.json', help='Arquivo JSON de resultados.')
+
+    def handle(self, *args, **options):
+        self.random = random.Random(options['seed'])
+        self.resultado = None
+        try:
+            with transaction.atomic():
+                self._preparar_configuracoes(options)
+                self.stdout.write(self.style.NOTICE('Gerando população sintética...'))
+                usuarios, questoes, simulados = self._gerar_populacao(options)
+                self.stdout.write(self.style.NOTICE(f"Reproduzindo {options['eventos']} eventos..."))
+                self.resultado = self._reproduzir_eventos(options, usuarios, questoes, simulados)
+                if not options['manter']:
+                    raise _DescartarDados
+        except _DescartarDados:
+            pass
+
+        with open(options['saida'], 'w', encoding='utf-8') as arquivo:
+            json.dump(self.resultado, arquivo, ensure_ascii=False, indent=2)
+
+        for tipo, metricas in self.resultado['eventos'].items():
+            self.stdout.write(
+                f"{tipo}: {metricas['quantidade']} eventos | p50 {metricas['latencia_ms']['p50']:.1f} ms | "
+                f"p95 {metricas['latencia_ms']['p95']:.1f} ms | p99 {metricas['latencia_ms']['p99']:.1f} ms | "
+                f"{metricas['consultas_por_evento']['media']:.1f} consultas/evento"
+            )
+        self.stdout.write(self.style.SUCCESS(
+            f"Vazão: {self.resultado['vazao_eventos_por_segundo']:.1f} eventos/s. Resultados gravados em {options['saida']}."
+        ))
+
+    # ------------------------------------------------------------------
+    # Preparação
+    # ------------------------------------------------------------------
+    def _preparar_configuracoes(self, options):
+        settings = GamificationSettings.load()
+        if not options['respeitar_cooldowns']:
+            # Todos os eventos acontecem em sequência e no mesmo instante, então
+            # as proteções anti-farming bloqueariam quase tudo.
+            settings.tempo_minimo_entre_respostas_segundos = 0
+            settings.limite_respostas_por_minuto = 0
+            settings.cooldown_mesma_questao_horas = 0
+            settings.cooldown_mesmo_simulado_horas = 0
+            settings.save()
+        self.configuracoes = {
+            campo.name: getattr(settings, campo.name)
+            for campo in GamificationSettings._meta.fields if campo.name != 'id'
+        }
+
+    def _gerar_populacao(self, options):
+        rnd = self.random
+        sufixo = f"{int(time.time())}"
+
+        disciplinas = [Disciplina.objects.create(nome=f"{PREFIXO}disciplina_{sufixo}_{i}") for i in range(5)]
+        bancas = [Banca.objects.create(nome=f"{PREFIXO}banca_{sufixo}_{i}") for i in range(3)]
+        assuntos = [Assunto.objects.create(disciplina=d, nome=f"{PREFIXO}assunto_{d.id}_{i}") for d in disciplinas for i in range(4)]
+        questoes = [
+            Questao.objects.create(
+                disciplina=assunto.disciplina, assunto=assunto, banca=rnd.choice(bancas), ano=2024,
+                enunciado=f"Questão sintética {i}", alternativas={'A': 'a', 'B': 'b', 'C': 'c', 'D': 'd'},
+                gabarito=rnd.choice('ABCD')
+            )
+            for i, assunto in enumerate(rnd.choice(assuntos) for _ in range(options['questoes']))
+        ]
+
+        # Usuários em lote: sem hash de senha e sem depender dos signals.
+        novos = [User(username=f"{PREFIXO}{sufixo}_{i}", email=f"{PREFIXO}{sufixo}_{i}@exemplo.com") for i in range(options['usuarios'])]
+        for user in novos:
+            user.set_unusable_password()
+        User.objects.bulk_create(novos)
+        usuarios = list(User.objects.filter(username__startswith=f"{PREFIXO}{sufixo}_"))
+        UserProfile.objects.bulk_create([UserProfile(user=u, nome='Bench', sobrenome=str(u.id)) for u in usuarios])
+        perfis = list(UserProfile.objects.filter(user__in=usuarios))
+        ProfileGamificacao.objects.bulk_create([ProfileGamificacao(user_profile=p) for p in perfis], ignore_conflicts=True)
+        ProfileStreak.objects.bulk_create([ProfileStreak(user_profile=p) for p in perfis], ignore_conflicts=True)
+        usuarios = list(User.objects.filter(id__in=[u.id for u in usuarios]).select_related('userprofile'))
+        # Habilidade de cada usuário: probabilidade de acerto.
+        self.habilidade = {u.id: rnd.uniform(0.35, 0.9) for u in usuarios}
+
+        simulados = []
+        for i in range(5):
+            simulado = Simulado.objects.create(nome=f"{PREFIXO}simulado_{sufixo}_{i}", is_oficial=True, dificuldade=rnd.choice(['FACIL', 'MEDIO', 'DIFICIL']))
+            simulado.questoes.set(rnd.sample(questoes, min(options['questoes_por_simulado'], len(questoes))))
+            simulados.append(simulado)
+
+        variaveis = {
+            chave: VariavelDoJogo.objects.get_or_create(chave=chave, defaults={'nome_exibicao': chave, 'descricao': chave})[0]
+            for chave in ('total_acertos', 'total_respostas', 'level', 'simulados_concluidos')
+        }
+        for i in range(options['conquistas']):
+            chave = rnd.choice(list(variaveis))
+            limite = {'total_acertos': 5, 'total_respostas': 10, 'level': 2, 'simulados_concluidos': 1}[chave] * (1 + i // 4)
+            conquista = Conquista.objects.create(
+                nome=f"{PREFIXO}conquista_{sufixo}_{i}", descricao='Conquista sintética', icone='fas fa-star',
+                recompensas={'xp': 20 * (1 + i % 5), 'moedas': 10 * (1 + i % 3)}
+            )
+            Condicao.objects.create(conquista=conquista, variavel=variaveis[chave], operador='>=', valor=limite)
+
+        avatar = Avatar.objects.create(nome=f"{PREFIXO}avatar_{sufixo}", descricao='Avatar sintético')
+        agora = timezone.now() - timedelta(minutes=1)
+        for i in range(options['campanhas']):
+            Campanha.objects.create(
+                nome=f"{PREFIXO}primeira_acao_{sufixo}_{i}", gatilho=Campanha.Gatilho.PRIMEIRA_ACAO_DO_DIA,
+                tipo_recorrencia=Campanha.TipoRecorrencia.DIARIA, data_inicio=agora, grupos_de_condicoes=[{'xp_extra': 10}]
+            )
+            Campanha.objects.create(
+                nome=f"{PREFIXO}meta_{sufixo}_{i}", gatilho=Campanha.Gatilho.META_DIARIA_CONCLUIDA,
+                tipo_recorrencia=Campanha.TipoRecorrencia.DIARIA, data_inicio=agora, grupos_de_condicoes=[{'moedas_extras': 15}]
+            )
+            Campanha.objects.create(
+                nome=f"{PREFIXO}simulado_{sufixo}_{i}", gatilho=Campanha.Gatilho.COMPLETAR_SIMULADO,
+                tipo_recorrencia=Campanha.TipoRecorrencia.SEMANAL, data_inicio=agora,
+                grupos_de_condicoes=[{'condicao_min_acertos_percent': 70, 'xp_extra': 50, 'avatares': [avatar.id]}]
+            )
+        return usuarios, questoes, simulados
+
+    # ------------------------------------------------------------------
+    # Reprodução dos eventos
+    # ------------------------------------------------------------------
+    def _reproduzir_eventos(self, options, usuarios, questoes, simulados):
+        rnd = self.random
+        medicoes = {'resposta': [], 'simulado': []}
+        bloqueios = Counter()
+        inicio_total = time.perf_counter()
+        tempo_servicos = 0.0
+
+        for _ in range(options['eventos']):
+            # O log de consultas da conexão tem tamanho limitado; esvaziá-lo
+            # mantém a contagem por evento correta em execuções longas.
+            connection.queries_log.clear()
+            user = rnd.choice(usuarios)
+            if rnd.random() < options['proporcao_simulados']:
+                sessao = self._montar_sessao_simulado(user, rnd.choice(simulados))
+                with CaptureQueriesContext(connection) as consultas:
+                    inicio = time.perf_counter()
+                    processar_conclusao_simulado(sessao)
+                    duracao = time.perf_counter() - inicio
+                medicoes['simulado'].append((duracao, len(consultas)))
+            else:
+                questao = rnd.choice(questoes)
+                alternativa = questao.gabarito if rnd.random() < self.habilidade[user.id] else rnd.choice([a for a in 'ABCD' if a != questao.gabarito])
+                with CaptureQueriesContext(connection) as consultas:
+                    inicio = time.perf_counter()
+                    retorno = processar_resposta_gamificacao(user, questao, alternativa)
+                    duracao = time.perf_counter() - inicio
+                medicoes['resposta'].append((duracao, len(consultas)))
+                if retorno.get('motivo_bloqueio'):
+                    bloqueios[retorno['motivo_bloqueio']] += 1
+            tempo_servicos += duracao
+
+        return {
+            'commit': self._commit_atual(),
+            'banco': connection.vendor,
+            'parametros': {k: v for k, v in options.items() if k in (
+                'usuarios', 'questoes', 'conquistas', 'campanhas', 'eventos', 'proporcao_simulados',
+                'questoes_por_simulado', 'seed', 'respeitar_cooldowns'
+            )},
+            'configuracoes_gamificacao': self.configuracoes,
+            'duracao_total_s': round(time.perf_counter() - inicio_total, 3),
+            'duracao_servicos_s': round(tempo_servicos, 3),
+            'vazao_eventos_por_segundo': round(options['eventos'] / tempo_servicos, 2) if tempo_servicos else 0,
+            'eventos': {tipo: self._resumir(valores) for tipo, valores in medicoes.items() if valores},
+            'bloqueios': dict(bloqueios),
+            'distribuicoes': self._distribuicoes(usuarios),
+        }
+
+    def _montar_sessao_simulado(self, user, simulado):
+        """Cria uma sessão finalizada, já corrigida, como faz a view `finalizar_simulado`."""
+        sessao = SessaoSimulado.objects.create(simulado=simulado, usuario=user)
+        respostas = []
+        for questao in simulado.questoes.all():
+            correta = self.random.random() < self.habilidade[user.id]
+            respostas.append(RespostaSimulado(
+                sessao=sessao, questao=questao, foi_correta=correta,
+                alternativa_selecionada=questao.gabarito if correta else 'X'
+            ))
+        RespostaSimulado.objects.bulk_create(respostas)
+        sessao.finalizar_sessao()
+        return sessao
+
+    # ------------------------------------------------------------------
+    # Métricas
+    # ------------------------------------------------------------------
+    @staticmethod
+    def _percentil(valores_ordenados, p):
+        if not valores_ordenados:
+            return 0
+        indice = min(len(valores_ordenados) - 1, max(0, round(p / 100 * len(valores_ordenados)) - 1))
+        return valores_ordenados[indice]
+
+    def _resumir(self, medicoes):
+        latencias = sorted(d * 1000 for d, _ in medicoes)
+        consultas = sorted(q for _, q in medicoes)
+        return {
+            'quantidade': len(medicoes),
+            'latencia_ms': {
+                'media': round(statistics.fmean(latencias), 3),
+                'p50': round(self._percentil(latencias, 50), 3),
+                'p95': round(self._percentil(latencias, 95), 3),
+                'p99': round(self._percentil(latencias, 99), 3),
+                'max': round(latencias[-1], 3),
+            },
+            'consultas_por_evento': {
+                'media': round(statistics.fmean(consultas), 2),
+                'p50': self._percentil(consultas, 50),
+                'p95': self._percentil(consultas, 95),
+                'max': consultas[-1],
+            },
+        }
+
+    def _distribuicoes(self, usuarios):
+        dados = list(ProfileGamificacao.objects.filter(user_profile__user__in=usuarios).values_list('xp', 'level', 'moedas'))
+
+        def resumo(valores):
+            valores = sorted(valores)
+            return {
+                'min': valores[0], 'p50': self._percentil(valores, 50), 'p90': self._percentil(valores, 90),
+                'max': valores[-1], 'media': round(statistics.fmean(valores), 2),
+            }
+
+        return {
+            'xp': resumo([xp for xp, _, _ in dados]),
+            'level': resumo([level for _, level, _ in dados]),
+            'moedas': resumo([moedas for _, _, moedas in dados]),
+            'usuarios_por_level': dict(sorted(Counter(level for _, level, _ in dados).items())),
+        }
+
+    @staticmethod
+    def _commit_atual():
+        try:
+            return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, check=True).stdout.strip()
+        except (OSError, subprocess.CalledProcessError):
+            return None
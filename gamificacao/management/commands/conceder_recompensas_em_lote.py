@@ -0,0 +1,51 @@
+# gamificacao/management/commands/conceder_recompensas_em_lote.py
+
+from django.core.management.base import BaseCommand, CommandError
+
+from gamificacao.models import Avatar, Borda, Banner, Campanha
+from gamificacao.services import PUBLICOS_CONCESSAO, TAMANHO_LOTE_CONCESSAO, conceder_recompensas_em_lote, perfis_do_publico
+from usuarios.models import UserProfile
+
+
+class Command(BaseCommand):
+    help = 'Envia avatares, bordas e banners para a caixa de recompensas de um público inteiro (eventos e pagamentos de campanha).'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--publico', choices=list(PUBLICOS_CONCESSAO), help='Público pré-definido que receberá as recompensas.')
+        parser.add_argument('--usuarios', nargs='+', metavar='USERNAME', help='Nomes de usuário que receberão as recompensas (alternativa a --publico).')
+        parser.add_argument('--avatares', nargs='+', type=int, default=[], metavar='ID')
+        parser.add_argument('--bordas', nargs='+', type=int, default=[], metavar='ID')
+        parser.add_argument('--banners', nargs='+', type=int, default=[], metavar='ID')
+        parser.add_argument('--origem', required=True, help="Texto exibido como origem do prêmio. Ex: 'Evento de Aniversário'.")
+        parser.add_argument('--campanha', type=int, help='ID da campanha cuja conclusão do ciclo atual será registrada.')
+        parser.add_argument('--lote', type=int, default=TAMANHO_LOTE_CONCESSAO, help='Quantidade de usuários por transação.')
+
+    def handle(self, *args, **options):
+        if bool(options['publico']) == bool(options['usuarios']):
+            raise CommandError('Informe exatamente um entre --publico e --usuarios.')
+
+        recompensas = [
+            *Avatar.objects.filter(id__in=options['avatares']),
+            *Borda.objects.filter(id__in=options['bordas']),
+            *Banner.objects.filter(id__in=options['banners']),
+        ]
+        if not recompensas:
+            raise CommandError('Nenhuma recompensa válida informada (--avatares, --bordas ou --banners).')
+
+        campanha = None
+        if options['campanha']:
+            try:
+                campanha = Campanha.objects.get(id=options['campanha'])
+            except Campanha.DoesNotExist:
+                raise CommandError(f"Campanha {options['campanha']} não encontrada.")
+
+        if options['usuarios']:
+            perfis_ids = UserProfile.objects.filter(user__username__in=options['usuarios']).values_list('id', flat=True)
+        else:
+            perfis_ids = perfis_do_publico(options['publico'])
+
+        resumo = conceder_recompensas_em_lote(list(perfis_ids), recompensas, options['origem'], campanha=campanha, tamanho_lote=options['lote'])
+        self.stdout.write(self.style.SUCCESS(
+            f"{resumo['recompensas_pendentes']} recompensas enviadas para {resumo['usuarios']} usuários "
+            f"({resumo['ja_existentes']} já existentes, {resumo['campanhas_concluidas']} conclusões de campanha registradas)."
+        ))
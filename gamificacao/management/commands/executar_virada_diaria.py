@@ -0,0 +1,31 @@
+# gamificacao/management/commands/executar_virada_diaria.py
+
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+
+from gamificacao.services import executar_virada_diaria
+
+
+class Command(BaseCommand):
+    help = ('Virada diária: zera streaks interrompidos, cria as metas do dia para quem praticou ontem, '
+            'compacta metas diárias antigas, remove cooldowns vencidos, eventos de resposta fora da retenção e placares por disciplina/banca de períodos encerrados. Agende logo após a meia-noite (America/Sao_Paulo).')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--data', help='Data de referência (AAAA-MM-DD). Padrão: hoje.')
+
+    def handle(self, *args, **options):
+        hoje = None
+        if options['data']:
+            try:
+                hoje = date.fromisoformat(options['data'])
+            except ValueError:
+                raise CommandError('Data inválida. Use o formato AAAA-MM-DD.')
+
+        resumo = executar_virada_diaria(hoje)
+        self.stdout.write(self.style.SUCCESS(
+            f"Virada diária concluída: {resumo['streaks_zerados']} streaks zerados, "
+            f"{resumo['metas_criadas']} metas criadas, {resumo['consolidados']} meses consolidados "
+            f"({resumo['removidas']} metas diárias removidas), {resumo['cooldowns_expirados']} cooldowns vencidos, "
+            f"{resumo['eventos_removidos']} eventos de resposta antigos e {resumo['placares_escopo_removidos']} placares por escopo encerrados removidos."
+        ))
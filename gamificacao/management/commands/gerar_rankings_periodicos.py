@@ -0,0 +1,45 @@
+# gamificacao/management/commands/gerar_rankings_periodicos.py
+
+from datetime import date
+from django.core.management.base import BaseCommand, CommandError
+
+from gamificacao.services import _verificar_e_gerar_ranking_semanal, _verificar_e_gerar_ranking_mensal
+
+
+class Command(BaseCommand):
+    help = (
+        'Gera os rankings semanal e mensal do período encerrado e paga as campanhas de ranking. '
+        'É idempotente: pode ser agendado com qualquer frequência (ex.: a cada hora via cron).'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--tipo', choices=['semanal', 'mensal', 'todos'], default='todos', help='Qual ranking gerar.')
+        parser.add_argument('--referencia', help='Data de referência (AAAA-MM-DD). Gera o período anterior a esta data. Padrão: hoje.')
+
+    def handle(self, *args, **options):
+        referencia = None
+        if options['referencia']:
+            try:
+                referencia = date.fromisoformat(options['referencia'])
+            except ValueError:
+                raise CommandError('Data de referência inválida. Use o formato AAAA-MM-DD.')
+
+        tarefas = []
+        if options['tipo'] in ('semanal', 'todos'): tarefas.append(_verificar_e_gerar_ranking_semanal)
+        if options['tipo'] in ('mensal', 'todos'): tarefas.append(_verificar_e_gerar_ranking_mensal)
+
+        for tarefa in tarefas:
+            resumo = tarefa(referencia)
+            if not resumo['gerado']:
+                self.stdout.write(self.style.NOTICE(f"{resumo['tarefa']}: período {resumo['periodo']} já gerado. Nada a fazer."))
+                continue
+
+            tempos = resumo['tempos']
+            self.stdout.write(self.style.SUCCESS(
+                f"{resumo['tarefa']}: período {resumo['periodo']} gerado com {resumo['ranqueados']} ranqueados, "
+                f"{resumo['recompensas_pendentes']} recompensas pendentes e {resumo['campanhas_concluidas']} campanhas concluídas."
+            ))
+            self.stdout.write(
+                f"  Tempos: agregação {tempos['agregacao']:.2f}s | classificação {tempos['classificacao']:.2f}s | "
+                f"gravação {tempos['gravacao']:.2f}s | premiação {tempos['premiacao']:.2f}s | total {sum(tempos.values()):.2f}s"
+            )
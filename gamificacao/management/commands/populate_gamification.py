@@ -9,7 +9,9 @@ from datetime import date, timedelta
 from faker import Faker
 
 from questoes.models import Questao
-from pratica.models import RespostaUsuario
+from pratica.models import RespostaUsuario, EventoResposta
+from pratica.eventos import EscritorDeEventos
+from desempenho.models import SerieDiariaDisciplina
 from gamificacao.models import ProfileGamificacao, ProfileStreak, MetaDiariaUsuario
 from gamificacao.services import processar_resposta_gamificacao
 from simulados.models import Simulado, SessaoSimulado
@@ -38,6 +40,8 @@ class Command(BaseCommand):
         self.stdout.write(self.style.WARNING('Limpando dados de gamificação e respostas antigas dos usuários de teste...'))
         user_ids = [user.id for user in test_users]
         RespostaUsuario.objects.filter(usuario_id__in=user_ids).delete()
+        EventoResposta.objects.filter(usuario_id__in=user_ids).delete()
+        SerieDiariaDisciplina.objects.filter(usuario_id__in=user_ids).delete()
         SessaoSimulado.objects.filter(usuario_id__in=user_ids).delete()
         ProfileGamificacao.objects.filter(user_profile__user_id__in=user_ids).update(level=1, xp=0, acertos_consecutivos=0)
         ProfileStreak.objects.filter(user_profile__user_id__in=user_ids).update(current_streak=0, max_streak=0, last_practice_date=None)
@@ -48,7 +52,7 @@ class Command(BaseCommand):
         total_respostas_simuladas = 200
         self.stdout.write(self.style.NOTICE(f'Simulando {total_respostas_simuladas} respostas de questões...'))
         
-        with transaction.atomic():
+        with transaction.atomic(), EscritorDeEventos() as escritor:
             for i in range(total_respostas_simuladas):
                 usuario_aleatorio = random.choice(test_users)
                 questao_aleatoria = random.choice(all_questions)
@@ -66,6 +70,11 @@ class Command(BaseCommand):
                         'data_resposta': data_simulada
                     }
                 )
+                # Os rankings periódicos leem o histórico de eventos.
+                escritor.adicionar(
+                    usuario_aleatorio.id, questao_aleatoria.id, questao_aleatoria.gabarito if foi_correta else 'X',
+                    foi_correta, EventoResposta.Origem.PRATICA, registrado_em=data_simulada
+                )
                 
                 # Simula a atualização do streak (lógica simplificada para o script)
                 streak_data, _ = ProfileStreak.objects.get_or_create(user_profile=usuario_aleatorio.userprofile)
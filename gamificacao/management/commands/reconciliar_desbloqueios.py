@@ -0,0 +1,13 @@
+# gamificacao/management/commands/reconciliar_desbloqueios.py
+
+from django.core.management.base import BaseCommand
+
+from gamificacao.services import reconciliar_desbloqueios_por_nivel
+
+
+class Command(BaseCommand):
+    help = 'Concede, em lote, as recompensas por nível que ainda faltam a cada usuário (reconciliação completa).'
+
+    def handle(self, *args, **options):
+        criadas = reconciliar_desbloqueios_por_nivel()
+        self.stdout.write(self.style.SUCCESS(f'Reconciliação concluída: {criadas} recompensas pendentes criadas.'))
@@ -0,0 +1,17 @@
+# gamificacao/management/commands/reconstruir_placar_geral.py
+
+import time
+from django.core.management.base import BaseCommand
+
+from gamificacao.services import reconstruir_placar_geral
+
+
+class Command(BaseCommand):
+    help = 'Reconstrói o placar materializado do Ranking Geral a partir das respostas dos usuários.'
+
+    def handle(self, *args, **options):
+        self.stdout.write(self.style.NOTICE('Reconstruindo o placar do Ranking Geral...'))
+        inicio = time.perf_counter()
+        total = reconstruir_placar_geral()
+        duracao = time.perf_counter() - inicio
+        self.stdout.write(self.style.SUCCESS(f'Placar reconstruído: {total} usuários ranqueados em {duracao:.2f}s.'))
@@ -0,0 +1,18 @@
+# gamificacao/management/commands/reconstruir_placares_escopo.py
+
+import time
+from django.core.management.base import BaseCommand
+
+from gamificacao.services import reconstruir_placares_escopo
+
+
+class Command(BaseCommand):
+    help = ('Reconstrói os placares dos rankings por disciplina e por banca (semana e mês correntes) '
+            'a partir do consolidado diário de desempenho.')
+
+    def handle(self, *args, **options):
+        self.stdout.write(self.style.NOTICE('Reconstruindo os placares por disciplina e banca...'))
+        inicio = time.perf_counter()
+        total = reconstruir_placares_escopo()
+        duracao = time.perf_counter() - inicio
+        self.stdout.write(self.style.SUCCESS(f'Placares reconstruídos: {total} linhas em {duracao:.2f}s.'))
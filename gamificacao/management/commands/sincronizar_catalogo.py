@@ -0,0 +1,23 @@
+# gamificacao/management/commands/sincronizar_catalogo.py
+
+from django.core.management.base import BaseCommand
+
+from gamificacao.models import ItemCatalogo, Avatar, Borda, Banner
+
+
+class Command(BaseCommand):
+    help = 'Reconstrói o catálogo da loja (ItemCatalogo) a partir dos Avatares, Bordas e Banners cadastrados.'
+
+    def handle(self, *args, **options):
+        total = 0
+        for Model in (Avatar, Borda, Banner):
+            tipo = Model.__name__
+            ids = []
+            for recompensa in Model.objects.all():
+                ItemCatalogo.sincronizar(recompensa)
+                ids.append(recompensa.id)
+            # Remove entradas órfãs de recompensas que não existem mais.
+            removidos, _ = ItemCatalogo.objects.filter(tipo=tipo).exclude(item_id__in=ids).delete()
+            total += len(ids)
+            self.stdout.write(f'{tipo}: {len(ids)} sincronizados, {removidos} removidos.')
+        self.stdout.write(self.style.SUCCESS(f'Catálogo sincronizado: {total} itens.'))
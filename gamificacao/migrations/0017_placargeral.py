@@ -0,0 +1,54 @@
+# Generated by Django 5.2.5 on 2026-10-19 13:00
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count, Q
+
+
+def popular_placar_geral(apps, schema_editor):
+    RespostaUsuario = apps.get_model('pratica', 'RespostaUsuario')
+    UserProfile = apps.get_model('usuarios', 'UserProfile')
+    ProfileStreak = apps.get_model('gamificacao', 'ProfileStreak')
+    PlacarGeral = apps.get_model('gamificacao', 'PlacarGeral')
+
+    perfis = dict(UserProfile.objects.values_list('user_id', 'id'))
+    streaks = dict(ProfileStreak.objects.values_list('user_profile_id', 'current_streak'))
+    totais = RespostaUsuario.objects.filter(usuario__is_active=True, usuario__is_staff=False).values('usuario_id').annotate(
+        respostas=Count('id'), acertos=Count('id', filter=Q(foi_correta=True))
+    )
+    PlacarGeral.objects.bulk_create([
+        PlacarGeral(
+            user_profile_id=perfis[item['usuario_id']], respostas=item['respostas'],
+            acertos=item['acertos'], streak=streaks.get(perfis[item['usuario_id']], 0)
+        )
+        for item in totais if item['usuario_id'] in perfis
+    ], batch_size=2000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gamificacao', '0016_alter_avatar_descricao_alter_banner_descricao_and_more'),
+        ('usuarios', '0001_initial'),
+        ('pratica', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PlacarGeral',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('acertos', models.PositiveIntegerField(default=0)),
+                ('streak', models.PositiveIntegerField(default=0)),
+                ('respostas', models.PositiveIntegerField(default=0)),
+                ('atualizado_em', models.DateTimeField(auto_now=True)),
+                ('user_profile', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='placar_geral', to='usuarios.userprofile')),
+            ],
+            options={
+                'verbose_name': 'Placar Geral',
+                'verbose_name_plural': 'Placar Geral',
+                'indexes': [models.Index(fields=['-acertos', '-streak', '-respostas', 'user_profile'], name='placar_geral_pontuacao_idx')],
+            },
+        ),
+        migrations.RunPython(popular_placar_geral, migrations.RunPython.noop),
+    ]
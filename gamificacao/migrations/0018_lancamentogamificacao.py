@@ -0,0 +1,33 @@
+# Generated by Django 5.2.5 on 2026-10-19 13:06
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gamificacao', '0017_placargeral'),
+        ('usuarios', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LancamentoGamificacao',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('delta_xp', models.IntegerField(default=0)),
+                ('delta_moedas', models.IntegerField(default=0)),
+                ('motivo', models.CharField(choices=[('RESPOSTA', 'Resposta de Questão'), ('META_DIARIA', 'Meta Diária Concluída'), ('PRIMEIRO_DO_DIA', 'Primeiro a Concluir a Meta do Dia'), ('CONQUISTA', 'Conquista Desbloqueada'), ('SIMULADO', 'Simulado Concluído'), ('CAMPANHA', 'Prêmio de Campanha'), ('COMPRA_LOJA', 'Compra na Loja'), ('CONCESSAO_MANUAL', 'Concessão Manual')], max_length=20)),
+                ('referencia', models.CharField(blank=True, help_text="Objeto de origem do lançamento. Ex: 'questao:42', 'avatar:7'.", max_length=100)),
+                ('criado_em', models.DateTimeField(auto_now_add=True)),
+                ('user_profile', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='lancamentos_gamificacao', to='usuarios.userprofile')),
+            ],
+            options={
+                'verbose_name': 'Lançamento de Gamificação',
+                'verbose_name_plural': 'Lançamentos de Gamificação',
+                'ordering': ['-criado_em'],
+                'indexes': [models.Index(fields=['user_profile', 'criado_em'], name='lancamento_usuario_data_idx')],
+            },
+        ),
+    ]
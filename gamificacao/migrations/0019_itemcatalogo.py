@@ -0,0 +1,55 @@
+# Generated by Django 5.2.5 on 2026-10-19 13:11
+
+import storages.backends.s3
+from django.db import migrations, models
+
+
+def popular_catalogo(apps, schema_editor):
+    ItemCatalogo = apps.get_model('gamificacao', 'ItemCatalogo')
+    itens = []
+    for tipo in ('Avatar', 'Borda', 'Banner'):
+        Model = apps.get_model('gamificacao', tipo)
+        for recompensa in Model.objects.prefetch_related('tipos_desbloqueio'):
+            formas = {t.nome for t in recompensa.tipos_desbloqueio.all()}
+            preco = recompensa.preco_moedas or 0
+            itens.append(ItemCatalogo(
+                tipo=tipo, item_id=recompensa.id, nome=recompensa.nome, descricao=recompensa.descricao,
+                imagem=recompensa.imagem.name if recompensa.imagem else None, raridade=recompensa.raridade,
+                nivel_necessario=recompensa.nivel_necessario, preco_moedas=preco,
+                na_loja='LOJA' in formas and preco > 0, desbloqueio_por_nivel='NIVEL' in formas,
+            ))
+    ItemCatalogo.objects.bulk_create(itens, batch_size=2000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gamificacao', '0018_lancamentogamificacao'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ItemCatalogo',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('tipo', models.CharField(choices=[('Avatar', 'Avatar'), ('Borda', 'Borda'), ('Banner', 'Banner')], max_length=10)),
+                ('item_id', models.PositiveIntegerField()),
+                ('nome', models.CharField(max_length=100)),
+                ('descricao', models.TextField(blank=True)),
+                ('imagem', models.ImageField(blank=True, null=True, storage=storages.backends.s3.S3Storage(), upload_to='gamificacao_recompensas/')),
+                ('raridade', models.CharField(choices=[('COMUM', 'Comum'), ('RARO', 'Raro'), ('EPICO', 'Épico'), ('LENDARIO', 'Lendário'), ('MITICO', 'Mítico')], default='COMUM', max_length=20)),
+                ('nivel_necessario', models.PositiveIntegerField(blank=True, null=True)),
+                ('preco_moedas', models.PositiveIntegerField(default=0)),
+                ('na_loja', models.BooleanField(default=False, help_text='Item marcado com a forma de desbloqueio LOJA e com preço maior que zero.')),
+                ('desbloqueio_por_nivel', models.BooleanField(default=False)),
+                ('atualizado_em', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name': 'Item do Catálogo',
+                'verbose_name_plural': 'Itens do Catálogo',
+                'indexes': [models.Index(fields=['na_loja', 'tipo', 'raridade', 'preco_moedas'], name='catalogo_loja_idx')],
+                'unique_together': {('tipo', 'item_id')},
+            },
+        ),
+        migrations.RunPython(popular_catalogo, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.5 on 2026-10-19 13:13
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gamificacao', '0019_itemcatalogo'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='profilegamificacao',
+            name='acesso_total_recompensas',
+            field=models.BooleanField(default=False, help_text='Libera todas as recompensas para uso sem criar registros de posse. Membros da equipe já têm esse acesso.'),
+        ),
+    ]
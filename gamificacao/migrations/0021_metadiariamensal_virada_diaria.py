@@ -0,0 +1,38 @@
+# Generated by Django 5.2.5 on 2026-10-19 13:25
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gamificacao', '0020_profilegamificacao_acesso_total_recompensas'),
+        ('usuarios', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='tarefaagendadalog',
+            name='nome_tarefa',
+            field=models.CharField(choices=[('gerar_ranking_semanal', 'Gerar Ranking Semanal'), ('gerar_ranking_mensal', 'Gerar Ranking Mensal'), ('virada_diaria', 'Virada Diária (Streaks e Metas)')], max_length=50, unique=True),
+        ),
+        migrations.CreateModel(
+            name='MetaDiariaMensal',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('mes', models.DateField(help_text='Primeiro dia do mês consolidado.')),
+                ('dias_ativos', models.PositiveIntegerField(default=0)),
+                ('dias_meta_atingida', models.PositiveIntegerField(default=0)),
+                ('questoes_resolvidas', models.PositiveIntegerField(default=0)),
+                ('xp_ganho', models.PositiveIntegerField(default=0)),
+                ('user_profile', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='metas_mensais', to='usuarios.userprofile')),
+            ],
+            options={
+                'verbose_name': 'Meta Diária (Consolidado Mensal)',
+                'verbose_name_plural': 'Metas Diárias (Consolidado Mensal)',
+                'ordering': ['-mes'],
+                'unique_together': {('user_profile', 'mes')},
+            },
+        ),
+    ]
@@ -0,0 +1,79 @@
+# Generated by Django 5.2.5 on 2026-10-19 13:27
+
+from datetime import timedelta
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+
+def migrar_cooldowns(apps, schema_editor):
+    """
+    Copia os cooldowns ainda vigentes para a nova tabela: os de simulado vêm do
+    JSON `cooldowns_ativos` e os de questão das respostas recentes.
+    """
+    GamificationSettings = apps.get_model('gamificacao', 'GamificationSettings')
+    ProfileGamificacao = apps.get_model('gamificacao', 'ProfileGamificacao')
+    CooldownAtivo = apps.get_model('gamificacao', 'CooldownAtivo')
+    UserProfile = apps.get_model('usuarios', 'UserProfile')
+    RespostaUsuario = apps.get_model('pratica', 'RespostaUsuario')
+
+    settings = GamificationSettings.objects.filter(pk=1).first()
+    horas_simulado = settings.cooldown_mesmo_simulado_horas if settings else 48
+    horas_questao = settings.cooldown_mesma_questao_horas if settings else 24
+    agora = timezone.now()
+    cooldowns = []
+
+    for perfil_id, dados in ProfileGamificacao.objects.exclude(cooldowns_ativos={}).values_list('user_profile_id', 'cooldowns_ativos'):
+        for simulado_id, inicio in (dados or {}).get('simulados', {}).items():
+            inicio = parse_datetime(inicio) if inicio else None
+            if inicio and inicio + timedelta(hours=horas_simulado) > agora:
+                cooldowns.append(CooldownAtivo(
+                    user_profile_id=perfil_id, tipo='SIMULADO', alvo_id=int(simulado_id),
+                    expira_em=inicio + timedelta(hours=horas_simulado)
+                ))
+
+    if horas_questao:
+        perfil_por_usuario = dict(UserProfile.objects.values_list('user_id', 'id'))
+        recentes = RespostaUsuario.objects.filter(data_resposta__gt=agora - timedelta(hours=horas_questao))
+        for usuario_id, questao_id, data_resposta in recentes.values_list('usuario_id', 'questao_id', 'data_resposta').iterator():
+            if usuario_id in perfil_por_usuario:
+                cooldowns.append(CooldownAtivo(
+                    user_profile_id=perfil_por_usuario[usuario_id], tipo='QUESTAO', alvo_id=questao_id,
+                    expira_em=data_resposta + timedelta(hours=horas_questao)
+                ))
+
+    CooldownAtivo.objects.bulk_create(cooldowns, batch_size=5000, ignore_conflicts=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gamificacao', '0021_metadiariamensal_virada_diaria'),
+        ('pratica', '0002_respostausuario_resposta_usuario_data_idx_and_more'),
+        ('usuarios', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CooldownAtivo',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('tipo', models.CharField(choices=[('RESPOSTA', 'Intervalo mínimo entre respostas'), ('QUESTAO', 'Mesma questão'), ('SIMULADO', 'Mesmo simulado')], max_length=10)),
+                ('alvo_id', models.PositiveIntegerField(default=0, help_text='ID da questão ou do simulado (0 para o intervalo entre respostas).')),
+                ('expira_em', models.DateTimeField(db_index=True)),
+                ('user_profile', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='cooldowns', to='usuarios.userprofile')),
+            ],
+            options={
+                'verbose_name': 'Cooldown Ativo',
+                'verbose_name_plural': 'Cooldowns Ativos',
+                'unique_together': {('user_profile', 'tipo', 'alvo_id')},
+            },
+        ),
+        migrations.RunPython(migrar_cooldowns, migrations.RunPython.noop),
+        migrations.RemoveField(
+            model_name='profilegamificacao',
+            name='cooldowns_ativos',
+        ),
+    ]
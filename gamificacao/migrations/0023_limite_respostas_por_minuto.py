@@ -0,0 +1,28 @@
+# Generated by Django 5.2.5 on 2026-10-19 13:33
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gamificacao', '0022_cooldownativo'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='gamificationsettings',
+            name='limite_respostas_por_minuto',
+            field=models.PositiveIntegerField(default=20, help_text='Proteção anti-bot contra rajadas de respostas. Use 0 para desativar.', verbose_name='Limite de respostas por minuto para ganhar XP'),
+        ),
+        migrations.AlterField(
+            model_name='cooldownativo',
+            name='alvo_id',
+            field=models.PositiveIntegerField(help_text='ID da questão ou do simulado.'),
+        ),
+        migrations.AlterField(
+            model_name='cooldownativo',
+            name='tipo',
+            field=models.CharField(choices=[('QUESTAO', 'Mesma questão'), ('SIMULADO', 'Mesmo simulado')], max_length=10),
+        ),
+    ]
@@ -0,0 +1,65 @@
+# Generated by Django 5.2.5 on 2026-10-19 14:03
+
+from datetime import timedelta
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Sum
+from django.utils import timezone
+
+
+def popular_placares_escopo(apps, schema_editor):
+    DesempenhoDiario = apps.get_model('desempenho', 'DesempenhoDiario')
+    UserProfile = apps.get_model('usuarios', 'UserProfile')
+    PlacarEscopo = apps.get_model('gamificacao', 'PlacarEscopo')
+
+    hoje = timezone.localdate()
+    inicios = {'SEMANAL': hoje - timedelta(days=hoje.weekday()), 'MENSAL': hoje.replace(day=1)}
+    perfis = dict(UserProfile.objects.filter(user__is_active=True, user__is_staff=False).values_list('user_id', 'id'))
+    novos = []
+    for periodo, inicio in inicios.items():
+        for escopo, campo in (('DISCIPLINA', 'disciplina_id'), ('BANCA', 'banca_id')):
+            totais = DesempenhoDiario.objects.filter(data__gte=inicio).exclude(**{campo: None}).values('usuario_id', campo).annotate(
+                respostas=Sum('respondidas'), total_acertos=Sum('acertos')
+            ).filter(respostas__gt=0).order_by()
+            novos.extend(
+                PlacarEscopo(
+                    user_profile_id=perfis[linha['usuario_id']], escopo=escopo, alvo_id=linha[campo], periodo=periodo,
+                    inicio_periodo=inicio, respostas=linha['respostas'], acertos=linha['total_acertos'],
+                )
+                for linha in totais if linha['usuario_id'] in perfis
+            )
+    PlacarEscopo.objects.bulk_create(novos, batch_size=2000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gamificacao', '0023_limite_respostas_por_minuto'),
+        ('usuarios', '0001_initial'),
+        ('desempenho', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PlacarEscopo',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('escopo', models.CharField(choices=[('DISCIPLINA', 'Disciplina'), ('BANCA', 'Banca')], max_length=10)),
+                ('alvo_id', models.PositiveIntegerField()),
+                ('periodo', models.CharField(choices=[('SEMANAL', 'Semanal'), ('MENSAL', 'Mensal')], max_length=7)),
+                ('inicio_periodo', models.DateField(help_text='Segunda-feira da semana ou primeiro dia do mês.')),
+                ('acertos', models.PositiveIntegerField(default=0)),
+                ('respostas', models.PositiveIntegerField(default=0)),
+                ('atualizado_em', models.DateTimeField(auto_now=True)),
+                ('user_profile', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='placares_escopo', to='usuarios.userprofile')),
+            ],
+            options={
+                'verbose_name': 'Placar por Escopo',
+                'verbose_name_plural': 'Placares por Escopo',
+                'indexes': [models.Index(fields=['escopo', 'alvo_id', 'periodo', 'inicio_periodo', '-acertos', '-respostas', 'user_profile'], name='placar_escopo_pontuacao_idx')],
+                'unique_together': {('escopo', 'alvo_id', 'periodo', 'inicio_periodo', 'user_profile')},
+            },
+        ),
+        migrations.RunPython(popular_placares_escopo, migrations.RunPython.noop),
+    ]
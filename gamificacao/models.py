@@ -15,6 +15,10 @@ from simulados.models import Simulado # Adicione esta importação no topo
 from questoes.models import Disciplina, Assunto, Banca 
 from django.db import transaction
 from django.db.models import JSONField, Max
+from django.core.cache import cache
+
+CHAVE_CACHE_SETTINGS = 'gamificacao:settings'
+
 # =======================================================================
 # MODELO DE CONFIGURAÇÕES GLOBAIS DA GAMIFICAÇÃO
 # =======================================================================
@@ -77,6 +81,10 @@ class GamificationSettings(models.Model):
         default=5, verbose_name="Tempo mínimo entre respostas para ganhar XP (em segundos)",
         help_text="Proteção anti-bot. Respostas mais rápidas que isso não geram XP."
     )
+    limite_respostas_por_minuto = models.PositiveIntegerField(
+        default=20, verbose_name="Limite de respostas por minuto para ganhar XP",
+        help_text="Proteção anti-bot contra rajadas de respostas. Use 0 para desativar."
+    )
     cooldown_mesmo_simulado_horas = models.PositiveIntegerField(
         default=48, verbose_name="Cooldown para ganhar XP no mesmo simulado (em horas)",
         help_text="Impede que o usuário ganhe XP finalizando o mesmo simulado várias vezes em um curto período."
@@ -121,10 +129,15 @@ class GamificationSettings(models.Model):
     def save(self, *args, **kwargs):
         self.pk = 1
         super(GamificationSettings, self).save(*args, **kwargs)
+        cache.delete(CHAVE_CACHE_SETTINGS)
 
     @classmethod
     def load(cls):
-        obj, created = cls.objects.get_or_create(pk=1)
+        # Lido em toda resposta: fica num cache curto, invalidado ao salvar.
+        obj = cache.get(CHAVE_CACHE_SETTINGS)
+        if obj is None:
+            obj, created = cls.objects.get_or_create(pk=1)
+            cache.set(CHAVE_CACHE_SETTINGS, obj, 60)
         return obj
 
 # =======================================================================
@@ -137,7 +150,7 @@ class ProfileGamificacao(models.Model):
     moedas = models.PositiveIntegerField(default=100, verbose_name="Fragmentos de Conhecimento (Moedas)")
     acertos_consecutivos = models.IntegerField(default=0, verbose_name="Acertos Consecutivos")
     bonus_xp_ativo = models.BooleanField(default=False, help_text="Indica se o bônus de XP em dobro está ativo.")
-    cooldowns_ativos = JSONField(default=dict, blank=True, help_text="Armazena timestamps de cooldowns para evitar farming.")
+    acesso_total_recompensas = models.BooleanField(default=False, help_text="Libera todas as recompensas para uso sem criar registros de posse. Membros da equipe já têm esse acesso.")
 
     def __str__(self):
         return f"Nível {self.level} de {self.user_profile.user.username}"
@@ -172,6 +185,76 @@ class MetaDiariaUsuario(models.Model):
     class Meta: unique_together = ('user_profile', 'data'); ordering = ['-data']
     def __str__(self): status = "Atingida" if self.meta_atingida else "Em progresso"; return f"Meta de {self.user_profile.user.username} em {self.data.strftime('%d/%m/%Y')}: {status}"
 
+class MetaDiariaMensal(models.Model):
+    """
+    Consolidação mensal das metas diárias antigas. A virada diária compacta as
+    linhas de MetaDiariaUsuario de meses encerrados nesta tabela, para que a
+    tabela diária guarde apenas o período recente.
+    """
+    user_profile = models.ForeignKey(UserProfile, on_delete=models.CASCADE, related_name='metas_mensais')
+    mes = models.DateField(help_text="Primeiro dia do mês consolidado.")
+    dias_ativos = models.PositiveIntegerField(default=0)
+    dias_meta_atingida = models.PositiveIntegerField(default=0)
+    questoes_resolvidas = models.PositiveIntegerField(default=0)
+    xp_ganho = models.PositiveIntegerField(default=0)
+    class Meta: unique_together = ('user_profile', 'mes'); ordering = ['-mes']; verbose_name = "Meta Diária (Consolidado Mensal)"; verbose_name_plural = "Metas Diárias (Consolidado Mensal)"
+    def __str__(self): return f"Metas de {self.user_profile.user.username} em {self.mes.strftime('%m/%Y')}: {self.dias_meta_atingida}/{self.dias_ativos} dias"
+
+class CooldownAtivo(models.Model):
+    """
+    Cooldowns anti-farming com expiração: (usuário, tipo, alvo) -> expira_em.
+    Substitui o antigo JSON `cooldowns_ativos`; as linhas vencidas são
+    removidas pela virada diária.
+    """
+    class Tipo(models.TextChoices):
+        QUESTAO = 'QUESTAO', 'Mesma questão'
+        SIMULADO = 'SIMULADO', 'Mesmo simulado'
+
+    user_profile = models.ForeignKey(UserProfile, on_delete=models.CASCADE, related_name='cooldowns')
+    tipo = models.CharField(max_length=10, choices=Tipo.choices)
+    alvo_id = models.PositiveIntegerField(help_text="ID da questão ou do simulado.")
+    expira_em = models.DateTimeField(db_index=True)
+
+    class Meta:
+        unique_together = ('user_profile', 'tipo', 'alvo_id')
+        verbose_name = "Cooldown Ativo"
+        verbose_name_plural = "Cooldowns Ativos"
+
+    def __str__(self):
+        return f"{self.get_tipo_display()} ({self.alvo_id}) de {self.user_profile.user.username} até {self.expira_em:%d/%m %H:%M}"
+
+class LancamentoGamificacao(models.Model):
+    """
+    Extrato (append-only) de XP e moedas. Toda alteração de saldo em
+    ProfileGamificacao passa por um lançamento, e o saldo é atualizado com
+    incrementos atômicos (F()), sem read-modify-write em Python.
+    """
+    class Motivo(models.TextChoices):
+        RESPOSTA = 'RESPOSTA', 'Resposta de Questão'
+        META_DIARIA = 'META_DIARIA', 'Meta Diária Concluída'
+        PRIMEIRO_DO_DIA = 'PRIMEIRO_DO_DIA', 'Primeiro a Concluir a Meta do Dia'
+        CONQUISTA = 'CONQUISTA', 'Conquista Desbloqueada'
+        SIMULADO = 'SIMULADO', 'Simulado Concluído'
+        CAMPANHA = 'CAMPANHA', 'Prêmio de Campanha'
+        COMPRA_LOJA = 'COMPRA_LOJA', 'Compra na Loja'
+        CONCESSAO_MANUAL = 'CONCESSAO_MANUAL', 'Concessão Manual'
+
+    user_profile = models.ForeignKey(UserProfile, on_delete=models.CASCADE, related_name='lancamentos_gamificacao')
+    delta_xp = models.IntegerField(default=0)
+    delta_moedas = models.IntegerField(default=0)
+    motivo = models.CharField(max_length=20, choices=Motivo.choices)
+    referencia = models.CharField(max_length=100, blank=True, help_text="Objeto de origem do lançamento. Ex: 'questao:42', 'avatar:7'.")
+    criado_em = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['-criado_em']
+        verbose_name = "Lançamento de Gamificação"
+        verbose_name_plural = "Lançamentos de Gamificação"
+        indexes = [models.Index(fields=['user_profile', 'criado_em'], name='lancamento_usuario_data_idx')]
+
+    def __str__(self):
+        return f"{self.user_profile.user.username}: {self.delta_xp:+} XP / {self.delta_moedas:+} moedas ({self.get_motivo_display()})"
+
 # =======================================================================
 # MODELOS DE RANKING
 # =======================================================================
@@ -179,6 +262,7 @@ class TarefaAgendadaLog(models.Model):
     TAREFA_CHOICES = [
         ('gerar_ranking_semanal', 'Gerar Ranking Semanal'),
         ('gerar_ranking_mensal', 'Gerar Ranking Mensal'),
+        ('virada_diaria', 'Virada Diária (Streaks e Metas)'),
     ]
     nome_tarefa = models.CharField(max_length=50, choices=TAREFA_CHOICES, unique=True)
     ultima_execucao = models.DateTimeField()
@@ -205,6 +289,70 @@ class RankingMensal(BaseRankingPeriodico):
     class Meta(BaseRankingPeriodico.Meta): unique_together = ('user_profile', 'ano', 'mes'); verbose_name = "Ranking Mensal"; verbose_name_plural = "Rankings Mensais"
     def __str__(self): return f"#{self.posicao} - {self.user_profile.user.username} (Mês {self.mes}/{self.ano})"
 
+class PlacarGeral(models.Model):
+    """
+    Placar materializado do Ranking Geral. Mantido de forma incremental pelo
+    pipeline de respostas, evita agregar todas as respostas a cada visita.
+    Apenas usuários ativos, não-staff e com ao menos uma resposta possuem linha.
+    """
+    user_profile = models.OneToOneField(UserProfile, on_delete=models.CASCADE, related_name='placar_geral')
+    acertos = models.PositiveIntegerField(default=0)
+    streak = models.PositiveIntegerField(default=0)
+    respostas = models.PositiveIntegerField(default=0)
+    atualizado_em = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = "Placar Geral"
+        verbose_name_plural = "Placar Geral"
+        # Índice de cobertura na mesma ordem dos critérios de classificação:
+        # o TOP N é uma varredura ordenada e a posição de um usuário é uma
+        # contagem sobre um intervalo do índice, sem tocar na tabela.
+        indexes = [
+            models.Index(fields=['-acertos', '-streak', '-respostas', 'user_profile'], name='placar_geral_pontuacao_idx'),
+        ]
+
+    def __str__(self): return f"{self.user_profile.user.username}: {self.acertos} acertos / {self.respostas} respostas"
+
+
+class PlacarEscopo(models.Model):
+    """
+    Placar materializado dos rankings por disciplina e por banca da semana e
+    do mês correntes. Cada linha conta, para um usuário e um recorte, as
+    questões distintas respondidas no período e as acertadas ao menos uma vez
+    (a mesma fonte, EventoResposta, e a mesma regra dos rankings periódicos).
+    Mantido de forma incremental pelo pipeline de respostas; períodos
+    encerrados são removidos na virada diária.
+    """
+    class Escopo(models.TextChoices):
+        DISCIPLINA = 'DISCIPLINA', 'Disciplina'
+        BANCA = 'BANCA', 'Banca'
+
+    class Periodo(models.TextChoices):
+        SEMANAL = 'SEMANAL', 'Semanal'
+        MENSAL = 'MENSAL', 'Mensal'
+
+    user_profile = models.ForeignKey(UserProfile, on_delete=models.CASCADE, related_name='placares_escopo')
+    escopo = models.CharField(max_length=10, choices=Escopo.choices)
+    alvo_id = models.PositiveIntegerField()
+    periodo = models.CharField(max_length=7, choices=Periodo.choices)
+    inicio_periodo = models.DateField(help_text="Segunda-feira da semana ou primeiro dia do mês.")
+    acertos = models.PositiveIntegerField(default=0)
+    respostas = models.PositiveIntegerField(default=0)
+    atualizado_em = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = "Placar por Escopo"
+        verbose_name_plural = "Placares por Escopo"
+        # A chave do ranking (escopo, alvo, período) vem antes do usuário em
+        # ambos os índices: a linha de um usuário é uma busca exata e o TOP N
+        # e a posição são intervalos do índice de pontuação de um só ranking.
+        unique_together = ('escopo', 'alvo_id', 'periodo', 'inicio_periodo', 'user_profile')
+        indexes = [
+            models.Index(fields=['escopo', 'alvo_id', 'periodo', 'inicio_periodo', '-acertos', '-respostas', 'user_profile'], name='placar_escopo_pontuacao_idx'),
+        ]
+
+    def __str__(self): return f"{self.user_profile.user.username} em {self.get_escopo_display()} #{self.alvo_id} ({self.get_periodo_display()}): {self.acertos}/{self.respostas}"
+
 
 # =======================================================================
 # MODELOS DE RECOMPENSAS (ITENS COSMÉTICOS)
@@ -277,6 +425,56 @@ class Avatar(Recompensa): pass
 class Borda(Recompensa): pass
 class Banner(Recompensa): pass
 
+class ItemCatalogo(models.Model):
+    """
+    Catálogo unificado e desnormalizado de Avatares, Bordas e Banners. Permite
+    que a loja filtre, ordene e pagine os três tipos numa única consulta SQL.
+    É mantido pelos signals de Recompensa (ver signals.py) e pode ser
+    reconstruído com o comando `sincronizar_catalogo`.
+    """
+    class Tipo(models.TextChoices):
+        AVATAR = 'Avatar', 'Avatar'
+        BORDA = 'Borda', 'Borda'
+        BANNER = 'Banner', 'Banner'
+
+    tipo = models.CharField(max_length=10, choices=Tipo.choices)
+    item_id = models.PositiveIntegerField()
+    nome = models.CharField(max_length=100)
+    descricao = models.TextField(blank=True)
+    imagem = models.ImageField(upload_to='gamificacao_recompensas/', storage=S3Boto3Storage(), null=True, blank=True)
+    raridade = models.CharField(max_length=20, choices=Recompensa.Raridade.choices, default=Recompensa.Raridade.COMUM)
+    nivel_necessario = models.PositiveIntegerField(null=True, blank=True)
+    preco_moedas = models.PositiveIntegerField(default=0)
+    na_loja = models.BooleanField(default=False, help_text="Item marcado com a forma de desbloqueio LOJA e com preço maior que zero.")
+    desbloqueio_por_nivel = models.BooleanField(default=False)
+    atualizado_em = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        unique_together = ('tipo', 'item_id')
+        verbose_name = "Item do Catálogo"
+        verbose_name_plural = "Itens do Catálogo"
+        indexes = [models.Index(fields=['na_loja', 'tipo', 'raridade', 'preco_moedas'], name='catalogo_loja_idx')]
+
+    def __str__(self): return f"{self.tipo}: {self.nome}"
+
+    @classmethod
+    def sincronizar(cls, recompensa):
+        """Cria ou atualiza a linha do catálogo correspondente à recompensa."""
+        tipos = set(recompensa.tipos_desbloqueio.values_list('nome', flat=True))
+        preco = recompensa.preco_moedas or 0
+        cls.objects.update_or_create(
+            tipo=recompensa.__class__.__name__, item_id=recompensa.id,
+            defaults={
+                'nome': recompensa.nome, 'descricao': recompensa.descricao, 'imagem': recompensa.imagem.name if recompensa.imagem else None,
+                'raridade': recompensa.raridade, 'nivel_necessario': recompensa.nivel_necessario, 'preco_moedas': preco,
+                'na_loja': 'LOJA' in tipos and preco > 0, 'desbloqueio_por_nivel': 'NIVEL' in tipos,
+            }
+        )
+
+    @classmethod
+    def remover(cls, recompensa):
+        cls.objects.filter(tipo=recompensa.__class__.__name__, item_id=recompensa.id).delete()
+
 # =======================================================================
 # NOVA ARQUITETURA DE CONDIÇÕES (DATA-DRIVEN)
 # =======================================================================
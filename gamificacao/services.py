@@ -1,25 +1,35 @@
 # gamificacao/services.py (ARQUIVO COMPLETO E REFATORADO)
 
+import json
+import operator
+from collections import OrderedDict, defaultdict
+from functools import reduce
+import threading
+import time
+from math import isqrt
 from datetime import date, timedelta
 from django.utils import timezone
-from django.db.models import Count, Q
 from django.contrib.contenttypes.models import ContentType
-from django.utils.dateparse import parse_datetime
 from itertools import chain
-from datetime import date, timedelta
 from django.contrib.auth.decorators import login_required
-from django.db import IntegrityError
+from django.db import IntegrityError, transaction
 from .models import ConquistaDiariaGlobalLog # Adicione esta importação
-from django.db.models import Count, Sum
+from django.db.models import Count, Q, Sum, F, OuterRef, Subquery
+from django.db.models import Case, When, Value, BooleanField, CharField
+from django.db.models.functions import Coalesce, Concat, Cast, TruncMonth
+from django.core.cache import cache
 
 
 # Importações de Modelos
-from pratica.models import RespostaUsuario
+from pratica.models import RespostaUsuario, EventoResposta
+from pratica.eventos import registrar_evento_resposta, compactar_eventos_resposta
+from pratica.utils import filtro_periodo, inicio_do_periodo, hoje_local, fuso_local
 from usuarios.models import UserProfile
-from simulados.models import SessaoSimulado
+from simulados.models import SessaoSimulado, Simulado
+from desempenho.services import registrar_resposta_no_desempenho
 from .models import (
     # Modelos Principais
-    GamificationSettings, ProfileGamificacao, ProfileStreak, MetaDiariaUsuario,
+    GamificationSettings, ProfileGamificacao, ProfileStreak, MetaDiariaUsuario, MetaDiariaMensal, LancamentoGamificacao,
     # Modelos de Recompensa
     Avatar, Borda, Banner, RecompensaPendente,
     AvatarUsuario, BordaUsuario, BannerUsuario, RecompensaUsuario,
@@ -29,7 +39,9 @@ from .models import (
     VariavelDoJogo, Condicao,
     # Modelos de Campanhas e Rankings
     Campanha, CampanhaUsuarioCompletion,
-    RankingSemanal, RankingMensal, TarefaAgendadaLog
+    RankingSemanal, RankingMensal, TarefaAgendadaLog, PlacarGeral, PlacarEscopo, CooldownAtivo,
+    # Catálogo da loja
+    ItemCatalogo
 )
 
 
@@ -37,40 +49,220 @@ def calcular_xp_para_nivel(level):
     """Calcula o total de XP necessário para atingir um determinado nível."""
     return 50 * (level ** 2) + 50 * level
 
+def calcular_nivel_por_xp(xp):
+    """
+    Nível correspondente a um total de XP, em forma fechada (inversa de
+    `calcular_xp_para_nivel`): o jogador está no nível k + 1, onde k é o maior
+    inteiro com 50·k·(k + 1) <= xp.
+    """
+    k = (isqrt(4 * (max(xp, 0) // 50) + 1) - 1) // 2
+    return k + 1
+
+# =======================================================================
+# LIMITADOR DE RESPOSTAS (ANTI-BOT)
+# =======================================================================
+# Janela deslizante por usuário com os instantes das últimas respostas aceitas
+# pelo limitador, guardada no cache (compartilhado em produção). Cada processo
+# guarda também uma cópia em memória, usada quando o cache falha ou não tem a
+# chave (fora do ar, despejada, ou um backend que não guarda nada). A cópia é
+# um LRU limitado a TAMANHO_MAXIMO_JANELAS_LOCAIS usuários, então não cresce
+# sem limite enquanto o cache estiver fora. Verifica o intervalo mínimo entre respostas e o limite de rajada por minuto
+# sem nenhuma consulta ao banco. Leitura e escrita não são atômicas: em corrida,
+# uma resposta a mais pode passar, o que é aceitável para um filtro anti-bot.
+CHAVE_CACHE_LIMITADOR = 'gamificacao:limitador:{}'
+JANELA_LIMITADOR_SEGUNDOS = 60
+TAMANHO_MAXIMO_JANELAS_LOCAIS = 10000
+_janelas_locais = OrderedDict()
+_trava_janelas_locais = threading.Lock()
+
+def _ler_janela(chave):
+    try:
+        instantes = cache.get(chave)
+    except Exception:
+        instantes = None
+    if instantes is None:
+        with _trava_janelas_locais:
+            instantes = _janelas_locais.get(chave)
+    return instantes
+
+def _gravar_janela(chave, instantes):
+    with _trava_janelas_locais:
+        _janelas_locais[chave] = instantes
+        _janelas_locais.move_to_end(chave)
+        while len(_janelas_locais) > TAMANHO_MAXIMO_JANELAS_LOCAIS:
+            _janelas_locais.popitem(last=False)
+    try:
+        cache.set(chave, instantes, JANELA_LIMITADOR_SEGUNDOS)
+    except Exception:
+        pass
+
+def verificar_limite_respostas(user_id, settings, agora=None):
+    """
+    Retorna o motivo do bloqueio ('RESPOSTA_RAPIDA' ou 'LIMITE_RESPOSTAS') ou
+    None. Respostas bloqueadas não entram na janela, então quem espera o
+    intervalo mínimo volta a ser aceito.
+    """
+    intervalo_minimo = settings.tempo_minimo_entre_respostas_segundos
+    limite_por_minuto = settings.limite_respostas_por_minuto
+    if not intervalo_minimo and not limite_por_minuto:
+        return None
+
+    agora = agora if agora is not None else time.time()
+    chave = CHAVE_CACHE_LIMITADOR.format(user_id)
+    instantes = [t for t in (_ler_janela(chave) or []) if t > agora - JANELA_LIMITADOR_SEGUNDOS]
+
+    if instantes and agora - instantes[-1] < intervalo_minimo:
+        return 'RESPOSTA_RAPIDA'
+    if limite_por_minuto and len(instantes) >= limite_por_minuto:
+        return 'LIMITE_RESPOSTAS'
+
+    instantes.append(agora)
+    _gravar_janela(chave, instantes)
+    return None
+
+# =======================================================================
+# COOLDOWNS ANTI-FARMING
+# =======================================================================
+# Cada cooldown é uma linha (usuário, tipo, alvo) -> expira_em em CooldownAtivo,
+# a fonte da verdade. Só os cooldowns ativos são espelhados no cache, até
+# expirarem; a ausência de cooldown nunca é guardada, então um cooldown gravado
+# por outro processo vale imediatamente.
+CHAVE_CACHE_COOLDOWN = 'gamificacao:cooldown:{}:{}:{}'
+
+def consultar_cooldowns(user_profile_id, alvos):
+    """
+    Recebe [(tipo, alvo_id)] e retorna o conjunto dos pares ainda em cooldown.
+    Os pares ausentes do cache são resolvidos em uma única consulta; os que
+    estiverem em cooldown entram no cache pelo tempo que ainda falta.
+    """
+    agora = time.time()
+    chaves = {CHAVE_CACHE_COOLDOWN.format(user_profile_id, tipo, alvo_id): (tipo, alvo_id) for tipo, alvo_id in alvos}
+    expiracoes = cache.get_many(chaves.keys())
+
+    faltantes = [par for chave, par in chaves.items() if chave not in expiracoes]
+    if faltantes:
+        filtro = Q()
+        for tipo, alvo_id in faltantes:
+            filtro |= Q(tipo=tipo, alvo_id=alvo_id)
+        do_banco = {
+            (tipo, alvo_id): expira_em.timestamp()
+            for tipo, alvo_id, expira_em in CooldownAtivo.objects.filter(filtro, user_profile_id=user_profile_id).values_list('tipo', 'alvo_id', 'expira_em')
+        }
+        for par, expira in do_banco.items():
+            if expira > agora:
+                chave = CHAVE_CACHE_COOLDOWN.format(user_profile_id, *par)
+                expiracoes[chave] = expira
+                cache.set(chave, expira, max(int(expira - agora), 1))
+
+    return {chaves[chave] for chave, expira in expiracoes.items() if expira > agora}
+
+def em_cooldown(user_profile_id, tipo, alvo_id):
+    return bool(consultar_cooldowns(user_profile_id, [(tipo, alvo_id)]))
+
+def iniciar_cooldown(user_profile_id, tipo, alvo_id, duracao):
+    """ Grava (ou renova) um cooldown com um único upsert e atualiza o cache. """
+    if not duracao or duracao <= timedelta(0):
+        return
+    expira_em = timezone.now() + duracao
+    CooldownAtivo.objects.bulk_create(
+        [CooldownAtivo(user_profile_id=user_profile_id, tipo=tipo, alvo_id=alvo_id, expira_em=expira_em)],
+        update_conflicts=True, unique_fields=['user_profile', 'tipo', 'alvo_id'], update_fields=['expira_em']
+    )
+    transaction.on_commit(lambda: cache.set(
+        CHAVE_CACHE_COOLDOWN.format(user_profile_id, tipo, alvo_id), expira_em.timestamp(), max(int(duracao.total_seconds()), 1)
+    ))
+
+def purgar_cooldowns_expirados():
+    removidos, _ = CooldownAtivo.objects.filter(expira_em__lte=timezone.now()).delete()
+    return removidos
+
+# =======================================================================
+# EXTRATO DE XP E MOEDAS (LEDGER)
+# =======================================================================
+def registrar_lancamento(user_profile, motivo, delta_xp=0, delta_moedas=0, referencia=''):
+    """
+    Registra um lançamento no extrato e aplica o delta ao saldo com um
+    UPDATE atômico (F()), de modo que respostas paralelas não se sobrescrevem.
+    """
+    if not delta_xp and not delta_moedas:
+        return None
+    with transaction.atomic():
+        lancamento = LancamentoGamificacao.objects.create(
+            user_profile=user_profile, motivo=motivo, delta_xp=delta_xp,
+            delta_moedas=delta_moedas, referencia=referencia
+        )
+        ProfileGamificacao.objects.filter(user_profile=user_profile).update(
+            xp=F('xp') + delta_xp, moedas=F('moedas') + delta_moedas
+        )
+    invalidar_cartao_perfil(user_profile.id)
+    return lancamento
+
+def debitar_moedas(user_profile, valor, motivo, referencia=''):
+    """
+    Debita moedas apenas se houver saldo suficiente, numa única instrução
+    condicional. Retorna False (sem lançamento) quando o saldo não cobre o valor.
+    """
+    with transaction.atomic():
+        debitado = ProfileGamificacao.objects.filter(user_profile=user_profile, moedas__gte=valor).update(moedas=F('moedas') - valor)
+        if not debitado:
+            return False
+        LancamentoGamificacao.objects.create(user_profile=user_profile, motivo=motivo, delta_moedas=-valor, referencia=referencia)
+    return True
+
+def _atualizar_nivel(user_profile):
+    """
+    Recalcula o nível a partir do XP persistido. O UPDATE só avança o nível
+    (level__lt), então chamadas concorrentes nunca o fazem regredir.
+    Retorna {"novo_level": n} quando houve subida de nível.
+    """
+    xp, level = ProfileGamificacao.objects.filter(user_profile=user_profile).values_list('xp', 'level').get()
+    novo_level = calcular_nivel_por_xp(xp)
+    if novo_level > level and ProfileGamificacao.objects.filter(user_profile=user_profile, level__lt=novo_level).update(level=novo_level):
+        reconciliar_desbloqueios_por_nivel(user_profile_ids=[user_profile.id])
+        invalidar_cartao_perfil(user_profile.id)
+        return {"novo_level": novo_level}
+    return None
+
 def processar_resposta_gamificacao(user, questao, alternativa_selecionada):
     """
     Motor de regras de gamificação, agora com feedback claro sobre bloqueios de XP e retorno de recompensas detalhadas.
     """
     settings = GamificationSettings.load()
-    user_profile, _ = UserProfile.objects.get_or_create(user=user)
-    gamificacao_data, _ = ProfileGamificacao.objects.get_or_create(user_profile=user_profile)
-    hoje = date.today()
-    meta_hoje, _ = MetaDiariaUsuario.objects.get_or_create(user_profile=user_profile, data=hoje)
-
     correta = (alternativa_selecionada == questao.gabarito)
-    
+
     bloqueio_retorno = {
         "xp_ganho": 0, "moedas_ganhas": 0, "bonus_ativo": False, 
         "level_up_info": None, "nova_conquista": None, "meta_completa_info": None, 
         "correta": correta, "gabarito": questao.gabarito, "novas_recompensas": [],
-        "novo_saldo_moedas": gamificacao_data.moedas
     }
 
-    try:
-        ultima_resposta_geral = RespostaUsuario.objects.filter(usuario=user).latest('data_resposta')
-        min_tempo = timedelta(seconds=settings.tempo_minimo_entre_respostas_segundos)
-        if timezone.now() - ultima_resposta_geral.data_resposta < min_tempo:
-            bloqueio_retorno['motivo_bloqueio'] = 'RESPOSTA_RAPIDA'
-            return bloqueio_retorno
-    except RespostaUsuario.DoesNotExist:
-        pass
+    # O limitador roda antes de qualquer acesso ao banco.
+    motivo_limite = verificar_limite_respostas(user.id, settings)
+    if motivo_limite:
+        bloqueio_retorno['motivo_bloqueio'] = motivo_limite
+        return bloqueio_retorno
+
+    return _registrar_resposta_gamificacao(user, questao, alternativa_selecionada, correta, settings, bloqueio_retorno)
+
+@transaction.atomic
+def _registrar_resposta_gamificacao(user, questao, alternativa_selecionada, correta, settings, bloqueio_retorno):
+    """
+    Tudo o que a resposta grava roda em uma única transação: resposta, evento,
+    desempenho, placares e extrato entram juntos ou nenhum deles. Os caches
+    só são invalidados após o COMMIT (transaction.on_commit).
+    """
+    user_profile, _ = UserProfile.objects.get_or_create(user=user)
+    gamificacao_data, _ = ProfileGamificacao.objects.get_or_create(user_profile=user_profile)
+    hoje = hoje_local()
+    meta_hoje, _ = MetaDiariaUsuario.objects.get_or_create(user_profile=user_profile, data=hoje)
+    bloqueio_retorno['novo_saldo_moedas'] = gamificacao_data.moedas
+
+    if em_cooldown(user_profile.id, CooldownAtivo.Tipo.QUESTAO, questao.id):
+        bloqueio_retorno['motivo_bloqueio'] = 'COOLDOWN_QUESTAO'
+        return bloqueio_retorno
 
+    # A resposta anterior define o XP (primeira vez, redenção) e o ajuste do placar.
     resposta_anterior = RespostaUsuario.objects.filter(usuario=user, questao=questao).first()
-    if resposta_anterior:
-        cooldown = timedelta(hours=settings.cooldown_mesma_questao_horas)
-        if timezone.now() - resposta_anterior.data_resposta < cooldown:
-            bloqueio_retorno['motivo_bloqueio'] = 'COOLDOWN_QUESTAO'
-            return bloqueio_retorno
 
     if settings.habilitar_teto_xp_diario and meta_hoje.xp_ganho_dia >= settings.teto_xp_diario:
         bloqueio_retorno['motivo_bloqueio'] = 'TETO_XP_DIARIO'
@@ -80,6 +272,19 @@ def processar_resposta_gamificacao(user, questao, alternativa_selecionada):
         usuario=user, questao=questao,
         defaults={'alternativa_selecionada': alternativa_selecionada, 'foi_correta': correta}
     )
+    registrar_evento_resposta(user.id, questao, alternativa_selecionada, correta)
+    registrar_resposta_no_desempenho(user.id, questao, correta, resposta_anterior)
+    invalidar_cache_progresso(user_profile.id)
+    invalidar_cartao_perfil(user_profile.id)
+    iniciar_cooldown(user_profile.id, CooldownAtivo.Tipo.QUESTAO, questao.id, timedelta(hours=settings.cooldown_mesma_questao_horas))
+
+    # Mantém o placar do Ranking Geral: a resposta é única por questão, então
+    # uma nova resposta só altera o total de acertos se o resultado mudou.
+    if resposta_anterior:
+        atualizar_placar_geral(user_profile, 0, int(correta) - int(resposta_anterior.foi_correta))
+    else:
+        atualizar_placar_geral(user_profile, 1, int(correta))
+    atualizar_placares_escopo(user_profile, questao, correta)
     
     xp_base = 0
     if correta:
@@ -105,16 +310,20 @@ def processar_resposta_gamificacao(user, questao, alternativa_selecionada):
     
     moedas_ganhas = settings.moedas_por_acerto if correta else 0
 
-    gamificacao_data.xp += xp_ganho
-    gamificacao_data.moedas += moedas_ganhas
+    # Estado da sequência de acertos: apenas estes campos são gravados pelo
+    # objeto; XP, moedas e nível são alterados exclusivamente via extrato.
+    gamificacao_data.save(update_fields=['acertos_consecutivos', 'bonus_xp_ativo'])
+    registrar_lancamento(user_profile, LancamentoGamificacao.Motivo.RESPOSTA, xp_ganho, moedas_ganhas, f"questao:{questao.id}")
     
     if meta_hoje.questoes_resolvidas == 0:
         _avaliar_e_conceder_recompensas(user_profile, Campanha.Gatilho.PRIMEIRA_ACAO_DO_DIA, contexto={})
     
     meta_completa_info = _processar_meta_diaria(user_profile, gamificacao_data, meta_hoje, xp_ganho, settings)
-    level_up_info = _verificar_level_up(gamificacao_data)
+    level_up_info = _atualizar_nivel(user_profile)
     
     nova_conquista = _avaliar_e_conceder_conquistas(user_profile)
+    if nova_conquista:
+        level_up_info = _atualizar_nivel(user_profile) or level_up_info
     
     novas_recompensas_serializadas = []
     if nova_conquista and nova_conquista.recompensas:
@@ -129,10 +338,7 @@ def processar_resposta_gamificacao(user, questao, alternativa_selecionada):
                 'raridade': r.get_raridade_display(), 'tipo': r.__class__.__name__
             })
 
-    if level_up_info or nova_conquista:
-        _verificar_desbloqueio_recompensas(user_profile, conquista_ganha=nova_conquista)
-
-    gamificacao_data.save()
+    gamificacao_data.refresh_from_db(fields=['xp', 'moedas', 'level'])
     
     return {
         "xp_ganho": xp_ganho, "moedas_ganhas": moedas_ganhas, "bonus_ativo": bonus_aplicado,
@@ -143,30 +349,43 @@ def processar_resposta_gamificacao(user, questao, alternativa_selecionada):
     }
     
 def _processar_meta_diaria(user_profile, gamificacao_data, meta_hoje, xp_atual, settings):
-    meta_hoje.xp_ganho_dia += xp_atual
-    meta_hoje.questoes_resolvidas += 1
+    # O progresso do dia é gravado apenas com incrementos (UPDATE ... SET x = x + n);
+    # a meta é marcada como atingida por um UPDATE condicional, de modo que
+    # respostas concorrentes não pagam o bônus duas vezes.
+    MetaDiariaUsuario.objects.filter(pk=meta_hoje.pk).update(
+        xp_ganho_dia=F('xp_ganho_dia') + xp_atual, questoes_resolvidas=F('questoes_resolvidas') + 1
+    )
     meta_completa_info = None
 
-    if not meta_hoje.meta_atingida and meta_hoje.questoes_resolvidas >= settings.meta_diaria_questoes:
-        meta_hoje.meta_atingida = True
-        gamificacao_data.xp += settings.xp_bonus_meta_diaria
-        gamificacao_data.moedas += settings.moedas_por_meta_diaria
+    meta_atingida_agora = MetaDiariaUsuario.objects.filter(
+        pk=meta_hoje.pk, meta_atingida=False, questoes_resolvidas__gte=settings.meta_diaria_questoes
+    ).update(meta_atingida=True)
+    if meta_atingida_agora:
+        registrar_lancamento(
+            user_profile, LancamentoGamificacao.Motivo.META_DIARIA,
+            settings.xp_bonus_meta_diaria, settings.moedas_por_meta_diaria, f"meta:{meta_hoje.data.isoformat()}"
+        )
         meta_completa_info = {"xp_bonus": settings.xp_bonus_meta_diaria, "moedas_bonus": settings.moedas_por_meta_diaria}
 
         # LÓGICA DO GATILHO "META DIÁRIA CONCLUÍDA" E "PRIMEIRO DO DIA"
         # 1. Dispara campanhas para TODOS que concluem a meta
         _avaliar_e_conceder_recompensas(user_profile, Campanha.Gatilho.META_DIARIA_CONCLUIDA, {})
 
-        # 2. Tenta registrar o usuário como o primeiro do dia
+        # 2. Tenta registrar o usuário como o primeiro do dia. O INSERT roda em
+        # um savepoint próprio: se outro usuário já ganhou, só ele é desfeito e
+        # a transação de quem chamou (resposta, benchmark) continua utilizável.
         try:
-            ConquistaDiariaGlobalLog.objects.create(
-                user=user_profile.user, data=date.today(), tipo='META_DIARIA'
-            )
+            with transaction.atomic():
+                ConquistaDiariaGlobalLog.objects.create(
+                    user=user_profile.user, data=meta_hoje.data, tipo='META_DIARIA'
+                )
             # Se conseguiu criar, ele é o primeiro! Concede o bônus especial.
             bonus_xp_primeiro = 200  # Pode vir de GamificationSettings no futuro
             bonus_moedas_primeiro = 100
-            gamificacao_data.xp += bonus_xp_primeiro
-            gamificacao_data.moedas += bonus_moedas_primeiro
+            registrar_lancamento(
+                user_profile, LancamentoGamificacao.Motivo.PRIMEIRO_DO_DIA,
+                bonus_xp_primeiro, bonus_moedas_primeiro, f"meta:{meta_hoje.data.isoformat()}"
+            )
             
             # Adiciona info ao retorno para o frontend (para exibir um toast especial)
             meta_completa_info['primeiro_do_dia'] = True
@@ -176,50 +395,44 @@ def _processar_meta_diaria(user_profile, gamificacao_data, meta_hoje, xp_atual,
             # Alguém já ganhou hoje. Não faz nada.
             pass
 
-    meta_hoje.save()
     return meta_completa_info
 
-def _verificar_level_up(gamificacao_data):
-    novo_level_info = None
-    xp_necessario = calcular_xp_para_nivel(gamificacao_data.level)
-    while gamificacao_data.xp >= xp_necessario:
-        gamificacao_data.level += 1
-        novo_level_info = {"novo_level": gamificacao_data.level}
-        xp_necessario = calcular_xp_para_nivel(gamificacao_data.level)
-    return novo_level_info
-
-# gamificacao/services.py
+# =======================================================================
+# DESBLOQUEIO DE RECOMPENSAS POR NÍVEL (ORIENTADO A EVENTOS)
+# =======================================================================
+# A reconciliação roda apenas quando o nível de um usuário muda (_atualizar_nivel,
+# criação do ProfileGamificacao) ou quando uma recompensa muda (signals); as
+# páginas de coleção e a caixa de recompensas só leem o resultado.
 
-def _verificar_desbloqueio_recompensas(user_profile, conquista_ganha=None):
-    def criar_recompensa_pendente(recompensa, origem):
-        RecompensaPendente.objects.get_or_create(user_profile=user_profile, content_type=ContentType.objects.get_for_model(recompensa), object_id=recompensa.id, defaults={'origem_desbloqueio': origem})
+def _recompensas_desbloqueaveis_por_nivel(Model):
+    # Itens que também estão na loja são liberados para compra, não concedidos.
+    return Model.objects.filter(tipos_desbloqueio__nome='NIVEL', nivel_necessario__isnull=False).exclude(tipos_desbloqueio__nome='LOJA')
 
-    nivel_atual = user_profile.gamificacao_data.level
-    
-    # =======================================================================
-    # INÍCIO DA ALTERAÇÃO: Lógica de desbloqueio direto por NÍVEL
-    # Agora, a função exclui itens que também estão marcados para a loja,
-    # pois esses serão desbloqueados para compra, e não concedidos diretamente.
-    # =======================================================================
-    recompensas_por_nivel = list(chain(
-        Avatar.objects.filter(tipos_desbloqueio__nome='NIVEL', nivel_necessario__lte=nivel_atual).exclude(tipos_desbloqueio__nome='LOJA'),
-        Borda.objects.filter(tipos_desbloqueio__nome='NIVEL', nivel_necessario__lte=nivel_atual).exclude(tipos_desbloqueio__nome='LOJA'),
-        Banner.objects.filter(tipos_desbloqueio__nome='NIVEL', nivel_necessario__lte=nivel_atual).exclude(tipos_desbloqueio__nome='LOJA')
-    ))
-    for recompensa in recompensas_por_nivel:
-        criar_recompensa_pendente(recompensa, f"Alcançou o Nível {recompensa.nivel_necessario}")
-    # =======================================================================
-    # FIM DA ALTERAÇÃO
-    # =======================================================================
-
-    # =======================================================================
-    # REMOÇÃO: A lógica de desbloqueio por conquista foi removida daqui.
-    # Agora, ela é tratada diretamente na função `_avaliar_e_conceder_conquistas`,
-    # que lê o JSONField da conquista e concede as recompensas.
-    # =======================================================================
-    if conquista_ganha:
-        # A lógica antiga que buscava `conquista_necessaria` foi removida.
-        pass
+def reconciliar_desbloqueios_por_nivel(user_profile_ids=None, recompensa=None):
+    """
+    Cria, num único bulk_create(ignore_conflicts=True), as RecompensaPendente
+    que faltam para os itens desbloqueados por nível. Pode ser restrita a
+    alguns usuários (subida de nível) ou a uma recompensa (mudança no catálogo).
+    Retorna o número de recompensas pendentes criadas.
+    """
+    perfis = ProfileGamificacao.objects.all()
+    if user_profile_ids is not None:
+        perfis = perfis.filter(user_profile_id__in=user_profile_ids)
+
+    pendentes = []
+    for Model in ([recompensa.__class__] if recompensa else [Avatar, Borda, Banner]):
+        itens = _recompensas_desbloqueaveis_por_nivel(Model)
+        if recompensa:
+            itens = itens.filter(pk=recompensa.pk)
+        content_type = ContentType.objects.get_for_model(Model)
+        for item_id, nivel in itens.values_list('id', 'nivel_necessario').distinct():
+            ja_concedidos = RecompensaPendente.objects.filter(content_type=content_type, object_id=item_id).values('user_profile_id')
+            faltantes = perfis.filter(level__gte=nivel).exclude(user_profile_id__in=ja_concedidos).values_list('user_profile_id', flat=True)
+            pendentes.extend(
+                RecompensaPendente(user_profile_id=perfil_id, content_type=content_type, object_id=item_id, origem_desbloqueio=f"Alcançou o Nível {nivel}")
+                for perfil_id in faltantes
+            )
+    return len(RecompensaPendente.objects.bulk_create(pendentes, batch_size=5000, ignore_conflicts=True))
 
 # =======================================================================
 # LÓGICA DE AVALIAÇÃO DE CONQUISTAS (TOTALMENTE REESCRITA E DINÂMICA)
@@ -257,26 +470,20 @@ def _avaliar_e_conceder_conquistas(user_profile):
         
         if todas_condicoes_satisfeitas:
             ConquistaUsuario.objects.create(user_profile=user_profile, conquista=conquista)
+            invalidar_cartao_perfil(user_profile.id)
             
             recompensas = conquista.recompensas
             if recompensas:
-                gamificacao_data = user_profile.gamificacao_data
-                gamificacao_data.xp += recompensas.get('xp', 0)
-                gamificacao_data.moedas += recompensas.get('moedas', 0)
-                gamificacao_data.save()
+                registrar_lancamento(
+                    user_profile, LancamentoGamificacao.Motivo.CONQUISTA,
+                    recompensas.get('xp', 0), recompensas.get('moedas', 0), f"conquista:{conquista.id}"
+                )
                 
-                for tipo, Model in [('avatares', Avatar), ('bordas', Borda), ('banners', Banner)]:
-                    for recompensa_id in recompensas.get(tipo, []):
-                        try:
-                            item = Model.objects.get(id=recompensa_id)
-                            RecompensaPendente.objects.get_or_create(
-                                user_profile=user_profile,
-                                content_type=ContentType.objects.get_for_model(item),
-                                object_id=item.id,
-                                defaults={'origem_desbloqueio': f"Prêmio da conquista '{conquista.nome}'"}
-                            )
-                        except Model.DoesNotExist:
-                            continue
+                itens = list(chain.from_iterable(
+                    Model.objects.filter(id__in=recompensas.get(tipo, [])) for tipo, Model in [('avatares', Avatar), ('bordas', Borda), ('banners', Banner)]
+                ))
+                if itens:
+                    conceder_recompensas_em_lote([user_profile.id], itens, f"Prêmio da conquista '{conquista.nome}'")
             
             # ===================================================================
             # INÍCIO DA ADIÇÃO: Dispara o novo gatilho de Campanha
@@ -302,7 +509,7 @@ def _obter_valor_variavel(user_profile, chave_variavel, contexto):
     user = user_profile.user
     
     if chave_variavel == 'level': return user_profile.gamificacao_data.level
-    if chave_variavel == 'current_streak': user_profile.streak_data.update_streak(); return user_profile.streak_data.current_streak
+    if chave_variavel == 'current_streak': return streak_vigente(user_profile.streak_data)
     if chave_variavel == 'max_streak': return user_profile.streak_data.max_streak
     
     # =======================================================================
@@ -316,7 +523,7 @@ def _obter_valor_variavel(user_profile, chave_variavel, contexto):
     if chave_variavel == 'dias_desde_ultima_pratica':
         last_date = user_profile.streak_data.last_practice_date
         if not last_date: return 999
-        return (date.today() - last_date).days
+        return (hoje_local() - last_date).days
     if chave_variavel == 'dias_desde_cadastro': return (timezone.now().date() - user.date_joined.date()).days
     if chave_variavel == 'acertos_consecutivos_atuais': return user_profile.gamificacao_data.acertos_consecutivos
     if chave_variavel == 'disciplinas_unicas_estudadas': return RespostaUsuario.objects.filter(usuario=user).values('questao__disciplina').distinct().count()
@@ -363,139 +570,1137 @@ def _obter_valor_variavel(user_profile, chave_variavel, contexto):
         total_acertos = qs.filter(foi_correta=True).count()
         return (total_acertos / total_respostas) * 100
     if chave_variavel == 'acertos_na_semana_atual':
-        hoje = date.today()
-        inicio_da_semana = hoje - timedelta(days=hoje.weekday())
-        return qs.filter(foi_correta=True, data_resposta__date__gte=inicio_da_semana).count()
+        return qs.filter(foi_correta=True, **filtro_periodo('data_resposta', inicio_do_periodo('semana'))).count()
     if chave_variavel == 'acertos_no_mes_atual':
-        hoje = date.today()
-        inicio_do_mes = hoje.replace(day=1)
-        return qs.filter(foi_correta=True, data_resposta__date__gte=inicio_do_mes).count()
+        return qs.filter(foi_correta=True, **filtro_periodo('data_resposta', inicio_do_periodo('mes'))).count()
     
     return 0
 
 # =======================================================================
-# LÓGICA DE RANKING E CAMPANHAS (sem alterações)
+# AVALIAÇÃO DE REGRAS EM LOTE (PRÉVIA E BACKFILL)
 # =======================================================================
-def verificar_e_gerar_rankings():
-    _verificar_e_gerar_ranking_semanal()
-    _verificar_e_gerar_ranking_mensal()
+# Versão set-based do motor de regras: cada (variável, contexto) é calculada
+# para a população inteira com uma consulta agrupada, e as condições viram
+# filtros sobre conjuntos de ids de UserProfile. Usada para a prévia de
+# elegíveis na gestão e para conceder conquistas/campanhas novas aos usuários
+# existentes (comando `aplicar_regras_em_lote`).
+OPERADORES_CONDICAO = {'>=': operator.ge, '<=': operator.le, '==': operator.eq, '!=': operator.ne}
 
-# gamificacao/services.py
-def _verificar_e_gerar_ranking_semanal():
-    hoje = timezone.now()
-    log_semanal, _ = TarefaAgendadaLog.objects.get_or_create(nome_tarefa='gerar_ranking_semanal', defaults={'ultima_execucao': hoje - timedelta(days=8)})
-    
-    # REMOÇÃO DA VALIDAÇÃO DE TEMPO: A verificação de existência no método
-    # _processar_e_salvar_ranking é suficiente e mais flexível para desenvolvimento.
-    # if (hoje - log_semanal.ultima_execucao).days < 7: return
-    
-    semana_passada_data = hoje.date() - timedelta(days=7)
+# Valor assumido para perfis sem nenhuma linha na consulta agrupada.
+VALOR_PADRAO_VARIAVEL = {'dias_desde_ultima_pratica': 999}
+
+# Condições de grupo que dependem do evento (posição no ranking, nota do
+# simulado) e, portanto, não podem ser avaliadas fora dele.
+CONDICOES_DE_EVENTO = ('condicao_posicao_exata', 'condicao_posicao_ate', 'condicao_min_acertos_percent')
+
+def _populacao_regras():
+    return UserProfile.objects.filter(user__is_active=True)
+
+def _agrupar_por_perfil(queryset, campo_perfil, **agregacao):
+    (apelido, expressao), = agregacao.items()
+    return dict(queryset.values(campo_perfil).annotate(**{apelido: expressao}).values_list(campo_perfil, apelido))
+
+def _valores_variavel_populacao(chave_variavel, contexto, perfis):
+    """
+    Calcula a variável para todos os perfis do queryset `perfis` com uma única
+    consulta agrupada. Retorna {user_profile_id: valor}; perfis ausentes valem
+    VALOR_PADRAO_VARIAVEL (ou 0), como no cálculo individual.
+    O streak atual é lido sem o efeito colateral de `update_streak`: vale
+    zero quando a última prática foi antes de ontem.
+    """
+    contexto = contexto or {}
+    hoje = hoje_local()
+
+    if chave_variavel in ('level', 'acertos_consecutivos_atuais'):
+        campo = 'level' if chave_variavel == 'level' else 'acertos_consecutivos'
+        return dict(ProfileGamificacao.objects.filter(user_profile__in=perfis).values_list('user_profile_id', campo))
+    if chave_variavel == 'max_streak':
+        return dict(ProfileStreak.objects.filter(user_profile__in=perfis).values_list('user_profile_id', 'max_streak'))
+    if chave_variavel == 'current_streak':
+        return dict(ProfileStreak.objects.filter(
+            user_profile__in=perfis, last_practice_date__gte=hoje - timedelta(days=1)
+        ).values_list('user_profile_id', 'current_streak'))
+    if chave_variavel == 'dias_desde_ultima_pratica':
+        return {
+            perfil_id: (hoje - ultima).days
+            for perfil_id, ultima in ProfileStreak.objects.filter(user_profile__in=perfis, last_practice_date__isnull=False).values_list('user_profile_id', 'last_practice_date')
+        }
+    if chave_variavel == 'dias_desde_cadastro':
+        return {perfil_id: (timezone.now().date() - cadastro.date()).days for perfil_id, cadastro in perfis.values_list('id', 'user__date_joined')}
+
+    if chave_variavel in ('simulados_concluidos', 'simulados_concluidos_por_dificuldade'):
+        sessoes = SessaoSimulado.objects.filter(usuario__userprofile__in=perfis, finalizado=True)
+        if chave_variavel == 'simulados_concluidos_por_dificuldade' and contexto.get('dificuldade'):
+            sessoes = sessoes.filter(simulado__dificuldade=contexto['dificuldade'])
+        return _agrupar_por_perfil(sessoes, 'usuario__userprofile', valor=Count('simulado', distinct=True))
+    if chave_variavel == 'melhor_percentual_acerto_em_simulado':
+        sessoes = SessaoSimulado.objects.filter(usuario__userprofile__in=perfis, finalizado=True).annotate(
+            acertos=Count('respostas', filter=Q(respostas__foi_correta=True), distinct=True),
+            total=Count('simulado__questoes', distinct=True),
+        ).values_list('usuario__userprofile', 'acertos', 'total')
+        melhores = {}
+        for perfil_id, acertos, total in sessoes:
+            if total:
+                melhores[perfil_id] = max(melhores.get(perfil_id, 0), (acertos / total) * 100)
+        return melhores
+    if chave_variavel == 'simulados_pessoais_criados':
+        return _agrupar_por_perfil(Simulado.objects.filter(criado_por__userprofile__in=perfis, is_oficial=False), 'criado_por__userprofile', valor=Count('id'))
+    if chave_variavel == 'comentarios_criados':
+        return _agrupar_por_perfil(Comentario.objects.filter(usuario__userprofile__in=perfis, parent__isnull=True), 'usuario__userprofile', valor=Count('id'))
+
+    respostas = RespostaUsuario.objects.filter(usuario__userprofile__in=perfis)
+    if chave_variavel == 'disciplinas_unicas_estudadas':
+        return _agrupar_por_perfil(respostas, 'usuario__userprofile', valor=Count('questao__disciplina', distinct=True))
+    if chave_variavel == 'bancas_unicas_estudadas':
+        return _agrupar_por_perfil(respostas, 'usuario__userprofile', valor=Count('questao__banca', distinct=True))
+
+    if chave_variavel in VARIAVEIS_DE_RESPOSTAS:
+        filtro = _filtro_contexto_respostas(contexto)
+        if chave_variavel == 'acertos_na_semana_atual':
+            filtro &= Q(**filtro_periodo('data_resposta', inicio_do_periodo('semana')))
+        elif chave_variavel == 'acertos_no_mes_atual':
+            filtro &= Q(**filtro_periodo('data_resposta', inicio_do_periodo('mes')))
+        totais = respostas.filter(filtro).values('usuario__userprofile').annotate(
+            respostas=Count('id'), acertos=Count('id', filter=Q(foi_correta=True))
+        ).values_list('usuario__userprofile', 'respostas', 'acertos')
+        if chave_variavel == 'total_respostas':
+            return {perfil_id: total for perfil_id, total, _ in totais}
+        if chave_variavel == 'percentual_acertos_geral':
+            return {perfil_id: (acertos / total) * 100 for perfil_id, total, acertos in totais if total}
+        return {perfil_id: acertos for perfil_id, _, acertos in totais}
+
+    return {}
+
+def _filtrar_por_condicoes(condicoes, perfis, candidatos):
+    """
+    Aplica as condições [(chave_variavel, contexto, operador, valor)] ao conjunto
+    de ids `candidatos`, calculando cada variável uma única vez para `perfis`.
+    """
+    for chave_variavel, contexto, operador_condicao, valor in condicoes:
+        if not candidatos:
+            break
+        comparar = OPERADORES_CONDICAO.get(operador_condicao)
+        if comparar is None:
+            return set()
+        valores = _valores_variavel_populacao(chave_variavel, contexto, perfis)
+        padrao = VALOR_PADRAO_VARIAVEL.get(chave_variavel, 0)
+        candidatos = {perfil_id for perfil_id in candidatos if comparar(valores.get(perfil_id, padrao), valor)}
+    return candidatos
+
+def perfis_elegiveis_conquista(conquista, perfis=None):
+    """ Ids dos perfis que ainda não têm a conquista e já cumprem pré-requisitos e condições. """
+    perfis = _populacao_regras() if perfis is None else perfis
+    candidatos = set(perfis.values_list('id', flat=True))
+    candidatos -= set(ConquistaUsuario.objects.filter(conquista=conquista, user_profile__in=perfis).values_list('user_profile_id', flat=True))
+    for pre_requisito in conquista.pre_requisitos.all():
+        candidatos &= set(ConquistaUsuario.objects.filter(conquista=pre_requisito, user_profile__in=perfis).values_list('user_profile_id', flat=True))
+
+    condicoes = list(conquista.condicoes.select_related('variavel'))
+    if any(condicao.variavel is None for condicao in condicoes):
+        return set()
+    return _filtrar_por_condicoes(
+        [(c.variavel.chave, c.contexto_json, c.operador, c.valor) for c in condicoes], perfis, candidatos
+    )
+
+def _condicoes_dinamicas_do_grupo(grupo, variaveis_map):
+    condicoes = []
+    for condicao in grupo.get('condicoes', []):
+        chave_variavel = variaveis_map.get(condicao.get('variavel_id'))
+        if not chave_variavel or 'valor' not in condicao or 'operador' not in condicao:
+            return None
+        condicoes.append((chave_variavel, condicao.get('contexto', {}), condicao['operador'], condicao['valor']))
+    return condicoes
+
+def perfis_elegiveis_campanha(campanha, perfis=None, agora=None):
+    """
+    Retorna [(indice_do_grupo, {ids})]: para cada grupo avaliável fora de um
+    evento, os perfis que o satisfazem e ainda não concluíram a campanha no
+    ciclo atual. Como no avaliador individual, cada perfil fica com o primeiro
+    grupo que satisfaz. Grupos com condições de evento (posição, nota) ou
+    campanhas de simulado específico não são avaliados.
+    """
+    perfis = _populacao_regras() if perfis is None else perfis
+    if campanha.simulado_especifico_id:
+        return []
+    agora = agora or timezone.now()
+    candidatos = set(perfis.values_list('id', flat=True))
+    if campanha.tipo_recorrencia != Campanha.TipoRecorrencia.UNICA:
+        candidatos -= set(CampanhaUsuarioCompletion.objects.filter(
+            campanha=campanha, ciclo_id=_ciclo_id_campanha(campanha, agora)
+        ).values_list('user_profile_id', flat=True))
+
+    variaveis_map = dict(VariavelDoJogo.objects.values_list('id', 'chave'))
+    resultado = []
+    for indice, grupo in enumerate(campanha.grupos_de_condicoes):
+        condicoes = _condicoes_dinamicas_do_grupo(grupo, variaveis_map)
+        if condicoes is None or any(grupo.get(campo) for campo in CONDICOES_DE_EVENTO):
+            continue
+        vencedores = _filtrar_por_condicoes(condicoes, perfis, candidatos)
+        resultado.append((indice, vencedores))
+        candidatos -= vencedores
+    return resultado
+
+def previa_conquista(conquista):
+    """ Contagens para a prévia na gestão: quantos usuários receberiam a conquista agora. """
+    populacao = _populacao_regras()
+    return {
+        'elegiveis': len(perfis_elegiveis_conquista(conquista, populacao)),
+        'ja_concedidos': ConquistaUsuario.objects.filter(conquista=conquista).count(),
+        'populacao': populacao.count(),
+    }
+
+def previa_campanha(campanha):
+    populacao = _populacao_regras()
+    avaliados = dict(perfis_elegiveis_campanha(campanha, populacao))
+    grupos = [
+        {
+            'nome': grupo.get('nome_grupo', f'Grupo #{indice + 1}'),
+            'avaliavel': indice in avaliados,
+            'elegiveis': len(avaliados.get(indice, ())),
+        }
+        for indice, grupo in enumerate(campanha.grupos_de_condicoes)
+    ]
+    return {'elegiveis': sum(g['elegiveis'] for g in grupos), 'grupos': grupos, 'populacao': populacao.count()}
+
+def _lotes_de_perfis(tamanho_lote, a_partir_de):
+    ultimo_id = a_partir_de
+    while True:
+        ids = list(_populacao_regras().filter(id__gt=ultimo_id).order_by('id').values_list('id', flat=True)[:tamanho_lote])
+        if not ids:
+            return
+        yield ids
+        ultimo_id = ids[-1]
+
+def _itens_das_recompensas(recompensas):
+    itens = []
+    for tipo_recompensa, Model in (('avatares', Avatar), ('bordas', Borda), ('banners', Banner)):
+        content_type = ContentType.objects.get_for_model(Model)
+        ids_validos = Model.objects.filter(id__in=recompensas.get(tipo_recompensa, [])).values_list('id', flat=True)
+        itens.extend((content_type, item_id) for item_id in ids_validos)
+    return itens
+
+def _creditar_em_lote(perfil_ids, motivo, delta_xp, delta_moedas, referencia):
+    """
+    Equivalente em lote de `registrar_lancamento` para um mesmo crédito a
+    vários perfis: um bulk_create no extrato, um UPDATE com F() e o ajuste de
+    nível dos que subiram.
+    """
+    if not perfil_ids or not (delta_xp or delta_moedas):
+        return
+    LancamentoGamificacao.objects.bulk_create([
+        LancamentoGamificacao(user_profile_id=perfil_id, delta_xp=delta_xp, delta_moedas=delta_moedas, motivo=motivo, referencia=referencia)
+        for perfil_id in perfil_ids
+    ], batch_size=5000)
+    ProfileGamificacao.objects.filter(user_profile_id__in=perfil_ids).update(xp=F('xp') + delta_xp, moedas=F('moedas') + delta_moedas)
+
+    subiram = []
+    for perfil_id, xp, level in ProfileGamificacao.objects.filter(user_profile_id__in=perfil_ids).values_list('user_profile_id', 'xp', 'level'):
+        novo_level = calcular_nivel_por_xp(xp)
+        if novo_level > level and ProfileGamificacao.objects.filter(user_profile_id=perfil_id, level__lt=novo_level).update(level=novo_level):
+            subiram.append(perfil_id)
+    if subiram:
+        reconciliar_desbloqueios_por_nivel(user_profile_ids=subiram)
+    invalidar_cartao_perfil(*perfil_ids)
+
+def aplicar_conquista_em_lote(conquista, tamanho_lote=1000, a_partir_de=0):
+    """
+    Concede a conquista a todos os usuários elegíveis, em lotes de perfis
+    ordenados por id. Cada lote é uma transação; o gerador devolve o último id
+    processado, que pode ser usado para retomar a execução (`a_partir_de`).
+    Reexecutar é seguro: quem já tem a conquista não é elegível.
+    Campanhas do gatilho CONQUISTA_DESBLOQUEADA não são disparadas pelo lote.
+    """
+    recompensas = conquista.recompensas or {}
+    itens = _itens_das_recompensas(recompensas)
+    origem = f"Prêmio da conquista '{conquista.nome}'"
+    for ids in _lotes_de_perfis(tamanho_lote, a_partir_de):
+        with transaction.atomic():
+            elegiveis = sorted(perfis_elegiveis_conquista(conquista, UserProfile.objects.filter(id__in=ids)))
+            ConquistaUsuario.objects.bulk_create(
+                [ConquistaUsuario(user_profile_id=perfil_id, conquista=conquista) for perfil_id in elegiveis],
+                batch_size=5000, ignore_conflicts=True
+            )
+            _creditar_em_lote(elegiveis, LancamentoGamificacao.Motivo.CONQUISTA, recompensas.get('xp', 0), recompensas.get('moedas', 0), f"conquista:{conquista.id}")
+            RecompensaPendente.objects.bulk_create([
+                RecompensaPendente(user_profile_id=perfil_id, content_type=content_type, object_id=item_id, origem_desbloqueio=origem)
+                for perfil_id in elegiveis for content_type, item_id in itens
+            ], batch_size=5000, ignore_conflicts=True)
+        cache.delete_many([CHAVE_CACHE_PROGRESSO.format(perfil_id) for perfil_id in elegiveis])
+        invalidar_cartao_perfil(*elegiveis)
+        yield {'ultimo_id': ids[-1], 'avaliados': len(ids), 'concedidos': len(elegiveis)}
+
+def aplicar_campanha_em_lote(campanha, tamanho_lote=1000, a_partir_de=0):
+    """
+    Concede as recompensas de uma campanha aos usuários que já satisfazem as
+    condições dinâmicas de algum grupo, em lotes retomáveis como em
+    `aplicar_conquista_em_lote`. O XP e as moedas extras do grupo entram no
+    extrato na mesma transação das recompensas. Registra a conclusão do ciclo atual para
+    campanhas recorrentes, de modo que o avaliador individual não pague de novo.
+    """
+    agora = timezone.now()
+    ciclo_id = _ciclo_id_campanha(campanha, agora)
+    origem = f"Prêmio da campanha '{campanha.nome}'"
+    itens_por_grupo = {indice: _itens_das_recompensas(grupo) for indice, grupo in enumerate(campanha.grupos_de_condicoes)}
+    for ids in _lotes_de_perfis(tamanho_lote, a_partir_de):
+        premiados = []
+        with transaction.atomic():
+            pendentes, conclusoes = [], []
+            for indice, vencedores in perfis_elegiveis_campanha(campanha, UserProfile.objects.filter(id__in=ids), agora):
+                grupo = campanha.grupos_de_condicoes[indice]
+                vencedores = sorted(vencedores)
+                premiados.extend(vencedores)
+                _creditar_em_lote(vencedores, LancamentoGamificacao.Motivo.CAMPANHA, grupo.get('xp_extra', 0), grupo.get('moedas_extras', 0), f"campanha:{campanha.id}")
+                for perfil_id in vencedores:
+                    pendentes.extend(
+                        RecompensaPendente(user_profile_id=perfil_id, content_type=content_type, object_id=item_id, origem_desbloqueio=origem)
+                        for content_type, item_id in itens_por_grupo[indice]
+                    )
+                    if campanha.tipo_recorrencia != Campanha.TipoRecorrencia.UNICA:
+                        conclusoes.append(CampanhaUsuarioCompletion(user_profile_id=perfil_id, campanha=campanha, ciclo_id=ciclo_id))
+            RecompensaPendente.objects.bulk_create(pendentes, batch_size=5000, ignore_conflicts=True)
+            CampanhaUsuarioCompletion.objects.bulk_create(conclusoes, batch_size=5000, ignore_conflicts=True)
+        cache.delete_many([CHAVE_CACHE_PROGRESSO.format(perfil_id) for perfil_id in premiados])
+        invalidar_cartao_perfil(*premiados)
+        yield {'ultimo_id': ids[-1], 'avaliados': len(ids), 'concedidos': len(premiados)}
+
+# =======================================================================
+# CONCESSÃO DE RECOMPENSAS EM LOTE (EVENTOS E PAGAMENTOS DE CAMPANHA)
+# =======================================================================
+# Envia uma lista de recompensas cosméticas para a caixa de recompensas de um
+# conjunto de usuários. As RecompensaPendente (e, opcionalmente, as conclusões
+# de campanha) são gravadas com bulk_create(ignore_conflicts=True) em lotes de
+# perfis; o que cada usuário já tinha pendente é apenas contado.
+PUBLICOS_CONCESSAO = {
+    'TODOS': 'Todos os usuários ativos',
+    'ATIVOS_SEMANA': 'Quem respondeu questões nesta semana',
+    'ATIVOS_MES': 'Quem respondeu questões neste mês',
+}
+TAMANHO_LOTE_CONCESSAO = 5000
+
+def perfis_do_publico(publico):
+    """ IDs (queryset) dos perfis não-staff de um dos PUBLICOS_CONCESSAO. """
+    perfis = _populacao_regras().filter(user__is_staff=False)
+    if publico == 'ATIVOS_SEMANA':
+        return perfis.filter(id__in=_perfis_com_respostas_desde(inicio_do_periodo('semana'))).values_list('id', flat=True)
+    if publico == 'ATIVOS_MES':
+        return perfis.filter(id__in=_perfis_com_respostas_desde(inicio_do_periodo('mes'))).values_list('id', flat=True)
+    return perfis.values_list('id', flat=True)
+
+def _perfis_com_respostas_desde(data_inicio):
+    return EventoResposta.objects.filter(**filtro_periodo('registrado_em', data_inicio)).values('usuario__userprofile')
+
+def conceder_recompensas_em_lote(user_profile_ids, recompensas, origem, campanha=None, tamanho_lote=TAMANHO_LOTE_CONCESSAO):
+    """
+    Concede `recompensas` (instâncias de Avatar/Borda/Banner) a todos os perfis
+    de `user_profile_ids`. Com `campanha`, registra também a conclusão do ciclo
+    atual (campanhas recorrentes), como o avaliador individual.
+    Retorna {'usuarios', 'recompensas_pendentes', 'ja_existentes', 'campanhas_concluidas'}.
+    """
+    content_types = ContentType.objects.get_for_models(*{recompensa.__class__ for recompensa in recompensas})
+    itens = {(content_types[recompensa.__class__].id, recompensa.id) for recompensa in recompensas}
+    registrar_conclusao = campanha is not None and campanha.tipo_recorrencia != Campanha.TipoRecorrencia.UNICA
+    ciclo_id = _ciclo_id_campanha(campanha, timezone.now()) if campanha is not None else None
+
+    ids = sorted(set(user_profile_ids))
+    resumo = {'usuarios': len(ids), 'recompensas_pendentes': 0, 'ja_existentes': 0, 'campanhas_concluidas': 0}
+    for inicio in range(0, len(ids), tamanho_lote):
+        lote = ids[inicio:inicio + tamanho_lote]
+        with transaction.atomic():
+            existentes = set(RecompensaPendente.objects.filter(
+                user_profile_id__in=lote,
+                content_type_id__in={ct_id for ct_id, _ in itens}, object_id__in={item_id for _, item_id in itens}
+            ).values_list('user_profile_id', 'content_type_id', 'object_id'))
+            pendentes = [
+                RecompensaPendente(user_profile_id=perfil_id, content_type_id=ct_id, object_id=item_id, origem_desbloqueio=origem)
+                for perfil_id in lote for ct_id, item_id in itens if (perfil_id, ct_id, item_id) not in existentes
+            ]
+            RecompensaPendente.objects.bulk_create(pendentes, batch_size=tamanho_lote, ignore_conflicts=True)
+            resumo['recompensas_pendentes'] += len(pendentes)
+            resumo['ja_existentes'] += sum(1 for chave in existentes if chave[1:] in itens)
+
+            if registrar_conclusao:
+                concluidos = set(CampanhaUsuarioCompletion.objects.filter(
+                    campanha=campanha, ciclo_id=ciclo_id, user_profile_id__in=lote
+                ).values_list('user_profile_id', flat=True))
+                conclusoes = [CampanhaUsuarioCompletion(user_profile_id=perfil_id, campanha=campanha, ciclo_id=ciclo_id) for perfil_id in lote if perfil_id not in concluidos]
+                CampanhaUsuarioCompletion.objects.bulk_create(conclusoes, batch_size=tamanho_lote, ignore_conflicts=True)
+                resumo['campanhas_concluidas'] += len(conclusoes)
+    return resumo
+
+# =======================================================================
+# PROGRESSO DAS CONQUISTAS EM LOTE
+# =======================================================================
+# A página de trilhas precisa do valor de cada (variável, contexto) usada pelas
+# condições das conquistas disponíveis. Em vez de uma consulta por condição, as
+# variáveis baseadas em respostas são resolvidas num único aggregate com
+# Count(filter=...) por par; as do perfil (nível, streak, cadastro) saem do
+# UserProfile com as relações carregadas por um único select_related, ou de
+# graça quando quem chama já as trouxe. As demais ainda custam uma consulta
+# cada. O resultado fica num cache curto por usuário, invalidado na próxima resposta.
+CHAVE_CACHE_PROGRESSO = 'gamificacao:progresso:{}'
+TEMPO_CACHE_PROGRESSO = 60 * 5
+
+VARIAVEIS_DE_RESPOSTAS = {
+    'total_respostas', 'total_acertos', 'percentual_acertos_geral',
+    'acertos_na_semana_atual', 'acertos_no_mes_atual',
+}
+
+# Variável -> relação do UserProfile de onde `_obter_valor_variavel` a lê.
+VARIAVEIS_DO_PERFIL = {
+    'level': 'gamificacao_data', 'acertos_consecutivos_atuais': 'gamificacao_data',
+    'current_streak': 'streak_data', 'max_streak': 'streak_data', 'dias_desde_ultima_pratica': 'streak_data',
+    'dias_desde_cadastro': 'user',
+}
+
+def _chave_par_variavel(chave_variavel, contexto):
+    return f"{chave_variavel}|{json.dumps(contexto or {}, sort_keys=True)}"
+
+def _filtro_contexto_respostas(contexto):
+    filtro = Q()
+    if contexto:
+        if contexto.get('disciplina_id'): filtro &= Q(questao__disciplina_id=contexto['disciplina_id'])
+        if contexto.get('banca_id'): filtro &= Q(questao__banca_id=contexto['banca_id'])
+        if contexto.get('assunto_id'): filtro &= Q(questao__assunto_id=contexto['assunto_id'])
+    return filtro
+
+def _calcular_variaveis_de_respostas(user, pares):
+    """Resolve todas as variáveis baseadas em respostas num único aggregate."""
+    agregacoes, apelidos = {}, {}
+    inicio_semana = filtro_periodo('data_resposta', inicio_do_periodo('semana'))
+    inicio_mes = filtro_periodo('data_resposta', inicio_do_periodo('mes'))
+    for i, (chave_variavel, contexto) in enumerate(pares):
+        filtro = _filtro_contexto_respostas(contexto)
+        apelidos[i] = (f"r{i}", f"a{i}")
+        if chave_variavel == 'acertos_na_semana_atual':
+            filtro &= Q(**inicio_semana)
+        elif chave_variavel == 'acertos_no_mes_atual':
+            filtro &= Q(**inicio_mes)
+        agregacoes[f"r{i}"] = Count('id', filter=filtro)
+        agregacoes[f"a{i}"] = Count('id', filter=filtro & Q(foi_correta=True))
+    totais = RespostaUsuario.objects.filter(usuario=user).aggregate(**agregacoes) if agregacoes else {}
+
+    valores = {}
+    for i, (chave_variavel, contexto) in enumerate(pares):
+        respostas, acertos = (totais[apelido] for apelido in apelidos[i])
+        if chave_variavel == 'total_respostas':
+            valor = respostas
+        elif chave_variavel == 'percentual_acertos_geral':
+            valor = (acertos / respostas) * 100 if respostas else 0
+        else:
+            valor = acertos
+        valores[_chave_par_variavel(chave_variavel, contexto)] = valor
+    return valores
+
+def calcular_valores_variaveis(user_profile, pares):
+    """
+    Recebe pares (chave_variavel, contexto) e devolve {chave_do_par: valor},
+    equivalente a chamar `_obter_valor_variavel` para cada par, mas com uma
+    única consulta para todas as variáveis baseadas em respostas e no máximo
+    uma para as do perfil. Pares repetidos são resolvidos uma única vez.
+    """
+    unicos = {}
+    for chave_variavel, contexto in pares:
+        unicos.setdefault(_chave_par_variavel(chave_variavel, contexto), (chave_variavel, contexto))
+
+    relacoes = {VARIAVEIS_DO_PERFIL[chave] for chave, _ in unicos.values() if chave in VARIAVEIS_DO_PERFIL}
+    if any(not UserProfile._meta.get_field(relacao).is_cached(user_profile) for relacao in relacoes):
+        user_profile = UserProfile.objects.select_related(*relacoes).get(pk=user_profile.pk)
+
+    de_respostas = [par for par in unicos.values() if par[0] in VARIAVEIS_DE_RESPOSTAS]
+    valores = _calcular_variaveis_de_respostas(user_profile.user, de_respostas)
+    for chave_par, (chave_variavel, contexto) in unicos.items():
+        if chave_par not in valores:
+            valores[chave_par] = _obter_valor_variavel(user_profile, chave_variavel, contexto)
+    return valores
+
+def obter_progresso_conquistas(user_profile, conquistas):
+    """
+    Calcula, de uma vez, as barras de progresso de todas as conquistas
+    informadas. Retorna {conquista_id: [{'label', 'atual', 'meta', 'percentual'}]}.
+    Os valores das variáveis são reaproveitados do cache do usuário quando possível.
+    """
+    condicoes_por_conquista = {c.id: [cond for cond in c.condicoes.all() if cond.variavel] for c in conquistas}
+    chave_cache = CHAVE_CACHE_PROGRESSO.format(user_profile.id)
+    valores = cache.get(chave_cache) or {}
+    faltantes = [
+        (condicao.variavel.chave, condicao.contexto_json)
+        for condicoes in condicoes_por_conquista.values() for condicao in condicoes
+        if _chave_par_variavel(condicao.variavel.chave, condicao.contexto_json) not in valores
+    ]
+    if faltantes:
+        valores.update(calcular_valores_variaveis(user_profile, faltantes))
+        cache.set(chave_cache, valores, TEMPO_CACHE_PROGRESSO)
+
+    progresso = {}
+    for conquista_id, condicoes in condicoes_por_conquista.items():
+        barras = []
+        for condicao in condicoes:
+            valor_atual = valores[_chave_par_variavel(condicao.variavel.chave, condicao.contexto_json)]
+            if condicao.valor > 0:
+                barras.append({
+                    'label': condicao.variavel.nome_exibicao,
+                    'atual': int(valor_atual),
+                    'meta': condicao.valor,
+                    'percentual': int(min((valor_atual / condicao.valor) * 100, 100)),
+                })
+        progresso[conquista_id] = barras
+    return progresso
+
+def invalidar_cache_progresso(user_profile_id):
+    # Após o COMMIT: apagar antes deixaria outra requisição recarregar o cache com o estado antigo.
+    transaction.on_commit(lambda: cache.delete(CHAVE_CACHE_PROGRESSO.format(user_profile_id)))
+
+# =======================================================================
+# CARTÃO DE PERFIL (SNAPSHOT EM CACHE)
+# =======================================================================
+# Os dados de gamificação exibidos em `meu_perfil`/`visualizar_perfil` são
+# montados só com leituras e guardados por usuário e por dia (a meta e o
+# streak mudam na virada). Lançamentos no extrato, respostas, subidas de nível,
+# conquistas e troféus de ranking invalidam o cartão. `gerado_em` identifica a
+# versão do cartão e compõe a chave do fragmento cacheado no template.
+CHAVE_CACHE_CARTAO_PERFIL = 'gamificacao:cartao:{}:{}'
+TEMPO_CACHE_CARTAO_PERFIL = 60 * 10
+LIMITE_CONQUISTAS_CARTAO = 5
+LIMITE_TROFEUS_CARTAO = 3
+
+def _montar_cartao_perfil(user_profile_id, hoje):
+    settings = GamificationSettings.load()
+    gamificacao = ProfileGamificacao.objects.filter(user_profile_id=user_profile_id).values('level', 'xp').first() or {'level': 1, 'xp': 0}
+    streak_data = ProfileStreak.objects.filter(user_profile_id=user_profile_id).first() or ProfileStreak(user_profile_id=user_profile_id)
+    questoes_hoje = MetaDiariaUsuario.objects.filter(user_profile_id=user_profile_id, data=hoje).values_list('questoes_resolvidas', flat=True).first() or 0
+
+    xp_proximo_nivel = calcular_xp_para_nivel(gamificacao['level'])
+    xp_nivel_anterior = calcular_xp_para_nivel(gamificacao['level'] - 1)
+    total_xp_do_nivel = xp_proximo_nivel - xp_nivel_anterior
+    meta_total = settings.meta_diaria_questoes
+
+    return {
+        'gerado_em': time.time(),
+        'level': gamificacao['level'],
+        'xp': gamificacao['xp'],
+        'xp_proximo_nivel': xp_proximo_nivel,
+        'progresso_percentual': (gamificacao['xp'] - xp_nivel_anterior) / total_xp_do_nivel * 100 if total_xp_do_nivel > 0 else 0,
+        'streak': streak_vigente(streak_data, hoje),
+        'meta_questoes_resolvidas': questoes_hoje,
+        'meta_diaria_total': meta_total,
+        'progresso_meta_diaria_percentual': min(questoes_hoje / meta_total * 100, 100) if meta_total > 0 else 0,
+        'conquistas': list(
+            Conquista.objects.filter(conquistausuario__user_profile_id=user_profile_id)
+            .order_by('nome').values('nome', 'descricao', 'icone', 'cor')[:LIMITE_CONQUISTAS_CARTAO]
+        ),
+        'trofeus_mensais': list(
+            RankingMensal.objects.filter(user_profile_id=user_profile_id, posicao__lte=3)
+            .order_by('-ano', '-mes').values('posicao', 'mes', 'ano')[:LIMITE_TROFEUS_CARTAO]
+        ),
+        'trofeus_semanais': list(
+            RankingSemanal.objects.filter(user_profile_id=user_profile_id, posicao__lte=3)
+            .order_by('-ano', '-semana').values('posicao', 'semana', 'ano')[:LIMITE_TROFEUS_CARTAO]
+        ),
+    }
+
+def obter_cartao_perfil(user_profile_id):
+    """ Snapshot (dict) dos dados de gamificação do perfil, sem nenhuma escrita no banco. """
+    hoje = hoje_local()
+    chave = CHAVE_CACHE_CARTAO_PERFIL.format(user_profile_id, hoje.isoformat())
+    cartao = cache.get(chave)
+    if cartao is None:
+        cartao = _montar_cartao_perfil(user_profile_id, hoje)
+        cache.set(chave, cartao, TEMPO_CACHE_CARTAO_PERFIL)
+    return cartao
+
+def invalidar_cartao_perfil(*user_profile_ids):
+    hoje = hoje_local().isoformat()
+    chaves = [CHAVE_CACHE_CARTAO_PERFIL.format(user_profile_id, hoje) for user_profile_id in user_profile_ids]
+    transaction.on_commit(lambda: cache.delete_many(chaves))
+
+# =======================================================================
+# VIRADA DIÁRIA (STREAKS E METAS)
+# =======================================================================
+# Executada logo após a meia-noite de America/Sao_Paulo pelo comando agendado
+# `executar_virada_diaria`. Zera em lote os streaks interrompidos (e a cópia no
+# PlacarGeral), cria as metas do dia para quem praticou ontem, compacta as
+# metas diárias de meses encerrados em MetaDiariaMensal e remove os cooldowns
+# vencidos e os placares por escopo de semanas e meses encerrados.
+MESES_DE_METAS_DIARIAS_MANTIDOS = 2
+TAMANHO_LOTE_COMPACTACAO = 2000
+CAMPOS_CONSOLIDADO_MENSAL = ('dias_ativos', 'dias_meta_atingida', 'questoes_resolvidas', 'xp_ganho')
+
+def streak_vigente(streak_data, hoje=None):
+    """
+    Streak atual sem efeitos colaterais: um streak só continua vivo se a
+    última prática foi hoje ou ontem (entre a meia-noite e a virada diária
+    o valor gravado ainda pode estar desatualizado).
+    """
+    hoje = hoje or hoje_local()
+    if not streak_data.last_practice_date or streak_data.last_practice_date < hoje - timedelta(days=1):
+        return 0
+    return streak_data.current_streak
+
+def zerar_streaks_interrompidos(hoje=None):
+    """ Zera, com um único UPDATE, os streaks de quem não praticou ontem nem hoje. """
+    hoje = hoje or hoje_local()
+    interrompidos = Q(last_practice_date__lt=hoje - timedelta(days=1)) | Q(last_practice_date__isnull=True)
+    zerados = ProfileStreak.objects.filter(interrompidos, current_streak__gt=0).update(current_streak=0)
+    # O placar do ranking geral guarda uma cópia do streak para o desempate.
+    PlacarGeral.objects.filter(streak__gt=0).filter(
+        Q(user_profile__streak_data__last_practice_date__lt=hoje - timedelta(days=1)) | Q(user_profile__streak_data__isnull=True)
+    ).update(streak=0)
+    return zerados
+
+def preparar_metas_do_dia(hoje=None):
+    """
+    Cria antecipadamente a MetaDiariaUsuario de hoje para quem praticou ontem,
+    de modo que a primeira resposta do dia dessas pessoas só faça incrementos.
+    """
+    hoje = hoje or hoje_local()
+    ativos_ontem = MetaDiariaUsuario.objects.filter(data=hoje - timedelta(days=1), questoes_resolvidas__gt=0).values_list('user_profile_id', flat=True)
+    criadas = MetaDiariaUsuario.objects.bulk_create(
+        [MetaDiariaUsuario(user_profile_id=perfil_id, data=hoje) for perfil_id in ativos_ontem],
+        batch_size=5000, ignore_conflicts=True
+    )
+    return len(criadas)
+
+def compactar_metas_diarias(hoje=None):
+    """
+    Consolida em MetaDiariaMensal as metas diárias anteriores aos últimos
+    MESES_DE_METAS_DIARIAS_MANTIDOS meses e remove as linhas diárias. Somar
+    ao consolidado existente torna a operação segura se for repetida.
+    Cada lote de TAMANHO_LOTE_COMPACTACAO totais custa uma leitura dos
+    consolidados existentes e um único upsert, sem consultas por usuário.
+    """
+    hoje = hoje or hoje_local()
+    limite = inicio_do_periodo('mes', hoje)
+    for _ in range(MESES_DE_METAS_DIARIAS_MANTIDOS - 1):
+        limite = inicio_do_periodo('mes', limite - timedelta(days=1))
+
+    antigas = MetaDiariaUsuario.objects.filter(data__lt=limite)
+    with transaction.atomic():
+        totais = antigas.annotate(mes=TruncMonth('data')).values('user_profile_id', 'mes').annotate(
+            dias_ativos=Count('id', filter=Q(questoes_resolvidas__gt=0)),
+            dias_meta_atingida=Count('id', filter=Q(meta_atingida=True)),
+            questoes_resolvidas=Sum('questoes_resolvidas'),
+            xp_ganho=Sum('xp_ganho_dia'),
+        ).order_by('user_profile_id', 'mes')
+        consolidados, lote = 0, []
+        for total in totais.iterator(chunk_size=TAMANHO_LOTE_COMPACTACAO):
+            lote.append(total)
+            if len(lote) >= TAMANHO_LOTE_COMPACTACAO:
+                consolidados += _somar_ao_consolidado_mensal(lote)
+                lote = []
+        consolidados += _somar_ao_consolidado_mensal(lote)
+        removidas, _ = antigas.delete()
+    return {'consolidados': consolidados, 'removidas': removidas}
+
+def _somar_ao_consolidado_mensal(totais):
+    """
+    Soma os totais (user_profile_id, mes, contadores) aos consolidados
+    existentes, travados com select_for_update, e grava tudo com um
+    bulk_create(update_conflicts=True) sobre (user_profile, mes).
+    """
+    if not totais:
+        return 0
+    existentes = {
+        (consolidado.user_profile_id, consolidado.mes): consolidado
+        for consolidado in MetaDiariaMensal.objects.select_for_update().filter(
+            user_profile_id__in={total['user_profile_id'] for total in totais}, mes__in={total['mes'] for total in totais}
+        )
+    }
+    linhas = []
+    for total in totais:
+        anterior = existentes.get((total['user_profile_id'], total['mes']))
+        linhas.append(MetaDiariaMensal(user_profile_id=total['user_profile_id'], mes=total['mes'], **{
+            campo: total[campo] + (getattr(anterior, campo) if anterior else 0) for campo in CAMPOS_CONSOLIDADO_MENSAL
+        }))
+    MetaDiariaMensal.objects.bulk_create(
+        linhas, update_conflicts=True, unique_fields=['user_profile', 'mes'], update_fields=list(CAMPOS_CONSOLIDADO_MENSAL)
+    )
+    return len(linhas)
+
+def executar_virada_diaria(hoje=None):
+    """ Executa as etapas da virada diária e registra a execução em TarefaAgendadaLog. """
+    hoje = hoje or hoje_local()
+    resumo = {
+        'streaks_zerados': zerar_streaks_interrompidos(hoje),
+        'metas_criadas': preparar_metas_do_dia(hoje),
+        **compactar_metas_diarias(hoje),
+        'cooldowns_expirados': purgar_cooldowns_expirados(),
+        'eventos_removidos': compactar_eventos_resposta(),
+        'placares_escopo_removidos': remover_placares_escopo_encerrados(hoje),
+    }
+    TarefaAgendadaLog.objects.update_or_create(nome_tarefa='virada_diaria', defaults={'ultima_execucao': timezone.now()})
+    return resumo
+
+# =======================================================================
+# LÓGICA DE RANKING E CAMPANHAS
+# =======================================================================
+# A geração dos rankings periódicos roda fora do ciclo de requisição, pelo
+# comando `gerar_rankings_periodicos` (agendado), e é idempotente: cada
+# período é gerado uma única vez, sob o lock da linha de TarefaAgendadaLog.
+def verificar_e_gerar_rankings(referencia=None):
+    """Gera os rankings semanal e mensal do período anterior, se ainda não existirem."""
+    return [_verificar_e_gerar_ranking_semanal(referencia), _verificar_e_gerar_ranking_mensal(referencia)]
+
+def _verificar_e_gerar_ranking_semanal(referencia=None):
+    hoje = referencia or hoje_local()
+    semana_passada_data = hoje - timedelta(days=7)
     ano, semana, _ = semana_passada_data.isocalendar()
     start_of_week = date.fromisocalendar(ano, semana, 1)
     end_of_week = start_of_week + timedelta(days=6)
-    
-    if _processar_e_salvar_ranking('semanal', start_of_week, end_of_week):
-        log_semanal.ultima_execucao = hoje
-        log_semanal.save()
+    return _executar_tarefa_ranking('gerar_ranking_semanal', 'semanal', start_of_week, end_of_week)
 
-def _verificar_e_gerar_ranking_mensal():
-    hoje = timezone.now()
-    log_mensal, _ = TarefaAgendadaLog.objects.get_or_create(nome_tarefa='gerar_ranking_mensal', defaults={'ultima_execucao': hoje - timedelta(days=32)})
-
-    # REMOÇÃO DA VALIDAÇÃO DE TEMPO: A verificação de existência no método
-    # _processar_e_salvar_ranking é suficiente e mais flexível para desenvolvimento.
-    # if log_mensal.ultima_execucao.month == hoje.month and log_mensal.ultima_execucao.year == hoje.year: return
-    
-    primeiro_dia_mes_atual = hoje.date().replace(day=1)
+def _verificar_e_gerar_ranking_mensal(referencia=None):
+    hoje = referencia or hoje_local()
+    primeiro_dia_mes_atual = hoje.replace(day=1)
     ultimo_dia_mes_passado = primeiro_dia_mes_atual - timedelta(days=1)
     primeiro_dia_mes_passado = ultimo_dia_mes_passado.replace(day=1)
+    return _executar_tarefa_ranking('gerar_ranking_mensal', 'mensal', primeiro_dia_mes_passado, ultimo_dia_mes_passado)
 
-    if _processar_e_salvar_ranking('mensal', primeiro_dia_mes_passado, ultimo_dia_mes_passado):
-        log_mensal.ultima_execucao = hoje
-        log_mensal.save()
+def _ranking_do_periodo_existe(tipo, data_inicio):
+    if tipo == 'semanal':
+        ano, semana, _ = data_inicio.isocalendar()
+        return RankingSemanal.objects.filter(ano=ano, semana=semana).exists()
+    return RankingMensal.objects.filter(ano=data_inicio.year, mes=data_inicio.month).exists()
+
+def _executar_tarefa_ranking(nome_tarefa, tipo, data_inicio, data_fim):
+    """
+    Executa a geração de um ranking periódico com exclusão mútua: a linha da
+    tarefa em TarefaAgendadaLog é travada (SELECT ... FOR UPDATE), de modo que
+    execuções concorrentes do agendador esperam e, em seguida, encontram o
+    período já gerado. Retorna um resumo com os tempos de cada etapa.
+    """
+    resumo = {'tarefa': nome_tarefa, 'periodo': f"{data_inicio:%d/%m/%Y} a {data_fim:%d/%m/%Y}", 'gerado': False}
+    agora = timezone.now()
+    TarefaAgendadaLog.objects.get_or_create(nome_tarefa=nome_tarefa, defaults={'ultima_execucao': agora})
+
+    with transaction.atomic():
+        log = TarefaAgendadaLog.objects.select_for_update().get(nome_tarefa=nome_tarefa)
+        if _ranking_do_periodo_existe(tipo, data_inicio):
+            return resumo
+        resumo.update(_processar_e_salvar_ranking(tipo, data_inicio, data_fim))
+        resumo['gerado'] = True
+        log.ultima_execucao = agora
+        log.save(update_fields=['ultima_execucao'])
+    return resumo
 
-# gamificacao/services.py
 def _processar_e_salvar_ranking(tipo, data_inicio, data_fim):
     """
-    Processa os dados de um período e salva o ranking correspondente,
-    agora com uma verificação para não criar duplicatas e com lógica aprimorada
-    de DENSE RANK para lidar com empates de forma justa.
+    Agrega as respostas do período, aplica DENSE RANK com os critérios de
+    desempate (acertos, respostas, streak), grava o ranking em lote e paga as
+    campanhas de ranking de forma set-based. Deve ser chamada dentro de uma
+    transação; retorna o número de ranqueados e o tempo de cada etapa.
     """
+    tempos = {}
+    inicio = time.perf_counter()
+
+    # Lê o histórico de eventos (e não RespostaUsuario, cujo horário é
+    # sobrescrito a cada nova resposta). Cada questão conta uma vez no período.
+    respostas_no_periodo = EventoResposta.objects.filter(
+        origem=EventoResposta.Origem.PRATICA, usuario__is_staff=False, usuario__is_active=True,
+        **filtro_periodo('registrado_em', data_inicio, data_fim)
+    )
+    ranking_data_list = list(respostas_no_periodo.values('usuario_id').annotate(
+        acertos=Count('questao_id', filter=Q(correta=True), distinct=True),
+        respostas=Count('questao_id', distinct=True)
+    ).order_by())
+    tempos['agregacao'] = time.perf_counter() - inicio
+
+    inicio = time.perf_counter()
+    perfis = {
+        user_id: (profile_id, streak or 0)
+        for user_id, profile_id, streak in UserProfile.objects.filter(
+            user_id__in=[item['usuario_id'] for item in ranking_data_list]
+        ).values_list('user_id', 'id', 'streak_data__current_streak')
+    }
+
+    # Ordena a lista em Python usando todos os critérios de desempate
+    for item in ranking_data_list:
+        item['streak'] = perfis.get(item['usuario_id'], (None, 0))[1]
+    ranking_data_sorted = sorted(
+        ranking_data_list,
+        key=lambda x: (-x['acertos'], -x['respostas'], -x['streak'])
+    )
+
+    Model = RankingSemanal if tipo == 'semanal' else RankingMensal
     if tipo == 'semanal':
         ano, semana, _ = data_inicio.isocalendar()
-        if RankingSemanal.objects.filter(ano=ano, semana=semana).exists():
-            return True
+        campos_periodo = {'ano': ano, 'semana': semana}
     else:
-        ano, mes = data_inicio.year, data_inicio.month
-        if RankingMensal.objects.filter(ano=ano, mes=mes).exists():
-            return True
+        campos_periodo = {'ano': data_inicio.year, 'mes': data_inicio.month}
 
-    respostas_no_periodo = RespostaUsuario.objects.filter(data_resposta__date__gte=data_inicio, data_resposta__date__lte=data_fim, usuario__is_staff=False, usuario__is_active=True)
-    
-    user_profiles_in_period = UserProfile.objects.filter(
-        user__in=respostas_no_periodo.values('usuario').distinct()
-    ).select_related('streak_data')
-    
-    streaks_map = {
-        profile.user_id: profile.streak_data.current_streak if hasattr(profile, 'streak_data') and profile.streak_data else 0
-        for profile in user_profiles_in_period
-    }
+    # Mesma regra (RANK) dos rankings ao vivo: empatados dividem a posição e
+    # a seguinte salta os empatados (1, 1, 3).
+    ranqueados = [item for item in ranking_data_sorted if item['usuario_id'] in perfis]
+    objetos_para_criar = []
+    posicao, ultima_pontuacao = 0, None
+    for i, item in enumerate(ranqueados, start=1):
+        pontuacao = (item['acertos'], item['respostas'], item['streak'])
+        if pontuacao != ultima_pontuacao:
+            posicao, ultima_pontuacao = i, pontuacao
+        objetos_para_criar.append(Model(
+            user_profile_id=perfis[item['usuario_id']][0], posicao=posicao,
+            acertos_periodo=item['acertos'], respostas_periodo=item['respostas'], **campos_periodo
+        ))
+    tempos['classificacao'] = time.perf_counter() - inicio
+
+    inicio = time.perf_counter()
+    Model.objects.bulk_create(objetos_para_criar, batch_size=5000)
+    tempos['gravacao'] = time.perf_counter() - inicio
+
+    inicio = time.perf_counter()
+    posicoes = [(obj.user_profile_id, obj.posicao) for obj in objetos_para_criar]
+    invalidar_cartao_perfil(*[perfil_id for perfil_id, posicao in posicoes if posicao <= 3])
+    premiacao = _pagar_campanhas_ranking(tipo, posicoes)
+    tempos['premiacao'] = time.perf_counter() - inicio
+
+    return {'ranqueados': len(objetos_para_criar), 'tempos': tempos, **premiacao}
+
+def _pagar_campanhas_ranking(tipo, posicoes):
+    """
+    Versão set-based de `processar_resultados_ranking` para o ranking inteiro:
+    decide de uma vez os vencedores de cada campanha de ranking ativa (cada
+    usuário fica com o primeiro grupo de condições que satisfaz, como no
+    avaliador individual) e grava RecompensaPendente/CampanhaUsuarioCompletion
+    com bulk_create. Condições dinâmicas (VariavelDoJogo) são avaliadas em lote
+    (`_filtrar_por_condicoes`) apenas para os candidatos que já passaram pelo
+    filtro de posição.
+    """
+    gatilho = Campanha.Gatilho.RANKING_SEMANAL_CONCLUIDO if tipo == 'semanal' else Campanha.Gatilho.RANKING_MENSAL_CONCLUIDO
+    agora = timezone.now()
+    campanhas = Campanha.objects.filter(
+        ativo=True, gatilho=gatilho, data_inicio__lte=agora
+    ).filter(Q(data_fim__gte=agora) | Q(data_fim__isnull=True))
+
+    tipos_recompensa = [('avatares', Avatar), ('bordas', Borda), ('banners', Banner)]
+    content_types = {tipo_recompensa: ContentType.objects.get_for_model(Model) for tipo_recompensa, Model in tipos_recompensa}
+    variaveis_map = dict(VariavelDoJogo.objects.values_list('id', 'chave'))
+
+    pendentes, conclusoes = [], []
+    for campanha in campanhas:
+        ciclo_id = _ciclo_id_campanha(campanha, agora)
+        ja_concluidos = set()
+        if campanha.tipo_recorrencia != Campanha.TipoRecorrencia.UNICA:
+            ja_concluidos = set(CampanhaUsuarioCompletion.objects.filter(campanha=campanha, ciclo_id=ciclo_id).values_list('user_profile_id', flat=True))
+        candidatos = [(perfil_id, posicao) for perfil_id, posicao in posicoes if perfil_id not in ja_concluidos]
+
+        origem = f"Prêmio da campanha '{campanha.nome}'"
+        for grupo in campanha.grupos_de_condicoes:
+            if not candidatos:
+                break
+            vencedores = [(perfil_id, posicao) for perfil_id, posicao in candidatos if _posicao_satisfaz_grupo(grupo, posicao)]
+            if grupo.get('condicoes') and vencedores:
+                condicoes = _condicoes_dinamicas_do_grupo(grupo, variaveis_map)
+                ids_vencedores = {perfil_id for perfil_id, _ in vencedores}
+                aprovados = _filtrar_por_condicoes(condicoes, UserProfile.objects.filter(id__in=ids_vencedores), ids_vencedores) if condicoes is not None else set()
+                vencedores = [(perfil_id, posicao) for perfil_id, posicao in vencedores if perfil_id in aprovados]
+            if not vencedores:
+                continue
 
-    ranking_data_qs = respostas_no_periodo.values('usuario_id').annotate(
-        acertos=Count('id', filter=Q(foi_correta=True)),
-        respostas=Count('id')
-    ).order_by('-acertos', '-respostas')
+            itens = []
+            for tipo_recompensa, Model in tipos_recompensa:
+                ids_validos = Model.objects.filter(id__in=grupo.get(tipo_recompensa, [])).values_list('id', flat=True)
+                itens.extend((content_types[tipo_recompensa], item_id) for item_id in ids_validos)
+
+            for perfil_id, _ in vencedores:
+                pendentes.extend(
+                    RecompensaPendente(user_profile_id=perfil_id, content_type=content_type, object_id=item_id, origem_desbloqueio=origem)
+                    for content_type, item_id in itens
+                )
+                if campanha.tipo_recorrencia != Campanha.TipoRecorrencia.UNICA:
+                    conclusoes.append(CampanhaUsuarioCompletion(user_profile_id=perfil_id, campanha=campanha, ciclo_id=ciclo_id))
+
+            ids_vencedores = {perfil_id for perfil_id, _ in vencedores}
+            candidatos = [(perfil_id, posicao) for perfil_id, posicao in candidatos if perfil_id not in ids_vencedores]
+
+    # Como em `conceder_recompensas_em_lote`, o resumo conta só as linhas de fato
+    # inseridas: descarta o mesmo item vindo de duas campanhas e o que o usuário
+    # já tem pendente. ignore_conflicts cobre apenas a corrida com outra execução.
+    unicos = {}
+    for pendente in pendentes:
+        unicos.setdefault((pendente.user_profile_id, pendente.content_type_id, pendente.object_id), pendente)
+    if unicos:
+        existentes = set(RecompensaPendente.objects.filter(
+            user_profile_id__in={chave[0] for chave in unicos},
+            content_type_id__in={chave[1] for chave in unicos}, object_id__in={chave[2] for chave in unicos}
+        ).values_list('user_profile_id', 'content_type_id', 'object_id'))
+        pendentes = [pendente for chave, pendente in unicos.items() if chave not in existentes]
+    RecompensaPendente.objects.bulk_create(pendentes, batch_size=5000, ignore_conflicts=True)
+    CampanhaUsuarioCompletion.objects.bulk_create(conclusoes, batch_size=5000, ignore_conflicts=True)
+    return {'recompensas_pendentes': len(pendentes), 'campanhas_concluidas': len(conclusoes)}
+
+def _posicao_satisfaz_grupo(grupo, posicao):
+    """Mesmas verificações legadas de `_verificar_condicoes_de_grupo` para o contexto de ranking."""
+    if grupo.get('condicao_posicao_exata') and posicao != grupo['condicao_posicao_exata']:
+        return False
+    if grupo.get('condicao_posicao_ate') and posicao > grupo['condicao_posicao_ate']:
+        return False
+    # O contexto de ranking não tem percentual de acerto: o grupo nunca é satisfeito.
+    if grupo.get('condicao_min_acertos_percent'):
+        return False
+    return True
 
-    ranking_data_list = list(ranking_data_qs)
+# =======================================================================
+# PLACAR MATERIALIZADO DO RANKING GERAL
+# =======================================================================
+ORDENACAO_PLACAR_GERAL = ('-acertos', '-streak', '-respostas', 'user_profile_id')
 
-    for item in ranking_data_list:
-        item['streak'] = streaks_map.get(item['usuario_id'], 0)
+def _usuario_elegivel_ranking(user):
+    return user.is_active and not user.is_staff
 
-    # Ordena a lista em Python usando todos os critérios de desempate
-    ranking_data_sorted = sorted(
-        ranking_data_list,
-        key=lambda x: (-x['acertos'], -x['respostas'], -x['streak'])
+def atualizar_placar_geral(user_profile, delta_respostas, delta_acertos):
+    """
+    Aplica o resultado de uma resposta ao placar geral com um único UPDATE
+    atômico. O streak é copiado do ProfileStreak na mesma instrução, pois o
+    signal de RespostaUsuario já o atualizou antes desta chamada.
+    """
+    if not _usuario_elegivel_ranking(user_profile.user):
+        return
+    streak_atual = Subquery(ProfileStreak.objects.filter(user_profile=OuterRef('user_profile')).values('current_streak')[:1])
+    atualizados = PlacarGeral.objects.filter(user_profile=user_profile).update(
+        respostas=F('respostas') + delta_respostas,
+        acertos=F('acertos') + delta_acertos,
+        streak=Coalesce(streak_atual, 0),
     )
+    if not atualizados:
+        # Primeira resposta do usuário (ou placar ainda não reconstruído):
+        # calcula a linha a partir da fonte de verdade.
+        recalcular_placar_geral(user_profile)
 
-    if not ranking_data_sorted:
-        return True
+def recalcular_placar_geral(user_profile):
+    """Recalcula (ou remove) a linha do placar de um usuário a partir de RespostaUsuario."""
+    user = user_profile.user
+    totais = RespostaUsuario.objects.filter(usuario=user).aggregate(
+        respostas=Count('id'), acertos=Count('id', filter=Q(foi_correta=True))
+    )
+    if not _usuario_elegivel_ranking(user) or not totais['respostas']:
+        PlacarGeral.objects.filter(user_profile=user_profile).delete()
+        return None
+    streak = ProfileStreak.objects.filter(user_profile=user_profile).values_list('current_streak', flat=True).first() or 0
+    placar, _ = PlacarGeral.objects.update_or_create(
+        user_profile=user_profile,
+        defaults={'respostas': totais['respostas'], 'acertos': totais['acertos'], 'streak': streak}
+    )
+    return placar
 
-    user_profiles_map = {up.user_id: up for up in UserProfile.objects.filter(user_id__in=[item['usuario_id'] for item in ranking_data_sorted])}
-    
-    objetos_para_criar = []
-    current_rank = 0
-    last_score = (-1, -1, -1) # Inicializa com um valor que não corresponde a nenhuma pontuação real
+def reconstruir_placar_geral():
+    """
+    Reconstrói o placar inteiro com agregações em lote. Usado na implantação
+    e após cargas de dados que não passam pelo pipeline de respostas.
+    """
+    totais = RespostaUsuario.objects.filter(usuario__is_active=True, usuario__is_staff=False).values('usuario_id').annotate(
+        respostas=Count('id'), acertos=Count('id', filter=Q(foi_correta=True))
+    )
+    perfis = dict(UserProfile.objects.values_list('user_id', 'id'))
+    streaks = dict(ProfileStreak.objects.values_list('user_profile_id', 'current_streak'))
 
-    for item in ranking_data_sorted:
-        user_profile = user_profiles_map.get(item['usuario_id'])
-        if not user_profile:
+    novos = []
+    for item in totais.iterator(chunk_size=2000):
+        user_profile_id = perfis.get(item['usuario_id'])
+        if not user_profile_id:
             continue
-            
-        current_score = (item['acertos'], item['respostas'], item['streak'])
-        
-        # Incrementa o rank apenas quando a pontuação muda
-        if current_score != last_score:
-            current_rank += 1
-        
-        posicao = current_rank
-        last_score = current_score
-            
-        if tipo == 'semanal':
-            obj = RankingSemanal(user_profile=user_profile, ano=data_inicio.year, semana=data_inicio.isocalendar()[1], posicao=posicao, acertos_periodo=item['acertos'], respostas_periodo=item['respostas'])
-        else: # mensal
-            obj = RankingMensal(user_profile=user_profile, ano=data_inicio.year, mes=data_inicio.month, posicao=posicao, acertos_periodo=item['acertos'], respostas_periodo=item['respostas'])
-        objetos_para_criar.append(obj)
-        
-    if objetos_para_criar:
-        if tipo == 'semanal':
-            novos_rankings_criados = RankingSemanal.objects.bulk_create(objetos_para_criar)
-        else:
-            novos_rankings_criados = RankingMensal.objects.bulk_create(objetos_para_criar)
-        
-        for ranking_item in novos_rankings_criados:
-            processar_resultados_ranking(ranking_item, tipo)
-            
-    return True
+        novos.append(PlacarGeral(
+            user_profile_id=user_profile_id, respostas=item['respostas'],
+            acertos=item['acertos'], streak=streaks.get(user_profile_id, 0)
+        ))
+
+    with transaction.atomic():
+        PlacarGeral.objects.all().delete()
+        PlacarGeral.objects.bulk_create(novos, batch_size=2000)
+    return len(novos)
+
+def obter_top_placar_geral(limite=10):
+    """
+    Retorna os `limite` primeiros do placar, já com a posição (RANK)
+    calculada. Lê no máximo `limite` linhas, seguindo o índice de pontuação.
+    """
+    linhas = list(
+        PlacarGeral.objects.filter(respostas__gt=0)
+        .select_related('user_profile__user', 'user_profile__streak_data', 'user_profile__avatar_equipado', 'user_profile__borda_equipada')
+        .order_by(*ORDENACAO_PLACAR_GERAL)[:limite]
+    )
+    return _atribuir_posicoes(linhas, lambda placar: (placar.acertos, placar.streak, placar.respostas))
+
+def _atribuir_posicoes(linhas, pontuacao_de):
+    """
+    Grava em cada linha (já ordenada a partir do 1º lugar) a posição RANK da
+    sua pontuação: empates dividem a posição e a seguinte salta os empatados,
+    ou seja, 1 + número de linhas com pontuação estritamente melhor.
+    """
+    posicao, ultima_pontuacao = 0, None
+    for i, linha in enumerate(linhas, start=1):
+        pontuacao = pontuacao_de(linha)
+        if pontuacao != ultima_pontuacao:
+            posicao = i
+            ultima_pontuacao = pontuacao
+        linha.posicao = posicao
+    return linhas
+
+def obter_posicao_placar_geral(placar):
+    """
+    Posição (RANK) de um placar: 1 + número de usuários com pontuação
+    estritamente melhor. É um único COUNT sobre o intervalo do índice de
+    pontuação acima do usuário, sem DISTINCT nem ordenação; o custo cresce
+    com a posição (O(rank)), então no fim de um placar grande a contagem
+    percorre quase todo o índice.
+    """
+    return PlacarGeral.objects.filter(respostas__gt=0).filter(
+        Q(acertos__gt=placar.acertos) |
+        Q(acertos=placar.acertos, streak__gt=placar.streak) |
+        Q(acertos=placar.acertos, streak=placar.streak, respostas__gt=placar.respostas)
+    ).count() + 1
+
+# =======================================================================
+# RANKINGS POR DISCIPLINA E POR BANCA (PLACAR POR ESCOPO)
+# =======================================================================
+# Cada ranking (escopo, alvo, período) é um intervalo contíguo do índice de
+# pontuação de PlacarEscopo: o TOP N e a posição de um usuário usam a mesma
+# estratégia do placar geral, sem janelas DENSE_RANK sobre as respostas.
+ORDENACAO_PLACAR_ESCOPO = ('-acertos', '-respostas', 'user_profile_id')
+PERIODOS_PLACAR_ESCOPO = {PlacarEscopo.Periodo.SEMANAL: 'semana', PlacarEscopo.Periodo.MENSAL: 'mes'}
+CAMPO_DO_ESCOPO = {PlacarEscopo.Escopo.DISCIPLINA: 'disciplina_id', PlacarEscopo.Escopo.BANCA: 'banca_id'}
+
+def inicio_periodo_placar(periodo, hoje=None):
+    return inicio_do_periodo(PERIODOS_PLACAR_ESCOPO[periodo], hoje or hoje_local())
+
+def _alvos_da_questao(questao):
+    alvos = [(PlacarEscopo.Escopo.DISCIPLINA, questao.disciplina_id)]
+    if questao.banca_id:
+        alvos.append((PlacarEscopo.Escopo.BANCA, questao.banca_id))
+    return alvos
+
+def atualizar_placares_escopo(user_profile, questao, correta, hoje=None):
+    """
+    Aplica uma resposta aos placares da disciplina e da banca da questão, na
+    semana e no mês correntes, com a regra dos rankings periódicos: no
+    período, cada questão conta uma resposta e, se foi acertada ao menos uma
+    vez, um acerto. Os eventos desta questão no período (o desta resposta já
+    foi gravado) dizem se ela é nova ou se é o primeiro acerto; os dois
+    períodos com o mesmo ajuste são atualizados por um único UPDATE.
+    """
+    if not _usuario_elegivel_ranking(user_profile.user):
+        return
+    hoje = hoje or hoje_local()
+    inicios = {periodo: inicio_periodo_placar(periodo, hoje) for periodo in PERIODOS_PLACAR_ESCOPO}
+    eventos = [
+        (timezone.localtime(registrado_em, fuso_local()).date(), evento_correto)
+        for registrado_em, evento_correto in EventoResposta.objects.filter(
+            usuario_id=user_profile.user_id, questao_id=questao.id, origem=EventoResposta.Origem.PRATICA,
+            **filtro_periodo('registrado_em', min(inicios.values()))
+        ).values_list('registrado_em', 'correta')
+    ]
+
+    periodos_por_ajuste = defaultdict(list)
+    for periodo, inicio in inicios.items():
+        no_periodo = [evento_correto for dia, evento_correto in eventos if dia >= inicio]
+        questao_nova = len(no_periodo) <= 1
+        primeiro_acerto = correta and sum(no_periodo) - 1 == 0
+        periodos_por_ajuste[(int(questao_nova), int(primeiro_acerto))].append(Q(periodo=periodo, inicio_periodo=inicio))
+
+    alvos = _alvos_da_questao(questao)
+    filtro_alvos = reduce(operator.or_, (Q(escopo=escopo, alvo_id=alvo_id) for escopo, alvo_id in alvos))
+    for (delta_respostas, delta_acertos), periodos in periodos_por_ajuste.items():
+        if not delta_respostas and not delta_acertos:
+            continue
+        atualizados = PlacarEscopo.objects.filter(filtro_alvos, reduce(operator.or_, periodos), user_profile=user_profile).update(
+            respostas=F('respostas') + delta_respostas, acertos=F('acertos') + delta_acertos,
+        )
+        if atualizados < len(alvos) * len(periodos):
+            # Primeira resposta no recorte/período (ou placar ainda não
+            # reconstruído): recalcula as linhas a partir dos eventos, que já
+            # incluem esta resposta.
+            recalcular_placares_escopo(user_profile, questao, hoje)
+            return
+
+def _pontuacao_por_eventos(inicio):
+    """ Agregações (respostas, acertos) com a regra dos rankings periódicos: questões distintas no período. """
+    no_periodo = Q(**filtro_periodo('registrado_em', inicio))
+    return (
+        Count('questao_id', filter=no_periodo, distinct=True),
+        Count('questao_id', filter=no_periodo & Q(correta=True), distinct=True),
+    )
+
+def recalcular_placares_escopo(user_profile, questao, hoje=None):
+    """ Recalcula, a partir do histórico de eventos, as linhas do usuário nos recortes da questão. """
+    hoje = hoje or hoje_local()
+    inicios = {periodo: inicio_periodo_placar(periodo, hoje) for periodo in PERIODOS_PLACAR_ESCOPO}
+    eventos = EventoResposta.objects.filter(
+        usuario_id=user_profile.user_id, origem=EventoResposta.Origem.PRATICA,
+        **filtro_periodo('registrado_em', min(inicios.values()), hoje)
+    )
+    for escopo, alvo_id in _alvos_da_questao(questao):
+        agregacoes = {}
+        for periodo, inicio in inicios.items():
+            agregacoes[f'respostas_{periodo}'], agregacoes[f'acertos_{periodo}'] = _pontuacao_por_eventos(inicio)
+        totais = eventos.filter(**{f'questao__{CAMPO_DO_ESCOPO[escopo]}': alvo_id}).aggregate(**agregacoes)
+        for periodo, inicio in inicios.items():
+            chave = {'user_profile': user_profile, 'escopo': escopo, 'alvo_id': alvo_id, 'periodo': periodo, 'inicio_periodo': inicio}
+            if not totais[f'respostas_{periodo}']:
+                PlacarEscopo.objects.filter(**chave).delete()
+                continue
+            PlacarEscopo.objects.update_or_create(**chave, defaults={
+                'respostas': totais[f'respostas_{periodo}'], 'acertos': totais[f'acertos_{periodo}'],
+            })
+
+def reconstruir_placares_escopo(hoje=None):
+    """
+    Reconstrói os placares por escopo da semana e do mês correntes com um
+    GROUP BY por recorte sobre o histórico de eventos da prática (a mesma
+    fonte e a mesma regra dos rankings periódicos) e remove os de períodos
+    encerrados. Retorna o número de linhas gravadas.
+    """
+    hoje = hoje or hoje_local()
+    perfis = dict(UserProfile.objects.filter(user__is_active=True, user__is_staff=False).values_list('user_id', 'id'))
+    novos = []
+    for periodo in PERIODOS_PLACAR_ESCOPO:
+        inicio = inicio_periodo_placar(periodo, hoje)
+        eventos = EventoResposta.objects.filter(origem=EventoResposta.Origem.PRATICA, **filtro_periodo('registrado_em', inicio, hoje))
+        respostas, acertos = _pontuacao_por_eventos(inicio)
+        for escopo, campo in CAMPO_DO_ESCOPO.items():
+            campo = f'questao__{campo}'
+            totais = eventos.exclude(**{campo: None}).values('usuario_id', campo).annotate(
+                respostas=respostas, total_acertos=acertos
+            ).filter(respostas__gt=0).order_by()
+            for linha in totais.iterator(chunk_size=5000):
+                if linha['usuario_id'] in perfis:
+                    novos.append(PlacarEscopo(
+                        user_profile_id=perfis[linha['usuario_id']], escopo=escopo, alvo_id=linha[campo], periodo=periodo,
+                        inicio_periodo=inicio, respostas=linha['respostas'], acertos=linha['total_acertos'],
+                    ))
+    with transaction.atomic():
+        PlacarEscopo.objects.all().delete()
+        PlacarEscopo.objects.bulk_create(novos, batch_size=2000)
+    return len(novos)
+
+def remover_placares_escopo_encerrados(hoje=None):
+    """ Remove as linhas de semanas e meses que já terminaram (etapa da virada diária). """
+    hoje = hoje or hoje_local()
+    encerrados = reduce(operator.or_, (
+        Q(periodo=periodo, inicio_periodo__lt=inicio_periodo_placar(periodo, hoje)) for periodo in PERIODOS_PLACAR_ESCOPO
+    ))
+    return PlacarEscopo.objects.filter(encerrados).delete()[0]
+
+def _ranking_escopo(escopo, alvo_id, periodo, hoje=None):
+    return PlacarEscopo.objects.filter(
+        escopo=escopo, alvo_id=alvo_id, periodo=periodo, inicio_periodo=inicio_periodo_placar(periodo, hoje), respostas__gt=0
+    )
+
+def obter_top_placar_escopo(escopo, alvo_id, periodo, limite=10, hoje=None):
+    """ Os `limite` primeiros de um ranking por escopo, com a posição (RANK) calculada. """
+    linhas = list(
+        _ranking_escopo(escopo, alvo_id, periodo, hoje)
+        .select_related('user_profile__user', 'user_profile__avatar_equipado', 'user_profile__borda_equipada')
+        .order_by(*ORDENACAO_PLACAR_ESCOPO)[:limite]
+    )
+    return _atribuir_posicoes(linhas, lambda placar: (placar.acertos, placar.respostas))
+
+def obter_posicao_placar_escopo(placar):
+    """
+    Posição (RANK) de uma linha no seu ranking: 1 + usuários estritamente
+    acima, um único COUNT sobre o intervalo do índice de pontuação; como no
+    placar geral, o custo cresce com a posição (O(rank)).
+    """
+    return PlacarEscopo.objects.filter(
+        escopo=placar.escopo, alvo_id=placar.alvo_id, periodo=placar.periodo, inicio_periodo=placar.inicio_periodo, respostas__gt=0
+    ).filter(Q(acertos__gt=placar.acertos) | Q(acertos=placar.acertos, respostas__gt=placar.respostas)).count() + 1
 
 def processar_conclusao_simulado(sessao):
     """
@@ -505,14 +1710,10 @@ def processar_conclusao_simulado(sessao):
     settings = GamificationSettings.load()
     user_profile = sessao.usuario.userprofile
     gamificacao_data = user_profile.gamificacao_data
-    simulado_id_str = str(sessao.simulado.id)
-
-    cooldown_timestamp_str = gamificacao_data.cooldowns_ativos.get("simulados", {}).get(simulado_id_str)
-    if cooldown_timestamp_str:
-        cooldown_timestamp = parse_datetime(cooldown_timestamp_str)
-        cooldown_delta = timedelta(hours=settings.cooldown_mesmo_simulado_horas)
-        if timezone.now() < cooldown_timestamp + cooldown_delta:
-            return {'xp_ganho': 0, 'moedas_ganhas': 0, 'regras_info': [], 'level_up_info': None, 'novas_recompensas': [], 'nova_conquista': None, 'percentual_acerto': 0}
+    invalidar_cache_progresso(user_profile.id)
+
+    if em_cooldown(user_profile.id, CooldownAtivo.Tipo.SIMULADO, sessao.simulado.id):
+        return {'xp_ganho': 0, 'moedas_ganhas': 0, 'regras_info': [], 'level_up_info': None, 'novas_recompensas': [], 'nova_conquista': None, 'percentual_acerto': 0}
     
     total_questoes = sessao.simulado.questoes.count()
     if total_questoes == 0:
@@ -548,16 +1749,15 @@ def processar_conclusao_simulado(sessao):
     xp_extra_campanhas = sum(info.get('xp_extra', 0) for info in campanhas_info)
     moedas_extras_campanhas = sum(info.get('moedas_extras', 0) for info in campanhas_info)
     
-    gamificacao_data.xp += xp_ganho + xp_extra_campanhas
-    gamificacao_data.moedas += moedas_ganhas + moedas_extras_campanhas
+    referencia = f"sessao_simulado:{sessao.id}"
+    registrar_lancamento(user_profile, LancamentoGamificacao.Motivo.SIMULADO, xp_ganho, moedas_ganhas, referencia)
+    registrar_lancamento(user_profile, LancamentoGamificacao.Motivo.CAMPANHA, xp_extra_campanhas, moedas_extras_campanhas, referencia)
     
     nova_conquista_obj = _avaliar_e_conceder_conquistas(user_profile)
-    level_up_info = _verificar_level_up(gamificacao_data)
+    level_up_info = _atualizar_nivel(user_profile)
     
-    if "simulados" not in gamificacao_data.cooldowns_ativos: 
-        gamificacao_data.cooldowns_ativos["simulados"] = {}
-    gamificacao_data.cooldowns_ativos["simulados"][simulado_id_str] = timezone.now().isoformat()
-    gamificacao_data.save()
+    iniciar_cooldown(user_profile.id, CooldownAtivo.Tipo.SIMULADO, sessao.simulado.id, timedelta(hours=settings.cooldown_mesmo_simulado_horas))
+    gamificacao_data.refresh_from_db(fields=['xp', 'moedas', 'level'])
     
     recompensas_serializadas = [{'nome': r.nome, 'imagem_url': r.imagem.url if r.imagem else '', 'raridade': r.get_raridade_display(), 'tipo': r.__class__.__name__} for r in recompensas_ganhas]
     
@@ -579,6 +1779,14 @@ def processar_conclusao_simulado(sessao):
         'novo_saldo_moedas': gamificacao_data.moedas
     }
 
+def _ciclo_id_campanha(campanha, agora):
+    """Identificador do ciclo de recorrência da campanha no instante informado."""
+    if campanha.tipo_recorrencia == Campanha.TipoRecorrencia.SEMANAL:
+        return agora.strftime('%Y-W%U')
+    if campanha.tipo_recorrencia == Campanha.TipoRecorrencia.MENSAL:
+        return agora.strftime('%Y-%m')
+    return 'geral'
+
 def _avaliar_e_conceder_recompensas(user_profile, gatilho, contexto):
     """
     Avalia e concede recompensas de campanhas, com a nova lógica para
@@ -605,12 +1813,8 @@ def _avaliar_e_conceder_recompensas(user_profile, gatilho, contexto):
                 continue
         # =======================================================================
 
-        ciclo_id = 'geral'
-        if regra.tipo_recorrencia == Campanha.TipoRecorrencia.SEMANAL:
-            ciclo_id = agora.strftime('%Y-W%U')
-        elif regra.tipo_recorrencia == Campanha.TipoRecorrencia.MENSAL:
-            ciclo_id = agora.strftime('%Y-%m')
-        
+        ciclo_id = _ciclo_id_campanha(regra, agora)
+
         if regra.tipo_recorrencia != Campanha.TipoRecorrencia.UNICA:
             if CampanhaUsuarioCompletion.objects.filter(user_profile=user_profile, campanha=regra, ciclo_id=ciclo_id).exists():
                 continue
@@ -727,3 +1931,93 @@ def _conceder_recompensa(user_profile, recompensa, campanha):
         defaults={'origem_desbloqueio': f"Prêmio da campanha '{campanha.nome}'"}
     )
     return created
+
+# =======================================================================
+# CATÁLOGO DA LOJA E POSSE DE ITENS
+# =======================================================================
+# A posse de itens de cada usuário é guardada no cache compartilhado como um
+# conjunto de ids por tipo. Um único get no cache responde se o usuário possui
+# qualquer item, e o cache é invalidado pelos signals de
+# AvatarUsuario/BordaUsuario/BannerUsuario (ou explicitamente após bulk_create).
+MODELOS_POSSE = {
+    'Avatar': (AvatarUsuario, 'avatar_id'),
+    'Borda': (BordaUsuario, 'borda_id'),
+    'Banner': (BannerUsuario, 'banner_id'),
+}
+CHAVE_CACHE_POSSE = 'gamificacao:posse:{}'
+TEMPO_CACHE_POSSE = 60 * 60 * 24
+
+def obter_ids_possuidos(user_profile_id):
+    """Retorna {tipo: frozenset(ids)} com os itens possuídos pelo usuário, usando o cache."""
+    chave = CHAVE_CACHE_POSSE.format(user_profile_id)
+    possuidos = cache.get(chave)
+    if possuidos is None:
+        possuidos = {
+            tipo: frozenset(Model.objects.filter(user_profile_id=user_profile_id).values_list(campo, flat=True))
+            for tipo, (Model, campo) in MODELOS_POSSE.items()
+        }
+        cache.set(chave, possuidos, TEMPO_CACHE_POSSE)
+    return possuidos
+
+def possui_item(user_profile_id, tipo, item_id):
+    return item_id in obter_ids_possuidos(user_profile_id).get(tipo, ())
+
+def possui_acesso_total(user_profile):
+    """
+    Membros da equipe (e perfis marcados com acesso_total_recompensas) podem usar
+    todas as recompensas sem que uma linha de posse seja criada para cada item.
+    """
+    if user_profile.user.is_staff:
+        return True
+    return ProfileGamificacao.objects.filter(user_profile=user_profile, acesso_total_recompensas=True).exists()
+
+def pode_usar_item(user_profile, tipo, item_id):
+    return possui_acesso_total(user_profile) or possui_item(user_profile.id, tipo, item_id)
+
+def invalidar_cache_posse(*user_profile_ids):
+    chaves = [CHAVE_CACHE_POSSE.format(user_profile_id) for user_profile_id in user_profile_ids]
+    transaction.on_commit(lambda: cache.delete_many(chaves))
+
+ORDENACOES_LOJA = {
+    'preco_asc': ('Preço (Menor > Maior)', ('preco_moedas',)),
+    'preco_desc': ('Preço (Maior > Menor)', ('-preco_moedas',)),
+    'nome_asc': ('Nome (A-Z)', ('nome',)),
+}
+
+def consultar_catalogo_loja(user_profile, tipo=None, raridade=None, ordenacao='preco_asc'):
+    """
+    Monta a consulta da loja sobre o ItemCatalogo: filtros, posse (a partir do
+    bitmap em cache), bloqueio por nível e ordenação são resolvidos no banco,
+    e o resultado pode ser paginado diretamente pelo Paginator.
+    Ordem: itens possuídos primeiro, depois os liberados, depois os bloqueados.
+    """
+    nivel_atual = user_profile.gamificacao_data.level
+    itens = ItemCatalogo.objects.filter(na_loja=True)
+    if tipo:
+        itens = itens.filter(tipo=tipo)
+    if raridade:
+        itens = itens.filter(raridade=raridade)
+
+    if possui_acesso_total(user_profile):
+        filtro_posse = Q(pk__isnull=False)
+    else:
+        filtro_posse = Q(pk__in=[])
+        for tipo_item, ids in obter_ids_possuidos(user_profile.id).items():
+            if ids:
+                filtro_posse |= Q(tipo=tipo_item, item_id__in=ids)
+
+    itens = itens.annotate(
+        ja_possui=Case(When(filtro_posse, then=Value(True)), default=Value(False), output_field=BooleanField()),
+    ).annotate(
+        is_locked=Case(
+            When(ja_possui=False, desbloqueio_por_nivel=True, nivel_necessario__gt=nivel_atual, then=Value(True)),
+            default=Value(False), output_field=BooleanField()
+        ),
+    ).annotate(
+        unlock_condition=Case(
+            When(is_locked=True, then=Concat(Value('Requer Nível '), Cast('nivel_necessario', CharField()))),
+            default=Value(''), output_field=CharField()
+        ),
+    )
+    campos_ordenacao = ORDENACOES_LOJA.get(ordenacao, ORDENACOES_LOJA['preco_asc'])[1]
+    return itens.order_by('-ja_possui', 'is_locked', *campos_ordenacao, 'id')
@@ -1,8 +1,13 @@
 # gamificacao/signals.py
-from django.db.models.signals import pre_delete
+from django.db.models.signals import pre_delete, post_init, post_save, post_delete, m2m_changed
 from django.dispatch import receiver
 from django.core.exceptions import ValidationError
-from .models import Conquista
+from django.contrib.auth.models import User
+from usuarios.models import UserProfile
+from .models import (
+    Conquista, PlacarGeral, ItemCatalogo, ProfileGamificacao,
+    Avatar, Borda, Banner, AvatarUsuario, BordaUsuario, BannerUsuario
+)
 
 @receiver(pre_delete, sender=Conquista)
 def verificar_dependencias_antes_de_excluir(sender, instance, **kwargs):
@@ -21,4 +26,93 @@ def verificar_dependencias_antes_de_excluir(sender, instance, **kwargs):
             f"Não é possível excluir a conquista '{instance.nome}', pois ela é um pré-requisito "
             f"para as seguintes conquistas: {nomes_dependentes}. Por favor, remova a dependência "
             f"dessas conquistas antes de prosseguir."
-        )
\ No newline at end of file
+        )
+
+def _elegivel_ranking(campos):
+    # Campos adiados (ex.: .only('username')) não estão em __dict__: elegibilidade desconhecida.
+    if 'is_active' not in campos or 'is_staff' not in campos:
+        return None
+    return campos['is_active'] and not campos['is_staff']
+
+@receiver(post_init, sender=User)
+def lembrar_elegibilidade_ranking(sender, instance, **kwargs):
+    """ Guarda a elegibilidade carregada, para o post_save só agir quando ela mudar. """
+    instance._elegivel_ranking_original = _elegivel_ranking(instance.__dict__)
+
+@receiver(post_save, sender=User)
+def sincronizar_placar_geral_usuario(sender, instance, created, update_fields=None, **kwargs):
+    """
+    Mantém o PlacarGeral coerente com a elegibilidade do usuário: contas
+    desativadas ou promovidas a staff saem do ranking; contas reativadas
+    voltam com os totais recalculados. Saves que não mudam is_active/is_staff
+    (login, edição de perfil) e contas novas, ainda sem respostas, não fazem
+    nenhuma consulta.
+    """
+    if created or (update_fields and not {'is_active', 'is_staff'} & set(update_fields)):
+        return
+    elegivel = _elegivel_ranking(instance.__dict__)
+    if elegivel == instance._elegivel_ranking_original:
+        return
+    instance._elegivel_ranking_original = elegivel
+    if not elegivel:
+        PlacarGeral.objects.filter(user_profile__user=instance).delete()
+        return
+    user_profile = UserProfile.objects.filter(user=instance).first()
+    if user_profile:
+        from .services import recalcular_placar_geral
+        recalcular_placar_geral(user_profile)
+
+# =======================================================================
+# CATÁLOGO DA LOJA E CACHE DE POSSE
+# =======================================================================
+
+@receiver(post_save, sender=Avatar)
+@receiver(post_save, sender=Borda)
+@receiver(post_save, sender=Banner)
+def sincronizar_item_catalogo(sender, instance, **kwargs):
+    from .services import reconciliar_desbloqueios_por_nivel
+    ItemCatalogo.sincronizar(instance)
+    reconciliar_desbloqueios_por_nivel(recompensa=instance)
+
+@receiver(post_delete, sender=Avatar)
+@receiver(post_delete, sender=Borda)
+@receiver(post_delete, sender=Banner)
+def remover_item_catalogo(sender, instance, **kwargs):
+    ItemCatalogo.remover(instance)
+
+@receiver(m2m_changed, sender=Avatar.tipos_desbloqueio.through)
+@receiver(m2m_changed, sender=Borda.tipos_desbloqueio.through)
+@receiver(m2m_changed, sender=Banner.tipos_desbloqueio.through)
+def sincronizar_formas_desbloqueio_catalogo(sender, instance, action, reverse, model, pk_set, **kwargs):
+    """
+    As flags de loja/nível do catálogo dependem das formas de desbloqueio,
+    que só são gravadas depois do save() da recompensa.
+    """
+    from .services import reconciliar_desbloqueios_por_nivel
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+    if not reverse:
+        recompensas = [instance]
+    else:
+        # Alteração feita pelo lado do TipoDesbloqueio: ressincroniza as recompensas afetadas.
+        recompensas = model.objects.filter(pk__in=pk_set) if pk_set else model.objects.all()
+    for recompensa in recompensas:
+        ItemCatalogo.sincronizar(recompensa)
+        reconciliar_desbloqueios_por_nivel(recompensa=recompensa)
+
+@receiver(post_save, sender=ProfileGamificacao)
+def conceder_desbloqueios_iniciais(sender, instance, created, **kwargs):
+    """ Perfis recém-criados recebem os itens do nível inicial. """
+    if created:
+        from .services import reconciliar_desbloqueios_por_nivel
+        reconciliar_desbloqueios_por_nivel(user_profile_ids=[instance.user_profile_id])
+
+@receiver(post_save, sender=AvatarUsuario)
+@receiver(post_save, sender=BordaUsuario)
+@receiver(post_save, sender=BannerUsuario)
+@receiver(post_delete, sender=AvatarUsuario)
+@receiver(post_delete, sender=BordaUsuario)
+@receiver(post_delete, sender=BannerUsuario)
+def invalidar_posse_usuario(sender, instance, **kwargs):
+    from .services import invalidar_cache_posse
+    invalidar_cache_posse(instance.user_profile_id)
@@ -1,3 +1,730 @@
-from django.test import TestCase
+# gamificacao/tests.py
 
-# Create your tests here.
+import json
+import os
+import tempfile
+from datetime import timedelta
+from io import StringIO
+from unittest.mock import patch
+from django.test import TestCase, Client
+from django.test.utils import CaptureQueriesContext
+from django.db import connection, transaction
+from django.urls import reverse
+from django.contrib.auth.models import User
+from django.core import management
+from django.core.cache import cache
+from django.db.models import F
+from django.utils import timezone
+
+from questoes.models import Questao, Disciplina, Assunto, Banca
+from usuarios.models import UserProfile
+from pratica.models import EventoResposta
+from gamificacao.models import (
+    GamificationSettings, PlacarGeral, RankingSemanal, Campanha, CampanhaUsuarioCompletion,
+    Avatar, Borda, RecompensaPendente, ProfileGamificacao, LancamentoGamificacao, TipoDesbloqueio,
+    AvatarUsuario, ItemCatalogo, Conquista, Condicao, VariavelDoJogo, ConquistaUsuario,
+    ProfileStreak, MetaDiariaUsuario, MetaDiariaMensal, CooldownAtivo, PlacarEscopo, ConquistaDiariaGlobalLog
+)
+from gamificacao.views import TAMANHO_TOP_RANKING
+from gamificacao.services import (
+    processar_resposta_gamificacao, obter_top_placar_geral, obter_posicao_placar_geral,
+    reconstruir_placar_geral, calcular_xp_para_nivel, calcular_nivel_por_xp, registrar_lancamento,
+    possui_item, reconciliar_desbloqueios_por_nivel, calcular_valores_variaveis, obter_progresso_conquistas,
+    _obter_valor_variavel, _chave_par_variavel, perfis_elegiveis_conquista, aplicar_campanha_em_lote, executar_virada_diaria, compactar_metas_diarias,
+    iniciar_cooldown, em_cooldown, verificar_limite_respostas, _janelas_locais, obter_cartao_perfil,
+    obter_top_placar_escopo, obter_posicao_placar_escopo, reconstruir_placares_escopo, _pagar_campanhas_ranking,
+    _processar_meta_diaria
+)
+
+
+class GamificacaoBaseTestCase(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        """
+        Cria usuários, questões e configurações sem cooldowns, para que as
+        respostas possam ser processadas em sequência durante os testes.
+        """
+        cache.clear()
+        settings = GamificationSettings.load()
+        settings.tempo_minimo_entre_respostas_segundos = 0
+        settings.cooldown_mesma_questao_horas = 0
+        settings.save()
+
+        cls.disciplina = Disciplina.objects.create(nome="Direito de Teste")
+        cls.banca = Banca.objects.create(nome="Banca de Teste")
+        cls.assunto = Assunto.objects.create(disciplina=cls.disciplina, nome="Assunto de Teste")
+        cls.questoes = [
+            Questao.objects.create(
+                disciplina=cls.disciplina, assunto=cls.assunto, banca=cls.banca, ano=2023,
+                enunciado=f"Enunciado {i}", alternativas={'A': '1', 'B': '2'}, gabarito='A'
+            )
+            for i in range(3)
+        ]
+
+        cls.usuarios = []
+        for i in range(3):
+            user = User.objects.create_user(f'jogador{i}', f'jogador{i}@test.com', 'password123')
+            UserProfile.objects.create(user=user, nome=f'Jogador{i}', sobrenome='Teste')
+            cls.usuarios.append(user)
+        cls.staff_user = User.objects.create_user('staffmember', 'staff@test.com', 'password123', is_staff=True)
+        UserProfile.objects.create(user=cls.staff_user, nome='Staff', sobrenome='Member')
+
+    def setUp(self):
+        # O cache de posse e a janela local do limitador sobrevivem ao rollback de cada teste.
+        cache.clear()
+        _janelas_locais.clear()
+
+    def responder(self, user, questao, alternativa):
+        # Como numa requisição real: as invalidações de cache rodam no COMMIT.
+        with self.captureOnCommitCallbacks(execute=True):
+            return processar_resposta_gamificacao(user, questao, alternativa)
+
+    def criar_item(self, Model, nome, preco, formas=('LOJA',), nivel=None):
+        item = Model.objects.create(nome=nome, descricao=nome, preco_moedas=preco, nivel_necessario=nivel)
+        item.tipos_desbloqueio.add(*[TipoDesbloqueio.objects.get_or_create(nome=forma)[0] for forma in formas])
+        return item
+
+
+class PlacarGeralTestCase(GamificacaoBaseTestCase):
+
+    def test_placar_incremental_considera_resposta_unica_por_questao(self):
+        """ Responder de novo a mesma questão só ajusta os acertos, não o total de respostas. """
+        user, questao = self.usuarios[0], self.questoes[0]
+        self.responder(user, questao, 'B')
+        self.responder(user, questao, 'A')
+
+        placar = PlacarGeral.objects.get(user_profile__user=user)
+        self.assertEqual((placar.respostas, placar.acertos), (1, 1))
+
+    def test_top_e_posicao_usam_rank(self):
+        """ Empates compartilham a posição e a seguinte salta os empatados. """
+        jogador0, jogador1, jogador2 = self.usuarios
+        for questao in self.questoes[:2]:
+            self.responder(jogador0, questao, 'A')
+            self.responder(jogador1, questao, 'A')
+        self.responder(jogador2, self.questoes[0], 'B')
+        self.responder(self.staff_user, self.questoes[0], 'A')
+
+        top = obter_top_placar_geral(limite=10)
+        self.assertEqual([p.posicao for p in top], [1, 1, 3])
+        self.assertNotIn(self.staff_user.userprofile.id, [p.user_profile_id for p in top])
+
+        placar_jogador2 = PlacarGeral.objects.get(user_profile__user=jogador2)
+        with self.assertNumQueries(1):
+            self.assertEqual(obter_posicao_placar_geral(placar_jogador2), 3)
+
+    def test_reconstrucao_igual_ao_incremental(self):
+        """ A reconstrução em lote deve produzir os mesmos totais do caminho incremental. """
+        for i, user in enumerate(self.usuarios):
+            for questao in self.questoes[:i + 1]:
+                self.responder(user, questao, 'A' if i % 2 == 0 else 'B')
+        incremental = set(PlacarGeral.objects.values_list('user_profile_id', 'acertos', 'respostas'))
+
+        reconstruir_placar_geral()
+        self.assertEqual(set(PlacarGeral.objects.values_list('user_profile_id', 'acertos', 'respostas')), incremental)
+
+    def test_view_ranking_geral_exibe_usuario_fora_do_top(self):
+        for i in range(TAMANHO_TOP_RANKING):
+            lider = User.objects.create_user(f'lider{i}', f'lider{i}@test.com', 'password123')
+            UserProfile.objects.create(user=lider, nome=f'Lider{i}', sobrenome='Teste')
+            self.responder(lider, self.questoes[0], 'A')
+        user = self.usuarios[0]
+        self.responder(user, self.questoes[0], 'B')
+        client = Client()
+        client.login(username=user.username, password='password123')
+
+        response = client.get(reverse('gamificacao:ranking'))
+        self.assertEqual(response.status_code, 200)
+        ranking = response.context['ranking_list']
+        self.assertEqual(len(ranking), TAMANHO_TOP_RANKING + 1)
+        self.assertTrue(ranking[-1].is_user_outside_top_10)
+        self.assertEqual(response.context['posicao_usuario_logado'].rank, TAMANHO_TOP_RANKING + 1)
+
+    def test_save_do_usuario_so_mexe_no_placar_quando_a_elegibilidade_muda(self):
+        self.responder(self.usuarios[0], self.questoes[0], 'A')
+        user = User.objects.get(pk=self.usuarios[0].pk)
+        user.first_name = 'Novo Nome'
+        with self.assertNumQueries(1):
+            user.save()
+
+        user.is_active = False
+        user.save()
+        self.assertFalse(PlacarGeral.objects.filter(user_profile__user=user).exists())
+        user.is_active = True
+        user.save(update_fields=['is_active'])
+        self.assertEqual(PlacarGeral.objects.get(user_profile__user=user).acertos, 1)
+
+
+class RankingPeriodicoTestCase(GamificacaoBaseTestCase):
+
+    def test_comando_gera_ranking_e_paga_campanha_uma_unica_vez(self):
+        jogador0, jogador1, _ = self.usuarios
+        for questao in self.questoes:
+            self.responder(jogador0, questao, 'A')
+        self.responder(jogador1, self.questoes[0], 'B')
+        EventoResposta.objects.update(registrado_em=timezone.now() - timedelta(days=7))
+
+        avatar = Avatar.objects.create(nome="Coroa", descricao="Prêmio do 1º lugar")
+        campanha = Campanha.objects.create(
+            nome="Campeão da Semana", gatilho=Campanha.Gatilho.RANKING_SEMANAL_CONCLUIDO,
+            data_inicio=timezone.now() - timedelta(days=30),
+            grupos_de_condicoes=[{'condicao_posicao_ate': 1, 'avatares': [avatar.id]}]
+        )
+
+        for _ in range(2):
+            management.call_command('gerar_rankings_periodicos', tipo='semanal', stdout=StringIO())
+
+        self.assertEqual(list(RankingSemanal.objects.order_by('posicao').values_list('user_profile__user', 'posicao')), [(jogador0.id, 1), (jogador1.id, 2)])
+        self.assertEqual(RecompensaPendente.objects.get().user_profile.user, jogador0)
+        self.assertEqual(CampanhaUsuarioCompletion.objects.filter(campanha=campanha).count(), 1)
+
+    def test_ranking_periodico_usa_rank_como_o_geral(self):
+        jogador0, jogador1, jogador2 = self.usuarios
+        for user, alternativa in ((jogador0, 'A'), (jogador1, 'A'), (jogador2, 'B')):
+            self.responder(user, self.questoes[0], alternativa)
+        EventoResposta.objects.update(registrado_em=timezone.now() - timedelta(days=7))
+
+        management.call_command('gerar_rankings_periodicos', tipo='semanal', stdout=StringIO())
+        self.assertEqual(list(RankingSemanal.objects.order_by('posicao', 'user_profile').values_list('user_profile__user', 'posicao')),
+                         [(jogador0.id, 1), (jogador1.id, 1), (jogador2.id, 3)])
+
+    def test_resumo_conta_apenas_recompensas_inseridas(self):
+        perfil = self.usuarios[0].userprofile
+        coroa = Avatar.objects.create(nome="Coroa", descricao="-")
+        trofeu = Avatar.objects.create(nome="Troféu", descricao="-")
+        RecompensaPendente.objects.create(user_profile=perfil, recompensa=coroa, origem_desbloqueio="Resgate anterior")
+        for nome, avatares in (("Campeão", [coroa.id, trofeu.id]), ("Líder", [trofeu.id])):
+            Campanha.objects.create(
+                nome=nome, gatilho=Campanha.Gatilho.RANKING_SEMANAL_CONCLUIDO, data_inicio=timezone.now() - timedelta(days=1),
+                grupos_de_condicoes=[{'condicao_posicao_ate': 1, 'avatares': avatares}]
+            )
+
+        resumo = _pagar_campanhas_ranking('semanal', [(perfil.id, 1)])
+        self.assertEqual(resumo['recompensas_pendentes'], 1)
+        self.assertEqual(RecompensaPendente.objects.filter(user_profile=perfil).count(), 2)
+
+
+class ExtratoGamificacaoTestCase(GamificacaoBaseTestCase):
+
+    def test_nivel_em_forma_fechada_equivale_ao_laco(self):
+        for xp in range(0, 20000, 7):
+            level = 1
+            while xp >= calcular_xp_para_nivel(level):
+                level += 1
+            self.assertEqual(calcular_nivel_por_xp(xp), level, msg=f"xp={xp}")
+
+    def test_lancamentos_com_instancia_desatualizada_nao_perdem_saldo(self):
+        """ Dois processos com cópias antigas do perfil: ambos os créditos devem persistir. """
+        user_profile = self.usuarios[0].userprofile
+        copia_a = ProfileGamificacao.objects.get(user_profile=user_profile)
+        copia_b = ProfileGamificacao.objects.get(user_profile=user_profile)
+        registrar_lancamento(copia_a.user_profile, LancamentoGamificacao.Motivo.RESPOSTA, 10, 5)
+        registrar_lancamento(copia_b.user_profile, LancamentoGamificacao.Motivo.RESPOSTA, 20, 5)
+        copia_a.acertos_consecutivos = 3
+        copia_a.save(update_fields=['acertos_consecutivos'])
+
+        gamificacao_data = ProfileGamificacao.objects.get(user_profile=user_profile)
+        self.assertEqual((gamificacao_data.xp, gamificacao_data.moedas), (30, 110))
+        self.assertEqual(LancamentoGamificacao.objects.filter(user_profile=user_profile).count(), 2)
+
+    def test_compra_na_loja_debita_e_registra_no_extrato(self):
+        user = self.usuarios[1]
+        avatar = Avatar.objects.create(nome="Coruja", descricao="Item da loja", preco_moedas=30)
+        avatar.tipos_desbloqueio.add(TipoDesbloqueio.objects.get_or_create(nome='LOJA')[0])
+        client = Client()
+        client.login(username=user.username, password='password123')
+        url = reverse('gamificacao:comprar_item')
+        payload = {'item_id': avatar.id, 'item_tipo': 'Avatar'}
+
+        response = client.post(url, payload, content_type='application/json')
+        self.assertEqual(response.json()['novo_saldo'], 70)
+        # Segunda compra do mesmo item: o débito é desfeito junto com a transação.
+        response = client.post(url, payload, content_type='application/json')
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(ProfileGamificacao.objects.get(user_profile__user=user).moedas, 70)
+
+        lancamento = LancamentoGamificacao.objects.get(user_profile__user=user)
+        self.assertEqual((lancamento.motivo, lancamento.delta_moedas, lancamento.referencia), ('COMPRA_LOJA', -30, f'avatar:{avatar.id}'))
+
+
+class BenchmarkGamificacaoTestCase(GamificacaoBaseTestCase):
+
+    def test_benchmark_roda_ate_o_fim_e_desfaz_os_dados(self):
+        # Com poucos usuários e muitos eventos, vários batem a meta no mesmo dia:
+        # a disputa pelo "primeiro do dia" não pode abortar a transação do replay.
+        GamificationSettings.objects.update_or_create(pk=1, defaults={'meta_diaria_questoes': 2})
+        with tempfile.TemporaryDirectory() as pasta:
+            saida = os.path.join(pasta, 'benchmark.json')
+            management.call_command(
+                'benchmark_gamificacao', usuarios=3, questoes=20, conquistas=2, campanhas=1, eventos=60,
+                saida=saida, stdout=StringIO()
+            )
+            with open(saida, encoding='utf-8') as arquivo:
+                resultado = json.load(arquivo)
+        self.assertEqual(sum(metricas['quantidade'] for metricas in resultado['eventos'].values()), 60)
+        self.assertFalse(User.objects.filter(username__startswith='bench_').exists())
+
+class CatalogoLojaTestCase(GamificacaoBaseTestCase):
+
+    def test_loja_filtra_ordena_e_marca_posse_e_bloqueio(self):
+        user = self.usuarios[0]
+        barato = self.criar_item(Avatar, "Barato", 10)
+        caro = self.criar_item(Borda, "Cara", 500)
+        bloqueado = self.criar_item(Avatar, "Nível Alto", 50, formas=('LOJA', 'NIVEL'), nivel=99)
+        self.criar_item(Avatar, "Só Conquista", 20, formas=('CONQUISTA',))
+        self.assertFalse(possui_item(user.userprofile.id, 'Avatar', barato.id))
+        with self.captureOnCommitCallbacks(execute=True):
+            AvatarUsuario.objects.create(user_profile=user.userprofile, avatar=barato)
+        self.assertTrue(possui_item(user.userprofile.id, 'Avatar', barato.id))
+
+        client = Client()
+        client.login(username=user.username, password='password123')
+        itens = list(client.get(reverse('gamificacao:loja'), {'sort_by': 'preco_desc'}).context['itens_loja'])
+        self.assertEqual([(i.tipo, i.item_id) for i in itens], [('Avatar', barato.id), ('Borda', caro.id), ('Avatar', bloqueado.id)])
+        self.assertEqual([(i.ja_possui, i.is_locked) for i in itens], [(True, False), (False, False), (False, True)])
+        self.assertEqual(itens[2].unlock_condition, 'Requer Nível 99')
+
+        itens = client.get(reverse('gamificacao:loja'), {'tipo': 'Borda'}).context['itens_loja']
+        self.assertEqual([i.nome for i in itens], ['Cara'])
+
+        caro.delete()
+        self.assertFalse(ItemCatalogo.objects.filter(tipo='Borda').exists())
+
+
+class DesbloqueioPorNivelTestCase(GamificacaoBaseTestCase):
+
+    def test_reconciliacao_ocorre_na_subida_de_nivel_e_na_mudanca_do_catalogo(self):
+        user_profile = self.usuarios[0].userprofile
+        ProfileGamificacao.objects.get_or_create(user_profile=user_profile)
+        inicial = self.criar_item(Avatar, "Nível 1", 0, formas=('NIVEL',), nivel=1)
+        nivel_2 = self.criar_item(Borda, "Nível 2", 0, formas=('NIVEL',), nivel=2)
+        self.criar_item(Avatar, "Loja", 10, formas=('NIVEL', 'LOJA'), nivel=1)
+        self.assertEqual(list(RecompensaPendente.objects.filter(user_profile=user_profile).values_list('object_id', flat=True)), [inicial.id])
+
+        registrar_lancamento(user_profile, LancamentoGamificacao.Motivo.CONCESSAO_MANUAL, delta_xp=calcular_xp_para_nivel(1))
+        self.responder(self.usuarios[0], self.questoes[0], 'A')
+        self.assertTrue(RecompensaPendente.objects.filter(user_profile=user_profile, object_id=nivel_2.id).exists())
+        self.assertEqual(reconciliar_desbloqueios_por_nivel(), 0)
+
+    def test_colecao_da_equipe_nao_cria_registros_de_posse(self):
+        avatar = self.criar_item(Avatar, "Exclusivo", 0, formas=('CONQUISTA',))
+        client = Client()
+        client.login(username=self.staff_user.username, password='password123')
+
+        response = client.get(reverse('colecao_avatares'))
+        self.assertEqual(response.context['desbloqueados_ids'], [avatar.id])
+        client.get(reverse('equipar_avatar', args=[avatar.id]))
+        self.staff_user.userprofile.refresh_from_db()
+        self.assertEqual(self.staff_user.userprofile.avatar_equipado, avatar)
+        self.assertFalse(AvatarUsuario.objects.exists())
+
+
+class CabecalhoUsuarioTestCase(GamificacaoBaseTestCase):
+
+    def test_perfil_do_cabecalho_e_carregado_uma_unica_vez(self):
+        user = self.usuarios[0]
+        avatar = self.criar_item(Avatar, "Prêmio", 0, formas=('CONQUISTA',))
+        RecompensaPendente.objects.create(user_profile=user.userprofile, recompensa=avatar, origem_desbloqueio="Teste")
+        client = Client()
+        client.login(username=user.username, password='password123')
+
+        with CaptureQueriesContext(connection) as consultas:
+            response = client.get(reverse('gamificacao:loja'))
+        self.assertEqual(response.context['recompensas_pendentes_count'], 1)
+        self.assertEqual(response.context['saldo_moedas_usuario'], user.userprofile.gamificacao_data.moedas)
+        consultas_perfil = [q for q in consultas.captured_queries if q['sql'].startswith('SELECT') and 'FROM "usuarios_userprofile"' in q['sql']]
+        self.assertEqual(len(consultas_perfil), 1)
+
+
+class ProgressoConquistasTestCase(GamificacaoBaseTestCase):
+
+    def test_calculo_em_lote_equivale_ao_individual(self):
+        user = self.usuarios[0]
+        self.responder(user, self.questoes[0], 'A')
+        self.responder(user, self.questoes[1], 'B')
+        pares = [
+            (chave, contexto)
+            for chave in ('total_respostas', 'total_acertos', 'percentual_acertos_geral', 'acertos_na_semana_atual', 'level', 'bancas_unicas_estudadas')
+            for contexto in ({}, {'disciplina_id': self.disciplina.id}, {'banca_id': self.banca.id + 1})
+        ]
+        user_profile = UserProfile.objects.select_related('user', 'gamificacao_data').get(user=user)
+        # Um aggregate para as 15 variáveis de respostas; os 3 pares de bancas_unicas_estudadas
+        # seguem pelo caminho individual e o nível vem do perfil já carregado.
+        with self.assertNumQueries(4):
+            valores = calcular_valores_variaveis(user_profile, pares)
+        for chave, contexto in pares:
+            self.assertEqual(valores[_chave_par_variavel(chave, contexto)], _obter_valor_variavel(user_profile, chave, contexto), msg=(chave, contexto))
+
+    def test_variaveis_do_perfil_em_uma_consulta(self):
+        user = self.usuarios[0]
+        self.responder(user, self.questoes[0], 'A')
+        pares = [(chave, None) for chave in ('level', 'acertos_consecutivos_atuais', 'current_streak', 'max_streak', 'dias_desde_ultima_pratica', 'dias_desde_cadastro')]
+        user_profile = UserProfile.objects.get(user=user)
+        with self.assertNumQueries(1):
+            valores = calcular_valores_variaveis(user_profile, pares)
+        for chave, contexto in pares:
+            self.assertEqual(valores[_chave_par_variavel(chave, contexto)], _obter_valor_variavel(user_profile, chave, contexto), msg=chave)
+
+    def test_progresso_em_cache_e_invalidado_pela_proxima_resposta(self):
+        user = self.usuarios[1]
+        variavel = VariavelDoJogo.objects.create(nome_exibicao="Total de Acertos", chave='total_acertos', descricao="-")
+        conquista = Conquista.objects.create(nome="Dez Acertos", descricao="-", icone="fas fa-star")
+        Condicao.objects.create(conquista=conquista, variavel=variavel, valor=10)
+
+        conquista = Conquista.objects.prefetch_related('condicoes__variavel').get(pk=conquista.pk)
+
+        self.responder(user, self.questoes[0], 'A')
+        self.assertEqual(obter_progresso_conquistas(user.userprofile, [conquista])[conquista.id][0]['atual'], 1)
+        with self.assertNumQueries(0):
+            obter_progresso_conquistas(user.userprofile, [conquista])
+        self.responder(user, self.questoes[1], 'A')
+        self.assertEqual(obter_progresso_conquistas(user.userprofile, [conquista])[conquista.id][0]['percentual'], 20)
+
+
+class RegrasEmLoteTestCase(GamificacaoBaseTestCase):
+
+    def criar_conquista(self, chave, valor, contexto=None, recompensas=None):
+        variavel, _ = VariavelDoJogo.objects.get_or_create(chave=chave, defaults={'nome_exibicao': chave, 'descricao': '-'})
+        conquista = Conquista.objects.create(nome=f"{chave} {valor}", descricao="-", icone="fas fa-star", recompensas=recompensas or {})
+        Condicao.objects.create(conquista=conquista, variavel=variavel, valor=valor, contexto_json=contexto or {})
+        return conquista
+
+    def test_avaliador_em_lote_equivale_ao_individual(self):
+        for i, user in enumerate(self.usuarios):
+            for questao in self.questoes[:i + 1]:
+                self.responder(user, questao, 'A' if i != 1 else 'B')
+        regras = [
+            ('total_acertos', 2, None), ('total_respostas', 1, {'disciplina_id': self.disciplina.id}),
+            ('percentual_acertos_geral', 50, None), ('level', 1, None), ('dias_desde_ultima_pratica', 5, None),
+            ('disciplinas_unicas_estudadas', 1, None), ('acertos_no_mes_atual', 1, None),
+        ]
+        perfis = UserProfile.objects.all()
+        for chave, valor, contexto in regras:
+            conquista = self.criar_conquista(chave, valor, contexto)
+            esperado = {p.id for p in perfis if _obter_valor_variavel(p, chave, contexto) >= valor}
+            self.assertEqual(perfis_elegiveis_conquista(conquista, perfis), esperado, msg=chave)
+
+    def test_backfill_concede_em_lotes_e_e_retomavel(self):
+        for user in self.usuarios:
+            self.responder(user, self.questoes[0], 'A')
+        avatar = Avatar.objects.create(nome="Medalha", descricao="-")
+        conquista = self.criar_conquista('total_acertos', 1, recompensas={'moedas': 50, 'avatares': [avatar.id]})
+        ConquistaUsuario.objects.filter(conquista=conquista).delete()
+        LancamentoGamificacao.objects.filter(referencia=f"conquista:{conquista.id}").delete()
+
+        saida = StringIO()
+        management.call_command('aplicar_regras_em_lote', conquista=conquista.id, lote=2, stdout=saida)
+        self.assertIn('3 usuários contemplados', saida.getvalue())
+        self.assertEqual(ConquistaUsuario.objects.filter(conquista=conquista).count(), 3)
+        self.assertEqual(RecompensaPendente.objects.filter(object_id=avatar.id).count(), 3)
+        self.assertEqual(LancamentoGamificacao.objects.filter(referencia=f"conquista:{conquista.id}").count(), 3)
+
+        management.call_command('aplicar_regras_em_lote', conquista=conquista.id, stdout=saida)
+        self.assertEqual(ConquistaUsuario.objects.filter(conquista=conquista).count(), 3)
+
+    def test_campanha_em_lote_credita_xp_e_moedas_do_grupo(self):
+        self.responder(self.usuarios[0], self.questoes[0], 'A')
+        self.responder(self.usuarios[1], self.questoes[0], 'B')
+        variavel, _ = VariavelDoJogo.objects.get_or_create(chave='total_acertos', defaults={'nome_exibicao': 'Acertos', 'descricao': '-'})
+        avatar = Avatar.objects.create(nome="Estandarte", descricao="-")
+        campanha = Campanha.objects.create(
+            nome="Quem já acertou", gatilho=Campanha.Gatilho.PRIMEIRA_ACAO_DO_DIA, tipo_recorrencia=Campanha.TipoRecorrencia.DIARIA,
+            data_inicio=timezone.now() - timedelta(minutes=1),
+            grupos_de_condicoes=[{'condicoes': [{'variavel_id': variavel.id, 'operador': '>=', 'valor': 1}],
+                                  'xp_extra': 30, 'moedas_extras': 20, 'avatares': [avatar.id]}]
+        )
+        perfil_premiado, perfil_fora = self.usuarios[0].userprofile, self.usuarios[1].userprofile
+        saldos = dict(ProfileGamificacao.objects.values_list('user_profile_id', 'moedas'))
+        xp_antes = ProfileGamificacao.objects.get(user_profile=perfil_premiado).xp
+
+        with self.captureOnCommitCallbacks(execute=True):
+            resumo = list(aplicar_campanha_em_lote(campanha, tamanho_lote=2))
+        self.assertEqual(sum(lote['concedidos'] for lote in resumo), 1)
+        self.assertEqual(
+            list(LancamentoGamificacao.objects.filter(referencia=f"campanha:{campanha.id}").values_list('user_profile_id', 'motivo', 'delta_xp', 'delta_moedas')),
+            [(perfil_premiado.id, LancamentoGamificacao.Motivo.CAMPANHA, 30, 20)]
+        )
+        premiado = ProfileGamificacao.objects.get(user_profile=perfil_premiado)
+        self.assertEqual((premiado.xp, premiado.moedas), (xp_antes + 30, saldos[perfil_premiado.id] + 20))
+        self.assertEqual(ProfileGamificacao.objects.get(user_profile=perfil_fora).moedas, saldos[perfil_fora.id])
+        self.assertTrue(RecompensaPendente.objects.filter(user_profile=perfil_premiado, object_id=avatar.id).exists())
+
+        # O ciclo ficou concluído: nem o lote nem o avaliador individual pagam de novo.
+        self.assertEqual(sum(lote['concedidos'] for lote in aplicar_campanha_em_lote(campanha)), 0)
+        self.assertEqual(LancamentoGamificacao.objects.filter(referencia=f"campanha:{campanha.id}").count(), 1)
+
+    def test_previa_na_gestao(self):
+        self.responder(self.usuarios[0], self.questoes[0], 'A')
+        conquista = self.criar_conquista('total_respostas', 1)
+        ConquistaUsuario.objects.filter(conquista=conquista).delete()
+        client = Client()
+        client.login(username=self.staff_user.username, password='password123')
+        response = client.get(reverse('gestao:previa_elegiveis_conquista', args=[conquista.id]))
+        self.assertEqual(response.json()['elegiveis'], 1)
+
+
+class ViradaDiariaTestCase(GamificacaoBaseTestCase):
+
+    def test_meta_diaria_paga_uma_unica_vez(self):
+        settings = GamificationSettings.load()
+        settings.meta_diaria_questoes = 2
+        settings.save()
+        user = self.usuarios[0]
+        resultados = [self.responder(user, questao, 'A') for questao in self.questoes]
+
+        self.assertEqual([r['meta_completa_info'] is not None for r in resultados], [False, True, False])
+        meta = MetaDiariaUsuario.objects.get(user_profile__user=user)
+        self.assertEqual((meta.questoes_resolvidas, meta.meta_atingida), (3, True))
+
+    def test_primeiro_do_dia_usa_a_data_da_meta(self):
+        # Perto da meia-noite o dia local da meta e o dia do servidor divergem;
+        # o registro do "primeiro do dia" segue o dia da meta.
+        settings = GamificationSettings.load()
+        settings.meta_diaria_questoes = 1
+        perfil = self.usuarios[0].userprofile
+        ontem = timezone.localdate() - timedelta(days=1)
+        meta = MetaDiariaUsuario.objects.create(user_profile=perfil, data=ontem)
+
+        info = _processar_meta_diaria(perfil, ProfileGamificacao.objects.get_or_create(user_profile=perfil)[0], meta, 10, settings)
+
+        self.assertTrue(info['primeiro_do_dia'])
+        self.assertEqual(ConquistaDiariaGlobalLog.objects.get(tipo='META_DIARIA').data, ontem)
+
+    def test_virada_zera_streaks_e_compacta_metas(self):
+        hoje = timezone.localdate()
+        vivo, quebrado = [user.userprofile for user in self.usuarios[:2]]
+        ProfileStreak.objects.filter(user_profile=vivo).update(current_streak=4, last_practice_date=hoje - timedelta(days=1))
+        ProfileStreak.objects.filter(user_profile=quebrado).update(current_streak=7, last_practice_date=hoje - timedelta(days=3))
+        PlacarGeral.objects.create(user_profile=quebrado, streak=7)
+
+        antigo = hoje.replace(day=1) - timedelta(days=70)
+        MetaDiariaUsuario.objects.create(user_profile=vivo, data=antigo, questoes_resolvidas=5, xp_ganho_dia=50, meta_atingida=True)
+        MetaDiariaUsuario.objects.create(user_profile=vivo, data=antigo + timedelta(days=1), questoes_resolvidas=2, xp_ganho_dia=20)
+        MetaDiariaUsuario.objects.create(user_profile=vivo, data=hoje - timedelta(days=1), questoes_resolvidas=1)
+
+        self.assertEqual(_obter_valor_variavel(quebrado, 'current_streak', None), 0)
+        resumo = executar_virada_diaria(hoje)
+
+        self.assertEqual((resumo['streaks_zerados'], resumo['metas_criadas'], resumo['removidas']), (1, 1, 2))
+        self.assertEqual(ProfileStreak.objects.get(user_profile=quebrado).current_streak, 0)
+        self.assertEqual(ProfileStreak.objects.get(user_profile=vivo).current_streak, 4)
+        self.assertEqual(PlacarGeral.objects.get(user_profile=quebrado).streak, 0)
+        self.assertTrue(MetaDiariaUsuario.objects.filter(user_profile=vivo, data=hoje).exists())
+        mensal = MetaDiariaMensal.objects.get(user_profile=vivo)
+        self.assertEqual((mensal.dias_ativos, mensal.dias_meta_atingida, mensal.questoes_resolvidas, mensal.xp_ganho), (2, 1, 7, 70))
+
+        management.call_command('executar_virada_diaria', data=hoje.isoformat(), stdout=StringIO())
+        self.assertEqual(MetaDiariaMensal.objects.get(user_profile=vivo).questoes_resolvidas, 7)
+
+    def test_compactacao_soma_ao_consolidado_em_lote(self):
+        hoje = timezone.localdate()
+        antigo = hoje.replace(day=1) - timedelta(days=70)
+        perfis = [user.userprofile for user in self.usuarios]
+        MetaDiariaMensal.objects.create(user_profile=perfis[0], mes=antigo.replace(day=1), dias_ativos=1, questoes_resolvidas=3, xp_ganho=30)
+        for perfil in perfis:
+            MetaDiariaUsuario.objects.create(user_profile=perfil, data=antigo, questoes_resolvidas=2, xp_ganho_dia=20)
+
+        # Lote de dois com três usuários: duas leituras e dois upserts, não uma ida ao banco por usuário.
+        with patch('gamificacao.services.TAMANHO_LOTE_COMPACTACAO', 2), self.assertNumQueries(8):
+            resumo = compactar_metas_diarias(hoje)
+
+        self.assertEqual((resumo['consolidados'], resumo['removidas']), (len(perfis), len(perfis)))
+        self.assertEqual(
+            MetaDiariaMensal.objects.filter(user_profile=perfis[0]).values_list('dias_ativos', 'questoes_resolvidas', 'xp_ganho').get(), (2, 5, 50)
+        )
+        self.assertEqual(MetaDiariaMensal.objects.filter(user_profile=perfis[1]).values_list('questoes_resolvidas', flat=True).get(), 2)
+
+
+class CooldownTestCase(GamificacaoBaseTestCase):
+
+    def configurar(self, **valores):
+        settings = GamificationSettings.load()
+        for campo, valor in valores.items():
+            setattr(settings, campo, valor)
+        settings.save()
+
+    def test_cooldown_da_mesma_questao(self):
+        self.configurar(cooldown_mesma_questao_horas=24)
+        user, questao = self.usuarios[0], self.questoes[0]
+        self.assertIsNone(self.responder(user, questao, 'A')['motivo_bloqueio'])
+        self.assertEqual(self.responder(user, questao, 'A')['motivo_bloqueio'], 'COOLDOWN_QUESTAO')
+        self.assertIsNone(self.responder(user, self.questoes[1], 'A')['motivo_bloqueio'])
+
+        # Uma resposta desfeita (rollback) não deixa cooldown no cache.
+        with self.assertRaises(RuntimeError), transaction.atomic():
+            processar_resposta_gamificacao(user, self.questoes[2], 'A')
+            raise RuntimeError
+        self.assertIsNone(self.responder(user, self.questoes[2], 'A')['motivo_bloqueio'])
+
+        # Sem o cache, a tabela continua sendo a fonte da verdade.
+        cache.clear()
+        self.assertEqual(self.responder(user, questao, 'A')['motivo_bloqueio'], 'COOLDOWN_QUESTAO')
+
+    def test_ausencia_de_cooldown_nao_fica_em_cache(self):
+        perfil = self.usuarios[0].userprofile
+        self.assertFalse(em_cooldown(perfil.id, CooldownAtivo.Tipo.SIMULADO, 7))
+        # Gravado por outro processo, direto na tabela: vale na próxima consulta.
+        CooldownAtivo.objects.create(user_profile=perfil, tipo=CooldownAtivo.Tipo.SIMULADO, alvo_id=7, expira_em=timezone.now() + timedelta(hours=1))
+        self.assertTrue(em_cooldown(perfil.id, CooldownAtivo.Tipo.SIMULADO, 7))
+        with self.assertNumQueries(0):
+            self.assertTrue(em_cooldown(perfil.id, CooldownAtivo.Tipo.SIMULADO, 7))
+
+    def test_limitador_bloqueia_sem_consultar_o_banco(self):
+        self.configurar(tempo_minimo_entre_respostas_segundos=30)
+        user = self.usuarios[0]
+        self.responder(user, self.questoes[0], 'A')
+        GamificationSettings.load()
+        with self.assertNumQueries(0):
+            self.assertEqual(self.responder(user, self.questoes[1], 'A')['motivo_bloqueio'], 'RESPOSTA_RAPIDA')
+
+    def test_limitador_de_rajada_em_janela_deslizante(self):
+        self.configurar(limite_respostas_por_minuto=3)
+        settings = GamificationSettings.load()
+        motivos = [verificar_limite_respostas(1, settings, agora=100 + i) for i in range(4)]
+        self.assertEqual(motivos, [None, None, None, 'LIMITE_RESPOSTAS'])
+        # A primeira resposta sai da janela 60s depois e libera uma nova.
+        self.assertIsNone(verificar_limite_respostas(1, settings, agora=160.5))
+        self.assertEqual(verificar_limite_respostas(1, settings, agora=160.8), 'LIMITE_RESPOSTAS')
+
+    def test_limitador_usa_a_janela_local_sem_cache(self):
+        self.configurar(tempo_minimo_entre_respostas_segundos=30)
+        settings = GamificationSettings.load()
+        self.assertIsNone(verificar_limite_respostas(1, settings, agora=100))
+        # Cache que perdeu a chave (ou nunca guarda nada) e cache fora do ar.
+        cache.clear()
+        self.assertEqual(verificar_limite_respostas(1, settings, agora=110), 'RESPOSTA_RAPIDA')
+        with patch('gamificacao.services.cache.get', side_effect=ConnectionError), patch('gamificacao.services.cache.set', side_effect=ConnectionError):
+            self.assertEqual(verificar_limite_respostas(1, settings, agora=120), 'RESPOSTA_RAPIDA')
+            self.assertIsNone(verificar_limite_respostas(1, settings, agora=130))
+
+        # A cópia local é um LRU limitado: o usuário menos recente sai primeiro.
+        with patch('gamificacao.services.TAMANHO_MAXIMO_JANELAS_LOCAIS', 2):
+            for user_id in (2, 3):
+                verificar_limite_respostas(user_id, settings, agora=200)
+        self.assertEqual(list(_janelas_locais), ['gamificacao:limitador:2', 'gamificacao:limitador:3'])
+
+    def test_cooldowns_vencidos_sao_liberados_e_purgados(self):
+        perfil = self.usuarios[0].userprofile
+        iniciar_cooldown(perfil.id, CooldownAtivo.Tipo.SIMULADO, 7, timedelta(hours=48))
+        self.assertTrue(em_cooldown(perfil.id, CooldownAtivo.Tipo.SIMULADO, 7))
+
+        CooldownAtivo.objects.update(expira_em=timezone.now() - timedelta(minutes=1))
+        cache.clear()
+        self.assertFalse(em_cooldown(perfil.id, CooldownAtivo.Tipo.SIMULADO, 7))
+        self.assertEqual(executar_virada_diaria()['cooldowns_expirados'], 1)
+        self.assertFalse(CooldownAtivo.objects.exists())
+
+
+class ConcessaoEmLoteTestCase(GamificacaoBaseTestCase):
+
+    def test_comando_concede_ao_publico_e_conta_existentes(self):
+        avatar = Avatar.objects.create(nome="Evento", descricao="-")
+        borda = Borda.objects.create(nome="Evento", descricao="-")
+        jogador = self.usuarios[0].userprofile
+        RecompensaPendente.objects.create(user_profile=jogador, recompensa=avatar, origem_desbloqueio="Antes")
+
+        saida = StringIO()
+        management.call_command(
+            'conceder_recompensas_em_lote', publico='TODOS', avatares=[avatar.id], bordas=[borda.id],
+            origem='Evento de Aniversário', lote=2, stdout=saida
+        )
+        self.assertIn('5 recompensas enviadas para 3 usuários (1 já existentes', saida.getvalue())
+        self.assertEqual(RecompensaPendente.objects.count(), 6)
+        self.assertFalse(RecompensaPendente.objects.filter(user_profile__user=self.staff_user).exists())
+        self.assertEqual(RecompensaPendente.objects.get(user_profile=jogador, content_type__model='borda').origem_desbloqueio, 'Evento de Aniversário')
+
+    def test_acao_da_gestao_registra_conclusao_da_campanha(self):
+        avatar = Avatar.objects.create(nome="Campeão", descricao="-")
+        campanha = Campanha.objects.create(nome="Evento Mensal", gatilho=Campanha.Gatilho.META_DIARIA_CONCLUIDA, tipo_recorrencia=Campanha.TipoRecorrencia.MENSAL)
+        client = Client()
+        client.login(username=self.staff_user.username, password='password123')
+
+        response = client.post(reverse('gestao:conceder_recompensa_em_lote'), {
+            'publico': 'LISTA', 'usernames': 'jogador0, jogador2', 'avatares': [avatar.id],
+            'campanha': campanha.id, 'justificativa': 'Pagamento do evento',
+        })
+        self.assertRedirects(response, reverse('gestao:conceder_recompensa_em_lote'))
+        self.assertEqual(set(RecompensaPendente.objects.values_list('user_profile__user__username', flat=True)), {'jogador0', 'jogador2'})
+        self.assertEqual(CampanhaUsuarioCompletion.objects.filter(campanha=campanha).count(), 2)
+
+
+class CartaoPerfilTestCase(GamificacaoBaseTestCase):
+
+    def test_perfil_publico_nao_escreve_e_usa_o_cache(self):
+        alvo = self.usuarios[1].userprofile
+        MetaDiariaUsuario.objects.filter(user_profile=alvo).delete()
+        client = Client()
+        client.login(username=self.usuarios[0].username, password='password123')
+        url = reverse('visualizar_perfil', args=[alvo.user.username])
+
+        with CaptureQueriesContext(connection) as primeira:
+            response = client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(any(q['sql'].lstrip().upper().startswith(('INSERT', 'UPDATE')) for q in primeira.captured_queries if 'django_session' not in q['sql']))
+        self.assertFalse(MetaDiariaUsuario.objects.filter(user_profile=alvo).exists())
+
+        with CaptureQueriesContext(connection) as segunda:
+            client.get(url)
+        self.assertLess(len(segunda.captured_queries), len(primeira.captured_queries))
+        self.assertFalse(any('gamificacao_conquista' in q['sql'] for q in segunda.captured_queries))
+
+    def test_resposta_e_conquista_invalidam_o_cartao(self):
+        user = self.usuarios[0]
+        perfil = user.userprofile
+        antes = obter_cartao_perfil(perfil.id)
+        self.assertEqual((antes['xp'], antes['meta_questoes_resolvidas'], antes['conquistas']), (0, 0, []))
+
+        self.responder(user, self.questoes[0], 'A')
+        conquista = Conquista.objects.create(nome="Primeira", descricao="-", icone="fas fa-star")
+        ConquistaUsuario.objects.create(user_profile=perfil, conquista=conquista)
+        self.responder(user, self.questoes[1], 'A')
+
+        depois = obter_cartao_perfil(perfil.id)
+        self.assertGreater(depois['xp'], 0)
+        self.assertEqual(depois['meta_questoes_resolvidas'], 2)
+        self.assertEqual([c['nome'] for c in depois['conquistas']], ['Primeira'])
+
+
+class PlacarEscopoTestCase(GamificacaoBaseTestCase):
+
+    def pontuacoes(self, escopo, alvo_id, periodo):
+        return [(placar.user_profile.user_id, placar.posicao, placar.acertos, placar.respostas) for placar in obter_top_placar_escopo(escopo, alvo_id, periodo)]
+
+    def test_placar_incremental_confere_com_reconstrucao(self):
+        jogador0, jogador1, jogador2 = self.usuarios
+        self.responder(jogador0, self.questoes[0], 'A')
+        self.responder(jogador0, self.questoes[1], 'A')
+        self.responder(jogador1, self.questoes[0], 'B')
+        self.responder(jogador1, self.questoes[1], 'A')
+        self.responder(jogador2, self.questoes[2], 'A')
+        self.assertEqual(self.pontuacoes(PlacarEscopo.Escopo.DISCIPLINA, self.disciplina.id, PlacarEscopo.Periodo.SEMANAL), [
+            (jogador0.id, 1, 2, 2), (jogador1.id, 2, 1, 2), (jogador2.id, 3, 1, 1)
+        ])
+
+        # Como nos rankings periódicos, refazer a questão no período não conta
+        # outra resposta, e o acerto vale se ela foi acertada ao menos uma vez.
+        self.responder(jogador1, self.questoes[0], 'A')
+        self.responder(jogador0, self.questoes[0], 'B')
+        self.assertEqual(self.pontuacoes(PlacarEscopo.Escopo.BANCA, self.banca.id, PlacarEscopo.Periodo.MENSAL), [
+            (jogador0.id, 1, 2, 2), (jogador1.id, 1, 2, 2), (jogador2.id, 3, 1, 1)
+        ])
+        placar = PlacarEscopo.objects.get(user_profile__user=jogador2, escopo=PlacarEscopo.Escopo.BANCA, periodo=PlacarEscopo.Periodo.SEMANAL)
+        with self.assertNumQueries(1):
+            self.assertEqual(obter_posicao_placar_escopo(placar), 3)
+
+        incremental = set(PlacarEscopo.objects.values_list('user_profile_id', 'escopo', 'alvo_id', 'periodo', 'inicio_periodo', 'acertos', 'respostas'))
+        self.assertEqual(reconstruir_placares_escopo(), 12)
+        self.assertEqual(set(PlacarEscopo.objects.values_list('user_profile_id', 'escopo', 'alvo_id', 'periodo', 'inicio_periodo', 'acertos', 'respostas')), incremental)
+
+        client = Client()
+        client.login(username=jogador2.username, password='password123')
+        response = client.get(reverse('gamificacao:ranking_escopo'), {'escopo': 'banca', 'periodo': 'mensal'})
+        self.assertEqual(response.context['alvo'], self.banca)
+        self.assertEqual(response.context['posicao_usuario_logado'].posicao, 3)
+
+    def test_virada_remove_periodos_encerrados(self):
+        self.responder(self.usuarios[0], self.questoes[0], 'A')
+        PlacarEscopo.objects.filter(periodo=PlacarEscopo.Periodo.SEMANAL).update(inicio_periodo=F('inicio_periodo') - timedelta(days=7))
+        self.assertEqual(executar_virada_diaria()['placares_escopo_removidos'], 2)
+        self.assertFalse(PlacarEscopo.objects.filter(periodo=PlacarEscopo.Periodo.SEMANAL).exists())
@@ -7,6 +7,7 @@ app_name = 'gamificacao'
 urlpatterns = [
     # URL principal da página de Ranking
     path('ranking/', views.ranking, name='ranking'),
+    path('ranking/por-escopo/', views.ranking_escopo, name='ranking_escopo'),
     path('loja/', views.loja, name='loja'),
     path('api/comprar-item/', views.comprar_item_ajax, name='comprar_item'),
     path('api/resgatar-recompensa/', views.resgatar_recompensa_ajax, name='resgatar_recompensa'),
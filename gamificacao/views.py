@@ -15,21 +15,36 @@ from django.db.models import Max
 
 # Utils e Services
 from questoes.utils import paginar_itens
-from .services import verificar_e_gerar_rankings
+from .services import (
+    debitar_moedas, obter_top_placar_geral, obter_posicao_placar_geral,
+    obter_top_placar_escopo, obter_posicao_placar_escopo, inicio_periodo_placar,
+    consultar_catalogo_loja, ORDENACOES_LOJA
+)
 
 # Modelos
 from usuarios.models import UserProfile
+from questoes.models import Disciplina, Banca
 from .models import (
     RankingSemanal, RankingMensal, Campanha, Avatar, Borda, Banner,
     RecompensaPendente,
     AvatarUsuario, BordaUsuario, BannerUsuario, RecompensaUsuario, 
-    VariavelDoJogo 
+    VariavelDoJogo, PlacarGeral, PlacarEscopo, LancamentoGamificacao
 )
 
 
 # gamificacao/views.py
-from django.db.models.functions import Rank, DenseRank
 from django.urls import reverse
+
+TAMANHO_TOP_RANKING = 10
+
+def _perfil_do_placar(placar):
+    """Adapta uma linha do PlacarGeral para o formato esperado pelo template (UserProfile anotado)."""
+    user_profile = placar.user_profile
+    user_profile.rank = placar.posicao
+    user_profile.total_acertos_geral = placar.acertos
+    user_profile.total_respostas_geral = placar.respostas
+    return user_profile
+
 @login_required
 def ranking(request):
     """
@@ -37,16 +52,19 @@ def ranking(request):
     incluindo XP e Moedas, e uma mensagem de parabéns para os vencedores.
     
     MELHORIAS IMPLEMENTADAS:
-    - Usa DenseRank para evitar saltos na classificação em caso de empates.
+    - Todas as abas usam a mesma regra de posição (RANK): empatados dividem a posição e a
+      seguinte salta os empatados (1, 1, 3). Os rankings periódicos já vêm gravados assim.
+    - O Ranking Geral é lido do placar materializado (PlacarGeral), sem agregar respostas; nele a
+      posição é 1 + usuários estritamente acima, uma contagem no índice de pontuação cujo custo
+      cresce com a posição (O(rank)).
     - Exibe apenas o TOP 10 e, separadamente, a posição do usuário logado se ele estiver fora do TOP 10.
     - Critérios de desempate foram aprimorados e clarificados.
     - Carrega avatares e bordas dos usuários para uma UI mais rica.
     - Adiciona um "Pódio Anterior" para os rankings semanais e mensais.
+    - Os rankings periódicos são gerados pelo comando `gerar_rankings_periodicos`, não aqui.
     """
-    verificar_e_gerar_rankings()
-
     periodo = request.GET.get('periodo', 'geral')
-    queryset_ranqueado = UserProfile.objects.none()
+    queryset_ranqueado = None
     titulo_ranking = "Ranking Geral"
     
     vencedores_semana_anterior = None
@@ -93,40 +111,29 @@ def ranking(request):
                 ano=data_ref.year, mes=data_ref.month, posicao__lte=2
             ).select_related('user_profile__user', 'user_profile__avatar_equipado', 'user_profile__borda_equipada').order_by('posicao')
             
-    else: # Período 'geral'
-        base_queryset = UserProfile.objects.filter(user__is_active=True, user__is_staff=False, user__respostausuario__isnull=False).select_related(
-            'user', 'streak_data', 'avatar_equipado', 'borda_equipada'
-        ).annotate(
-            total_respostas_geral=Count('user__respostausuario'), 
-            total_acertos_geral=Count('user__respostausuario', filter=Q(user__respostausuario__foi_correta=True))
-        ).distinct()
-        
-        ordenacao = ('-total_acertos_geral', '-streak_data__current_streak', '-total_respostas_geral')
-        
-        queryset_ranqueado = base_queryset.annotate(
-            rank=Window(expression=DenseRank(), order_by=[F(field[1:]).desc() if field.startswith('-') else F(field).asc() for field in ordenacao])
-        ).order_by(*ordenacao)
-
-    # --- LÓGICA ROBUSTA PARA ENCONTRAR O USUÁRIO E MONTAR A LISTA DE EXIBIÇÃO ---
-    full_ranking_list = list(queryset_ranqueado)
+    # --- MONTAGEM DA LISTA DE EXIBIÇÃO: TOP 10 + POSIÇÃO DO USUÁRIO ---
+    # Nunca carrega mais do que TAMANHO_TOP_RANKING + 1 linhas.
     posicao_usuario_logado = None
+    if periodo == 'semanal' or periodo == 'mensal':
+        ranking_para_exibir = list(queryset_ranqueado[:TAMANHO_TOP_RANKING]) if queryset_ranqueado is not None else []
+        usuario_no_top_10 = any(item.user_profile.user_id == request.user.id for item in ranking_para_exibir)
+        if usuario_no_top_10:
+            posicao_usuario_logado = next(item for item in ranking_para_exibir if item.user_profile.user_id == request.user.id)
+        elif queryset_ranqueado is not None:
+            posicao_usuario_logado = queryset_ranqueado.filter(user_profile__user=request.user).first()
+    else: # Período 'geral', servido pelo placar materializado
+        ranking_para_exibir = [_perfil_do_placar(placar) for placar in obter_top_placar_geral(TAMANHO_TOP_RANKING)]
+        usuario_no_top_10 = any(item.user.id == request.user.id for item in ranking_para_exibir)
+        if usuario_no_top_10:
+            posicao_usuario_logado = next(item for item in ranking_para_exibir if item.user.id == request.user.id)
+        else:
+            placar_usuario = PlacarGeral.objects.filter(user_profile__user=request.user, respostas__gt=0).select_related(
+                'user_profile__user', 'user_profile__streak_data', 'user_profile__avatar_equipado', 'user_profile__borda_equipada'
+            ).first()
+            if placar_usuario:
+                placar_usuario.posicao = obter_posicao_placar_geral(placar_usuario)
+                posicao_usuario_logado = _perfil_do_placar(placar_usuario)
 
-    for item in full_ranking_list:
-        user_id_item = item.user.id if periodo == 'geral' else item.user_profile.user.id
-        if user_id_item == request.user.id:
-            posicao_usuario_logado = item
-            break
-
-    ranking_top_10 = full_ranking_list[:10]
-    usuario_no_top_10 = False
-    if posicao_usuario_logado:
-        for item_top_10 in ranking_top_10:
-            user_id_item = item_top_10.user.id if periodo == 'geral' else item_top_10.user_profile.user.id
-            if user_id_item == request.user.id:
-                usuario_no_top_10 = True
-                break
-    
-    ranking_para_exibir = ranking_top_10
     if posicao_usuario_logado and not usuario_no_top_10:
         setattr(posicao_usuario_logado, 'is_user_outside_top_10', True)
         ranking_para_exibir.append(posicao_usuario_logado)
@@ -178,6 +185,58 @@ def ranking(request):
     }
     return render(request, 'gamificacao/ranking.html', context)
 
+@login_required
+def ranking_escopo(request):
+    """
+    Rankings por disciplina e por banca da semana ou do mês correntes. Lidos
+    do placar materializado (PlacarEscopo): TOP 10 e, se o usuário estiver
+    fora dele, a sua posição, sem agregar respostas na requisição.
+    """
+    escopo = request.GET.get('escopo', '').upper()
+    if escopo not in PlacarEscopo.Escopo.values:
+        escopo = PlacarEscopo.Escopo.DISCIPLINA
+    periodo = request.GET.get('periodo', '').upper()
+    if periodo not in PlacarEscopo.Periodo.values:
+        periodo = PlacarEscopo.Periodo.SEMANAL
+    user_profile = request.user.userprofile
+    inicio_periodo = inicio_periodo_placar(periodo)
+
+    alvos = (Disciplina if escopo == PlacarEscopo.Escopo.DISCIPLINA else Banca).objects.order_by('nome')
+    alvo_id = request.GET.get('alvo')
+    alvo_id = int(alvo_id) if alvo_id and alvo_id.isdigit() else None
+    if alvo_id is None:
+        # Sem alvo escolhido: o recorte em que o usuário mais respondeu no período.
+        alvo_id = PlacarEscopo.objects.filter(
+            user_profile=user_profile, escopo=escopo, periodo=periodo, inicio_periodo=inicio_periodo
+        ).order_by('-respostas').values_list('alvo_id', flat=True).first()
+    alvo = alvos.filter(id=alvo_id).first() if alvo_id else alvos.first()
+
+    ranking_list, posicao_usuario_logado = [], None
+    if alvo:
+        ranking_list = obter_top_placar_escopo(escopo, alvo.id, periodo, TAMANHO_TOP_RANKING)
+        posicao_usuario_logado = next((placar for placar in ranking_list if placar.user_profile_id == user_profile.id), None)
+        if posicao_usuario_logado is None:
+            posicao_usuario_logado = PlacarEscopo.objects.filter(
+                user_profile=user_profile, escopo=escopo, alvo_id=alvo.id, periodo=periodo, inicio_periodo=inicio_periodo, respostas__gt=0
+            ).select_related('user_profile__user', 'user_profile__avatar_equipado', 'user_profile__borda_equipada').first()
+            if posicao_usuario_logado:
+                posicao_usuario_logado.posicao = obter_posicao_placar_escopo(posicao_usuario_logado)
+                posicao_usuario_logado.is_user_outside_top_10 = True
+                ranking_list.append(posicao_usuario_logado)
+
+    context = {
+        'ranking_list': ranking_list,
+        'posicao_usuario_logado': posicao_usuario_logado,
+        'escopo_ativo': escopo,
+        'periodo_ativo': periodo,
+        'inicio_periodo': inicio_periodo,
+        'alvos': alvos,
+        'alvo': alvo,
+        'escopos': PlacarEscopo.Escopo.choices,
+        'periodos': PlacarEscopo.Periodo.choices,
+    }
+    return render(request, 'gamificacao/ranking_escopo.html', context)
+
 @login_required
 def loja(request):
     """
@@ -186,80 +245,18 @@ def loja(request):
     que estão bloqueados por requisito de nível.
     """
     user_profile = request.user.userprofile
-    
-    avatares_base = Avatar.objects.filter(tipos_desbloqueio__nome='LOJA', preco_moedas__gt=0).prefetch_related('tipos_desbloqueio')
-    bordas_base = Borda.objects.filter(tipos_desbloqueio__nome='LOJA', preco_moedas__gt=0).prefetch_related('tipos_desbloqueio')
-    banners_base = Banner.objects.filter(tipos_desbloqueio__nome='LOJA', preco_moedas__gt=0).prefetch_related('tipos_desbloqueio')
-
-    all_items_base = list(chain(avatares_base, bordas_base, banners_base))
 
-    itens_visiveis = []
-    nivel_atual = user_profile.gamificacao_data.level
-    
-    avatares_possuidos = set(user_profile.avatares_desbloqueados.values_list('avatar_id', flat=True))
-    bordas_possuidas = set(user_profile.bordas_desbloqueadas.values_list('borda_id', flat=True))
-    banners_possuidas = set(user_profile.banners_desbloqueados.values_list('banner_id', flat=True))
-
-    for item in all_items_base:
-        item.ja_possui = False
-        item.is_locked = False
-        item.unlock_condition = ''
-        
-        item_type_name = item.__class__.__name__
-        if item_type_name == 'Avatar' and item.id in avatares_possuidos:
-            item.ja_possui = True
-        elif item_type_name == 'Borda' and item.id in bordas_possuidas:
-            item.ja_possui = True
-        elif item_type_name == 'Banner' and item.id in banners_possuidas:
-            item.ja_possui = True
-        
-        if not item.ja_possui:
-            tipos_desbloqueio_nomes = {t.nome for t in item.tipos_desbloqueio.all()}
-            if 'NIVEL' in tipos_desbloqueio_nomes:
-                if nivel_atual < item.nivel_necessario:
-                    item.is_locked = True
-                    item.unlock_condition = f"Requer Nível {item.nivel_necessario}"
-
-        itens_visiveis.append(item)
-
-    filtro_tipo = request.GET.get('tipo', '')
-    filtro_raridade = request.GET.get('raridade', '')
-
-    filtered_items = itens_visiveis
-    if filtro_tipo:
-        filtered_items = [item for item in filtered_items if item.__class__.__name__ == filtro_tipo]
-    if filtro_raridade:
-        filtered_items = [item for item in filtered_items if item.raridade == filtro_raridade]
-
-    # =======================================================================
-    # INÍCIO DA CORREÇÃO: Lógica para ordenar por possuídos primeiro
-    # =======================================================================
+    # Filtros, posse, bloqueio por nível e ordenação são resolvidos no banco
+    # sobre o ItemCatalogo; a paginação busca apenas os itens da página atual.
     sort_by = request.GET.get('sort_by', 'preco_asc')
-    sort_options = {
-        'preco_asc': ('Preço (Menor > Maior)', lambda item: (item.ja_possui, item.is_locked, item.preco_moedas)),
-        'preco_desc': ('Preço (Maior > Menor)', lambda item: (item.ja_possui, item.is_locked, -item.preco_moedas)),
-        'nome_asc': ('Nome (A-Z)', lambda item: (item.ja_possui, item.is_locked, item.nome)),
-    }
-    
-    # A ordenação por `item.ja_possui` (False vem antes de True) já coloca os não possuídos primeiro.
-    # O pedido é o contrário: possuídos primeiro. Então, invertemos a lógica.
-    sort_key_lambda = sort_options.get(sort_by, sort_options['preco_asc'])[1]
-    
-    # Nova chave que prioriza `not item.ja_possui`.
-    # Itens possuídos (ja_possui=True) terão a chave (False, ...), vindo primeiro.
-    # Itens não possuídos (ja_possui=False) terão a chave (True, ...), vindo depois.
-    final_sort_key = lambda item: (
-        not item.ja_possui,  # Critério primário: possuídos primeiro
-        sort_key_lambda(item)[1], # Critério secundário: bloqueado por nível
-        sort_key_lambda(item)[2]  # Critério terciário: ordenação do usuário
+    itens = consultar_catalogo_loja(
+        user_profile,
+        tipo=request.GET.get('tipo', ''),
+        raridade=request.GET.get('raridade', ''),
+        ordenacao=sort_by,
     )
-    
-    sorted_items = sorted(filtered_items, key=final_sort_key)
-    # =======================================================================
-    # FIM DA CORREÇÃO
-    # =======================================================================
-    
-    page_obj, page_numbers, per_page = paginar_itens(request, sorted_items, items_per_page=8)
+
+    page_obj, page_numbers, per_page = paginar_itens(request, itens, items_per_page=8)
 
     context = {
         'itens_loja': page_obj,
@@ -269,7 +266,7 @@ def loja(request):
         'saldo_atual': user_profile.gamificacao_data.moedas,
         'raridade_choices': Avatar.Raridade.choices,
         'tipo_choices': [('Avatar', 'Avatares'), ('Borda', 'Bordas'), ('Banner', 'Banners')],
-        'sort_options': {key: val[0] for key, val in sort_options.items()},
+        'sort_options': {key: val[0] for key, val in ORDENACOES_LOJA.items()},
         'active_filters': request.GET,
     }
     return render(request, 'gamificacao/loja.html', context)
@@ -305,7 +302,10 @@ def comprar_item_ajax(request):
         user_profile = request.user.userprofile
         gamificacao_data = user_profile.gamificacao_data
 
-        if gamificacao_data.moedas < item.preco_moedas:
+        # O débito é condicional ao saldo (UPDATE ... WHERE moedas >= preço) e fica
+        # registrado no extrato, que serve de trilha de auditoria da loja.
+        referencia = f"{item_tipo.lower()}:{item.id}"
+        if not debitar_moedas(user_profile, item.preco_moedas, LancamentoGamificacao.Motivo.COMPRA_LOJA, referencia):
             return JsonResponse({'status': 'error', 'message': 'Você não tem moedas suficientes.'}, status=403)
 
         created = False
@@ -317,11 +317,11 @@ def comprar_item_ajax(request):
             _, created = BannerUsuario.objects.get_or_create(user_profile=user_profile, banner=item)
         
         if not created:
+            # Desfaz o débito e o lançamento feitos acima.
+            transaction.set_rollback(True)
             return JsonResponse({'status': 'error', 'message': 'Você já possui este item.'}, status=409)
 
-        # Se a criação foi bem-sucedida, deduz as moedas e registra a transação
-        gamificacao_data.moedas -= item.preco_moedas
-        gamificacao_data.save()
+        gamificacao_data.refresh_from_db(fields=['moedas'])
         
         # Cria um registro da recompensa para fins de log e histórico
         RecompensaUsuario.objects.create(
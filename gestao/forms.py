@@ -10,7 +10,7 @@ from gamificacao.models import (
 from simulados.models import Simulado, StatusSimulado, NivelDificuldade
 from questoes.models import Questao, Disciplina, Banca, Assunto, Instituicao
 import json
-from gamificacao.services import _obter_valor_variavel 
+from gamificacao.services import _obter_valor_variavel, PUBLICOS_CONCESSAO
 import inspect
 from django.db.models import Max
 from django.db.models import Q, Count, Max, Prefetch, Exists, OuterRef, Avg, Sum, F, Window
@@ -38,6 +38,7 @@ class GamificationSettingsForm(forms.ModelForm):
             'teto_xp_diario': forms.NumberInput(attrs={'class': 'form-control'}),
             'cooldown_mesma_questao_horas': forms.NumberInput(attrs={'class': 'form-control'}),
             'tempo_minimo_entre_respostas_segundos': forms.NumberInput(attrs={'class': 'form-control'}),
+            'limite_respostas_por_minuto': forms.NumberInput(attrs={'class': 'form-control'}),
             'cooldown_mesmo_simulado_horas': forms.NumberInput(attrs={'class': 'form-control'}),
             'usar_xp_dinamico_simulado': forms.CheckboxInput(attrs={'class': 'form-check-input', 'role': 'switch'}),
             'xp_dinamico_considera_erros': forms.CheckboxInput(attrs={'class': 'form-check-input', 'role': 'switch'}),
@@ -623,4 +624,33 @@ class ConcessaoManualForm(forms.Form):
         elif tipo == 'AVATAR' and not cleaned_data.get('avatar'): self.add_error('avatar', 'Este campo é obrigatório.')
         elif tipo == 'BORDA' and not cleaned_data.get('borda'): self.add_error('borda', 'Este campo é obrigatório.')
         elif tipo == 'BANNER' and not cleaned_data.get('banner'): self.add_error('banner', 'Este campo é obrigatório.')
-        return cleaned_data
\ No newline at end of file
+        return cleaned_data
+
+
+class ConcessaoEmLoteForm(forms.Form):
+    """ Concessão de recompensas cosméticas para um público inteiro (eventos e pagamentos de campanha). """
+    PUBLICO_CHOICES = list(PUBLICOS_CONCESSAO.items()) + [('LISTA', 'Lista de usuários (nomes de usuário)')]
+
+    publico = forms.ChoiceField(choices=PUBLICO_CHOICES, label="Público", widget=forms.Select(attrs={'class': 'form-select'}))
+    usernames = forms.CharField(label="Nomes de Usuário", required=False, widget=forms.Textarea(attrs={'class': 'form-control', 'rows': 4}), help_text="Um por linha ou separados por vírgula. Usado apenas com o público 'Lista de usuários'.")
+
+    avatares = forms.ModelMultipleChoiceField(queryset=Avatar.objects.all().order_by('nome'), label="Avatares", required=False, widget=forms.SelectMultiple(attrs={'class': 'form-select tom-select-multiple'}))
+    bordas = forms.ModelMultipleChoiceField(queryset=Borda.objects.all().order_by('nome'), label="Bordas", required=False, widget=forms.SelectMultiple(attrs={'class': 'form-select tom-select-multiple'}))
+    banners = forms.ModelMultipleChoiceField(queryset=Banner.objects.all().order_by('nome'), label="Banners", required=False, widget=forms.SelectMultiple(attrs={'class': 'form-select tom-select-multiple'}))
+    campanha = forms.ModelChoiceField(queryset=Campanha.objects.all().order_by('nome'), label="Campanha (opcional)", required=False, widget=forms.Select(attrs={'class': 'form-select'}), help_text="Se informada, a conclusão do ciclo atual da campanha é registrada para cada usuário.")
+
+    justificativa = forms.CharField(label="Justificativa", widget=forms.Textarea(attrs={'class': 'form-control', 'rows': 3}), help_text="Motivo da concessão (ex: prêmio de evento). Também é exibida como origem do prêmio.")
+
+    def clean(self):
+        cleaned_data = super().clean()
+        if not any(cleaned_data.get(campo) for campo in ('avatares', 'bordas', 'banners')):
+            raise forms.ValidationError("Selecione ao menos uma recompensa.")
+        if cleaned_data.get('publico') == 'LISTA':
+            nomes = {nome.strip() for nome in (cleaned_data.get('usernames') or '').replace(',', '\n').splitlines() if nome.strip()}
+            if not nomes:
+                self.add_error('usernames', 'Informe ao menos um nome de usuário.')
+            cleaned_data['usernames'] = nomes
+        return cleaned_data
+
+    def recompensas(self):
+        return [*self.cleaned_data['avatares'], *self.cleaned_data['bordas'], *self.cleaned_data['banners']]
@@ -9,6 +9,7 @@ app_name = 'gestao'
 urlpatterns = [
     # DASHBOARD
     path('', views.dashboard_gestao, name='dashboard'),
+    path('engajamento/', views.painel_engajamento, name='painel_engajamento'),
 
     # GERENCIAMENTO DE QUESTÕES
     path('questoes/', views.listar_questoes_gestao, name='listar_questoes'),
@@ -92,11 +93,13 @@ urlpatterns = [
     # =======================================================================
     path('gamificacao/dashboard/', views.dashboard_gamificacao, name='dashboard_gamificacao'),
     path('gamificacao/conceder-recompensa/', views.conceder_recompensa_manual, name='conceder_recompensa_manual'),
+    path('gamificacao/conceder-recompensa/lote/', views.conceder_recompensa_em_lote, name='conceder_recompensa_em_lote'),
     path('gamificacao/configuracoes/', views.gerenciar_gamificacao_settings, name='gerenciar_gamificacao_settings'),
     path('gamificacao/campanhas/', views.listar_campanhas, name='listar_campanhas'),
     path('gamificacao/campanhas/nova/', views.criar_ou_editar_campanha, name='criar_campanha'),
     path('gamificacao/campanhas/editar/<int:campanha_id>/', views.criar_ou_editar_campanha, name='editar_campanha'),
     path('gamificacao/campanhas/deletar/<int:campanha_id>/', views.deletar_campanha, name='deletar_campanha'),
+    path('gamificacao/campanhas/<int:campanha_id>/previa/', views.previa_elegiveis_campanha, name='previa_elegiveis_campanha'),
 
     # --- URLs de Trilhas ---
     path('gamificacao/trilhas/', views.listar_trilhas, name='listar_trilhas'),
@@ -121,6 +124,7 @@ urlpatterns = [
     # Editar conquista (URL única)
     path('gamificacao/conquistas/editar/<int:conquista_id>/', views.criar_ou_editar_conquista, name='editar_conquista'),
     path('gamificacao/conquistas/deletar/<int:conquista_id>/', views.deletar_conquista, name='deletar_conquista'),
+    path('gamificacao/conquistas/<int:conquista_id>/previa/', views.previa_elegiveis_conquista, name='previa_elegiveis_conquista'),
     
     # --- URLs de Variáveis do Jogo ---
     path('gamificacao/variaveis/', views.listar_variaveis_do_jogo, name='listar_variaveis_do_jogo'),
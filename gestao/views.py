@@ -52,7 +52,10 @@ from gamificacao.models import (
     Conquista, ConquistaUsuario, GamificationSettings, MetaDiariaUsuario, 
     ProfileGamificacao, RankingMensal, RankingSemanal, RecompensaPendente, 
     RecompensaUsuario, TarefaAgendadaLog, TrilhaDeConquistas, SerieDeConquistas,
-    VariavelDoJogo, Condicao
+    VariavelDoJogo, Condicao, LancamentoGamificacao
+)
+from gamificacao.services import (
+    registrar_lancamento, previa_conquista, previa_campanha, conceder_recompensas_em_lote, perfis_do_publico
 )
 
 
@@ -61,7 +64,10 @@ from pratica.models import Comentario, Notificacao
 
 # App 'questoes'
 from questoes.forms import GestaoQuestaoForm, EntidadeSimplesForm, AssuntoForm
-from questoes.models import Questao, Disciplina, Banca, Instituicao, Assunto
+from questoes.models import Questao, Disciplina, Banca, Instituicao, Assunto, CalibracaoQuestao
+from questoes.calibracao import sugerir_dificuldade
+from desempenho.models import EngajamentoDiario, VolumeDisciplinaDiario, RetencaoCoorte
+from desempenho.engajamento import DIAS_ENGAJAMENTO, SEMANAS_COORTE
 from questoes.utils import (
     paginar_itens, filtrar_e_paginar_questoes, filtrar_e_paginar_lixeira, 
     filtrar_e_paginar_questoes_com_prefixo
@@ -71,6 +77,7 @@ from questoes.utils import (
 from simulados.models import Simulado, StatusSimulado, NivelDificuldade
 
 # App 'usuarios'
+from usuarios.models import UserProfile
 from usuarios.utils import enviar_email_com_template
 
 # -----------------------------------------------------------------------
@@ -79,7 +86,7 @@ from usuarios.utils import enviar_email_com_template
 from .forms import (
     TrilhaDeConquistasForm, ConquistaForm, CondicaoForm, VariavelDoJogoForm,
     AvatarForm, BordaForm, BannerForm, CampanhaForm, 
-    GamificationSettingsForm, ConcessaoManualForm,
+    GamificationSettingsForm, ConcessaoManualForm, ConcessaoEmLoteForm,
     SerieDeConquistasForm, BaseCondicaoFormSet,
     
     # Formulários de Simulados
@@ -160,6 +167,51 @@ def dashboard_gestao(request):
     return render(request, 'gestao/dashboard.html', context)
 
 
+@user_passes_test(is_staff_member)
+@login_required
+def painel_engajamento(request):
+    """
+    Painel de engajamento: usuários ativos (DAU/WAU/MAU), respostas por dia,
+    volume por disciplina e retenção por coorte de cadastro. Lê apenas as
+    tabelas-resumo gravadas pelo comando noturno `calcular_engajamento`.
+    """
+    dias = list(EngajamentoDiario.objects.order_by('-data')[:DIAS_ENGAJAMENTO])[::-1]
+    ultimo_dia = dias[-1] if dias else None
+
+    volume_disciplinas = []
+    if ultimo_dia:
+        volume_disciplinas = VolumeDisciplinaDiario.objects.filter(data__gt=ultimo_dia.data - timedelta(days=30)).values(
+            'disciplina__nome'
+        ).annotate(total_respostas=Sum('respostas'), total_acertos=Sum('acertos')).order_by('-total_respostas')
+
+    retencao = []
+    ultima_coorte = RetencaoCoorte.objects.aggregate(ultima=Max('coorte'))['ultima']
+    if ultima_coorte:
+        for celula in RetencaoCoorte.objects.filter(coorte__gt=ultima_coorte - timedelta(weeks=SEMANAS_COORTE)):
+            if not retencao or retencao[-1]['coorte'] != celula.coorte:
+                retencao.append({'coorte': celula.coorte, 'tamanho': celula.tamanho_coorte, 'semanas': []})
+            percentual = celula.ativos * 100 / celula.tamanho_coorte if celula.tamanho_coorte else None
+            # A intensidade da cor da célula acompanha a retenção (mapa de calor).
+            opacidade = f'{percentual / 100:.2f}' if percentual is not None else None
+            retencao[-1]['semanas'].append({'percentual': percentual, 'opacidade': opacidade})
+
+    context = {
+        'ultimo_dia': ultimo_dia,
+        'fator_fixacao': ultimo_dia.usuarios_ativos * 100 / ultimo_dia.ativos_30_dias if ultimo_dia and ultimo_dia.ativos_30_dias else None,
+        'serie_engajamento': {
+            'datas': [dia.data.strftime('%d/%m') for dia in dias],
+            'dau': [dia.usuarios_ativos for dia in dias],
+            'wau': [dia.ativos_7_dias for dia in dias],
+            'mau': [dia.ativos_30_dias for dia in dias],
+            'respostas': [dia.respostas for dia in dias],
+        },
+        'volume_disciplinas': volume_disciplinas,
+        'retencao': retencao,
+        'semanas_retencao': range(SEMANAS_COORTE),
+    }
+    return render(request, 'gestao/painel_engajamento.html', context)
+
+
 
 # =======================================================================
 # BLOKO 2: GERENCIAMENTO DE QUESTÕES (CRUD E LIXEIRA)
@@ -172,7 +224,11 @@ def listar_questoes_gestao(request):
     Lista, filtra e ordena todas as questões ativas (não deletadas).
     Fornece a interface principal para gerenciamento de questões.
     """
-    lista_questoes = Questao.objects.all() # O manager padrão já filtra is_deleted=False
+    lista_questoes = Questao.objects.select_related('calibracao') # O manager padrão já filtra is_deleted=False
+    # Itens marcados pela calibração (ex.: gabarito provavelmente errado)
+    apenas_suspeitas = request.GET.get('suspeitas') == '1'
+    if apenas_suspeitas:
+        lista_questoes = lista_questoes.filter(calibracao__suspeita=True)
     sort_by = request.GET.get('sort_by', '-id')
     sort_options = {
         '-id': 'Mais Recentes', 'id': 'Mais Antigas',
@@ -199,6 +255,8 @@ def listar_questoes_gestao(request):
         'entidade_simples_form': EntidadeSimplesForm(),
         'assunto_form': AssuntoForm(),
         'lixeira_count': lixeira_count,
+        'apenas_suspeitas': apenas_suspeitas,
+        'suspeitas_count': CalibracaoQuestao.objects.filter(suspeita=True, questao__is_deleted=False).count(),
     })
     
     return render(request, 'gestao/listar_questoes.html', context)
@@ -2065,7 +2123,10 @@ def editar_simulado_meta_ajax(request, simulado_id):
     
     # Se a requisição for GET
     form = SimuladoMetaForm(instance=simulado)
-    form_html = render_to_string('gestao/includes/_form_simulado_meta.html', {'form': form}, request=request)
+    contexto_form = {'form': form, 'sugestao_dificuldade': sugerir_dificuldade(simulado.questoes.all())}
+    if contexto_form['sugestao_dificuldade']:
+        contexto_form['sugestao_dificuldade']['nivel_display'] = NivelDificuldade(contexto_form['sugestao_dificuldade']['nivel']).label
+    form_html = render_to_string('gestao/includes/_form_simulado_meta.html', contexto_form, request=request)
     
     return JsonResponse({'status': 'success', 'form_html': form_html})
 
@@ -2215,6 +2276,17 @@ from django.forms import inlineformset_factory # <-- ADICIONE ESTA IMPORTAÇÃO
 
 # gestao/views.py
 
+@user_passes_test(is_staff_member)
+@login_required
+def previa_elegiveis_conquista(request, conquista_id):
+    """
+    Retorna (JSON) quantos usuários já cumprem as condições e os pré-requisitos
+    da conquista e a receberiam num backfill (`aplicar_regras_em_lote`).
+    """
+    conquista = get_object_or_404(Conquista, id=conquista_id)
+    return JsonResponse({'status': 'success', **previa_conquista(conquista)})
+
+
 @user_passes_test(is_staff_member)
 @login_required
 @transaction.atomic
@@ -2877,6 +2949,16 @@ def listar_campanhas(request):
     return render(request, 'gestao/listar_regras_recompensa.html', context)
 
 
+@user_passes_test(is_staff_member)
+@login_required
+def previa_elegiveis_campanha(request, campanha_id):
+    """
+    Retorna (JSON) quantos usuários receberiam a campanha agora, avaliando as
+    condições dinâmicas de cada grupo sobre toda a base em lote.
+    """
+    campanha = get_object_or_404(Campanha, id=campanha_id)
+    return JsonResponse({'status': 'success', **previa_campanha(campanha)})
+
 @user_passes_test(is_staff_member)
 @login_required
 @transaction.atomic
@@ -3080,7 +3162,6 @@ def conceder_recompensa_manual(request):
             tipo = form.cleaned_data['tipo_recompensa']
             justificativa = form.cleaned_data['justificativa']
             user_profile = usuario.userprofile
-            gamificacao_data = user_profile.gamificacao_data
             
             detalhes_log = {
                 'usuario_alvo': usuario.username,
@@ -3090,8 +3171,10 @@ def conceder_recompensa_manual(request):
 
             if tipo == 'MOEDAS':
                 quantidade = form.cleaned_data['quantidade_moedas']
-                gamificacao_data.moedas += quantidade
-                gamificacao_data.save(update_fields=['moedas'])
+                registrar_lancamento(
+                    user_profile, LancamentoGamificacao.Motivo.CONCESSAO_MANUAL,
+                    delta_moedas=quantidade, referencia=f"staff:{request.user.id}"
+                )
                 detalhes_log['quantidade'] = quantidade
                 messages.success(request, f"{quantidade} moedas concedidas a {usuario.username} com sucesso.")
             
@@ -3129,6 +3212,50 @@ def conceder_recompensa_manual(request):
     }
     return render(request, 'gestao/conceder_recompensa_manual.html', context)
 
+@user_passes_test(is_staff_member)
+@login_required
+def conceder_recompensa_em_lote(request):
+    """ View para o admin conceder recompensas cosméticas a um público inteiro de uma vez. """
+    if request.method == 'POST':
+        form = ConcessaoEmLoteForm(request.POST)
+        if form.is_valid():
+            publico = form.cleaned_data['publico']
+            justificativa = form.cleaned_data['justificativa']
+            campanha = form.cleaned_data['campanha']
+            recompensas = form.recompensas()
+
+            if publico == 'LISTA':
+                perfis_ids = UserProfile.objects.filter(user__username__in=form.cleaned_data['usernames']).values_list('id', flat=True)
+            else:
+                perfis_ids = perfis_do_publico(publico)
+
+            resumo = conceder_recompensas_em_lote(list(perfis_ids), recompensas, f"Concedido por administrador: {justificativa}", campanha=campanha)
+
+            criar_log(
+                ator=request.user,
+                acao=LogAtividade.Acao.RECOMPENSA_CONCEDIDA_MANUALMENTE,
+                detalhes={
+                    'em_lote': True, 'publico': publico, 'justificativa': justificativa,
+                    'recompensas': [r.nome for r in recompensas], 'campanha': campanha.nome if campanha else None,
+                    **resumo,
+                }
+            )
+            messages.success(
+                request,
+                f"{resumo['recompensas_pendentes']} recompensas enviadas para {resumo['usuarios']} usuários "
+                f"({resumo['ja_existentes']} já estavam na caixa de recompensas)."
+            )
+            return redirect('gestao:conceder_recompensa_em_lote')
+    else:
+        form = ConcessaoEmLoteForm()
+
+    context = {
+        'form': form,
+        'active_tab': 'concessao_lote',
+        'titulo': 'Conceder Recompensas em Lote'
+    }
+    return render(request, 'gestao/conceder_recompensa_em_lote.html', context)
+
 @user_passes_test(is_staff_member)
 @login_required
 def listar_trilhas(request):
@@ -2,7 +2,7 @@
 from django.contrib import admin
 from django.urls import reverse
 from django.utils.html import format_html
-from .models import RespostaUsuario, Comentario, FiltroSalvo, Notificacao
+from .models import RespostaUsuario, EventoResposta, RevisaoEspacada, Comentario, FiltroSalvo, Notificacao
 
 @admin.register(RespostaUsuario)
 class RespostaUsuarioAdmin(admin.ModelAdmin):
@@ -18,6 +18,27 @@ class RespostaUsuarioAdmin(admin.ModelAdmin):
             return format_html('<a href="{}">{}</a>', url, obj.questao.codigo)
         return "N/A"
 
+@admin.register(EventoResposta)
+class EventoRespostaAdmin(admin.ModelAdmin):
+    list_display = ('usuario', 'questao_id', 'alternativa', 'correta', 'origem', 'registrado_em')
+    list_filter = ('origem', 'correta')
+    search_fields = ('usuario__username',)
+    raw_id_fields = ('usuario', 'questao',)
+    date_hierarchy = 'registrado_em'
+
+    # Histórico somente de inserção.
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+@admin.register(RevisaoEspacada)
+class RevisaoEspacadaAdmin(admin.ModelAdmin):
+    list_display = ('usuario', 'questao_id', 'facilidade', 'intervalo_dias', 'repeticoes', 'proxima_revisao')
+    search_fields = ('usuario__username',)
+    raw_id_fields = ('usuario', 'questao',)
+
 @admin.register(Comentario)
 class ComentarioAdmin(admin.ModelAdmin):
     list_display = ('usuario', 'get_questao_link', 'short_content', 'data_criacao', 'parent')
@@ -0,0 +1,86 @@
+# pratica/eventos.py
+
+from datetime import timedelta
+
+from django.utils import timezone
+
+from desempenho.services import registrar_eventos_na_serie
+from .models import EventoResposta
+
+# =======================================================================
+# ESCRITA EM LOTE DO HISTÓRICO DE RESPOSTAS
+# =======================================================================
+TAMANHO_LOTE_EVENTOS = 2000
+
+class EscritorDeEventos:
+    """
+    Acumula eventos de resposta e os grava com bulk_create, em lotes de
+    `tamanho_lote`, somando cada lote na série diária por disciplina do
+    desempenho. Use como context manager: o que sobrar é gravado na saída
+    (e descartado se o bloco terminar com exceção).
+
+        with EscritorDeEventos() as escritor:
+            for resposta in respostas:
+                escritor.adicionar(usuario_id, questao_id, alternativa, correta, EventoResposta.Origem.SIMULADO)
+    """
+    def __init__(self, tamanho_lote=TAMANHO_LOTE_EVENTOS):
+        self.tamanho_lote = tamanho_lote
+        self.pendentes = []
+        self.disciplinas = {}
+        self.gravados = 0
+
+    def adicionar(self, usuario_id, questao_id, alternativa, correta, origem, registrado_em=None, disciplina_id=None):
+        if disciplina_id is not None:
+            self.disciplinas[questao_id] = disciplina_id
+        self.pendentes.append(EventoResposta(
+            usuario_id=usuario_id, questao_id=questao_id, alternativa=alternativa or '',
+            correta=bool(correta), origem=origem, registrado_em=registrado_em or timezone.now(),
+        ))
+        if len(self.pendentes) >= self.tamanho_lote:
+            self.descarregar()
+
+    def descarregar(self):
+        if self.pendentes:
+            EventoResposta.objects.bulk_create(self.pendentes)
+            registrar_eventos_na_serie(self.pendentes, self.disciplinas)
+            self.gravados += len(self.pendentes)
+            self.pendentes = []
+        return self.gravados
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, tipo_excecao, excecao, traceback):
+        if tipo_excecao is None:
+            self.descarregar()
+        else:
+            self.pendentes = []
+        return False
+
+def registrar_evento_resposta(usuario_id, questao, alternativa, correta, origem=EventoResposta.Origem.PRATICA):
+    """ Grava um único evento (uma resposta avulsa na prática). """
+    with EscritorDeEventos() as escritor:
+        escritor.adicionar(usuario_id, questao.id, alternativa, correta, origem, disciplina_id=questao.disciplina_id)
+
+# =======================================================================
+# RETENÇÃO
+# =======================================================================
+# Rankings fechados ficam gravados em RankingSemanal/RankingMensal e o
+# estado atual em RespostaUsuario/DesempenhoDiario, então o histórico bruto
+# só precisa cobrir o ano corrente de análises.
+MESES_DE_EVENTOS_MANTIDOS = 13
+TAMANHO_LOTE_REMOCAO_EVENTOS = 10000
+
+def compactar_eventos_resposta(meses=MESES_DE_EVENTOS_MANTIDOS, agora=None, tamanho_lote=TAMANHO_LOTE_REMOCAO_EVENTOS):
+    """
+    Remove os eventos mais antigos que `meses` meses, em lotes por faixa de id
+    (os ids crescem com o tempo), para não segurar um DELETE longo. Retorna o
+    número de eventos removidos.
+    """
+    limite = (agora or timezone.now()) - timedelta(days=30 * meses)
+    removidos = 0
+    while True:
+        ids = list(EventoResposta.objects.filter(registrado_em__lt=limite).order_by('id').values_list('id', flat=True)[:tamanho_lote])
+        if not ids:
+            return removidos
+        removidos += EventoResposta.objects.filter(id__gte=ids[0], id__lte=ids[-1], registrado_em__lt=limite).delete()[0]
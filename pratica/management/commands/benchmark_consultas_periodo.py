@@ -0,0 +1,120 @@
+# pratica/management/commands/benchmark_consultas_periodo.py
+
+import time
+from datetime import timedelta, timezone as dt_timezone
+from django.core.management.base import BaseCommand
+from django.db import connection
+
+from pratica.utils import hoje_local, intervalo_de_datas, inicio_do_periodo
+
+TABELA = 'bench_respostausuario'
+
+
+class Command(BaseCommand):
+    help = (
+        'Cria uma tabela sintética no formato de RespostaUsuario (padrão: 10 milhões de linhas), '
+        'com os índices (usuario, data_resposta) e (data_resposta), e compara os planos de execução '
+        'das consultas por período usando cast para data (__date) e intervalos semiabertos de timestamp.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--linhas', type=int, default=10_000_000, help='Quantidade de respostas sintéticas.')
+        parser.add_argument('--usuarios', type=int, default=100_000, help='Quantidade de usuários distintos.')
+        parser.add_argument('--dias', type=int, default=365, help='Janela de dias das respostas geradas.')
+        parser.add_argument('--manter', action='store_true', help='Não remove a tabela sintética ao final.')
+
+    def handle(self, *args, **options):
+        self.postgres = connection.vendor == 'postgresql'
+        self.stdout.write(self.style.NOTICE(f"Gerando {options['linhas']} respostas sintéticas ({connection.vendor})..."))
+        inicio = time.perf_counter()
+        with connection.cursor() as cursor:
+            self._criar_tabela(cursor, options)
+            self.stdout.write(self.style.SUCCESS(f'Tabela {TABELA} criada em {time.perf_counter() - inicio:.1f}s.'))
+
+            hoje = hoje_local()
+            semana_passada = hoje - timedelta(days=7)
+            inicio_semana = semana_passada - timedelta(days=semana_passada.weekday())
+            fim_semana = inicio_semana + timedelta(days=6)
+            inicio_mes = inicio_do_periodo('mes', hoje)
+            usuario_id = options['usuarios'] // 2
+
+            cenarios = [
+                ('Ranking semanal (agregação global por período)',
+                 f"SELECT usuario_id, COUNT(*) FROM {TABELA} WHERE {self._data('data_resposta')} >= %s AND {self._data('data_resposta')} <= %s GROUP BY usuario_id",
+                 [inicio_semana, fim_semana],
+                 f"SELECT usuario_id, COUNT(*) FROM {TABELA} WHERE data_resposta >= %s AND data_resposta < %s GROUP BY usuario_id",
+                 self._intervalo(inicio_semana, fim_semana)),
+                ('Dashboard / acertos no mês (um usuário)',
+                 f"SELECT COUNT(*) FROM {TABELA} WHERE usuario_id = %s AND foi_correta AND {self._data('data_resposta')} >= %s",
+                 [usuario_id, inicio_mes],
+                 f"SELECT COUNT(*) FROM {TABELA} WHERE usuario_id = %s AND foi_correta AND data_resposta >= %s",
+                 [usuario_id, self._intervalo(inicio_mes, inicio_mes)[0]]),
+                ('Última resposta do usuário (anti-bot)',
+                 None, None,
+                 f"SELECT data_resposta FROM {TABELA} WHERE usuario_id = %s ORDER BY data_resposta DESC LIMIT 1",
+                 [usuario_id]),
+            ]
+
+            for titulo, sql_antigo, params_antigo, sql_novo, params_novo in cenarios:
+                self.stdout.write(self.style.NOTICE(f'\n=== {titulo} ==='))
+                if sql_antigo:
+                    self._explicar(cursor, 'Com cast para data (__date)', sql_antigo, params_antigo)
+                    self._explicar(cursor, 'Com intervalo semiaberto de timestamp', sql_novo, params_novo)
+                else:
+                    self._explicar(cursor, 'Com o índice (usuario, data_resposta)', sql_novo, params_novo)
+
+            if not options['manter']:
+                cursor.execute(f'DROP TABLE {TABELA}')
+
+    def _criar_tabela(self, cursor, options):
+        cursor.execute(f'DROP TABLE IF EXISTS {TABELA}')
+        if self.postgres:
+            cursor.execute(f"""
+                CREATE UNLOGGED TABLE {TABELA} AS
+                SELECT g AS id,
+                       (random() * %s)::int + 1 AS usuario_id,
+                       random() < 0.6 AS foi_correta,
+                       now() - random() * (%s * interval '1 day') AS data_resposta
+                FROM generate_series(1, %s) AS g
+            """, [options['usuarios'] - 1, options['dias'], options['linhas']])
+        else:
+            cursor.execute(f"""
+                CREATE TABLE {TABELA} AS
+                WITH RECURSIVE g(id) AS (SELECT 1 UNION ALL SELECT id + 1 FROM g WHERE id < %s)
+                SELECT id,
+                       abs(random()) %% %s + 1 AS usuario_id,
+                       abs(random()) %% 10 < 6 AS foi_correta,
+                       datetime('now', '-' || (abs(random()) %% (%s * 86400)) || ' seconds') AS data_resposta
+                FROM g
+            """, [options['linhas'], options['usuarios'], options['dias']])
+        cursor.execute(f'CREATE INDEX {TABELA}_usuario_data ON {TABELA} (usuario_id, data_resposta)')
+        cursor.execute(f'CREATE INDEX {TABELA}_data ON {TABELA} (data_resposta)')
+        cursor.execute(f'ANALYZE {TABELA}')
+
+    def _data(self, coluna):
+        """Expressão equivalente à que o Django gera para `__date` com USE_TZ."""
+        if self.postgres:
+            return f"({coluna} AT TIME ZONE 'America/Sao_Paulo')::date"
+        return f"date({coluna}, '-3 hours')"
+
+    def _intervalo(self, data_inicio, data_fim):
+        inicio, fim = intervalo_de_datas(data_inicio, data_fim)
+        if self.postgres:
+            return [inicio, fim]
+        # No SQLite os timestamps são texto em UTC.
+        return [t.astimezone(dt_timezone.utc).strftime('%Y-%m-%d %H:%M:%S') for t in (inicio, fim)]
+
+    def _explicar(self, cursor, rotulo, sql, params):
+        self.stdout.write(self.style.WARNING(f'-- {rotulo}'))
+        if self.postgres:
+            cursor.execute(f'EXPLAIN (ANALYZE, BUFFERS) {sql}', params)
+            for (linha,) in cursor.fetchall():
+                self.stdout.write(f'   {linha}')
+            return
+        cursor.execute(f'EXPLAIN QUERY PLAN {sql}', params)
+        for linha in cursor.fetchall():
+            self.stdout.write(f'   {linha[-1]}')
+        inicio = time.perf_counter()
+        cursor.execute(sql, params)
+        cursor.fetchall()
+        self.stdout.write(f'   Tempo de execução: {(time.perf_counter() - inicio) * 1000:.1f} ms')
@@ -0,0 +1,24 @@
+# Generated by Django 5.2.5 on 2026-10-19 13:03
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pratica', '0001_initial'),
+        ('questoes', '0001_initial'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='respostausuario',
+            index=models.Index(fields=['usuario', 'data_resposta'], name='resposta_usuario_data_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='respostausuario',
+            index=models.Index(fields=['data_resposta'], name='resposta_data_idx'),
+        ),
+    ]
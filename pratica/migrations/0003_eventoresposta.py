@@ -0,0 +1,69 @@
+# Generated by Django 5.2.5 on 2026-10-19 13:43
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+
+def criar_indice_brin(apps, schema_editor):
+    # BRIN: índice minúsculo para uma coluna que cresce junto com a tabela.
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute(
+            'CREATE INDEX IF NOT EXISTS evento_registrado_em_brin ON pratica_eventoresposta USING brin (registrado_em)'
+        )
+
+
+def remover_indice_brin(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute('DROP INDEX IF EXISTS evento_registrado_em_brin')
+
+
+def popular_eventos(apps, schema_editor):
+    # Sem histórico anterior, cada resposta atual vira o primeiro evento.
+    RespostaUsuario = apps.get_model('pratica', 'RespostaUsuario')
+    EventoResposta = apps.get_model('pratica', 'EventoResposta')
+    respostas = RespostaUsuario.objects.order_by('data_resposta').values_list(
+        'usuario_id', 'questao_id', 'alternativa_selecionada', 'foi_correta', 'data_resposta'
+    )
+    lote = []
+    for usuario_id, questao_id, alternativa, correta, data in respostas.iterator(chunk_size=5000):
+        lote.append(EventoResposta(
+            usuario_id=usuario_id, questao_id=questao_id, alternativa=alternativa[:1],
+            correta=correta, origem=1, registrado_em=data,
+        ))
+        if len(lote) >= 5000:
+            EventoResposta.objects.bulk_create(lote)
+            lote = []
+    EventoResposta.objects.bulk_create(lote)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pratica', '0002_respostausuario_resposta_usuario_data_idx_and_more'),
+        ('questoes', '0001_initial'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EventoResposta',
+            fields=[
+                ('id', models.BigAutoField(primary_key=True, serialize=False)),
+                ('alternativa', models.CharField(blank=True, max_length=1)),
+                ('correta', models.BooleanField()),
+                ('origem', models.PositiveSmallIntegerField(choices=[(1, 'Prática'), (2, 'Simulado')], default=1)),
+                ('registrado_em', models.DateTimeField(default=django.utils.timezone.now)),
+                ('questao', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='questoes.questao')),
+                ('usuario', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='eventos_resposta', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Evento de Resposta',
+                'verbose_name_plural': 'Eventos de Resposta',
+                'indexes': [models.Index(fields=['usuario', 'registrado_em'], name='evento_usuario_data_idx')],
+            },
+        ),
+        migrations.RunPython(criar_indice_brin, remover_indice_brin),
+        migrations.RunPython(popular_eventos, migrations.RunPython.noop),
+    ]
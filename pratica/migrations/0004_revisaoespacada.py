@@ -0,0 +1,59 @@
+# Generated by Django 5.2.5 on 2026-10-19 13:51
+
+import django.db.models.deletion
+from django.conf import settings
+from datetime import timedelta
+
+from django.db import migrations, models
+
+
+def agendar_respostas_existentes(apps, schema_editor):
+    # Primeira revisão do SM-2 para cada resposta atual: vence um dia depois
+    # dela; o erro já reduz a facilidade inicial (2.5 -> 1.96).
+    RespostaUsuario = apps.get_model('pratica', 'RespostaUsuario')
+    RevisaoEspacada = apps.get_model('pratica', 'RevisaoEspacada')
+    lote = []
+    for usuario_id, questao_id, correta, data in RespostaUsuario.objects.values_list(
+        'usuario_id', 'questao_id', 'foi_correta', 'data_resposta'
+    ).iterator(chunk_size=5000):
+        lote.append(RevisaoEspacada(
+            usuario_id=usuario_id, questao_id=questao_id, facilidade=2.5 if correta else 1.96,
+            intervalo_dias=1, repeticoes=1 if correta else 0,
+            proxima_revisao=data + timedelta(days=1), ultima_revisao=data,
+        ))
+        if len(lote) >= 5000:
+            RevisaoEspacada.objects.bulk_create(lote)
+            lote = []
+    RevisaoEspacada.objects.bulk_create(lote)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pratica', '0003_eventoresposta'),
+        ('questoes', '0001_initial'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RevisaoEspacada',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('facilidade', models.FloatField(default=2.5, help_text='Fator de facilidade do SM-2 (mínimo 1.3).')),
+                ('intervalo_dias', models.PositiveIntegerField(default=0)),
+                ('repeticoes', models.PositiveSmallIntegerField(default=0, help_text='Acertos seguidos desde o último erro.')),
+                ('proxima_revisao', models.DateTimeField()),
+                ('ultima_revisao', models.DateTimeField()),
+                ('questao', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='questoes.questao')),
+                ('usuario', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='revisoes', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Revisão Espaçada',
+                'verbose_name_plural': 'Revisões Espaçadas',
+                'indexes': [models.Index(fields=['usuario', 'proxima_revisao'], name='revisao_usuario_proxima_idx')],
+                'unique_together': {('usuario', 'questao')},
+            },
+        ),
+        migrations.RunPython(agendar_respostas_existentes, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,20 @@
+# Generated by Django 5.2.5 on 2026-10-19 14:38
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pratica', '0004_revisaoespacada'),
+        ('questoes', '0002_calibracaoquestao'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='eventoresposta',
+            index=models.Index(fields=['questao'], name='evento_questao_idx'),
+        ),
+    ]
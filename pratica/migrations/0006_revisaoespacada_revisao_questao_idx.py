@@ -0,0 +1,20 @@
+# Generated by Django 5.2.5 on 2026-10-19 14:40
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pratica', '0005_eventoresposta_evento_questao_idx'),
+        ('questoes', '0002_calibracaoquestao'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='revisaoespacada',
+            index=models.Index(fields=['questao'], name='revisao_questao_idx'),
+        ),
+    ]
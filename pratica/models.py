@@ -2,6 +2,7 @@
 
 from django.db import models
 from django.contrib.auth.models import User
+from django.utils import timezone
 from questoes.models import Questao
 from django.db.models import Q
 from django.contrib.contenttypes.models import ContentType
@@ -30,11 +31,82 @@ class RespostaUsuario(models.Model):
 
     class Meta:
         unique_together = ('usuario', 'questao')
+        # Índices para consultas por período (intervalos de data_resposta):
+        # por usuário (dashboard, variáveis de conquista, última resposta) e
+        # globais (geração dos rankings semanal/mensal).
+        indexes = [
+            models.Index(fields=['usuario', 'data_resposta'], name='resposta_usuario_data_idx'),
+            models.Index(fields=['data_resposta'], name='resposta_data_idx'),
+        ]
 
     def __str__(self):
         status = "Correta" if self.foi_correta else "Incorreta"
         return f"{self.usuario.username} - Questão {self.questao.id} - {status}"
 
+class EventoResposta(models.Model):
+    """
+    Histórico imutável (somente inserção) de todas as respostas. RespostaUsuario
+    continua sendo o estado atual (uma linha por usuário e questão); rankings e
+    análises por período leem daqui, onde o horário de cada resposta não é
+    sobrescrito. Gravado em lote por `pratica.eventos.EscritorDeEventos`.
+    """
+    class Origem(models.IntegerChoices):
+        PRATICA = 1, 'Prática'
+        SIMULADO = 2, 'Simulado'
+
+    id = models.BigAutoField(primary_key=True)
+    # Colunas estreitas: o índice (usuario, registrado_em) já cobre o FK de usuário;
+    # o de questão tem índice próprio (evento_questao_idx), usado pelo CASCADE.
+    usuario = models.ForeignKey(User, on_delete=models.CASCADE, db_index=False, related_name='eventos_resposta')
+    questao = models.ForeignKey(Questao, on_delete=models.CASCADE, db_index=False, related_name='+')
+    alternativa = models.CharField(max_length=1, blank=True)
+    correta = models.BooleanField()
+    origem = models.PositiveSmallIntegerField(choices=Origem.choices, default=Origem.PRATICA)
+    # As linhas chegam em ordem de tempo: no PostgreSQL há também um índice BRIN
+    # em registrado_em (criado na migração) para as varreduras globais por período.
+    registrado_em = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        verbose_name = "Evento de Resposta"
+        verbose_name_plural = "Eventos de Resposta"
+        indexes = [
+            models.Index(fields=['usuario', 'registrado_em'], name='evento_usuario_data_idx'),
+            # Excluir uma questão apaga os eventos dela: sem este índice, uma varredura da tabela inteira.
+            models.Index(fields=['questao'], name='evento_questao_idx'),
+        ]
+
+    def __str__(self):
+        status = "Correta" if self.correta else "Incorreta"
+        return f"{self.usuario_id} - Questão {self.questao_id} - {status} ({self.get_origem_display()})"
+
+class RevisaoEspacada(models.Model):
+    """
+    Agenda de revisão (estilo SM-2) de cada questão respondida pelo usuário.
+    A fila "Revisar hoje" é uma varredura do índice (usuario, proxima_revisao).
+    Atualizada a cada resposta por `pratica.revisao.agendar_revisao`.
+    """
+    # Os índices (usuario, questao) e (usuario, proxima_revisao) já cobrem o FK de
+    # usuário; o de questão tem índice próprio (revisao_questao_idx), usado pelo CASCADE.
+    usuario = models.ForeignKey(User, on_delete=models.CASCADE, db_index=False, related_name='revisoes')
+    questao = models.ForeignKey(Questao, on_delete=models.CASCADE, db_index=False, related_name='+')
+    facilidade = models.FloatField(default=2.5, help_text="Fator de facilidade do SM-2 (mínimo 1.3).")
+    intervalo_dias = models.PositiveIntegerField(default=0)
+    repeticoes = models.PositiveSmallIntegerField(default=0, help_text="Acertos seguidos desde o último erro.")
+    proxima_revisao = models.DateTimeField()
+    ultima_revisao = models.DateTimeField()
+
+    class Meta:
+        unique_together = ('usuario', 'questao')
+        indexes = [
+            models.Index(fields=['usuario', 'proxima_revisao'], name='revisao_usuario_proxima_idx'),
+            models.Index(fields=['questao'], name='revisao_questao_idx'),
+        ]
+        verbose_name = "Revisão Espaçada"
+        verbose_name_plural = "Revisões Espaçadas"
+
+    def __str__(self):
+        return f"{self.usuario_id} - Questão {self.questao_id} em {self.proxima_revisao:%d/%m/%Y}"
+
 class Comentario(models.Model):
     # Relacionamentos
     questao = models.ForeignKey(Questao, related_name='comentarios', on_delete=models.CASCADE)
@@ -0,0 +1,73 @@
+# pratica/revisao.py
+
+from datetime import timedelta
+
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+
+from .models import RevisaoEspacada
+
+# =======================================================================
+# AGENDAMENTO (SM-2)
+# =======================================================================
+# A resposta é binária, então usamos duas notas do SM-2: acerto = 4
+# ("lembrou com esforço") e erro = 1 ("não lembrou").
+NOTA_ACERTO = 4
+NOTA_ERRO = 1
+FACILIDADE_INICIAL = 2.5
+FACILIDADE_MINIMA = 1.3
+TAMANHO_SESSAO_REVISAO = 20
+
+def proximo_estado_sm2(facilidade, intervalo_dias, repeticoes, correta):
+    """ Aplica uma revisão do SM-2 e retorna (facilidade, intervalo_dias, repeticoes). """
+    nota = NOTA_ACERTO if correta else NOTA_ERRO
+    facilidade = max(FACILIDADE_MINIMA, facilidade + 0.1 - (5 - nota) * (0.08 + (5 - nota) * 0.02))
+    if not correta:
+        return facilidade, 1, 0
+    repeticoes += 1
+    if repeticoes == 1:
+        intervalo_dias = 1
+    elif repeticoes == 2:
+        intervalo_dias = 6
+    else:
+        intervalo_dias = round(intervalo_dias * facilidade)
+    return facilidade, intervalo_dias, repeticoes
+
+def agendar_revisao(usuario_id, questao_id, correta, agora=None):
+    """ Atualiza (ou cria) a agenda da questão após uma resposta. """
+    agora = agora or timezone.now()
+    revisao = RevisaoEspacada.objects.filter(usuario_id=usuario_id, questao_id=questao_id).first()
+    if revisao is None:
+        facilidade, intervalo, repeticoes = proximo_estado_sm2(FACILIDADE_INICIAL, 0, 0, correta)
+        try:
+            with transaction.atomic():
+                RevisaoEspacada.objects.create(
+                    usuario_id=usuario_id, questao_id=questao_id, facilidade=facilidade, intervalo_dias=intervalo,
+                    repeticoes=repeticoes, proxima_revisao=agora + timedelta(days=intervalo), ultima_revisao=agora,
+                )
+            return
+        except IntegrityError:
+            # Outra requisição criou a linha ao mesmo tempo: aplica sobre ela.
+            revisao = RevisaoEspacada.objects.get(usuario_id=usuario_id, questao_id=questao_id)
+
+    revisao.facilidade, revisao.intervalo_dias, revisao.repeticoes = proximo_estado_sm2(
+        revisao.facilidade, revisao.intervalo_dias, revisao.repeticoes, correta
+    )
+    revisao.proxima_revisao = agora + timedelta(days=revisao.intervalo_dias)
+    revisao.ultima_revisao = agora
+    revisao.save(update_fields=['facilidade', 'intervalo_dias', 'repeticoes', 'proxima_revisao', 'ultima_revisao'])
+
+# =======================================================================
+# FILA "REVISAR HOJE"
+# =======================================================================
+def revisoes_pendentes(usuario_id, agora=None, limite=TAMANHO_SESSAO_REVISAO):
+    """
+    IDs das próximas questões vencidas, das mais atrasadas para as mais
+    recentes. Uma única varredura do índice (usuario, proxima_revisao).
+    """
+    return list(RevisaoEspacada.objects.filter(
+        usuario_id=usuario_id, proxima_revisao__lte=agora or timezone.now()
+    ).order_by('proxima_revisao').values_list('questao_id', flat=True)[:limite])
+
+def contar_revisoes_pendentes(usuario_id, agora=None):
+    return RevisaoEspacada.objects.filter(usuario_id=usuario_id, proxima_revisao__lte=agora or timezone.now()).count()
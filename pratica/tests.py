@@ -1,3 +1,133 @@
-from django.test import TestCase
+# pratica/tests.py
 
-# Create your tests here.
+from datetime import timedelta
+from io import StringIO
+from django.test import TestCase, Client
+from django.urls import reverse
+from django.contrib.auth.models import User
+from django.core import management
+from django.core.cache import cache
+from django.utils import timezone
+
+from questoes.models import Questao, Disciplina, Assunto, Banca
+from usuarios.models import UserProfile
+from pratica.models import RespostaUsuario, EventoResposta, RevisaoEspacada
+from pratica.eventos import EscritorDeEventos, compactar_eventos_resposta
+from pratica.revisao import agendar_revisao, revisoes_pendentes
+from gamificacao.models import GamificationSettings, RankingSemanal
+from desempenho.models import SerieDiariaDisciplina
+from gamificacao.services import processar_resposta_gamificacao, _janelas_locais
+
+
+class PraticaBaseTestCase(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        """
+        Três usuários e três questões, sem limitador de respostas, para que o
+        pipeline de resposta rode em sequência.
+        """
+        settings = GamificationSettings.load()
+        settings.tempo_minimo_entre_respostas_segundos = 0
+        settings.cooldown_mesma_questao_horas = 0
+        settings.save()
+
+        cls.disciplina = Disciplina.objects.create(nome="Direito de Teste")
+        cls.banca = Banca.objects.create(nome="Banca de Teste")
+        cls.assunto = Assunto.objects.create(disciplina=cls.disciplina, nome="Assunto de Teste")
+        cls.questoes = [
+            Questao.objects.create(
+                disciplina=cls.disciplina, assunto=cls.assunto, banca=cls.banca, ano=2023,
+                enunciado=f"Enunciado {i}", alternativas={'A': '1', 'B': '2'}, gabarito='A'
+            )
+            for i in range(3)
+        ]
+        cls.usuarios = []
+        for i in range(3):
+            user = User.objects.create_user(f'aluno{i}', f'aluno{i}@test.com', 'password123')
+            UserProfile.objects.create(user=user, nome=f'Aluno{i}', sobrenome='Teste')
+            cls.usuarios.append(user)
+
+    def setUp(self):
+        cache.clear()
+        _janelas_locais.clear()
+
+    def responder(self, user, questao, alternativa):
+        with self.captureOnCommitCallbacks(execute=True):
+            return processar_resposta_gamificacao(user, questao, alternativa)
+
+
+class EventoRespostaTestCase(PraticaBaseTestCase):
+
+    def test_historico_nao_e_sobrescrito_e_alimenta_o_ranking(self):
+        jogador0, jogador1, _ = self.usuarios
+        self.responder(jogador0, self.questoes[0], 'A')
+        self.responder(jogador1, self.questoes[0], 'B')
+        EventoResposta.objects.update(registrado_em=timezone.now() - timedelta(days=7))
+        # Reresponder hoje não apaga a resposta da semana passada.
+        self.responder(jogador0, self.questoes[0], 'B')
+        self.assertEqual(EventoResposta.objects.filter(usuario=jogador0).count(), 2)
+        self.assertFalse(RespostaUsuario.objects.get(usuario=jogador0).foi_correta)
+
+        management.call_command('gerar_rankings_periodicos', tipo='semanal', stdout=StringIO())
+        self.assertEqual(
+            list(RankingSemanal.objects.order_by('posicao').values_list('user_profile__user', 'acertos_periodo', 'respostas_periodo')),
+            [(jogador0.id, 1, 1), (jogador1.id, 0, 1)]
+        )
+
+    def test_escritor_grava_em_lote_e_retencao_remove_antigos(self):
+        user = self.usuarios[0]
+        # Por lote: o INSERT dos eventos e o UPDATE da célula da série; o primeiro
+        # lote ainda cria a célula (SAVEPOINT, INSERT, RELEASE).
+        with self.assertNumQueries(7):
+            with EscritorDeEventos(tamanho_lote=2) as escritor:
+                for questao in self.questoes:
+                    escritor.adicionar(user.id, questao.id, 'A', True, EventoResposta.Origem.SIMULADO, disciplina_id=questao.disciplina_id)
+        self.assertEqual(escritor.gravados, 3)
+        self.assertEqual(list(SerieDiariaDisciplina.objects.filter(usuario=user).values_list('respondidas', 'acertos')), [(3, 3)])
+
+        EventoResposta.objects.filter(questao=self.questoes[0]).update(registrado_em=timezone.now() - timedelta(days=500))
+        self.assertEqual(compactar_eventos_resposta(tamanho_lote=1), 1)
+        self.assertEqual(EventoResposta.objects.count(), 2)
+        # A série diária não perde as respostas compactadas.
+        self.assertEqual(SerieDiariaDisciplina.objects.get(usuario=user).respondidas, 3)
+
+
+class RevisaoEspacadaTestCase(PraticaBaseTestCase):
+
+    def test_sm2_espaca_acertos_e_reinicia_no_erro(self):
+        user, questao = self.usuarios[0], self.questoes[0]
+        agora = timezone.now()
+        intervalos = []
+        for dia, correta in [(0, True), (1, True), (7, True), (30, False)]:
+            agendar_revisao(user.id, questao.id, correta, agora=agora + timedelta(days=dia))
+            intervalos.append(RevisaoEspacada.objects.get(usuario=user, questao=questao).intervalo_dias)
+        self.assertEqual(intervalos, [1, 6, 15, 1])
+        self.assertAlmostEqual(RevisaoEspacada.objects.get(usuario=user, questao=questao).facilidade, 1.96)
+
+    def test_fila_revisar_hoje_segue_o_vencimento(self):
+        user = self.usuarios[1]
+        client = Client()
+        client.login(username=user.username, password='password123')
+        url = reverse('pratica:verificar_resposta')
+        # Só a primeira resposta ganha XP: as outras caem no limitador, mas
+        # todas entram na agenda de revisão.
+        settings = GamificationSettings.load()
+        settings.tempo_minimo_entre_respostas_segundos = 30
+        settings.save()
+        motivos = [
+            client.post(url, {'questao_id': questao.id, 'alternativa': alternativa}, content_type='application/json').json()['motivo_bloqueio']
+            for questao, alternativa in zip(self.questoes, 'BAB')
+        ]
+        self.assertEqual(motivos, [None, 'RESPOSTA_RAPIDA', 'RESPOSTA_RAPIDA'])
+        self.assertEqual(RevisaoEspacada.objects.filter(usuario=user).count(), 3)
+        RevisaoEspacada.objects.filter(usuario=user, questao=self.questoes[2]).update(proxima_revisao=timezone.now() - timedelta(days=3))
+        RevisaoEspacada.objects.filter(usuario=user, questao=self.questoes[0]).update(proxima_revisao=timezone.now() - timedelta(hours=1))
+
+        with self.assertNumQueries(1):
+            fila = revisoes_pendentes(user.id)
+        self.assertEqual(fila, [self.questoes[2].id, self.questoes[0].id])
+
+        response = client.get(reverse('pratica:listar_questoes'), {'status': 'revisar_hoje'})
+        self.assertEqual([q.id for q in response.context['questoes']], fila)
+        self.assertEqual(response.context['revisoes_pendentes'], 2)
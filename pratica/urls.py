@@ -11,6 +11,7 @@ app_name = 'pratica'
 urlpatterns = [
     # URL para a página de filtros e lista de questões
     path('', views.listar_questoes, name='listar_questoes'),
+    path('pontos-fracos/', views.praticar_pontos_fracos, name='praticar_pontos_fracos'),
     
     # URLs de API para interações com as questões
     path('verificar-resposta/', views.verificar_resposta, name='verificar_resposta'),
@@ -0,0 +1,53 @@
+# pratica/utils.py
+
+from datetime import datetime, time, timedelta
+from django.utils import timezone
+
+
+# =======================================================================
+# INTERVALOS DE TEMPO PARA CONSULTAS POR PERÍODO
+# =======================================================================
+# As consultas por período sobre `data_resposta` usam intervalos semiabertos
+# [início, fim) de timestamps, calculados no fuso do projeto (TIME_ZONE =
+# America/Sao_Paulo). Diferente de `data_resposta__date`, que converte cada
+# linha para data e impede o uso de índices, um intervalo de timestamps é
+# resolvido com uma busca no índice (usuario, data_resposta) ou (data_resposta).
+
+def fuso_local():
+    """Fuso horário usado para definir onde começa e termina cada dia."""
+    return timezone.get_default_timezone()
+
+def hoje_local():
+    """Data de hoje no fuso do projeto (e não no fuso do servidor)."""
+    return timezone.localdate(timezone=fuso_local())
+
+def inicio_do_dia(dia):
+    """Instante (aware) em que o dia começa no fuso do projeto."""
+    return datetime.combine(dia, time.min, tzinfo=fuso_local())
+
+def intervalo_de_datas(data_inicio, data_fim):
+    """Intervalo semiaberto [início, fim) que cobre os dias `data_inicio` a `data_fim`, inclusive."""
+    return inicio_do_dia(data_inicio), inicio_do_dia(data_fim + timedelta(days=1))
+
+def filtro_periodo(campo, data_inicio, data_fim=None):
+    """
+    Monta os kwargs de filtro para um período de datas sobre um campo de
+    timestamp. Sem `data_fim`, o intervalo fica aberto à direita.
+    Ex.: RespostaUsuario.objects.filter(**filtro_periodo('data_resposta', inicio, fim))
+    """
+    if data_fim is None:
+        return {f'{campo}__gte': inicio_do_dia(data_inicio)}
+    inicio, fim = intervalo_de_datas(data_inicio, data_fim)
+    return {f'{campo}__gte': inicio, f'{campo}__lt': fim}
+
+def inicio_do_periodo(periodo, referencia=None):
+    """
+    Primeiro dia do período ('hoje', 'semana', 'mes' ou 'ano') que contém a
+    data de referência. Retorna None para períodos desconhecidos (ex.: 'geral').
+    """
+    hoje = referencia or hoje_local()
+    if periodo == 'hoje': return hoje
+    if periodo == 'semana': return hoje - timedelta(days=hoje.weekday())
+    if periodo == 'mes': return hoje.replace(day=1)
+    if periodo == 'ano': return hoje.replace(month=1, day=1)
+    return None
@@ -1,11 +1,14 @@
 # pratica/views.py
-from django.shortcuts import render, get_object_or_404
+from django.shortcuts import render, get_object_or_404, redirect
+from django.contrib import messages
+from django.urls import reverse
+from urllib.parse import urlencode
 from django.contrib.auth.decorators import login_required
 from django.http import JsonResponse
 from django.views.decorators.http import require_POST
 import json
 import markdown
-from django.db.models import Count, Q
+from django.db.models import Count, Q, Case, When
 from django.utils import formats
 from django.utils.timezone import localtime
 from django.db import IntegrityError
@@ -20,6 +23,18 @@ from usuarios.models import UserProfile # Importação correta do UserProfile
 from gamificacao.services import processar_resposta_gamificacao, _avaliar_e_conceder_recompensas
 from questoes.utils import filtrar_e_paginar_questoes
 from gamificacao.models import Campanha
+from desempenho.services import pontos_fracos_do_usuario
+from .revisao import agendar_revisao, revisoes_pendentes, contar_revisoes_pendentes
+
+
+@login_required
+def praticar_pontos_fracos(request):
+    """ Abre a lista de questões filtrada pelos assuntos recomendados ao usuário. """
+    assuntos = pontos_fracos_do_usuario(request.user.id)
+    if not assuntos:
+        messages.info(request, "Suas recomendações de estudo são atualizadas toda noite. Responda algumas questões e volte amanhã.")
+        return redirect('pratica:listar_questoes')
+    return redirect(f"{reverse('pratica:listar_questoes')}?{urlencode([('assunto', a) for a in assuntos])}")
 
 
 @login_required
@@ -49,12 +64,18 @@ def listar_questoes(request):
         lista_questoes = lista_questoes.filter(pk__in=respostas_incorretas_pks)
     elif status == 'favoritas':
         lista_questoes = lista_questoes.filter(pk__in=user_profile.questoes_favoritas.all())
+    elif status == 'revisar_hoje':
+        # Próximo lote de revisões vencidas, na ordem da fila (mais atrasadas primeiro).
+        fila = revisoes_pendentes(user.id)
+        lista_questoes = lista_questoes.filter(pk__in=fila)
+        if fila:
+            lista_questoes = lista_questoes.order_by(Case(*[When(pk=pk, then=posicao) for posicao, pk in enumerate(fila)]))
     # =======================================================================
     # FIM DA CORREÇÃO
     # =======================================================================
 
     # Lógica de Ordenação
-    sort_by = request.GET.get('sort_by', '-id')
+    sort_by = request.GET.get('sort_by', '' if status == 'revisar_hoje' else '-id')
     sort_options = {
         '-id': 'Mais Recentes',
         'id': 'Mais Antigas',
@@ -75,6 +96,7 @@ def listar_questoes(request):
         'instituicoes': Instituicao.objects.all().order_by('nome'),
         'anos': Questao.objects.exclude(ano__isnull=True).values_list('ano', flat=True).distinct().order_by('-ano'),
         'status_param': status,
+        'revisoes_pendentes': contar_revisoes_pendentes(user.id),
         'sort_by': sort_by,
         'sort_options': sort_options,
     })
@@ -101,6 +123,9 @@ def verificar_resposta(request):
             questao=questao, 
             alternativa_selecionada=alternativa_selecionada
         )
+        # A agenda de revisão depende só do acerto: vale mesmo quando o XP da
+        # resposta foi bloqueado (cooldown, limitador ou teto diário).
+        agendar_revisao(request.user.id, questao.id, gamificacao_eventos['correta'])
         
         nova_conquista_data = None
         if gamificacao_eventos.get('nova_conquista'):
@@ -137,6 +137,33 @@ else:
         }
     }
 
+# --- CACHE ---
+# Cooldowns, posse de itens, limitador de respostas e cartões de perfil ficam no
+# cache e são invalidados por qualquer processo (workers web e comandos agendados),
+# então em produção o cache precisa ser compartilhado por todos eles. Com REDIS_URL
+# usamos o Redis; sem ele, uma tabela no próprio PostgreSQL, criada com
+# `python manage.py createcachetable`. Em desenvolvimento basta a memória local.
+if DEBUG:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        }
+    }
+elif os.getenv('REDIS_URL'):
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': os.getenv('REDIS_URL'),
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.db.DatabaseCache',
+            'LOCATION': 'cache_compartilhado',
+        }
+    }
+
 # --- VALIDAÇÃO DE SENHA ---
 AUTH_PASSWORD_VALIDATORS = [
     {'NAME': 'django.contrib.auth.password_validation.UserAttributeSimilarityValidator'},
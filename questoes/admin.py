@@ -1,6 +1,6 @@
 # questoes/admin.py
 from django.contrib import admin
-from .models import Disciplina, Banca, Assunto, Questao, Instituicao
+from .models import Disciplina, Banca, Assunto, Questao, Instituicao, CalibracaoQuestao
 from .forms import BaseQuestaoForm 
 from .widgets import TiptapEditorWidget
 
@@ -37,4 +37,11 @@ class QuestaoAdmin(admin.ModelAdmin):
     def save_model(self, request, obj, form, change):
         if not obj.pk:
             obj.criada_por = request.user
-        super().save_model(request, obj, form, change)
\ No newline at end of file
+        super().save_model(request, obj, form, change)
+
+@admin.register(CalibracaoQuestao)
+class CalibracaoQuestaoAdmin(admin.ModelAdmin):
+    list_display = ('questao', 'respostas', 'facilidade', 'discriminacao', 'alternativa_mais_escolhida', 'suspeita', 'calibrado_em')
+    list_filter = ('suspeita',)
+    search_fields = ('questao__codigo',)
+    raw_id_fields = ('questao',)
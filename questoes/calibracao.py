@@ -0,0 +1,154 @@
+# questoes/calibracao.py
+
+import numpy as np
+from django.db import transaction
+from django.db.models import Avg, Count, Q
+from django.utils import timezone
+
+from pratica.models import RespostaUsuario
+from .models import Questao, CalibracaoQuestao
+
+# =======================================================================
+# CALIBRAÇÃO CLÁSSICA DAS QUESTÕES
+# =======================================================================
+# Para cada questão: facilidade (proporção de acertos) e discriminação
+# ponto-bisserial, isto é, a correlação entre acertar a questão e o
+# desempenho do usuário nas *demais* questões (escore de resto). A matriz
+# usuário x questão é esparsa, então as respostas são lidas em lotes de
+# (usuário, questão, acerto) e acumuladas por questão com np.bincount:
+# a memória depende do número de questões e usuários, não de respostas.
+ALTERNATIVAS = 'ABCDE'
+TAMANHO_LOTE_CALIBRACAO = 100000
+MINIMO_RESPOSTAS_CALIBRACAO = 30
+# Usuários com poucas respostas não têm um escore de resto confiável.
+MINIMO_RESPOSTAS_USUARIO = 5
+LIMITE_DISCRIMINACAO_NEGATIVA = -0.1
+
+def _somas_por_lote(respostas, usuarios, questoes, acumulado):
+    """ Soma um lote de respostas nos acumuladores por questão (tudo vetorizado). """
+    usuario_ids, questao_ids, acertos, alternativas = (np.array(coluna) for coluna in zip(*respostas))
+    q = np.searchsorted(questoes['ids'], questao_ids)
+    conhecida = (q < len(questoes['ids'])) & (questoes['ids'][np.minimum(q, len(questoes['ids']) - 1)] == questao_ids)
+    u = np.searchsorted(usuarios['ids'], usuario_ids)
+    q, u, x, alternativas = q[conhecida], u[conhecida], acertos[conhecida].astype(float), alternativas[conhecida]
+    n_q = len(questoes['ids'])
+
+    acumulado['n'] += np.bincount(q, minlength=n_q)
+    acumulado['acertos'] += np.bincount(q, weights=x, minlength=n_q)
+    letra = np.array([ALTERNATIVAS.find(a) for a in alternativas], dtype=int)
+    valida = letra >= 0
+    acumulado['alternativas'] += np.bincount(q[valida] * len(ALTERNATIVAS) + letra[valida], minlength=n_q * len(ALTERNATIVAS)).reshape(n_q, len(ALTERNATIVAS))
+
+    # Escore de resto: acerto do usuário nas outras questões que respondeu.
+    n_u, c_u = usuarios['respondidas'][u], usuarios['acertos'][u]
+    confiavel = n_u >= MINIMO_RESPOSTAS_USUARIO
+    q, x = q[confiavel], x[confiavel]
+    theta = (c_u[confiavel] - x) / (n_u[confiavel] - 1)
+    acumulado['n_theta'] += np.bincount(q, minlength=n_q)
+    acumulado['x'] += np.bincount(q, weights=x, minlength=n_q)
+    acumulado['theta'] += np.bincount(q, weights=theta, minlength=n_q)
+    acumulado['theta2'] += np.bincount(q, weights=theta * theta, minlength=n_q)
+    acumulado['x_theta'] += np.bincount(q, weights=x * theta, minlength=n_q)
+
+def _ponto_bisserial(acumulado):
+    """ Correlação de Pearson entre acerto (0/1) e escore de resto, por questão; NaN sem variância. """
+    n, sx, st = acumulado['n_theta'], acumulado['x'], acumulado['theta']
+    covariancia = n * acumulado['x_theta'] - sx * st
+    variancia_x = n * sx - sx * sx  # x² = x para respostas 0/1
+    variancia_t = n * acumulado['theta2'] - st * st
+    denominador = np.sqrt(np.clip(variancia_x, 0, None) * np.clip(variancia_t, 0, None))
+    return np.divide(covariancia, denominador, out=np.full(len(n), np.nan), where=denominador > 1e-12)
+
+def _motivo_suspeita(gabarito, facilidade, discriminacao, mais_escolhida):
+    if discriminacao is not None and discriminacao < LIMITE_DISCRIMINACAO_NEGATIVA:
+        return "Discriminação negativa: quem vai melhor nas outras questões erra mais esta. Confira o gabarito."
+    if mais_escolhida and mais_escolhida != gabarito:
+        return f"A alternativa {mais_escolhida} é mais marcada que o gabarito ({gabarito}, {facilidade:.0%} de acerto)."
+    return ''
+
+def calibrar_questoes(tamanho_lote=TAMANHO_LOTE_CALIBRACAO, minimo_respostas=MINIMO_RESPOSTAS_CALIBRACAO):
+    """
+    Recalcula a calibração de todas as questões com pelo menos
+    `minimo_respostas` respostas e grava os parâmetros em lote.
+    Retorna {'calibradas', 'suspeitas'}.
+    """
+    totais_usuarios = list(RespostaUsuario.objects.values('usuario_id').annotate(
+        n=Count('id'), c=Count('id', filter=Q(foi_correta=True))
+    ).values_list('usuario_id', 'n', 'c').order_by('usuario_id'))
+    if not totais_usuarios:
+        return {'calibradas': 0, 'suspeitas': 0}
+    ids_u, n_u, c_u = (np.array(coluna) for coluna in zip(*totais_usuarios))
+    usuarios = {'ids': ids_u, 'respondidas': n_u.astype(float), 'acertos': c_u.astype(float)}
+
+    gabaritos = dict(Questao.objects.values_list('id', 'gabarito'))
+    questoes = {'ids': np.array(sorted(gabaritos))}
+    n_q = len(questoes['ids'])
+    acumulado = {chave: np.zeros(n_q) for chave in ('n', 'acertos', 'n_theta', 'x', 'theta', 'theta2', 'x_theta')}
+    acumulado['alternativas'] = np.zeros((n_q, len(ALTERNATIVAS)))
+
+    lote = []
+    for resposta in RespostaUsuario.objects.order_by().values_list(
+        'usuario_id', 'questao_id', 'foi_correta', 'alternativa_selecionada'
+    ).iterator(chunk_size=min(tamanho_lote, 10000)):
+        lote.append(resposta)
+        if len(lote) >= tamanho_lote:
+            _somas_por_lote(lote, usuarios, questoes, acumulado)
+            lote = []
+    if lote:
+        _somas_por_lote(lote, usuarios, questoes, acumulado)
+
+    discriminacoes = _ponto_bisserial(acumulado)
+    calibracoes = []
+    for i in np.flatnonzero(acumulado['n'] >= minimo_respostas):
+        questao_id = int(questoes['ids'][i])
+        facilidade = float(acumulado['acertos'][i] / acumulado['n'][i])
+        discriminacao = None if np.isnan(discriminacoes[i]) else round(float(discriminacoes[i]), 4)
+        contagens = acumulado['alternativas'][i]
+        mais_escolhida = ALTERNATIVAS[int(np.argmax(contagens))] if contagens.any() else ''
+        motivo = _motivo_suspeita(gabaritos[questao_id], facilidade, discriminacao, mais_escolhida)
+        calibracoes.append(CalibracaoQuestao(
+            questao_id=questao_id, respostas=int(acumulado['n'][i]), facilidade=round(facilidade, 4),
+            discriminacao=discriminacao, alternativa_mais_escolhida=mais_escolhida,
+            suspeita=bool(motivo), motivo_suspeita=motivo,
+        ))
+
+    inicio = timezone.now()
+    with transaction.atomic():
+        CalibracaoQuestao.objects.bulk_create(
+            calibracoes, batch_size=2000, update_conflicts=True, unique_fields=['questao'],
+            update_fields=['respostas', 'facilidade', 'discriminacao', 'alternativa_mais_escolhida', 'suspeita', 'motivo_suspeita', 'calibrado_em'],
+        )
+        # O que não foi regravado agora ficou abaixo do mínimo de respostas (ou foi excluído).
+        CalibracaoQuestao.objects.filter(calibrado_em__lt=inicio).delete()
+    return {'calibradas': len(calibracoes), 'suspeitas': sum(c.suspeita for c in calibracoes)}
+
+# =======================================================================
+# DIFICULDADE CALIBRADA
+# =======================================================================
+# Faixas de facilidade (proporção de acertos) de cada nível de dificuldade.
+FAIXAS_DIFICULDADE = {'FACIL': (0.7, 1.0), 'MEDIO': (0.4, 0.7), 'DIFICIL': (0.0, 0.4)}
+MINIMO_QUESTOES_CALIBRADAS = 5
+
+def nivel_por_facilidade(facilidade):
+    if facilidade >= FAIXAS_DIFICULDADE['FACIL'][0]:
+        return 'FACIL'
+    if facilidade >= FAIXAS_DIFICULDADE['MEDIO'][0]:
+        return 'MEDIO'
+    return 'DIFICIL'
+
+def filtro_dificuldade_calibrada(nivel):
+    """ Filtro de Questao para as questões calibradas dentro da faixa do nível. """
+    minimo, maximo = FAIXAS_DIFICULDADE[nivel]
+    filtro = Q(calibracao__facilidade__gte=minimo)
+    return filtro & (Q(calibracao__facilidade__lte=maximo) if nivel == 'FACIL' else Q(calibracao__facilidade__lt=maximo))
+
+def sugerir_dificuldade(questoes):
+    """
+    Sugere o nível de dificuldade de um conjunto de questões (queryset) pela
+    facilidade média das calibradas: {'nivel', 'facilidade_media', 'calibradas'}
+    ou None se houver menos de MINIMO_QUESTOES_CALIBRADAS calibradas.
+    """
+    resumo = CalibracaoQuestao.objects.filter(questao__in=questoes).aggregate(media=Avg('facilidade'), total=Count('questao'))
+    if resumo['total'] < MINIMO_QUESTOES_CALIBRADAS:
+        return None
+    return {'nivel': nivel_por_facilidade(resumo['media']), 'facilidade_media': resumo['media'], 'calibradas': resumo['total']}
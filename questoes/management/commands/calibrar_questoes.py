@@ -0,0 +1,18 @@
+# questoes/management/commands/calibrar_questoes.py
+
+from django.core.management.base import BaseCommand
+
+from questoes.calibracao import calibrar_questoes, TAMANHO_LOTE_CALIBRACAO, MINIMO_RESPOSTAS_CALIBRACAO
+
+
+class Command(BaseCommand):
+    help = ('Calcula a facilidade e a discriminação (ponto-bisserial) de cada questão a partir das respostas, '
+            'grava os parâmetros em lote e marca itens suspeitos (ex.: gabarito provavelmente errado) para a gestão.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--lote', type=int, default=TAMANHO_LOTE_CALIBRACAO, help='Respostas processadas por lote.')
+        parser.add_argument('--minimo', type=int, default=MINIMO_RESPOSTAS_CALIBRACAO, help='Mínimo de respostas para calibrar uma questão.')
+
+    def handle(self, *args, **options):
+        resumo = calibrar_questoes(tamanho_lote=options['lote'], minimo_respostas=options['minimo'])
+        self.stdout.write(self.style.SUCCESS(f"{resumo['calibradas']} questões calibradas, {resumo['suspeitas']} marcadas como suspeitas."))
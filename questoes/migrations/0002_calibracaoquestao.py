@@ -0,0 +1,31 @@
+# Generated by Django 5.2.5 on 2026-10-19 13:53
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('questoes', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CalibracaoQuestao',
+            fields=[
+                ('questao', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='calibracao', serialize=False, to='questoes.questao')),
+                ('respostas', models.PositiveIntegerField(default=0)),
+                ('facilidade', models.FloatField(help_text='Proporção de acertos (0 a 1). Quanto menor, mais difícil.')),
+                ('discriminacao', models.FloatField(blank=True, help_text='Correlação ponto-bisserial entre acertar a questão e o desempenho do usuário nas demais.', null=True)),
+                ('alternativa_mais_escolhida', models.CharField(blank=True, max_length=1)),
+                ('suspeita', models.BooleanField(db_index=True, default=False)),
+                ('motivo_suspeita', models.CharField(blank=True, max_length=255)),
+                ('calibrado_em', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name': 'Calibração de Questão',
+                'verbose_name_plural': 'Calibrações de Questões',
+            },
+        ),
+    ]
@@ -105,6 +105,27 @@ class Questao(models.Model):
     def hard_delete(self):
         super(Questao, self).delete()
     
+class CalibracaoQuestao(models.Model):
+    """
+    Parâmetros psicométricos clássicos de uma questão, calculados em lote
+    pelo comando `calibrar_questoes` a partir das respostas dos usuários.
+    """
+    questao = models.OneToOneField(Questao, on_delete=models.CASCADE, primary_key=True, related_name='calibracao')
+    respostas = models.PositiveIntegerField(default=0)
+    facilidade = models.FloatField(help_text="Proporção de acertos (0 a 1). Quanto menor, mais difícil.")
+    discriminacao = models.FloatField(null=True, blank=True, help_text="Correlação ponto-bisserial entre acertar a questão e o desempenho do usuário nas demais.")
+    alternativa_mais_escolhida = models.CharField(max_length=1, blank=True)
+    suspeita = models.BooleanField(default=False, db_index=True)
+    motivo_suspeita = models.CharField(max_length=255, blank=True)
+    calibrado_em = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = "Calibração de Questão"
+        verbose_name_plural = "Calibrações de Questões"
+
+    def __str__(self):
+        return f"Calibração de {self.questao_id}: {self.facilidade:.0%} de acerto"
+
 @receiver(post_save, sender=Questao)
 def gerar_codigo_questao(sender, instance, created, **kwargs):
     if created and not instance.codigo:
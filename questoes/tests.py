@@ -1,3 +1,59 @@
-from django.test import TestCase
+# questoes/tests.py
 
-# Create your tests here.
+from django.test import TestCase, Client
+from django.urls import reverse
+from django.contrib.auth.models import User
+
+from questoes.models import Questao, Disciplina, Assunto, Banca, CalibracaoQuestao
+from questoes.calibracao import calibrar_questoes, sugerir_dificuldade
+from usuarios.models import UserProfile
+from pratica.models import RespostaUsuario
+
+
+class CalibracaoQuestaoTestCase(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        """ Três questões, três alunos e um membro da equipe para a listagem da gestão. """
+        cls.disciplina = Disciplina.objects.create(nome="Direito de Teste")
+        cls.banca = Banca.objects.create(nome="Banca de Teste")
+        cls.assunto = Assunto.objects.create(disciplina=cls.disciplina, nome="Assunto de Teste")
+        cls.questoes = [
+            Questao.objects.create(
+                disciplina=cls.disciplina, assunto=cls.assunto, banca=cls.banca, ano=2023,
+                enunciado=f"Enunciado {i}", alternativas={'A': '1', 'B': '2'}, gabarito='A'
+            )
+            for i in range(3)
+        ]
+        cls.usuarios = [User.objects.create_user(f'aluno{i}', password='password123') for i in range(3)]
+        cls.staff_user = User.objects.create_user('staffmember', 'staff@test.com', 'password123', is_staff=True)
+        UserProfile.objects.create(user=cls.staff_user, nome='Staff', sobrenome='Member')
+
+    def test_calibracao_marca_gabarito_suspeito(self):
+        questoes = self.questoes + [
+            Questao.objects.create(disciplina=self.disciplina, assunto=self.assunto, ano=2023,
+                                   enunciado=f"Extra {i}", alternativas={'A': '1', 'B': '2'}, gabarito='A')
+            for i in range(6)
+        ]
+        suspeita, normais = questoes[-1], questoes[:-1]
+        fortes = self.usuarios + [User.objects.create_user('forte_extra', password='x')]
+        fracos = [User.objects.create_user(f'fraco{i}', password='x') for i in range(4)]
+        respostas = []
+        for usuarios, alternativa_normal, alternativa_suspeita in [(fortes, 'A', 'B'), (fracos, 'B', 'A')]:
+            for user in usuarios:
+                respostas += [RespostaUsuario(usuario=user, questao=q, alternativa_selecionada=alternativa_normal, foi_correta=alternativa_normal == 'A') for q in normais]
+                respostas.append(RespostaUsuario(usuario=user, questao=suspeita, alternativa_selecionada=alternativa_suspeita, foi_correta=alternativa_suspeita == 'A'))
+        RespostaUsuario.objects.bulk_create(respostas)
+
+        resumo = calibrar_questoes(tamanho_lote=7, minimo_respostas=3)
+        self.assertEqual(resumo, {'calibradas': len(questoes), 'suspeitas': 1})
+        calibracao = CalibracaoQuestao.objects.get(questao=suspeita)
+        self.assertTrue(calibracao.suspeita)
+        self.assertLess(calibracao.discriminacao, 0)
+        self.assertAlmostEqual(CalibracaoQuestao.objects.get(questao=normais[0]).discriminacao, 1.0)
+        self.assertEqual(sugerir_dificuldade(Questao.objects.filter(id__in=[q.id for q in normais]))['nivel'], 'MEDIO')
+
+        client = Client()
+        client.login(username=self.staff_user.username, password='password123')
+        response = client.get(reverse('gestao:listar_questoes'), {'suspeitas': '1'})
+        self.assertEqual([q.id for q in response.context['questoes']], [suspeita.id])
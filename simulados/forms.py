@@ -2,6 +2,7 @@
 
 from django import forms
 from questoes.models import Disciplina
+from .models import NivelDificuldade
 
 class SimuladoAvancadoForm(forms.Form):
     """
@@ -16,4 +17,11 @@ class SimuladoAvancadoForm(forms.Form):
     tempo_por_questao = forms.IntegerField(
         label="Minutos por questão",
         required=False, # 0 ou nulo será tratado como ilimitado
-    )
\ No newline at end of file
+    )
+    dificuldade = forms.ChoiceField(
+        label="Dificuldade das questões",
+        choices=[('', 'Qualquer dificuldade')] + NivelDificuldade.choices,
+        required=False,
+        widget=forms.Select(attrs={'class': 'form-select'}),
+        help_text="Prioriza questões cuja taxa de acerto na plataforma corresponde ao nível escolhido.",
+    )
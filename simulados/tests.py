@@ -1,3 +1,107 @@
-from django.test import TestCase
+# simulados/tests.py
 
-# Create your tests here.
+from django.test import TestCase, Client
+from django.urls import reverse
+from django.contrib.auth.models import User
+from django.core.cache import cache
+
+from questoes.models import Questao, Disciplina, Assunto, Banca, CalibracaoQuestao
+from usuarios.models import UserProfile
+from pratica.models import EventoResposta
+from gamificacao.models import LancamentoGamificacao
+from desempenho.models import HistogramaAcerto
+from desempenho.services import FAIXAS_HISTOGRAMA
+from gamificacao.services import _janelas_locais
+from simulados.models import Simulado, SessaoSimulado, RespostaSimulado
+
+
+class SimuladosBaseTestCase(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        """ Um aluno e doze questões de uma disciplina, das quais as três primeiras formam um simulado. """
+        cls.disciplina = Disciplina.objects.create(nome="Direito de Teste")
+        cls.banca = Banca.objects.create(nome="Banca de Teste")
+        cls.assunto = Assunto.objects.create(disciplina=cls.disciplina, nome="Assunto de Teste")
+        cls.questoes = [
+            Questao.objects.create(
+                disciplina=cls.disciplina, assunto=cls.assunto, banca=cls.banca, ano=2023,
+                enunciado=f"Enunciado {i}", alternativas={'A': '1', 'B': '2'}, gabarito='A'
+            )
+            for i in range(12)
+        ]
+        cls.user = User.objects.create_user('candidato', 'candidato@test.com', 'password123')
+        UserProfile.objects.create(user=cls.user, nome='Candidato', sobrenome='Teste')
+        cls.simulado = Simulado.objects.create(nome="Simulado de Teste", criado_por=cls.user)
+        cls.simulado.questoes.set(cls.questoes[:3])
+
+    def setUp(self):
+        cache.clear()
+        _janelas_locais.clear()
+        self.client = Client()
+        self.client.login(username='candidato', password='password123')
+
+    def iniciar_sessao(self, respostas):
+        sessao = SessaoSimulado.objects.create(simulado=self.simulado, usuario=self.user)
+        for questao, alternativa in zip(self.questoes, respostas):
+            RespostaSimulado.objects.create(sessao=sessao, questao=questao, alternativa_selecionada=alternativa)
+        return sessao
+
+
+class FinalizacaoSimuladoTestCase(SimuladosBaseTestCase):
+
+    def test_envio_duplo_grava_os_eventos_uma_vez(self):
+        sessao = self.iniciar_sessao(['A', 'B', None])
+        url = reverse('simulados:finalizar_simulado', args=[sessao.id])
+
+        for _ in range(2):
+            with self.captureOnCommitCallbacks(execute=True):
+                response = self.client.post(url)
+            self.assertRedirects(response, reverse('simulados:resultado_simulado', args=[sessao.id]), fetch_redirect_response=False)
+
+        sessao.refresh_from_db()
+        self.assertTrue(sessao.finalizado)
+        self.assertEqual(
+            sorted(EventoResposta.objects.filter(origem=EventoResposta.Origem.SIMULADO).values_list('questao_id', 'correta')),
+            [(self.questoes[0].id, True), (self.questoes[1].id, False)]
+        )
+        self.assertEqual(
+            list(RespostaSimulado.objects.filter(sessao=sessao).order_by('questao_id').values_list('foi_correta', flat=True)), [True, False, False]
+        )
+        self.assertEqual(LancamentoGamificacao.objects.filter(user_profile__user=self.user, motivo=LancamentoGamificacao.Motivo.SIMULADO).count(), 1)
+
+
+class GeracaoSimuladoTestCase(SimuladosBaseTestCase):
+
+    def gerar(self, quantidade, dificuldade):
+        self.client.post(reverse('simulados:gerar_simulado_usuario'), {
+            'nome': f"Gerado {quantidade} {dificuldade}", 'tempo_por_questao': 0, 'dificuldade': dificuldade, f'disciplina-{self.disciplina.id}': quantidade,
+        })
+        return set(Simulado.objects.get(nome=f"Gerado {quantidade} {dificuldade}").questoes.values_list('id', flat=True))
+
+    def test_sorteio_prioriza_calibradas_na_faixa_e_completa_com_as_demais(self):
+        # Dez questões difíceis calibradas, uma fácil calibrada e uma sem calibração.
+        for questao in self.questoes[:10]:
+            CalibracaoQuestao.objects.create(questao=questao, respostas=50, facilidade=0.2)
+        facil = CalibracaoQuestao.objects.create(questao=self.questoes[10], respostas=50, facilidade=0.9).questao_id
+        dificeis = {questao.id for questao in self.questoes[:10]}
+
+        self.assertEqual(self.gerar(10, 'DIFICIL'), dificeis)
+        self.assertEqual(self.gerar(12, 'DIFICIL'), {questao.id for questao in self.questoes})
+        self.assertIn(facil, self.gerar(10, 'FACIL'))
+
+
+class ResultadoSimuladoTestCase(SimuladosBaseTestCase):
+
+    def test_resultado_mostra_a_posicao_na_plataforma(self):
+        sessao = self.iniciar_sessao(['A', 'A', None])
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(reverse('simulados:finalizar_simulado', args=[sessao.id]))
+        url = reverse('simulados:resultado_simulado', args=[sessao.id])
+        self.assertIsNone(self.client.get(url).context['posicao_plataforma'])
+
+        # Quatro usuários com 100% e quatro com 0%: com 67% o candidato fica no top 50%.
+        contagens = [0] * FAIXAS_HISTOGRAMA
+        contagens[0] = contagens[-1] = 4
+        HistogramaAcerto.objects.create(escopo=HistogramaAcerto.Escopo.SIMULADO, alvo_id=self.simulado.id, contagens=contagens, total_usuarios=8)
+        self.assertEqual(self.client.get(url).context['posicao_plataforma'], {'top': 50, 'usuarios': 8})
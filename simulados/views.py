@@ -5,7 +5,7 @@ from django.contrib.auth.decorators import login_required
 from django.http import JsonResponse
 from django.views.decorators.http import require_POST
 from django.utils import timezone
-from django.db import models
+from django.db import models, transaction
 from django.db.models import Exists, OuterRef, Count
 from django.contrib import messages
 from random import sample
@@ -22,6 +22,11 @@ from .forms import SimuladoAvancadoForm
 from questoes.utils import paginar_itens
 from django.views.decorators.cache import never_cache
 from gamificacao.services import processar_conclusao_simulado
+from pratica.models import EventoResposta
+from pratica.eventos import EscritorDeEventos
+from desempenho.models import HistogramaAcerto
+from desempenho.services import posicoes_na_plataforma
+from questoes.calibracao import filtro_dificuldade_calibrada
 
 @login_required
 def listar_simulados(request):
@@ -207,6 +212,7 @@ def gerar_simulado_avancado(request):
             if tempo_por_questao == 0:
                 tempo_por_questao = None
 
+            dificuldade = form.cleaned_data.get('dificuldade')
             questoes_selecionadas_ids = []
             
             for key, qtd_str in request.POST.items():
@@ -216,12 +222,17 @@ def gerar_simulado_avancado(request):
                         qtd = int(qtd_str)
 
                         if qtd > 0:
-                            ids_disponiveis = list(Questao.objects.filter(
-                                disciplina_id=disciplina_id
-                            ).values_list('id', flat=True))
-
-                            qtd_real = min(qtd, len(ids_disponiveis))
-                            ids_sorteados = sample(ids_disponiveis, qtd_real)
+                            questoes_disciplina = Questao.objects.filter(disciplina_id=disciplina_id)
+                            ids_sorteados = []
+                            if dificuldade:
+                                # Sorteia primeiro entre as calibradas na faixa do nível escolhido.
+                                ids_na_faixa = list(questoes_disciplina.filter(filtro_dificuldade_calibrada(dificuldade)).values_list('id', flat=True))
+                                ids_sorteados = sample(ids_na_faixa, min(qtd, len(ids_na_faixa)))
+                                questoes_disciplina = questoes_disciplina.exclude(id__in=ids_sorteados)
+
+                            ids_disponiveis = list(questoes_disciplina.values_list('id', flat=True))
+                            qtd_real = min(qtd - len(ids_sorteados), len(ids_disponiveis))
+                            ids_sorteados += sample(ids_disponiveis, qtd_real)
                             questoes_selecionadas_ids.extend(ids_sorteados)
 
                     except (ValueError, IndexError):
@@ -235,7 +246,8 @@ def gerar_simulado_avancado(request):
                 nome=nome,
                 tempo_por_questao=tempo_por_questao,
                 criado_por=request.user,
-                is_oficial=False
+                is_oficial=False,
+                dificuldade=dificuldade or NivelDificuldade.MEDIO,
             )
             simulado.questoes.set(questoes_selecionadas_ids)
 
@@ -329,6 +341,7 @@ def registrar_resposta_simulado(request, sessao_id):
     return JsonResponse({'status': 'success'})
 
 @login_required
+@transaction.atomic
 def finalizar_simulado(request, sessao_id):
     """
     Processa a finalização de uma sessão de simulado.
@@ -337,9 +350,12 @@ def finalizar_simulado(request, sessao_id):
     3. Chama o serviço de gamificação para processar XP e recompensas.
     4. Serializa os resultados da gamificação e os armazena na sessão do usuário.
     5. Redireciona para a página de resultados.
+    A sessão fica travada (SELECT ... FOR UPDATE) até o fim da transação: um
+    envio duplo espera o primeiro terminar e encontra a sessão já finalizada,
+    sem gravar os eventos nem pagar a gamificação outra vez.
     """
     # Garante que a sessão pertence ao usuário logado.
-    sessao = get_object_or_404(SessaoSimulado, id=sessao_id, usuario=request.user)
+    sessao = get_object_or_404(SessaoSimulado.objects.select_for_update(), id=sessao_id, usuario=request.user)
 
     # Se a sessão já foi finalizada, redireciona diretamente para os resultados.
     if sessao.finalizado:
@@ -348,14 +364,20 @@ def finalizar_simulado(request, sessao_id):
     # 1. Correção das respostas
     # Este passo é importante para garantir que o status de acerto/erro esteja salvo
     # antes de chamar os serviços de gamificação e de cálculo de resultados.
+    # As questões respondidas também entram no histórico de eventos, em um único lote.
     respostas_para_corrigir = RespostaSimulado.objects.filter(sessao=sessao).select_related('questao')
-    for resposta in respostas_para_corrigir:
-        if resposta.alternativa_selecionada:
-            resposta.foi_correta = (resposta.alternativa_selecionada == resposta.questao.gabarito)
-        else:
-            resposta.foi_correta = False
-        # Usamos update_fields para uma pequena otimização, salvando apenas o campo alterado.
-        resposta.save(update_fields=['foi_correta'])
+    with EscritorDeEventos() as escritor:
+        for resposta in respostas_para_corrigir:
+            if resposta.alternativa_selecionada:
+                resposta.foi_correta = (resposta.alternativa_selecionada == resposta.questao.gabarito)
+                escritor.adicionar(
+                    request.user.id, resposta.questao_id, resposta.alternativa_selecionada, resposta.foi_correta,
+                    EventoResposta.Origem.SIMULADO, disciplina_id=resposta.questao.disciplina_id
+                )
+            else:
+                resposta.foi_correta = False
+            # Usamos update_fields para uma pequena otimização, salvando apenas o campo alterado.
+            resposta.save(update_fields=['foi_correta'])
     
     # 2. Finaliza a sessão (marcando a data/hora de fim)
     sessao.finalizar_sessao() # Supondo que este método atualize o campo data_fim e 'finalizado'.
@@ -437,6 +459,9 @@ def resultado_simulado(request, sessao_id):
     total_em_branco = total_questoes - total_respondidas
     percentual_acerto = (total_acertos / total_questoes * 100) if total_questoes > 0 else 0
 
+    # Posição entre todas as sessões finalizadas deste simulado (histograma pré-calculado).
+    posicao_plataforma = posicoes_na_plataforma(HistogramaAcerto.Escopo.SIMULADO, {sessao.simulado_id: percentual_acerto}).get(sessao.simulado_id)
+
     tempo_gasto_td = sessao.data_fim - sessao.data_inicio
     tempo_gasto_segundos = tempo_gasto_td.total_seconds()
     tempo_gasto_formatado = formatar_tempo_gasto(tempo_gasto_segundos)
@@ -481,6 +506,7 @@ def resultado_simulado(request, sessao_id):
         'total_erros': total_erros,
         'total_em_branco': total_em_branco,
         'percentual_acerto': round(percentual_acerto, 2),
+        'posicao_plataforma': posicao_plataforma,
         'tempo_gasto_formatado': tempo_gasto_formatado,
         'acertos_por_minuto': round(acertos_por_minuto, 2),
         'desempenho_disciplina': desempenho_final,
@@ -1,8 +1,11 @@
 # usuarios/context_processors.py
+from .utils import carregar_perfil_da_requisicao
+
 def avatar_equipado_processor(request):
     """
     Injeta as URLs do avatar/borda, saldo de moedas e contagem de
     prêmios pendentes do usuário logado em todos os templates.
+    Os dados vêm do perfil carregado uma única vez por requisição.
     """
     contexto = {
         'avatar_equipado_url': None,
@@ -10,8 +13,10 @@ def avatar_equipado_processor(request):
         'saldo_moedas_usuario': 0,
         'recompensas_pendentes_count': 0, # Valor padrão
     }
-    if request.user.is_authenticated and hasattr(request.user, 'userprofile'):
-        profile = request.user.userprofile
+    if request.user.is_authenticated:
+        profile = carregar_perfil_da_requisicao(request)
+        if profile is None:
+            return contexto
         if profile.avatar_equipado:
             contexto['avatar_equipado_url'] = profile.avatar_equipado.imagem.url
         if profile.borda_equipada:
@@ -20,7 +25,6 @@ def avatar_equipado_processor(request):
         if hasattr(profile, 'gamificacao_data'):
             contexto['saldo_moedas_usuario'] = profile.gamificacao_data.moedas
 
-        # Conta as recompensas pendentes
-        contexto['recompensas_pendentes_count'] = profile.recompensas_pendentes.filter(resgatado_em__isnull=True).count()
+        contexto['recompensas_pendentes_count'] = profile.pending_rewards_count
             
-    return contexto
\ No newline at end of file
+    return contexto
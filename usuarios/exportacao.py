@@ -0,0 +1,91 @@
+# usuarios/exportacao.py
+
+import csv
+import json
+import zlib
+
+from django.core.serializers.json import DjangoJSONEncoder
+
+from gamificacao.models import LancamentoGamificacao
+from pratica.models import RespostaUsuario, EventoResposta, Comentario
+from simulados.models import SessaoSimulado, RespostaSimulado
+
+# =======================================================================
+# EXPORTAÇÃO DO HISTÓRICO DE ESTUDOS (PORTABILIDADE - LGPD)
+# =======================================================================
+# Tudo é gerado sob demanda: cada seção lê o banco com .iterator(), cada
+# linha é serializada e comprimida assim que sai do cursor. A memória usada
+# fica constante, tenha o usuário cem ou cinquenta mil respostas.
+FORMATOS_EXPORTACAO = ('jsonl', 'csv')
+TAMANHO_LOTE_EXPORTACAO = 2000
+NIVEL_COMPRESSAO = 6
+# wbits = 16 + 15: cabeçalho e rodapé gzip, janela máxima.
+GZIP_WBITS = 31
+
+def _secoes_do_historico(usuario):
+    """ (tipo, colunas, queryset de tuplas) de cada parte do histórico, na ordem de exportação. """
+    return [
+        ('resposta', ('questao', 'disciplina', 'alternativa', 'correta', 'respondida_em'),
+         RespostaUsuario.objects.filter(usuario=usuario).order_by('data_resposta').values_list(
+             'questao__codigo', 'questao__disciplina__nome', 'alternativa_selecionada', 'foi_correta', 'data_resposta')),
+        ('evento_resposta', ('questao', 'alternativa', 'correta', 'origem', 'registrado_em'),
+         EventoResposta.objects.filter(usuario=usuario).order_by('registrado_em', 'id').values_list(
+             'questao__codigo', 'alternativa', 'correta', 'origem', 'registrado_em')),
+        ('sessao_simulado', ('sessao', 'simulado', 'inicio', 'fim', 'finalizado'),
+         SessaoSimulado.objects.filter(usuario=usuario).order_by('data_inicio').values_list(
+             'id', 'simulado__nome', 'data_inicio', 'data_fim', 'finalizado')),
+        ('resposta_simulado', ('sessao', 'questao', 'alternativa', 'correta'),
+         RespostaSimulado.objects.filter(sessao__usuario=usuario).order_by('sessao_id', 'id').values_list(
+             'sessao_id', 'questao__codigo', 'alternativa_selecionada', 'foi_correta')),
+        ('comentario', ('comentario', 'questao', 'em_resposta_a', 'criado_em', 'conteudo'),
+         Comentario.objects.filter(usuario=usuario).order_by('data_criacao').values_list(
+             'id', 'questao__codigo', 'parent_id', 'data_criacao', 'conteudo')),
+        ('lancamento_gamificacao', ('motivo', 'delta_xp', 'delta_moedas', 'referencia', 'criado_em'),
+         LancamentoGamificacao.objects.filter(user_profile__user=usuario).order_by('criado_em', 'id').values_list(
+             'motivo', 'delta_xp', 'delta_moedas', 'referencia', 'criado_em')),
+    ]
+
+class _Eco:
+    """ Pseudo-arquivo para o csv.writer: devolve a linha em vez de guardá-la. """
+    def write(self, valor):
+        return valor
+
+def _linhas_jsonl(usuario, tamanho_lote):
+    for tipo, colunas, linhas in _secoes_do_historico(usuario):
+        for linha in linhas.iterator(chunk_size=tamanho_lote):
+            registro = {'tipo': tipo, **dict(zip(colunas, linha))}
+            yield json.dumps(registro, cls=DjangoJSONEncoder, ensure_ascii=False) + '\n'
+
+def _linhas_csv(usuario, tamanho_lote):
+    # As seções têm colunas diferentes: cada uma abre com o próprio cabeçalho
+    # e toda linha começa pelo tipo, para facilitar o filtro na planilha.
+    escritor = csv.writer(_Eco())
+    yield '\ufeff'  # BOM: o Excel só reconhece UTF-8 com ele.
+    for tipo, colunas, linhas in _secoes_do_historico(usuario):
+        yield escritor.writerow(('tipo', *colunas))
+        for linha in linhas.iterator(chunk_size=tamanho_lote):
+            yield escritor.writerow((tipo, *(valor.isoformat() if hasattr(valor, 'isoformat') else valor for valor in linha)))
+
+def linhas_do_historico(usuario, formato='jsonl', tamanho_lote=TAMANHO_LOTE_EXPORTACAO):
+    """ Gera o histórico completo do usuário, linha a linha (texto), em JSONL ou CSV. """
+    if formato not in FORMATOS_EXPORTACAO:
+        raise ValueError(f"Formato de exportação inválido: {formato!r}.")
+    if formato == 'csv':
+        return _linhas_csv(usuario, tamanho_lote)
+    return _linhas_jsonl(usuario, tamanho_lote)
+
+def comprimir_gzip(pedacos, nivel=NIVEL_COMPRESSAO):
+    """ Comprime um fluxo de texto em gzip incrementalmente, sem montar o arquivo em memória. """
+    compressor = zlib.compressobj(nivel, zlib.DEFLATED, GZIP_WBITS)
+    for pedaco in pedacos:
+        comprimido = compressor.compress(pedaco.encode('utf-8'))
+        if comprimido:
+            yield comprimido
+    yield compressor.flush()
+
+def exportar_historico(usuario, formato='jsonl', tamanho_lote=TAMANHO_LOTE_EXPORTACAO):
+    """ Fluxo de bytes gzip do histórico do usuário (para StreamingHttpResponse ou arquivo). """
+    return comprimir_gzip(linhas_do_historico(usuario, formato, tamanho_lote))
+
+def nome_arquivo_exportacao(usuario, formato, data):
+    return f"historico-{usuario.username}-{data:%Y%m%d}.{formato}.gz"
@@ -0,0 +1,32 @@
+# usuarios/management/commands/exportar_historico.py
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from usuarios.exportacao import FORMATOS_EXPORTACAO, exportar_historico, nome_arquivo_exportacao
+
+
+class Command(BaseCommand):
+    help = ('Exporta o histórico completo de estudos de um usuário (respostas, simulados, comentários e extrato de '
+            'gamificação) em um arquivo .gz, gravado em fluxo. Use para atender pedidos de portabilidade (LGPD).')
+
+    def add_arguments(self, parser):
+        parser.add_argument('username', help='Usuário a exportar.')
+        parser.add_argument('--formato', choices=FORMATOS_EXPORTACAO, default='jsonl')
+        parser.add_argument('--saida', help='Caminho do arquivo gerado. Padrão: historico-<usuario>-<data>.<formato>.gz')
+
+    def handle(self, *args, **options):
+        try:
+            usuario = User.objects.get(username=options['username'])
+        except User.DoesNotExist:
+            raise CommandError(f"Usuário '{options['username']}' não encontrado.")
+
+        formato = options['formato']
+        caminho = options['saida'] or nome_arquivo_exportacao(usuario, formato, timezone.localdate())
+        tamanho = 0
+        with open(caminho, 'wb') as arquivo:
+            for pedaco in exportar_historico(usuario, formato):
+                arquivo.write(pedaco)
+                tamanho += len(pedaco)
+        self.stdout.write(self.style.SUCCESS(f'Histórico de {usuario.username} exportado em {caminho} ({tamanho / 1024:.1f} KB).'))
@@ -4,26 +4,32 @@ from django.urls import reverse, resolve
 from django.conf import settings
 from django.contrib.auth import logout
 from django.contrib import messages
-from .models import UserProfile
+from .utils import carregar_perfil_da_requisicao
 
 class ProfileMiddleware:
     def __init__(self, get_response):
         self.get_response = get_response
+        self._allowed_urls = None
+
+    @property
+    def allowed_urls(self):
+        # As URLs permitidas são resolvidas uma única vez, na primeira requisição.
+        if self._allowed_urls is None:
+            self._allowed_urls = {
+                reverse('editar_perfil'),
+                reverse('sair'),
+                reverse('alterar_senha'),
+            }
+        return self._allowed_urls
 
     def __call__(self, request):
         if request.user.is_authenticated:
             if request.user.is_superuser:
                 return self.get_response(request)
             
-            allowed_urls = [
-                reverse('editar_perfil'),
-                reverse('sair'),
-                reverse('alterar_senha'),
-            ]
-            
-            # Usamos hasattr para uma verificação segura, sem causar erros.
-            if not hasattr(request.user, 'userprofile'):
-                if request.path not in allowed_urls:
+            # A mesma consulta abastece o context processor e `request.user.userprofile` nas views.
+            if carregar_perfil_da_requisicao(request) is None:
+                if request.path not in self.allowed_urls:
                     messages.warning(request, 'Por favor, complete seu perfil para continuar.')
                     return redirect('editar_perfil')
         
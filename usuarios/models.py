@@ -43,7 +43,11 @@ class UserProfile(models.Model):
         """
         Retorna a contagem APENAS de recompensas pendentes (não resgatadas).
         Usa uma importação local para evitar importação circular.
+        Reaproveita a contagem anotada quando o perfil veio de
+        `carregar_perfil_da_requisicao`.
         """
+        if hasattr(self, 'qtd_recompensas_pendentes'):
+            return self.qtd_recompensas_pendentes
         from gamificacao.models import RecompensaPendente
         return RecompensaPendente.objects.filter(
             user_profile=self, 
@@ -0,0 +1,83 @@
+# usuarios/tests.py
+
+import csv
+import gzip
+import json
+import os
+import tempfile
+from io import StringIO
+from django.test import TestCase, Client
+from django.urls import reverse
+from django.contrib.auth.models import User
+from django.core import management
+from django.core.cache import cache
+
+from questoes.models import Questao, Disciplina, Assunto, Banca
+from usuarios.models import UserProfile
+from pratica.models import Comentario
+from gamificacao.models import GamificationSettings, LancamentoGamificacao
+from gamificacao.services import processar_resposta_gamificacao, _janelas_locais
+
+
+class ExportacaoHistoricoTestCase(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        """ Dois alunos e três questões, sem limitador de respostas. """
+        settings = GamificationSettings.load()
+        settings.tempo_minimo_entre_respostas_segundos = 0
+        settings.cooldown_mesma_questao_horas = 0
+        settings.save()
+
+        disciplina = Disciplina.objects.create(nome="Direito de Teste")
+        assunto = Assunto.objects.create(disciplina=disciplina, nome="Assunto de Teste")
+        banca = Banca.objects.create(nome="Banca de Teste")
+        cls.questoes = [
+            Questao.objects.create(
+                disciplina=disciplina, assunto=assunto, banca=banca, ano=2023,
+                enunciado=f"Enunciado {i}", alternativas={'A': '1', 'B': '2'}, gabarito='A'
+            )
+            for i in range(3)
+        ]
+        cls.usuarios = []
+        for i in range(2):
+            user = User.objects.create_user(f'aluno{i}', f'aluno{i}@test.com', 'password123')
+            UserProfile.objects.create(user=user, nome=f'Aluno{i}', sobrenome='Teste')
+            cls.usuarios.append(user)
+
+    def setUp(self):
+        cache.clear()
+        _janelas_locais.clear()
+
+    def responder(self, user, questao, alternativa):
+        with self.captureOnCommitCallbacks(execute=True):
+            return processar_resposta_gamificacao(user, questao, alternativa)
+
+    def test_exportacao_em_fluxo_comprimido(self):
+        user = self.usuarios[0]
+        self.responder(user, self.questoes[0], 'A')
+        self.responder(user, self.questoes[1], 'B')
+        self.responder(self.usuarios[1], self.questoes[2], 'A')
+        Comentario.objects.create(questao=self.questoes[0], usuario=user, conteudo='Ótima questão, "pegadinha" no item B')
+
+        client = Client()
+        client.login(username=user.username, password='password123')
+        response = client.get(reverse('exportar_meu_historico'), {'formato': 'jsonl'})
+        self.assertTrue(response.streaming)
+        self.assertIn('.jsonl.gz', response['Content-Disposition'])
+        linhas = [json.loads(linha) for linha in gzip.decompress(b''.join(response.streaming_content)).decode('utf-8').splitlines()]
+        por_tipo = {}
+        for linha in linhas:
+            por_tipo.setdefault(linha['tipo'], []).append(linha)
+        self.assertEqual(len(por_tipo['resposta']), 2)
+        self.assertEqual(len(por_tipo['evento_resposta']), 2)
+        self.assertEqual(por_tipo['comentario'][0]['conteudo'], 'Ótima questão, "pegadinha" no item B')
+        self.assertEqual(len(por_tipo['lancamento_gamificacao']), LancamentoGamificacao.objects.filter(user_profile__user=user).count())
+
+        with tempfile.TemporaryDirectory() as pasta:
+            saida = os.path.join(pasta, 'historico.csv.gz')
+            management.call_command('exportar_historico', user.username, formato='csv', saida=saida, stdout=StringIO())
+            with gzip.open(saida, 'rt', encoding='utf-8-sig', newline='') as arquivo:
+                linhas_csv = list(csv.reader(arquivo))
+        self.assertIn(['tipo', 'questao', 'disciplina', 'alternativa', 'correta', 'respondida_em'], linhas_csv)
+        self.assertEqual(sum(1 for linha in linhas_csv if linha[0] == 'resposta'), 2)
@@ -17,6 +17,7 @@ urlpatterns = [
     path('perfil/editar/', views.editar_perfil, name='editar_perfil'),
     path('perfil/alterar-senha/', views.alterar_senha, name='alterar_senha'),
     path('perfil/deletar-conta/', views.deletar_conta, name='deletar_conta'),
+    path('perfil/exportar-historico/', views.exportar_meu_historico, name='exportar_meu_historico'),
     
     path('perfil/caixa-de-recompensas/', views.caixa_de_recompensas, name='caixa_de_recompensas'),
     path('perfil/trilhas-de-conquistas/', views.trilhas_de_conquistas, name='trilhas_de_conquistas'),
@@ -39,4 +39,38 @@ def enviar_email_com_template(request, subject, template_name, context, recipien
     email.attach_alternative(html_content, "text/html")
 
     # Inicia a thread para enviar o e-mail sem bloquear a aplicação
-    EmailThread(email).start()
\ No newline at end of file
+    EmailThread(email).start()
+# =======================================================================
+# PERFIL DA REQUISIÇÃO (CABEÇALHO DO USUÁRIO)
+# =======================================================================
+
+def carregar_perfil_da_requisicao(request):
+    """
+    Carrega, numa única consulta com JOINs, o perfil do usuário logado junto
+    com avatar, borda, banner, dados de gamificação e a contagem de prêmios pendentes,
+    e o deixa no cache de relações de `request.user`. Assim o middleware, o
+    context processor e as views que acessam `request.user.userprofile`
+    compartilham o mesmo objeto, sem consultas extras.
+    O resultado é guardado na requisição: chamadas seguintes não vão ao banco.
+    """
+    if not hasattr(request, '_perfil_carregado'):
+        from django.db.models import Count, OuterRef, Subquery, IntegerField
+        from django.db.models.functions import Coalesce
+        from gamificacao.models import RecompensaPendente
+        from .models import UserProfile
+
+        pendentes = RecompensaPendente.objects.filter(
+            user_profile=OuterRef('pk'), resgatado_em__isnull=True
+        ).order_by().values('user_profile').annotate(total=Count('id')).values('total')
+        perfil = UserProfile.objects.select_related(
+            'avatar_equipado', 'borda_equipada', 'banner_equipado', 'gamificacao_data'
+        ).annotate(
+            qtd_recompensas_pendentes=Coalesce(Subquery(pendentes, output_field=IntegerField()), 0)
+        ).filter(user=request.user).first()
+
+        if perfil is not None:
+            perfil.user = request.user
+        # Preenche o cache da relação reversa (inclusive com None, quando não há perfil).
+        request.user._state.fields_cache['userprofile'] = perfil
+        request._perfil_carregado = perfil
+    return request._perfil_carregado
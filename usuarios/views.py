@@ -1,21 +1,23 @@
 # usuarios/views.py
 
 from django.shortcuts import render, redirect, get_object_or_404
+from django.http import Http404, StreamingHttpResponse
+from django.utils import timezone
 from django.contrib.auth.models import User
 # =======================================================================
 # IMPORTAÇÕES REORDENADAS PARA RESOLVER O ERRO
 # =======================================================================
 # 1. Imports de Gamificação vêm PRIMEIRO, para que os modelos sejam conhecidos.
 from gamificacao.models import (
-    RecompensaPendente, TrilhaDeConquistas, ConquistaUsuario, ProfileStreak, 
-    Conquista, ProfileGamificacao, MetaDiariaUsuario, RankingSemanal, 
-    RankingMensal, Avatar, Borda, Banner, GamificationSettings,
+    RecompensaPendente, TrilhaDeConquistas, ConquistaUsuario, 
+    Conquista, ProfileGamificacao, Avatar, Borda, Banner,
     AvatarUsuario, BordaUsuario, BannerUsuario
 )
 from gamificacao.services import (
-    calcular_xp_para_nivel, 
-    _verificar_desbloqueio_recompensas,
-    _obter_valor_variavel
+    possui_acesso_total,
+    pode_usar_item,
+    obter_progresso_conquistas,
+    obter_cartao_perfil
 )
 # 2. Agora, importamos UserProfile, que DEPENDE dos modelos de gamificação.
 from .models import UserProfile, Ativacao, PasswordResetToken
@@ -33,9 +35,9 @@ from django.conf import settings
 from questoes.models import Questao
 from gestao.utils import criar_log
 from gestao.models import LogAtividade
-from .utils import enviar_email_com_template
+from .utils import enviar_email_com_template, carregar_perfil_da_requisicao
+from .exportacao import FORMATOS_EXPORTACAO, exportar_historico, nome_arquivo_exportacao
 from django.db import transaction
-from datetime import date
 from questoes.utils import paginar_itens
 from questoes.models import Questao # Adicione esta importação no topo
 
@@ -228,71 +230,33 @@ def home(request):
 
 @login_required
 def meu_perfil(request):
-    user_profile = get_object_or_404(UserProfile, user=request.user)
+    user_profile = carregar_perfil_da_requisicao(request)
+    if user_profile is None:
+        raise Http404
     context = _get_profile_context(user_profile)
     return render(request, 'usuarios/perfil.html', context)
 
 @login_required
 def visualizar_perfil(request, username):
-    user_alvo = get_object_or_404(User, username=username)
-    if user_alvo == request.user:
+    if username == request.user.username:
         return redirect('meu_perfil')
     
-    user_profile = get_object_or_404(UserProfile, user=user_alvo)
+    user_profile = get_object_or_404(
+        UserProfile.objects.select_related('user', 'avatar_equipado', 'borda_equipada', 'banner_equipado'),
+        user__username=username
+    )
     context = _get_profile_context(user_profile)
     return render(request, 'usuarios/perfil.html', context)
 
 
 def _get_profile_context(user_profile):
     """
-    Função auxiliar que busca TODOS os dados de gamificação e perfil.
+    Contexto da página de perfil: o perfil visualizado (cabeçalho) e o cartão
+    de gamificação em cache, montado sem nenhuma escrita no banco.
     """
-    settings = GamificationSettings.load()
-
-    streak_data, _ = ProfileStreak.objects.get_or_create(user_profile=user_profile)
-    gamificacao_data, _ = ProfileGamificacao.objects.get_or_create(user_profile=user_profile)
-    
-    meta_hoje, _ = MetaDiariaUsuario.objects.get_or_create(
-        user_profile=user_profile,
-        data=date.today()
-    )
-    
-    if settings.meta_diaria_questoes > 0:
-        progresso_meta_diaria_percentual = min((meta_hoje.questoes_resolvidas / settings.meta_diaria_questoes * 100), 100)
-    else:
-        progresso_meta_diaria_percentual = 0
-
-    xp_proximo_nivel = calcular_xp_para_nivel(gamificacao_data.level)
-    xp_nivel_anterior = calcular_xp_para_nivel(gamificacao_data.level - 1)
-    total_xp_do_nivel = xp_proximo_nivel - xp_nivel_anterior
-    xp_no_nivel_atual = gamificacao_data.xp - xp_nivel_anterior
-    progresso_percentual_xp = (xp_no_nivel_atual / total_xp_do_nivel * 100) if total_xp_do_nivel > 0 else 0
-
-    # =======================================================================
-    # INÍCIO DA ALTERAÇÃO: Passando os objetos de conquista desbloqueados
-    # =======================================================================
-    conquistas_desbloqueadas = Conquista.objects.filter(
-        conquistausuario__user_profile=user_profile
-    ).order_by('nome')
-    # =======================================================================
-    # FIM DA ALTERAÇÃO
-    # =======================================================================
-
-    trofeus_semanais = RankingSemanal.objects.filter(user_profile=user_profile, posicao__lte=3).order_by('-ano', '-semana')
-    trofeus_mensais = RankingMensal.objects.filter(user_profile=user_profile, posicao__lte=3).order_by('-ano', '-mes')
-
     return {
         'perfil_visualizado': user_profile,
-        'streak_data': streak_data,
-        'gamificacao_data': gamificacao_data,
-        'xp_proximo_nivel': xp_proximo_nivel,
-        'progresso_percentual': progresso_percentual_xp,
-        'conquistas_desbloqueadas': conquistas_desbloqueadas, # Nome da variável alterado para clareza
-        'meta_hoje': meta_hoje,
-        'meta_diaria_total': settings.meta_diaria_questoes, 
-        'progresso_meta_diaria_percentual': progresso_meta_diaria_percentual,
-        'trofeus_semanais': trofeus_semanais,
-        'trofeus_mensais': trofeus_mensais,
+        'cartao': obter_cartao_perfil(user_profile.id),
     }
     
 @login_required
@@ -354,6 +318,22 @@ def deletar_conta(request):
     return redirect('editar_perfil')
 
 
+@login_required
+def exportar_meu_historico(request):
+    """
+    Download do histórico completo de estudos do usuário (portabilidade de
+    dados), gerado e comprimido em fluxo: nada é montado em memória.
+    """
+    formato = request.GET.get('formato', 'jsonl')
+    if formato not in FORMATOS_EXPORTACAO:
+        formato = 'jsonl'
+    response = StreamingHttpResponse(exportar_historico(request.user, formato), content_type='application/gzip')
+    nome_arquivo = nome_arquivo_exportacao(request.user, formato, timezone.localdate())
+    response['Content-Disposition'] = f'attachment; filename="{nome_arquivo}"'
+    response['Cache-Control'] = 'private, no-store'
+    return response
+
+
 def reenviar_ativacao(request):
     if request.method == 'POST':
         email = request.POST.get('email')
@@ -387,24 +367,12 @@ def reenviar_ativacao(request):
 # VIEWS DE COLEÇÃO
 # =======================================================================
 
-def _grant_all_rewards_to_staff(user_profile, Model, M2M_Manager):
-    """Concede todas as recompensas de um tipo a um membro da equipe."""
-    if not user_profile.user.is_staff:
-        return
-    
-    todos_os_itens = Model.objects.all()
-    for item in todos_os_itens:
-        m2m_field_name = Model.__name__.lower()
-        M2M_Manager.get_or_create(user_profile=user_profile, **{m2m_field_name: item})
-
-
 def _get_colecao_context(request, Model, user_profile, tipo_item, titulo_pagina):
     """
     Função auxiliar para obter o contexto de qualquer página de coleção (Avatares, Bordas, Banners),
-    já com lógica de filtro, ordenação e paginação.
+    já com lógica de filtro, ordenação e paginação. A página é somente leitura:
+    os desbloqueios são reconciliados quando o nível ou o catálogo mudam.
     """
-    _verificar_desbloqueio_recompensas(user_profile)
-    
     related_name_map = {
         'avatar': 'avatares_desbloqueados',
         'borda': 'bordas_desbloqueadas',
@@ -416,18 +384,17 @@ def _get_colecao_context(request, Model, user_profile, tipo_item, titulo_pagina)
     
     M2M_Manager = getattr(user_profile, related_manager_name)
     
-    if user_profile.user.is_staff:
-        todos_os_itens = Model.objects.all()
-        for item in todos_os_itens:
-            M2M_Manager.model.objects.get_or_create(user_profile=user_profile, **{f'{tipo_item}_id': item.id})
-
     base_queryset = Model.objects.all()
     
     filtro_raridade = request.GET.get('raridade')
     if filtro_raridade:
         base_queryset = base_queryset.filter(raridade=filtro_raridade)
 
-    desbloqueados_ids = list(M2M_Manager.values_list(f'{tipo_item}_id', flat=True))
+    # Membros da equipe têm acesso a todos os itens sem registros de posse.
+    if possui_acesso_total(user_profile):
+        desbloqueados_ids = list(Model.objects.values_list('id', flat=True))
+    else:
+        desbloqueados_ids = list(M2M_Manager.values_list(f'{tipo_item}_id', flat=True))
 
     unlocked_first_order = Case(
         When(pk__in=desbloqueados_ids, then=Value(0)),
@@ -502,7 +469,7 @@ def equipar_avatar(request, avatar_id):
     user_profile = request.user.userprofile
     avatar_para_equipar = get_object_or_404(Avatar, id=avatar_id)
     
-    if not user_profile.avatares_desbloqueados.filter(avatar=avatar_para_equipar).exists():
+    if not pode_usar_item(user_profile, 'Avatar', avatar_para_equipar.id):
         messages.error(request, 'Você ainda não desbloqueou este avatar.')
         return redirect('colecao_avatares')
 
@@ -526,7 +493,7 @@ def equipar_borda(request, borda_id):
         messages.error(request, 'Você precisa equipar um avatar antes de poder usar uma borda.')
         return redirect('colecao_bordas')
 
-    if not user_profile.bordas_desbloqueadas.filter(borda=borda_para_equipar).exists():
+    if not pode_usar_item(user_profile, 'Borda', borda_para_equipar.id):
         messages.error(request, 'Você ainda não desbloqueou esta borda.')
         return redirect('colecao_bordas')
 
@@ -546,7 +513,7 @@ def equipar_banner(request, banner_id):
     user_profile = request.user.userprofile
     banner_para_equipar = get_object_or_404(Banner, id=banner_id)
 
-    if not user_profile.banners_desbloqueados.filter(banner=banner_para_equipar).exists():
+    if not pode_usar_item(user_profile, 'Banner', banner_para_equipar.id):
         messages.error(request, 'Você ainda não desbloqueou este banner.')
         return redirect('colecao_banners')
 
@@ -591,8 +558,6 @@ def caixa_de_recompensas(request):
     """ Exibe a página com os prêmios pendentes do usuário para resgate. """
     user_profile = request.user.userprofile
     
-    _verificar_desbloqueio_recompensas(user_profile)
-    
     # =======================================================================
     # ✅ INÍCIO DA CORREÇÃO: Contexto de paginação completo
     # =======================================================================
@@ -650,6 +615,14 @@ def trilhas_de_conquistas(request):
     bordas_map = {b.id: b for b in Borda.objects.filter(id__in=reward_ids['bordas'])}
     banners_map = {b.id: b for b in Banner.objects.filter(id__in=reward_ids['banners'])}
 
+    # O progresso de todas as conquistas disponíveis é calculado de uma só vez.
+    conquistas_disponiveis = [
+        conquista for trilha in trilhas for conquista in trilha.conquistas.all()
+        if conquista.id not in conquistas_usuario_ids and not conquista.is_secreta
+        and {p.id for p in conquista.pre_requisitos.all()}.issubset(conquistas_usuario_ids)
+    ]
+    progresso_por_conquista = obter_progresso_conquistas(user_profile, conquistas_disponiveis)
+
     for trilha in trilhas:
         conquistas_em_serie = [c for c in trilha.conquistas.all() if c.serie]
         conquistas_individuais = [c for c in trilha.conquistas.all() if not c.serie]
@@ -683,26 +656,10 @@ def trilhas_de_conquistas(request):
                 if pre_req_ids.issubset(conquistas_usuario_ids):
                     conquista.status = 'available'
                     
-                    # ✅ INÍCIO DA ALTERAÇÃO: Lógica para múltiplos progressos
-                    conquista.progress_bars = []
-                    # ✅ FIM DA ALTERAÇÃO
-
+                    conquista.progress_bars = progresso_por_conquista.get(conquista.id, [])
                     for condicao in conquista.condicoes.all():
                         cond_text = f"{condicao.variavel.nome_exibicao} {condicao.get_operador_display().lower()} {condicao.valor}"
                         conquista.unlock_conditions_humanized.append(cond_text)
-                    
-                        # ✅ INÍCIO DA ALTERAÇÃO: Calcula o progresso para cada condição
-                        valor_atual = _obter_valor_variavel(user_profile, condicao.variavel.chave, condicao.contexto_json)
-                        valor_meta = condicao.valor
-                        if valor_meta > 0:
-                            progresso = min((valor_atual / valor_meta) * 100, 100)
-                            conquista.progress_bars.append({
-                                'label': condicao.variavel.nome_exibicao,
-                                'atual': int(valor_atual), 
-                                'meta': valor_meta, 
-                                'percentual': int(progresso)
-                            })
-                        # ✅ FIM DA ALTERAÇÃO
                 else:
                     conquista.status = 'locked'
                     for pre_req in conquista.pre_requisitos.all():